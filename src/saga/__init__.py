@@ -17,7 +17,7 @@ from   saga.task           import Task, Container
 from   saga.attributes     import Attributes, Callback
 from   saga.session        import Session, DefaultSession
 from   saga.context        import Context
-from   saga.url            import Url
+from   saga.url            import Url, FrozenUrl
 
 from   saga.exceptions     import SagaException
 from   saga.exceptions     import NotImplemented
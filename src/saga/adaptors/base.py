@@ -91,7 +91,8 @@ class Base (ruc.Configurable) :
     # --------------------------------------------------------------------------
     #
     def get_name (self) :
-        return self._name
+        # self._name is overwritten by the Configurable c'tor
+        return self._info['name']
 
 
     # --------------------------------------------------------------------------
@@ -15,6 +15,8 @@ import saga.adaptors.cpi.job
 
 from saga.job.constants import *
 from saga.utils.job     import TransferDirectives
+from saga.utils.job     import JobArray, JobTable, PollScheduler, ARRAY_INDEX_ENV
+from saga.utils.host_cache import HostCache
 
 import re
 import os
@@ -99,13 +101,18 @@ def _condorscript_generator(url, logger, jds, option_dict=None):
     # Per Job in Bulk settings
     for jd in jds:
 
+        job_array = JobArray.from_description(jd)
+
         # environment -> environment
         # http://research.cs.wisc.edu/htcondor/manual/current/condor_submit.html#SECTION0012514000000000000000
+        environment = ''
         if jd.environment:
-            environment = ''
             for key,val in jd.environment.iteritems():
                 environment += ' "%s=%s"'     % (key, val)
               # condor_file += "\n%-25s = %s" % (key, val)
+
+        # for job arrays, the environment is set per array element (see below)
+        if environment and not job_array:
             condor_file += "\nenvironment               = %s\n" % environment
 
         condor_file += "\nstream_output             = True"
@@ -219,18 +226,46 @@ def _condorscript_generator(url, logger, jds, option_dict=None):
 
         # output -> output
         if jd.output is not None:
-            condor_file += "\noutput       = %s " % os.path.join(job_pwd, jd.output)
+            output = jd.output
+            if job_array:
+                output = job_array.substitute(output, '$(Process)')
+            condor_file += "\noutput       = %s " % os.path.join(job_pwd, output)
 
         # error -> error
         if jd.error is not None:
-            condor_file += "\nerror        = %s " % os.path.join(job_pwd, jd.error)
+            error = jd.error
+            if job_array:
+                error = job_array.substitute(error, '$(Process)')
+            condor_file += "\nerror        = %s " % os.path.join(job_pwd, error)
 
         if jd.total_cpu_count:
             condor_file += "\nrequest_cpus = %d" % jd.total_cpu_count
 
 
         # 'queue' concludes the description of a job
-        condor_file += "\nqueue\n"
+        if not job_array:
+            condor_file += "\nqueue\n"
+
+        elif job_array.start == 0 and job_array.step == 1:
+            # the array indices are the process ids of the cluster
+            condor_file += "\nenvironment  = %s \"%s=$(Process)\"" \
+                         % (environment, ARRAY_INDEX_ENV)
+            condor_file += "\nqueue %d\n" % len(job_array)
+
+        else:
+            # Condor can't map process ids to arbitrary indices, so we queue
+            # the array elements one by one, in index order
+            for idx in job_array.indices:
+                condor_file += "\nenvironment  = %s \"%s=%d\"" \
+                             % (environment, ARRAY_INDEX_ENV, idx)
+                if jd.output is not None:
+                    condor_file += "\noutput       = %s " % os.path.join(job_pwd, 
+                                   job_array.substitute(jd.output, idx))
+                if jd.error is not None:
+                    condor_file += "\nerror        = %s " % os.path.join(job_pwd,
+                                   job_array.substitute(jd.error, idx))
+                condor_file += "\nqueue\n"
+
         condor_file += "\n##### END OF JOB #####\n\n"
 
     condor_file += "\n##### END OF FILE #####\n\n"
@@ -278,7 +313,10 @@ _ADAPTOR_CAPABILITIES = {
                           saga.job.TOTAL_CPU_COUNT,
                           saga.job.PROCESSES_PER_HOST,
                           saga.job.SPMD_VARIATION,
-                          saga.job.FILE_TRANSFER],
+                          saga.job.FILE_TRANSFER,
+                          saga.job.ARRAY_START,
+                          saga.job.ARRAY_END,
+                          saga.job.ARRAY_STEP],
     "job_attributes":    [saga.job.EXIT_CODE,
                           saga.job.EXECUTION_HOSTS,
                           saga.job.NAME,
@@ -399,9 +437,13 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
         self.session       = session
         self.ppn           = 0
         self.is_cray       = False
-        self.jobs          = dict()
+        self.jobs          = JobTable()
         self.query_options = dict()
 
+        # concurrent state polls are served by one condor_q call per cluster
+        self.poller        = PollScheduler(self._job_update_states,
+                                           min_interval=0.5, max_interval=30.0)
+
         rm_scheme = rm_url.scheme
         pty_url   = surl.Url (rm_url)
 
@@ -452,6 +494,20 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
     #
     def initialize(self):
 
+        # the tool paths may be known from an earlier job service
+        commands = HostCache().get(self.shell.url, _ADAPTOR_NAME, self.session)
+
+        if commands:
+            self._commands = commands
+            self._logger.info("Using cached Condor tools: %s", self._commands)
+        else:
+            self._probe_commands()
+            HostCache().set(self.shell.url, _ADAPTOR_NAME, self._commands, self.session)
+
+    # ----------------------------------------------------------------
+    #
+    def _probe_commands(self):
+
         # check if all required condor tools are available
         commands = self._commands.keys()
         ret, out, _ = self.shell.run_sync("which %s " % ' '.join(commands))
@@ -650,7 +706,9 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
             % (self._commands['condor_submit'], submit_file_name))
 
         if ret != 0:
-            # something went wrong
+            # something went wrong -- the cached tool paths may be stale, so
+            # probe again next time
+            HostCache().invalidate(self.shell.url, _ADAPTOR_NAME, self.session)
             message = "Error running job via 'condor_submit': %s. Script was: %s" \
                 % (out, script)
             log_error_and_raise(message, saga.NoSuccess, self._logger)
@@ -661,6 +719,11 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
                     pid = line.split()[2][:-1]
                     break
 
+            # a job array is identified by its cluster id
+            job_array = JobArray.from_description(jd)
+            if job_array:
+                pid = pid.split('.')[0]
+
             # we don't want the 'query' part of the URL to be part of the ID,
             # simply because it can get terribly long (and ugly). to get rid
             # of it, we clone the URL and set the query part to None.
@@ -671,11 +734,17 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
             job_id = "[%s]-[%s]" % (rm_clone, pid)
             self._logger.info("Submitted Condor job with id: %s", job_id)
 
-            # add job to internal list of known jobs.
+            # add job to internal list of known jobs (and forget about
+            # jobs which finished a while ago)
+            self.jobs.purge()
             self.jobs[job_id]          = self._new_job_info()
             self.jobs[job_id]['state'] = saga.job.PENDING
             self.jobs[job_id]['td']    = jd.transfer_directives
 
+            if job_array:
+                self.jobs[job_id]['array']        = job_array
+                self.jobs[job_id]['array_states'] = job_array.initial_states()
+
             # remove submit file(s)
             # TODO: leave them in case of debugging?
             self._logger.info("Submitted Condor job with scheme: '%s'", self.shell.url.scheme)
@@ -880,6 +949,10 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
         if time.time() - info['timestamp'] < _CACHE_TIMEOUT:
             return info
 
+        # the state of a job array is derived from its elements
+        if info.get('array'):
+            return self._job_get_array_info(job_id)
+
         rm, pid = self._adaptor.parse_id(job_id)
 
         # run the Condor 'condor_q' command to get some infos about our job
@@ -956,6 +1029,74 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
         info['timestamp'] = time.time()
 
 
+    # ----------------------------------------------------------------
+    #
+    def _job_get_array_info(self, job_id):
+        """ get the element states of a job array via condor_q (and
+            condor_history, if enabled), and derive the array state from those
+        """
+
+        info     = self.jobs[job_id]
+        ja       = info['array']
+        indices  = ja.indices
+        seen     = dict()
+        _, pid   = self._adaptor.parse_id(job_id)
+
+        # array elements were queued in index order, so the process id of an
+        # element is its position in the index list
+        def _proc2idx(procid):
+            try:
+                return indices[int(procid)]
+            except (ValueError, IndexError):
+                return None
+
+        opts = "%s -autoformat:, ProcId JobStatus" % pid
+        ret, out, err = self._run_condor_q(retries=3, timeout=60, options=opts)
+
+        if ret == 0:
+            for row in filter(bool, out.split('\n')):
+                elems = [col.strip() for col in row.split(',')]
+                if len(elems) != 2:
+                    continue
+                idx = _proc2idx(elems[0])
+                if idx is not None:
+                    seen[idx] = _condor_to_saga_jobstate(elems[1])
+
+        missing = [idx for idx in indices if idx not in seen]
+
+        if self._adaptor.use_hist and missing:
+
+            cmd = "%s %s -autoformat:, ProcId ExitCode ExitBySignal" \
+                % (self._commands['condor_history'], pid)
+            ret, out, err = self.shell.run_sync(cmd)
+
+            if ret != 0:
+                self._logger.warn("condor_history failed: (%s) (%s)", out, err)
+
+            else:
+                for row in filter(bool, out.split('\n')):
+                    elems = [col.strip() for col in row.split(',')]
+                    if len(elems) != 3:
+                        continue
+                    idx = _proc2idx(elems[0])
+                    if idx is None or idx in seen:
+                        continue
+                    if elems[1] == '0' and elems[2] != 'true':
+                        seen[idx] = saga.job.DONE
+                    else:
+                        seen[idx] = saga.job.FAILED
+
+        info['array_states'] = ja.merge_states(info['array_states'], seen)
+        info['state']        = ja.collapse_states(info['array_states'])
+        info['timestamp']    = time.time()
+
+        if info['state'] in [saga.job.DONE, saga.job.FAILED, saga.job.CANCELED]:
+            info['gone'] = True
+            self._handle_file_transfers(info['td'], mode='out')
+
+        return info
+
+
     # ----------------------------------------------------------------
     #
     def _job_get_info_bulk(self, cluster_id, job_ids):
@@ -1215,6 +1356,32 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
             info['state'] = saga.job.CANCELED
 
 
+    # ----------------------------------------------------------------
+    #
+    def _job_update_states(self, job_ids):
+        """ update the infos of the given jobs, with one condor_q call per
+            cluster, and return a dict of their states.  This is the query
+            function of the service's poll scheduler.
+        """
+
+        clusters = dict()
+        for job_id in job_ids:
+
+            # job arrays derive their state from their elements
+            if self.jobs[job_id].get('array'):
+                self._job_get_info(job_id=job_id)
+                continue
+
+            proc_id    = self._adaptor.parse_id(job_id)[1]
+            cluster_id = proc_id.split('.', 1)[0]
+            clusters.setdefault(cluster_id, list()).append(job_id)
+
+        for cluster_id in clusters:
+            self._job_get_info_bulk(cluster_id, clusters[cluster_id])
+
+        return dict([(job_id, self.jobs[job_id]['state']) for job_id in job_ids])
+
+
     # ----------------------------------------------------------------
     #
     def _job_get_state(self, job_id):
@@ -1226,9 +1393,15 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
                                           saga.job.DONE]:
             return self.jobs[job_id]['state']
 
-        # check if we can / should update
+        # check if we can / should update -- concurrent polls are aggregated
         if self.jobs[job_id]['gone'] is not True:
-            self._job_get_info(job_id=job_id)
+            self.poller.poll(job_id)
+
+        # final jobs are not polled anymore
+        if self.jobs[job_id]['state'] in [saga.job.CANCELED,
+                                          saga.job.FAILED,
+                                          saga.job.DONE]:
+            self.poller.forget(job_id)
 
         return self.jobs[job_id]['state']
 
@@ -1328,6 +1501,10 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
         # assume the job was successfully canceled
         self.jobs[job_id]['state'] = saga.job.CANCELED
 
+        if self.jobs[job_id].get('array'):
+            info = self.jobs[job_id]
+            info['array_states'] = info['array'].cancel_states(info['array_states'])
+
 
     # ----------------------------------------------------------------
     #
@@ -1338,6 +1515,11 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
         time_start = time.time()
         time_now   = time_start
         rm, pid    = self._adaptor.parse_id(job_id)
+        interval   = self.poller.interval()
+        deadline   = None
+
+        if timeout >= 0:
+            deadline = time_start + timeout
 
         while True:
             state = self._job_get_state(job_id=job_id)
@@ -1347,8 +1529,8 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
                 state == saga.job.CANCELED:
                 return True
 
-            # avoid busy poll
-            time.sleep(0.5)
+            # avoid busy poll -- poll less often while the state doesn't change
+            interval.sleep(state, deadline)
 
             # check if we hit timeout
             if timeout >= 0:
@@ -1409,6 +1591,15 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
         return self.rm
 
 
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_poll_stats(self):
+        """ implements saga.adaptors.cpi.job.Service.get_poll_stats()
+        """
+        return self.poller.stats()
+
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
@@ -1534,6 +1725,7 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
 
         if ret != 0:
             # condor_submit went wrong
+            HostCache().invalidate(self.shell.url, _ADAPTOR_NAME, self.session)
             message = "Error running job via 'condor_submit': %s. Script: %s" \
                     % (out, script)
             log_error_and_raise(message, saga.NoSuccess, self._logger)
@@ -1570,6 +1762,7 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
             self.jobs[job_id] = self._new_job_info()
             self.jobs[job_id]['state'] = saga.job.PENDING
             self.jobs[job_id]['td']    = job.description.transfer_directives
+            self.jobs.attach(job_id, job)
 
         # remove submit file(s)
         # XXX: maybe leave them in case of debugging?
@@ -1589,11 +1782,15 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
       # if mode == saga.ALL:
       #     pass
 
+        # the container states are fetched in bulk -- we only adapt the poll
+        # interval to how often they change
+        interval = self.poller.interval()
+
         while True:
             states = self.container_get_states(jobs)
             if saga.job.RUNNING not in states and saga.job.PENDING not in states:
                 break
-            time.sleep(5)
+            interval.sleep(states)
 
         return states[0]
 
@@ -1628,33 +1825,21 @@ class CondorJobService (saga.adaptors.cpi.job.Service):
     @SYNC_CALL
     def container_get_states(self, jobs):
 
-        log = self._logger
-
-        # JobIds also include the rm, so we strip that out.  Then sort in
-        # clusters we can query
-        clusters = dict()
-        for job in jobs:
-
-            job_id     = job._adaptor._id
-            proc_id    = self._adaptor.parse_id(job_id)[1]
-            cluster_id = proc_id.split('.', 1)[0]
+        # the states are fetched with one condor_q call per cluster, and
+        # concurrent polls of other threads are served by the same calls
+        job_ids = [job._adaptor._id for job in jobs]
+        self._logger.debug('get bulk states for %s', job_ids)
 
-            log.debug('get bulk state for %s %s %s', job_id, proc_id, cluster_id)
-
-            if cluster_id not in clusters:
-                clusters[cluster_id] = list()
-            clusters[cluster_id].append(job_id)
-
-
-        states = list()
-        for cluster_id in clusters:
+        states = self.poller.poll_many(job_ids)
 
-            job_ids   = clusters[cluster_id]
-            log.debug(' query job state for %s', job_ids)
-            bulk_info = self._job_get_info_bulk(cluster_id, job_ids)
-            states   += [self.jobs[job_id]['state'] for job_id in job_ids]
+        # final jobs are not polled anymore
+        for job_id in job_ids:
+            if states[job_id] in [saga.job.CANCELED,
+                                  saga.job.FAILED,
+                                  saga.job.DONE]:
+                self.poller.forget(job_id)
 
-        return states
+        return [states[job_id] for job_id in job_ids]
 
         # TODO: check "cache" for final state jobs
         # check if we have already reach a terminal state
@@ -1701,6 +1886,7 @@ class CondorJob (saga.adaptors.cpi.job.Job):
         if job_info['reconnect'] is True:
             self._id      = job_info['reconnect_jobid']
             self._started = True
+            self.js.jobs.attach(self._id, self.get_api())
         else:
             self._id      = None
             self._started = False
@@ -1727,6 +1913,29 @@ class CondorJob (saga.adaptors.cpi.job.Job):
             return self.js._job_get_state(self._id)
 
 
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_array_states(self):
+        """ implements saga.adaptors.cpi.job.Job.get_array_states()
+        """
+        info = self.js.jobs.get(self._id, {})
+
+        if not info.get('array'):
+            job_array = None
+            if self.jd:
+                job_array = JobArray.from_description(self.jd)
+            if not job_array:
+                log_error_and_raise("Job %s is not a job array" % self._id,
+                    saga.IncorrectState, self._logger)
+            return job_array.initial_states(saga.job.NEW)
+
+        # a state update also updates the element states
+        self.js._job_get_state(self._id)
+
+        return dict(info['array_states'])
+
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
@@ -1762,6 +1971,8 @@ class CondorJob (saga.adaptors.cpi.job.Job):
         self._id = self.js._job_run(self.jd)
         self._started = True
 
+        self.js.jobs.attach(self._id, self.get_api())
+
 
     # ----------------------------------------------------------------
     #
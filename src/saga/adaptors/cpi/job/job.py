@@ -118,6 +118,11 @@ class Job (cpi_base.CPIBase, cpi_async.Async) :
     @ASYNC
     def get_state_async           (self, ttype)          : pass
 
+    @SYNC
+    def get_array_states          (self, ttype)          : pass
+    @ASYNC
+    def get_array_states_async    (self, ttype)          : pass
+
     @SYNC
     def get_result                (self, ttype)          : pass
     @ASYNC
@@ -64,6 +64,16 @@ class Service (cpi_base.CPIBase, cpi_async.Async) :
     @ASYNC
     def get_job_async              (self, job_id, ttype)       : pass
 
+    @SYNC
+    def get_jobs                   (self, job_ids, ttype)      : pass
+    @ASYNC
+    def get_jobs_async             (self, job_ids, ttype)      : pass
+
+    @SYNC
+    def get_poll_stats             (self, ttype)               : pass
+    @ASYNC
+    def get_poll_stats_async       (self, ttype)               : pass
+
     @SYNC
     def get_self                   (self, ttype)               : pass
     @ASYNC
@@ -65,6 +65,16 @@ class LogicalDirectory (cpi_ns.directory.Directory,
     @ASYNC
     def find_replicas_async (self, name_pattern, attr_pattern, flags, ttype)  : pass
 
+    @SYNC
+    def replicate_bulk          (self, tgts, name, flags, ttype)     : pass
+    @ASYNC
+    def replicate_bulk_async    (self, tgts, name, flags, ttype)     : pass
+
+    @SYNC
+    def upload_bulk             (self, names, tgt, flags, ttype)     : pass
+    @ASYNC
+    def upload_bulk_async       (self, names, tgt, flags, ttype)     : pass
+
 
 
 
@@ -81,6 +81,11 @@ class LogicalFile (cpi_ns.entry.Entry,
     @ASYNC
     def download_async        (self, name, src, flags, ttype)  : pass
 
+    @SYNC
+    def replicate_bulk        (self, names, flags, ttype)      : pass
+    @ASYNC
+    def replicate_bulk_async  (self, names, flags, ttype)      : pass
+
 
 
 
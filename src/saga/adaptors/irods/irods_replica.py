@@ -34,12 +34,17 @@ import sys
 import time
 import string
 import errno
+import Queue
+import threading
+import collections
 
 import saga.url
 import saga.adaptors.base
 import saga.adaptors.cpi.replica
 import saga.utils.pty_shell
 import saga.utils.misc
+import saga.utils.lru_cache
+import saga.utils.host_metrics as suhm
 import shutil
 import saga.namespace as ns
 #from saga.utils.cmdlinewrapper import CommandLineWrapper
@@ -53,7 +58,40 @@ ASYNC_CALL = saga.adaptors.cpi.decorators.ASYNC_CALL
 
 _ADAPTOR_NAME          = 'saga.adaptor.replica.irods'
 _ADAPTOR_SCHEMAS       = ['irods']
-_ADAPTOR_OPTIONS       = []
+_ADAPTOR_OPTIONS       = [
+    {
+    'category'         : _ADAPTOR_NAME,
+    'name'             : 'listing_cache_ttl',
+    'type'             : float,
+    'default'          : 10.0,
+    'documentation'    : '''Lifetime (in seconds) of cached collection
+                          listings (as obtained via 'ils -L').  Listings are
+                          invalidated on all changes made by this adaptor, but
+                          changes made by others are only seen once the
+                          listing expired.  Set to 0 to disable caching.''',
+    'env_variable'     : None
+    },
+    {
+    'category'         : _ADAPTOR_NAME,
+    'name'             : 'bulk_concurrency',
+    'type'             : int,
+    'default'          : 4,
+    'documentation'    : '''Number of transfers which are run concurrently
+                          by the bulk methods (replicate_bulk, upload_bulk),
+                          each in its own shell.''',
+    'env_variable'     : None
+    },
+    {
+    'category'         : _ADAPTOR_NAME,
+    'name'             : 'transfer_threads',
+    'type'             : int,
+    'default'          : 0,
+    'documentation'    : '''Number of threads per transfer (the '-N' option of
+                          iput, iget and irepl).  Set to 0 to use the iRODS
+                          default.''',
+    'env_variable'     : None
+    }
+]
 _ADAPTOR_CAPABILITIES  = {}
 _ADAPTOR_DOC           = {
     'name'             : _ADAPTOR_NAME,
@@ -160,6 +198,87 @@ class irods_resource_entry:
         self.group_members     = []
 
 
+
+# ------------------------------------------------------------------------------
+#
+def irods_get_resource (url) :
+    '''Returns the resource (or resource group) given in the query of an URL
+       ('irods://localhost/?resource=myresource'), or None.
+    '''
+
+    query = saga.Url (url).get_query ()
+
+    if  not query or not '=' in query :
+        return None
+
+    return query.split ("=", 1)[1]
+
+
+# ------------------------------------------------------------------------------
+#
+def irods_parse_listing (out) :
+    '''Parses the output of 'ils -L' in a single pass, and returns an ordered
+       dict of names to irods_logical_entry instances.  All replicas of a file
+       are merged into a single entry, with one location per replica.
+    '''
+
+    # [azebro1@gw68]$ ils -L /osg/home/azebro1
+    # /osg/home/azebro1:
+    #   azebro1           0 UFlorida-SSERCA_FTP            12 2012-11-14.09:55 & irods-test.txt
+    #         /data/cache/UFlorida-SSERCA_FTPplaceholder/home/azebro1/irods-test.txt    osgGridFtpGroup
+    #   azebro1           1 Nebraska_FTP                   12 2012-11-14.09:57   irods-test.txt
+    #         /data/cache/Nebraska_FTPplaceholder/home/azebro1/irods-test.txt    osgGridFtpGroup
+    #   C- /osg/home/azebro1/subdir
+    #
+    # The '&' marks up-to-date replicas.  Lines which show the physical
+    # location of a replica are ignored (not using them for now).
+
+    result = collections.OrderedDict ()
+
+    for item in out.split ("\n") :
+
+        # remove whitespace
+        item = item.strip ()
+
+        if  not item or item.startswith ("/") :
+            continue
+
+        # if we have a directory here
+        if  item.startswith ("C- ") :
+            dir_entry              = irods_logical_entry ()
+            dir_entry.name         = item[3:]
+            dir_entry.is_directory = True
+            result[dir_entry.name] = dir_entry
+            continue
+
+        # if we have a file replica here
+        #  0          1    2                      3     4                   5
+        # ['azebro1', '0', 'UFlorida-SSERCA_FTP', '12', '2012-11-14.09:55', '& irods-test.txt']
+        elems = item.split (None, 5)
+
+        if  len(elems) < 6 or not elems[1].isdigit () :
+            continue  # physical path etc.
+
+        name = elems[5]
+        if  name.startswith ("& ") :
+            name = name[2:].strip ()
+
+        # duplicate name: merge this replica into the existing entry
+        if  name in result :
+            result[name].locations.append (elems[2])
+            continue
+
+        dir_entry           = irods_logical_entry ()
+        dir_entry.owner     = elems[0]
+        dir_entry.locations = [elems[2]]
+        dir_entry.size      = elems[3]
+        dir_entry.date      = elems[4]
+        dir_entry.name      = name
+        result[name]        = dir_entry
+
+    return result
+
+
 ###############################################################################
 # The adaptor class
 
@@ -178,6 +297,18 @@ class Adaptor (saga.adaptors.base.Base):
                                           _ADAPTOR_INFO,
                                           _ADAPTOR_OPTIONS)
 
+        self.opts = self.get_config (_ADAPTOR_NAME)
+
+        # collection listings, keyed by collection path
+        self._listings = saga.utils.lru_cache.LRUCache (
+                             size=1000, ttl=self.opts['listing_cache_ttl'].get_value ())
+
+        # resource information (from 'ilsresc -l') rarely changes
+        self._resources = saga.utils.lru_cache.LRUCache (size=1, ttl=600)
+
+        self.bulk_concurrency = self.opts['bulk_concurrency'].get_value ()
+        self.transfer_threads = self.opts['transfer_threads'].get_value ()
+
 
     def sanity_check (self) :
         try:
@@ -213,14 +344,70 @@ class Adaptor (saga.adaptors.base.Base):
         '''Function takes an iRODS logical directory as an argument,
            and returns a list of irods_logical_entry instances containing
            information on files/directories found in the directory argument.
-           It uses the commandline tool ils.
+           It uses the commandline tool ils.  Listings are cached per
+           collection -- the returned entries must not be altered.
            :param self: reference to adaptor which called this function
            :param dir: iRODS directory we want to get a listing of
            :param wrapper: the wrapper we will make our iRODS
            commands with
         '''
 
-        result = []
+        return self._irods_get_listing (irods_dir, wrapper).values ()
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def irods_get_entry (self, irods_path, wrapper) :
+        '''Returns the irods_logical_entry for a single logical file or
+           directory, as found in the (cached) listing of its parent
+           collection.
+        '''
+
+        irods_path = os.path.normpath (irods_path)
+        parent     = os.path.dirname  (irods_path)
+        name       = os.path.basename (irods_path)
+
+        listing = self._irods_get_listing (parent, wrapper)
+
+        # collections are listed with their full path
+        for key in [name, irods_path] :
+            if  key in listing :
+                return listing[key]
+
+        raise saga.DoesNotExist ("Could not find %s in %s" % (name, parent))
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def irods_invalidate (self, irods_path) :
+        '''Drops the cached listings which show the given logical file or
+           directory, i.e. the listing of the path itself and of its parent
+           collection.  Needs to be called on every change of the path.
+        '''
+
+        irods_path = os.path.normpath (irods_path)
+
+        self._listings.delete (irods_path)
+        self._listings.delete (os.path.dirname (irods_path))
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def _irods_get_listing (self, irods_dir, wrapper) :
+        '''Returns the (cached) listing of a collection, as an ordered dict
+           of names to irods_logical_entry instances.
+        '''
+
+        irods_dir = os.path.normpath (irods_dir)
+
+        try :
+            return self._listings.get (irods_dir)
+        except KeyError :
+            pass
+
         try:
             cw = wrapper
 
@@ -230,159 +417,314 @@ class Adaptor (saga.adaptors.base.Base):
             # make sure we ran ok
             if returncode != 0:
                 raise saga.NoSuccess ("Could not open directory %s, errorcode %s: %s"\
-                                        % (irods_dir, str(cw_result.returncode),
-                                           out))
-    
-            # strip extra linebreaks from stdout, make a list from the linebreaks that
-            # remain, skip first entry which just tells us the current directory
-            for item in out.strip().split("\n"):
-    
-                # if we are listing a directory or remote resource file location i.e.
-                # [azebro1@gw68]$ ils -L /osg/home/azebro1
-                # /osg/home/azebro1:
-                #    azebro1           1 UFlorida-SSERCA_FTP            12 2012-11-14.09:55 & irods-test.txt
-                #          /data/cache/UFlorida-SSERCA_FTPplaceholder/home/azebro1/irods-test.txt    osgGridFtpGroup
-    
-                # then we want to ignore that entry (not using it for now)
-                if item.strip().startswith("/"):
-                    continue 
-                
-                # remove whitespace
-                item = item.strip()
-    
-                # entry for file or directory
-                dir_entry = irods_logical_entry()
-                
-                # if we have a directory here
-                if item.startswith("C- "):
-                    dir_entry.name = item[3:]
-                    dir_entry.is_directory = True
-    
-                # if we have a file here
-                else:
-                    # ils -L output looks like this after you split it:
-                    #  0           1    2                      3     4                   5    6
-                    # ['azebro1', '1', 'UFlorida-SSERCA_FTP', '12', '2012-11-14.09:55', '&', 'irods-test.txt']
-                    # not sure what 1 and 5 are ... 
-                    dir_entry.owner = item.split()[0]
-                    dir_entry.locations = [item.split()[2]]
-                    dir_entry.size = item.split()[3]
-                    dir_entry.date = item.split()[4]
-                    dir_entry.name = item.split()[6]
-    
-                result.append(dir_entry)
-    
-            # merge all entries on the list with duplicate filenames into a
-            # single entry with one filename and multiple resource locations
-            final_list = []
-            for item in result:
-                if item.name in [i.name for i in final_list]:
-                    # duplicate name, merge this entry with the previous one
-                    for final_list_item in final_list:
-                        if final_list_item.name == item.name:
-                            final_list_item.locations.append(item.locations[0])
-                else:
-                    final_list.append(item)
-            return final_list
-    
+                                        % (irods_dir, str(returncode), out))
+
+            listing = irods_parse_listing (out)
+
         except Exception, e:
-            raise saga.NoSuccess ("Couldn't get directory listing: %s %s " % e)
-    
-        return result
+            raise saga.NoSuccess ("Couldn't get directory listing: %s " % e)
+
+        self._listings.set (irods_dir, listing)
+
+        return listing
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def irods_transfer_opts (self) :
+        '''Returns the icommand options which apply to all transfers.
+        '''
+
+        if  self.transfer_threads > 0 :
+            return "-N %d" % self.transfer_threads
+
+        return ""
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def irods_transfer_shell (self) :
+        '''Returns a new shell for running the icommands of one transfer
+           worker.
+        '''
+
+        return saga.utils.pty_shell.PTYShell (saga.url.Url ("ssh://localhost"),
+                                              logger=self._logger)
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def irods_run_transfers (self, transfers) :
+        '''Runs a number of transfers concurrently, each worker using its own
+           shell.  `transfers` is a list of dicts with the keys 'cmd' (the
+           icommand to run), 'source', 'target', 'size' (in bytes, if known),
+           'host' (the remote host, if known) and 'invalidate' (the logical
+           paths changed by the transfer).  The bandwidth of successful
+           transfers is recorded in the host metrics.
+
+           Returns a report with the transfers (with 'state', 'time' and
+           'error' set), and with their aggregate size, time and throughput.
+           Failed transfers are reported, but do not abort the other ones.
+        '''
+
+        todo  = Queue.Queue ()
+        lock  = threading.Lock ()
+        count = [0]
+
+        for t in transfers :
+            t['state'] = saga.task.NEW
+            t['time']  = None
+            t['error'] = None
+            todo.put (t)
+
+        def _worker () :
+
+            shell = None
+
+            try :
+                while True :
+
+                    try :
+                        t = todo.get_nowait ()
+                    except Queue.Empty :
+                        return
+
+                    start = time.time ()
+
+                    try :
+                        if  not shell :
+                            shell = self.irods_transfer_shell ()
+                            start = time.time ()  # don't count the shell startup
+
+                        self._logger.debug ("Executing: %s" % t['cmd'])
+                        returncode, out, _ = shell.run_sync (t['cmd'])
+
+                        if  returncode != 0 :
+                            raise saga.NoSuccess ("errorcode %s: %s" % (returncode, out))
+
+                        t['state'] = saga.task.DONE
+                        t['time']  = time.time () - start
+
+                        if  t.get ('host') :
+                            suhm.HostMetrics ().record_transfer (
+                                    "irods://%s/" % t['host'], t['size'], t['time'])
+
+                    except Exception as e :
+                        t['state'] = saga.task.FAILED
+                        t['error'] = str(e)
+
+                    if  t['time'] is None :
+                        t['time'] = time.time () - start
+
+                    for path in t.get ('invalidate', []) :
+                        self.irods_invalidate (path)
+
+                    with lock :
+                        count[0] += 1
+                        self._logger.info ("transfer %d/%d %s: %s -> %s (%.2fs)"
+                                        % (count[0], len(transfers), t['state'],
+                                           t['source'], t['target'], t['time']))
+            finally :
+                if  shell :
+                    shell.finalize (kill_pty=True)
+
+        start   = time.time ()
+        workers = list()
+
+        for i in range (max (1, min (self.bulk_concurrency, len(transfers)))) :
+            w = threading.Thread (target=_worker, name="irods-transfer-%d" % i)
+            w.start ()
+            workers.append (w)
+
+        for w in workers :
+            w.join ()
+
+        elapsed = time.time () - start
+        nbytes  = sum ([t['size'] or 0 for t in transfers
+                                       if t['state'] == saga.task.DONE])
+
+        report = {'transfers'  : transfers,
+                  'size'       : nbytes,
+                  'time'       : elapsed,
+                  'throughput' : nbytes / elapsed if elapsed > 0 else 0.0}
+
+        for t in transfers :
+            if  t['state'] == saga.task.FAILED :
+                self._logger.error ("transfer %s -> %s failed: %s"
+                                 % (t['source'], t['target'], t['error']))
+
+        self._logger.info ("%d transfers: %d bytes in %.2fs (%.0f bytes/s)"
+                        % (len(transfers), nbytes, elapsed, report['throughput']))
+
+        return report
 
 
     # ----------------------------------------------------------------
     #
     #
-    def irods_get_resource_listing(self):
+    def irods_get_resource_listing(self, wrapper):
         ''' Return a list of irods resources and resource groups with
             information stored in irods_resource_entry format.
             It uses commandline tool ilsresc -l 
             :param self: reference to adaptor which called this function
+            :param wrapper: the wrapper we will make our iRODS
+            commands with
         '''
-        result = []
         try:
-            cw = CommandLineWrapper()
-            cw.open()
-    
             # execute the ilsresc -l command
-            cw_result = cw.run_sync("ilsresc -l")
+            returncode, out, _ = wrapper.run_sync("ilsresc -l")
     
             # make sure we ran ok
-            if cw_result.returncode != 0:
+            if returncode != 0:
                 raise Exception("Could not obtain list of resources with ilsresc -l")
     
-            # convert our command's stdout to a list of text lines
-            cw_result_list = cw_result.stdout.strip().split("\n")
-    
+            # singular resource entry output from ilsresc -l
+            #   resource name: BNL_ATLAS_2_FTP
+            #   resc id: 16214
+            #   zone: osg
+            #   type: MSS universal driver
+            #   class: compound
+            #   location: gw014k1.fnal.gov
+            #   vault: /data/cache/BNL_ATLAS_2_FTPplaceholder
+            #   free space:
+            #   status: up
+            #   info:
+            #   comment:
+            #   create time: 01343055975: 2012-07-23.09:06:15
+            #   modify time: 01347480717: 2012-09-12.14:11:57
+            #   ----
+            #
+            # resource group entries list their members
+            #   resource group: osgGridFtpGroup
+            #   Includes resource: NWICG_NotreDame_FTP
+            #   Includes resource: UCSDT2-B_FTP
+            #   -----
+            attrs = {'zone'        : 'zone',
+                     'type'        : 'type',
+                     'class'       : 'resource_class',
+                     'location'    : 'location',
+                     'vault'       : 'vault',
+                     'free space'  : 'free_space',
+                     'status'      : 'status',
+                     'info'        : 'info',
+                     'comment'     : 'comment',
+                     'create time' : 'create_time',
+                     'modify time' : 'modify_time'}
+
             # list of resource entries we will save our results to
             result = []
-    
-            # while loop instead of for loop so we can mutate the list
-            # as we iterate
-            while cw_result_list:
-                entry = irods_resource_entry()
-                
-                # get our next line from the FRONT of the list
-                line = cw_result_list.pop(0)
-                
+            entry  = None
+
+            for line in out.strip().split("\n"):
+
+                key, _, val = line.partition(":")
+                key = key.strip()
+                val = val.strip()
+
                 # check to see if this is the beginning of a
                 # singular resource entry 
-                if line.startswith("resource name: "):
-                    # singular resource entry output from ilsresc -l
-                    # LINE NUMBERS AND PADDING ADDED
-                    # ex. actual output, line 0 starts like "resource name"
-                    # 0  resource name: BNL_ATLAS_2_FTP
-                    # 1  resc id: 16214
-                    # 2  zone: osg
-                    # 3  type: MSS universal driver
-                    # 4  class: compound
-                    # 5  location: gw014k1.fnal.gov
-                    # 6  vault: /data/cache/BNL_ATLAS_2_FTPplaceholder
-                    # 7  free space:
-                    # 8  status: up
-                    # 9  info:
-                    # 10 comment:
-                    # 11 create time: 01343055975: 2012-07-23.09:06:15
-                    # 12 modify time: 01347480717: 2012-09-12.14:11:57
-                    # 13 ----
-                    entry.name = line[len("resource name: "):].strip()
+                if key == "resource name":
+                    entry = irods_resource_entry()
+                    entry.name = val
                     entry.is_resource_group = False
-    
-                    # TODO: SAVE ALL THE OTHER INFO
-                    for i in range(13):
-                        cw_result_list.pop(0)
-    
-                    #add our resource to the list
                     result.append(entry)
     
                 # check to see if this is an entry for a resource group
-                elif line.startswith("resource group: "):
-                    entry.name = line[len("resource group: "):].strip()
+                elif key == "resource group":
+                    entry = irods_resource_entry()
+                    entry.name = val
                     entry.is_resource_group = True
-    
-                    # continue processing ilsresc -l results until we
-                    # are at the end of the resource group information
-                    # ----- is not printed if there are no further entries
-                    # so we have to make sure to check we don't pop off
-                    # an empty stack too
-                    #
-                    # TODO: ACTUALLY SAVE THE LIST OF RESOURCES IN A RESOURCE GROUP
-                    while len(cw_result_list)>0 and (not line.startswith("-----")):
-                        line=cw_result_list.pop(0)
-    
                     result.append(entry)
-    
-                # for some reason, we're at a line which we have 
-                # no idea how to handle this is bad -- throw an error
-                else:
-                    raise saga.NoSuccess ("Error parsing iRODS ilsresc -l information!")
+
+                elif key == "Includes resource" and entry:
+                    entry.group_members.append(val)
+
+                elif key in attrs and entry:
+                    setattr(entry, attrs[key], val or None)
+
+                # separators and unknown lines are ignored
                     
             return result
     
         except Exception, e:
             raise saga.NoSuccess ("Couldn't get resource listing: %s " % (str(e)))
 
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def irods_get_resource_hosts (self, wrapper) :
+        '''Returns a (cached) dict which maps resource names to the hosts they
+           are located on.
+        '''
+
+        try :
+            return self._resources.get ('hosts')
+        except KeyError :
+            pass
+
+        hosts = dict()
+        for entry in self.irods_get_resource_listing (wrapper) :
+            if  entry.location :
+                hosts[entry.name] = entry.location
+
+        self._resources.set ('hosts', hosts)
+
+        return hosts
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def irods_get_resource_host (self, resource, wrapper) :
+        '''Returns the host a resource is located on, or None if unknown.
+        '''
+
+        try :
+            return self.irods_get_resource_hosts (wrapper).get (resource)
+        except Exception as e :
+            self._logger.debug ("cannot get host for resource %s: %s" % (resource, e))
+            return None
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def irods_rank_locations (self, locations, nbytes, wrapper) :
+        '''Orders the given resources by the expected time to transfer
+           `nbytes` bytes from the hosts they are located on (fastest first).
+           Resources with unknown hosts are moved to the end.  As long as no
+           transfers from any of the hosts were recorded, the order is kept --
+           latency probes alone are not worth the time they take.
+        '''
+
+        if  len(locations) < 2 :
+            return list(locations)
+
+        try :
+            hosts = self.irods_get_resource_hosts (wrapper)
+        except Exception as e :
+            self._logger.debug ("cannot rank locations: %s" % e)
+            return list(locations)
+
+        known   = [loc for loc in locations if     loc in hosts]
+        unknown = [loc for loc in locations if not loc in hosts]
+
+        metrics = suhm.HostMetrics ()
+        urls    = dict ([(loc, "irods://%s/" % hosts[loc]) for loc in known])
+
+        if  not [loc for loc in known if metrics.get_bandwidth (urls[loc])] :
+            return list(locations)
+
+        known   = sorted (known, key=lambda loc :
+                          metrics.estimate (urls[loc], nbytes))
+
+        return known + unknown
+
+
 ###############################################################################
 #
 # logical_directory adaptor class
@@ -406,7 +748,7 @@ class IRODSDirectory (saga.adaptors.cpi.replica.LogicalDirectory) :
 
     def __del__ (self):
         self._logger.debug("Deconstructor for iRODS directory")
-        self.shell.close()
+        self.shell.finalize(kill_pty=True)
 
     # ----------------------------------------------------------------
     #
@@ -492,6 +834,7 @@ class IRODSDirectory (saga.adaptors.cpi.replica.LogicalDirectory) :
         #attempt to run iRODS mkdir command
         try:
             returncode, out, _ = self.shell.run_sync("imkdir %s" % complete_path)
+            self._adaptor.irods_invalidate (complete_path)
 
             if returncode != 0:
                 raise saga.NoSuccess ("Could not create directory %s, errorcode %s: %s"\
@@ -522,6 +865,7 @@ class IRODSDirectory (saga.adaptors.cpi.replica.LogicalDirectory) :
         try:
             self._logger.debug("Executing: irm -r %s" % complete_path)
             returncode, out, _ = self.shell.run_sync("irm -r %s" % complete_path)
+            self._adaptor.irods_invalidate (complete_path)
 
             if returncode != 0:
                 raise saga.NoSuccess ("Could not remove directory %s, errorcode %s: %s"\
@@ -544,35 +888,116 @@ class IRODSDirectory (saga.adaptors.cpi.replica.LogicalDirectory) :
     #
     @SYNC_CALL
     def list (self, npat, flags) :
-       #TODO: Make this use the irods_get_directory_listing
 
         complete_path = self._url.path
-        result = []
         
         self._logger.debug("Attempting to get directory listing for logical"
                            "path %s" % complete_path)
 
         try:
-            returncode, out, _ = self.shell.run_sync("ils %s" % complete_path)
-            
-            if returncode != 0:
-                raise Exception("Could not open directory")
-
-            # strip extra linebreaks from stdout, make a list w/ linebreaks,
-            # skip first entry which tells us the current directory
-            for item in out.strip().split("\n")[1:]:
-                item = item.strip()
-                if item.startswith("C- "):
-                    #result.append("dir " + item[3:])
-                    result.append(item[3:])
-                else:
-                    #result.append("file " +item)
-                    result.append(item)
+            listing = self._adaptor.irods_get_directory_listing (complete_path,
+                                                                 self.shell)
 
         except Exception, ex:
             raise saga.NoSuccess ("Couldn't list directory: %s " % (str(ex)))
 
-        return result
+        return [entry.name for entry in listing]
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    @SYNC_CALL
+    def replicate_bulk (self, tgts, name, flags) :
+        '''This method is called upon logicaldir.replicate_bulk()
+        '''
+
+        resource = irods_get_resource (name)
+        if  not resource :
+            raise saga.BadParameter ("Cannot replicate to %s (no resource)" % name)
+
+        opts      = self._adaptor.irods_transfer_opts ()
+        host      = self._adaptor.irods_get_resource_host (resource, self.shell)
+        transfers = list()
+
+        for tgt in tgts :
+
+            path = saga.utils.misc.url_make_absolute (self._url, tgt).path
+
+            try :
+                size = int (self._adaptor.irods_get_entry (path, self.shell).size)
+            except Exception :
+                size = None
+
+            transfers.append ({'cmd'        : "irepl %s -R %s %s" % (opts, resource, path),
+                               'source'     : path,
+                               'target'     : resource,
+                               'size'       : size,
+                               'host'       : host,
+                               'invalidate' : [path]})
+
+        return self._adaptor.irods_run_transfers (transfers)
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    @SYNC_CALL
+    def upload_bulk (self, names, tgt, flags) :
+        '''This method is called upon logicaldir.upload_bulk().  The files are
+           distributed over (at most) 'bulk_concurrency' bulk puts ('iput -b'),
+           balanced by size.
+        '''
+
+        resource  = None
+        if  tgt :
+            resource = irods_get_resource (tgt)
+
+        args = self._adaptor.irods_transfer_opts ()
+
+        if  flags & saga.namespace.OVERWRITE :
+            args += " -f"
+
+        host = None
+        if  resource :
+            args += " -R %s" % resource
+            host  = self._adaptor.irods_get_resource_host (resource, self.shell)
+
+        # largest files first, each to the group with the least bytes so far
+        sources = list()
+        for name in names :
+            path = saga.Url (name).get_path ()
+            try :
+                size = os.path.getsize (path)
+            except OSError :
+                size = 0   # iput will report the error
+            sources.append ((size, path))
+
+        ngroups = max (1, min (self._adaptor.bulk_concurrency, len(sources)))
+        groups  = [[0, []] for i in range (ngroups)]
+
+        for size, path in sorted (sources, reverse=True) :
+            group     = min (groups)
+            group[0] += size
+            group[1].append (path)
+
+        dirpath   = self._url.path
+        transfers = list()
+
+        for size, paths in groups :
+
+            if  not paths :
+                continue
+
+            transfers.append ({'cmd'        : "iput -b %s %s %s"
+                                            % (args, " ".join (paths), dirpath),
+                               'source'     : paths,
+                               'target'     : dirpath,
+                               'size'       : size,
+                               'host'       : host,
+                               'invalidate' : [dirpath]})
+
+        return self._adaptor.irods_run_transfers (transfers)
 
 ######################################################################
 #
@@ -601,7 +1026,7 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
 
     def __del__ (self):
         self._logger.debug("Deconstructor for iRODS file")
-        self.shell.close()
+        self.shell.finalize(kill_pty=True)
 
 
     # ----------------------------------------------------------------
@@ -713,8 +1138,11 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
          path = self._url.get_path()
          self._logger.debug("Attempting to get a list of replica locations for %s"
                             % path)
-         listing = self._adaptor.irods_get_directory_listing(path, self.shell)
-         return listing[0].locations
+         entry = self._adaptor.irods_get_entry (path, self.shell)
+
+         # fastest locations first
+         return self._adaptor.irods_rank_locations (entry.locations,
+                                                    int(entry.size), self.shell)
 
     # ----------------------------------------------------------------
     #
@@ -723,7 +1151,8 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
     def get_size_self (self) :
          '''This method is called upon logicaldir.get_size()
          '''
-         return self.size
+         entry = self._adaptor.irods_get_entry (self._url.get_path(), self.shell)
+         return int(entry.size)
 
 
     # ----------------------------------------------------------------
@@ -759,6 +1188,7 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
                                % (resource, complete_path) )
             returncode, out, _ = self.shell.run_sync("irepl -R %s %s" 
                                           % (resource, complete_path) )
+            self._adaptor.irods_invalidate (complete_path)
 
             if returncode != 0:
                 raise Exception("Could not replicate logical file %s to resource/resource group %s, errorcode %s: %s"\
@@ -770,6 +1200,40 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
         return
 
 
+    # ----------------------------------------------------------------
+    #
+    #
+    @SYNC_CALL
+    def replicate_bulk (self, names, flags):
+        '''This method is called upon logicalfile.replicate_bulk()
+        '''
+        complete_path = self._url.get_path()
+
+        try :
+            size = int (self._adaptor.irods_get_entry (complete_path, self.shell).size)
+        except Exception :
+            size = None
+
+        opts      = self._adaptor.irods_transfer_opts ()
+        transfers = list()
+
+        for name in names :
+
+            resource = irods_get_resource (name)
+            if  not resource :
+                raise saga.BadParameter ("Cannot replicate to %s (no resource)" % name)
+
+            transfers.append ({'cmd'        : "irepl %s -R %s %s" % (opts, resource, complete_path),
+                               'source'     : complete_path,
+                               'target'     : resource,
+                               'size'       : size,
+                               'host'       : self._adaptor.irods_get_resource_host (
+                                                  resource, self.shell),
+                               'invalidate' : [complete_path]})
+
+        return self._adaptor.irods_run_transfers (transfers)
+
+
     # ----------------------------------------------------------------
     #
     # TODO: This is COMPLETELY untested, as it is unsupported on the only iRODS
@@ -786,6 +1250,8 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
 
         try:
             returncode, out, _ = self.shell.run_sync("imv %s %s" % (source_path, dest_path) )
+            self._adaptor.irods_invalidate (source_path)
+            self._adaptor.irods_invalidate (dest_path)
 
             if errorcode != 0:
                 raise saga.NoSuccess ("Could not move logical file %s to location %s, errorcode %s: %s"\
@@ -818,6 +1284,7 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
 
         try:
             returncode, out, _ = self.shell.run_sync("irm %s" % complete_path)
+            self._adaptor.irods_invalidate (complete_path)
 
             if returncode != 0:
                 raise saga.NoSuccess ("Could not remove file %s, errorcode %s: %s"\
@@ -898,6 +1365,9 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
                 returncode, out, _ = self.shell.run_sync("iput -R %s %s %s %s" %
                                          (resource, arg_list, complete_path, destination_path))
 
+            # the file shows up in the logical dir
+            self._adaptor.irods_invalidate (self._url.get_path())
+
             # check our result
             if returncode != 0:
                 raise saga.NoSuccess ("Could not upload file %s, errorcode %s: %s"\
@@ -916,8 +1386,10 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
            directory.
            @param target: param containing a local path/filename
                           to save the file to
-           @param source: Optional param containing a remote replica to retrieve
-                          the file from (not evaluated, yet)
+           @param source: Optional param containing a ?resource=myresource
+                          query, to retrieve a specific replica.  Otherwise
+                          the replica which is expected to be the fastest
+                          (see list_locations) is retrieved.
         '''
 
         target = name
@@ -941,20 +1413,43 @@ class IRODSFile (saga.adaptors.cpi.replica.LogicalFile) :
                            "will download logical file: %s, specified local target is %s" %
                            (logical_path, target) )
 
-            # was no local target selected?
-            if target==None:
-                self._logger.debug("Attempting to download file %s with iget to current local directory" % \
-                                   logical_path)
-                self._logger.debug("Executing: iget %s" % logical_path)
-                returncode, out, _ = self.shell.run_sync("iget %s" % \
-                                         (logical_path))
+            # pick the replica to download
+            resource = None
+            size     = None
 
-            # local target selected
-            else:
-                self._logger.debug("Attempting to download file %s with iget to %s" % (logical_path, local_path))
-                self._logger.debug("Executing: iget %s %s" % (logical_path, local_path))
-                returncode, out, _ = self.shell.run_sync("iget %s %s " %
-                                         (logical_path, local_path))
+            if source:
+                resource = irods_get_resource (source)
+
+            try:
+                entry = self._adaptor.irods_get_entry (logical_path, self.shell)
+                size  = int(entry.size)
+
+                if not resource and len(entry.locations) > 1:
+                    resource = self._adaptor.irods_rank_locations (
+                                   entry.locations, size, self.shell)[0]
+            except Exception, ex:
+                # iget will pick a replica then
+                self._logger.debug("Cannot select replica for %s: %s" % (logical_path, ex))
+
+            args = self._adaptor.irods_transfer_opts ()
+            if resource:
+                args += " -R %s" % resource
+
+            self._logger.debug("Attempting to download file %s with iget to %s" \
+                               % (logical_path, local_path or "current local directory"))
+            self._logger.debug("Executing: iget %s %s %s" % (args, logical_path, local_path))
+
+            start = time.time()
+            returncode, out, _ = self.shell.run_sync("iget %s %s %s" %
+                                     (args, logical_path, local_path))
+
+            host = None
+            if resource and returncode == 0:
+                host = self._adaptor.irods_get_resource_host (resource, self.shell)
+
+            if host:
+                suhm.HostMetrics ().record_transfer ("irods://%s/" % host,
+                                                     size, time.time() - start)
 
             # check our result
             if returncode != 0:
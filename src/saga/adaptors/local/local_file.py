@@ -0,0 +1,1442 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" local file adaptor implementation """
+
+import os
+import glob
+import fnmatch
+import mmap
+import stat
+import errno
+import shutil
+
+import saga.utils.pty_shell as sups
+import saga.utils.misc      as sumisc
+
+import saga.adaptors.base
+import saga.adaptors.cpi.filesystem
+
+
+SYNC_CALL  = saga.adaptors.cpi.decorators.SYNC_CALL
+ASYNC_CALL = saga.adaptors.cpi.decorators.ASYNC_CALL
+
+
+# ------------------------------------------------------------------------------
+# the adaptor name
+#
+_ADAPTOR_NAME          = "saga.adaptor.local_file"
+_ADAPTOR_SCHEMAS       = ["file", "local"]
+_ADAPTOR_OPTIONS       = []
+
+# remote schemas we can copy from / to -- those transfers can't be done
+# natively, and are routed through a (leased) pty shell to the remote host.
+_STAGING_SCHEMAS       = ["sftp", "gsisftp", "ssh", "gsissh"]
+
+# chunk size for copies which can't be handled in kernel space
+_COPY_BUFSIZE          = 1024 * 1024
+
+# ------------------------------------------------------------------------------
+# the adaptor capabilities & supported attributes
+#
+_ADAPTOR_CAPABILITIES  = {
+    "metrics"          : [],
+    "contexts"         : {"ssh"      : "public/private keypair (for staging)",
+                          "x509"     : "X509 proxy for gsissh (for staging)",
+                          "userpass" : "username/password pair (for staging)"}
+}
+
+# ------------------------------------------------------------------------------
+# the adaptor documentation
+#
+_ADAPTOR_DOC           = {
+    "name"             : _ADAPTOR_NAME,
+    "cfg_options"      : _ADAPTOR_OPTIONS,
+    "capabilities"     : _ADAPTOR_CAPABILITIES,
+    "description"      : """
+        The local file adaptor. This adaptor uses native Python calls (os,
+        shutil, mmap) to access the local filesystem, and thus avoids the
+        shell round trips of the shell file adaptor.
+        """,
+    "details"          : """
+        The adaptor mirrors the semantics of the shell file adaptor for
+        ``file://localhost`` URLs (flags, ``CREATE_PARENTS``, ``OVERWRITE``,
+        ``RECURSIVE``), but performs all operations in-process.  File copies
+        are performed in kernel space (``sendfile(2)``) where the platform
+        supports it, and ``read()`` is backed by ``mmap``.
+
+        Copies from and to remote ``ssh://`` / ``sftp://`` (and ``gsi*``)
+        locations are supported, and are routed through a pty shell to the
+        remote host, exactly as the shell file adaptor would do.
+
+        Known Limitations:
+        ------------------
+
+          * only local URLs are supported -- ``file://`` URLs pointing to
+            remote hosts are declined (``NotImplemented``), and are then
+            handled by the shell file adaptor.
+        """,
+    "schemas"          : {"file"    :"use native calls to access local filesystems",
+                          "local"   :"alias for file://"}
+}
+
+# ------------------------------------------------------------------------------
+# the adaptor info is used to register the adaptor with SAGA
+
+_ADAPTOR_INFO          = {
+    "name"             : _ADAPTOR_NAME,
+    "version"          : "v0.1",
+    "schemas"          : _ADAPTOR_SCHEMAS,
+    "cpis"             : [
+        {
+            "type"     : "saga.namespace.Directory",
+            "class"    : "LocalDirectory"
+        },
+        {
+            "type"     : "saga.namespace.Entry",
+            "class"    : "LocalFile"
+        },
+        {
+            "type"     : "saga.filesystem.Directory",
+            "class"    : "LocalDirectory"
+        },
+        {
+            "type"     : "saga.filesystem.File",
+            "class"    : "LocalFile"
+        }
+    ]
+}
+
+
+# ------------------------------------------------------------------------------
+#
+# native equivalents of the shell commands used by the shell file adaptor.
+# Those raise EnvironmentError on failure, which the CPI methods translate into
+# the respective SAGA exceptions.
+#
+def _mkdir_p(path):
+    """ equivalent of 'mkdir -p path' """
+
+    try:
+        os.makedirs(path)
+
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+# ------------------------------------------------------------------------------
+#
+def _touch(path):
+    """ equivalent of 'touch path' """
+
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+# ------------------------------------------------------------------------------
+#
+def _copy_data(src, tgt):
+    """
+    copy file content from src to tgt.  We use sendfile(2) where available, so
+    that the data never pass through user space, and fall back to a buffered
+    copy otherwise.
+    """
+
+    with open(src, 'rb') as fsrc:
+        with open(tgt, 'wb') as ftgt:
+
+            sendfile = getattr(os, 'sendfile', None)
+            if  sendfile:
+
+                size   = os.fstat(fsrc.fileno()).st_size
+                offset = 0
+
+                try:
+                    while offset < size:
+                        sent = sendfile(ftgt.fileno(), fsrc.fileno(),
+                                        offset, size - offset)
+                        if  not sent:
+                            break
+                        offset += sent
+
+                    if  offset >= size:
+                        return
+
+                except OSError as e:
+                    # sendfile may not support this pair of file types -- we
+                    # can only fall back if nothing has been transferred, yet
+                    if  offset or e.errno not in [errno.EINVAL, errno.ENOSYS]:
+                        raise
+
+                fsrc.seek(offset)
+                ftgt.seek(offset)
+
+            shutil.copyfileobj(fsrc, ftgt, _COPY_BUFSIZE)
+
+
+# ------------------------------------------------------------------------------
+#
+def _copy_file(src, tgt):
+
+    is_new = not os.path.exists(tgt)
+
+    _copy_data(src, tgt)
+
+    # like 'cp', we only set the permissions on newly created files
+    if  is_new:
+        shutil.copymode(src, tgt)
+
+    return tgt
+
+
+# ------------------------------------------------------------------------------
+#
+def _copy_tree(src, tgt):
+
+    copied = list()
+
+    if  not os.path.isdir(tgt):
+        os.mkdir(tgt)
+        shutil.copymode(src, tgt)
+
+    for name in os.listdir(src):
+
+        s = os.path.join(src, name)
+        t = os.path.join(tgt, name)
+
+        if  os.path.islink(s):
+            # 'cp -r' does not dereference links within the copied tree
+            if  os.path.lexists(t):
+                os.unlink(t)
+            os.symlink(os.readlink(s), t)
+            copied.append(t)
+
+        elif os.path.isdir(s):
+            copied += _copy_tree(s, t)
+
+        else:
+            copied.append(_copy_file(s, t))
+
+    return copied
+
+
+# ------------------------------------------------------------------------------
+#
+def _copy(src, tgt, recursive):
+    """
+    equivalent of 'cp [-r] src tgt' -- returns the list of copied files
+    """
+
+    if  os.path.isdir(tgt):
+        tgt = os.path.join(tgt, os.path.basename(src.rstrip('/')))
+
+    if  os.path.isdir(src):
+        if  not recursive:
+            raise IOError(errno.EISDIR, "omitting directory (no RECURSIVE "
+                                        "flag)", src)
+        return _copy_tree(src, tgt)
+
+    return [_copy_file(src, tgt)]
+
+
+# ------------------------------------------------------------------------------
+#
+def _move(src, tgt, recursive):
+    """
+    equivalent of 'mv src tgt' -- returns the new path of src.  Renames within
+    a filesystem are atomic, across filesystems the data are copied.
+    """
+
+    if  os.path.isdir(tgt):
+        tgt = os.path.join(tgt, os.path.basename(src.rstrip('/')))
+
+    if  os.path.isdir(src) and not os.path.islink(src) and not recursive:
+        raise OSError(errno.EISDIR, "cannot move directory (no RECURSIVE "
+                                    "flag)", src)
+
+    shutil.move(src, tgt)
+
+    return tgt
+
+
+# ------------------------------------------------------------------------------
+#
+def _link(src, tgt):
+    """ equivalent of 'ln -s src tgt' """
+
+    if  os.path.isdir(tgt) and not os.path.islink(tgt):
+        tgt = os.path.join(tgt, os.path.basename(src.rstrip('/')))
+
+    os.symlink(src, tgt)
+
+
+# ------------------------------------------------------------------------------
+#
+def _remove(path, recursive):
+    """ equivalent of 'rm -f [-r] path' """
+
+    if  os.path.isdir(path) and not os.path.islink(path):
+        if  not recursive:
+            raise OSError(errno.EISDIR, "cannot remove directory (no "
+                                        "RECURSIVE flag)", path)
+        shutil.rmtree(path)
+        return
+
+    try:
+        os.unlink(path)
+
+    except OSError as e:
+        if  e.errno != errno.ENOENT:
+            raise
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_size(path):
+    """
+    For files, return the number of bytes in the file (as 'wc -c').  For
+    directories, return the disk usage of the whole tree (as 'du -ks').
+    """
+
+    st = os.stat(path)
+
+    if  not stat.S_ISDIR(st.st_mode):
+        return st.st_size
+
+    blocks = st.st_blocks
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            blocks += os.lstat(os.path.join(root, name)).st_blocks
+
+    # st_blocks counts 512 byte blocks, 'du -k' rounds up to kB
+    return ((blocks * 512 + 1023) / 1024) * 1024
+
+
+# ------------------------------------------------------------------------------
+#
+def _is_cycle(top, path):
+    """
+    Returns True if `path` (below `top`) refers to the same directory as one
+    of its ancestors, i.e. if walking it would loop.
+    """
+
+    real = os.path.realpath(path)
+    top  = os.path.normpath(top)
+
+    while path != top and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+        if  os.path.realpath(path) == real:
+            return True
+
+    return False
+
+
+# ------------------------------------------------------------------------------
+#
+def _list(path, npat, recursive, dereference):
+    """
+    Returns the sorted names of the entries in the given directory, relative to
+    it, like 'ls [-d npat]' does -- hidden entries are skipped, unless the
+    pattern starts with a dot.  If `recursive` is set, the entries of all
+    subdirectories are included (like 'ls -R'), and `npat` is matched against
+    the entry names on all levels.  Symlinks to directories are only followed
+    in that case if `dereference` is set, too.
+    """
+
+    if  not recursive:
+
+        if  npat is None:
+            return sorted([n for n in os.listdir(path) if not n.startswith('.')])
+
+        names = [os.path.relpath(p, path)
+                 for p in glob.glob(os.path.join(path, npat))]
+        if  not names:
+            raise OSError(errno.ENOENT, "no match for '%s'" % npat)
+
+        return sorted(names)
+
+    names = list()
+
+    for root, dirs, files in os.walk(path, followlinks=dereference):
+
+        for name in dirs + files:
+            if  name.startswith('.') and not (npat or '').startswith('.'):
+                continue
+            if  npat is not None and not fnmatch.fnmatch(name, npat):
+                continue
+            names.append(os.path.relpath(os.path.join(root, name), path))
+
+        # don't descend into hidden dirs, nor into symlinks to our ancestors
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+
+        if  dereference:
+            dirs[:] = [d for d in dirs
+                         if not _is_cycle(path, os.path.join(root, d))]
+
+    if  npat is not None and not names:
+        raise OSError(errno.ENOENT, "no match for '%s'" % npat)
+
+    return sorted(names)
+
+
+# ------------------------------------------------------------------------------
+#
+def _is_native(url):
+    """
+    Returns True if the given URL can be handled by native calls, i.e. if it
+    refers to the local filesystem.
+    """
+
+    if  url.scheme and url.scheme.lower() not in _ADAPTOR_SCHEMAS:
+        return False
+
+    return sumisc.url_is_local(url)
+
+
+###############################################################################
+# The adaptor class
+
+class Adaptor(saga.adaptors.base.Base):
+    """
+    This is the actual adaptor class, which gets loaded by SAGA (i.e. by the
+    SAGA engine), and which registers the CPI implementation classes which
+    provide the adaptor's functionality.
+    """
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+
+        saga.adaptors.base.Base.__init__(self, _ADAPTOR_INFO, _ADAPTOR_OPTIONS)
+
+        self.opts  = self.get_config(_ADAPTOR_NAME)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def sanity_check(self):
+
+        pass
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_lease_target(self, tgt):
+        """
+        return a URL with empty path which can be used to identify leased copy
+        shells.  We use the same lease path as the shell file adaptor, so that
+        both adaptors share their pools of remote shells.
+        """
+
+        # FrozenUrl caches the derived URL, so this is cheap for repeated calls
+        return saga.FrozenUrl(tgt).with_path('/shell_file_adaptor_command_shell/')
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _check_remote(self, url):
+
+        if  not url.scheme or url.scheme.lower() not in _STAGING_SCHEMAS:
+            raise saga.BadParameter("unsupported schema (%s)" % url)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _lease_shell(self, session, url):
+
+        def _shell_creator(url):
+            return sups.PTYShell(url, session, self._logger)
+
+        lease_tgt = self.get_lease_target(url)
+
+        return session._lease_manager.lease(lease_tgt, _shell_creator, url)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def create_parent(self, session, tgt):
+        """
+        create the parent directory of tgt, which may live on a remote host
+        """
+
+        dirname = sumisc.url_get_dirname(tgt)
+
+        if  _is_native(tgt):
+
+            try:
+                _mkdir_p(dirname)
+            except Exception as e:
+                raise saga.NoSuccess("failed at mkdir '%s': %s" % (dirname, e))
+
+        else:
+
+            self._check_remote(tgt)
+
+            with self._lease_shell(session, tgt) as tmp_shell:
+                ret, out, _ = tmp_shell.run_sync("mkdir -p '%s'" % dirname)
+                if  ret:
+                    raise saga.NoSuccess("failed at mkdir '%s': (%s) (%s)"
+                                       % (dirname, ret, out))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def copy(self, session, src, tgt, flags):
+        """
+        copy src to tgt, where both URLs are absolute.  At least one side needs
+        to be local -- the other side may be remote, in which case we stage the
+        data through a pty shell to that remote host.  Returns the list of
+        copied files.
+        """
+
+        if  flags & saga.filesystem.CREATE_PARENTS:
+            self.create_parent(session, tgt)
+
+        recursive = bool(flags & saga.filesystem.RECURSIVE)
+        rec_flag  = ""
+        if  recursive:
+            rec_flag = "-r "
+
+        if  _is_native(src) and _is_native(tgt):
+
+            try:
+                return _copy(src.path, tgt.path, recursive)
+
+            except Exception as e:
+                raise saga.NoSuccess("copy (%s -> %s) failed: %s"
+                                   % (src, tgt, e))
+
+        elif _is_native(src):
+
+            self._check_remote(tgt)
+
+            with self._lease_shell(session, tgt) as copy_shell:
+                return copy_shell.stage_to_remote(src.path, tgt.path, rec_flag)
+
+        elif _is_native(tgt):
+
+            self._check_remote(src)
+
+            with self._lease_shell(session, src) as copy_shell:
+                return copy_shell.stage_from_remote(src.path, tgt.path, rec_flag)
+
+        else:
+            # we cannot support two remote URLs
+            raise saga.BadParameter("copy from %s to %s is not supported"
+                                  % (src, tgt))
+
+
+###############################################################################
+#
+class LocalDirectory(saga.adaptors.cpi.filesystem.Directory):
+    """ Implements saga.adaptors.cpi.filesystem.Directory """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, api, adaptor):
+
+        _cpi_base = super (LocalDirectory, self)
+        _cpi_base.__init__(api, adaptor)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __del__(self):
+
+        self.finalize(kill=True)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _is_valid(self):
+
+        if  not self.valid:
+            raise saga.IncorrectState("this instance was closed or removed")
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_path(self, tgt_in):
+        """
+        return the local path for the given URL, interpreting relative paths
+        relative to this directory
+        """
+
+        path = saga.FrozenUrl(tgt_in).path
+        if  not path:
+            path = '.'
+
+        return os.path.join(self.url.path or '.', path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_url(self, tgt_in):
+        """
+        return an absolute, read-only URL for the given (possibly relative) URL
+        """
+
+        tgt = saga.FrozenUrl(tgt_in)
+
+        if  sumisc.url_is_relative(tgt):
+            tgt = sumisc.url_make_absolute(saga.FrozenUrl(self.url), tgt)
+
+        return tgt
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def init_instance(self, adaptor_state, url, flags, session):
+        """ Directory instance constructor """
+
+        if flags is None:
+            flags = 0
+
+        self.url         = saga.Url(url)  # deep copy
+        self.flags       = flags
+        self.session     = session
+        self.valid       = False           # will be set by initialize
+
+        # Use `_set_session` method of the base class to set the session object.
+        # `_set_session` and `get_session` methods are provided by `CPIBase`.
+        self._set_session(session)
+
+        # remote hosts are left to the shell file adaptor
+        if  not sumisc.host_is_local(self.url.host):
+            raise saga.NotImplemented("expect local host for '%s://', not '%s'"
+                                     % (self.url.schema, self.url.host))
+
+        self.initialize()
+
+        return self.get_api()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def initialize(self):
+
+        path = self.url.path
+        if not path:
+            path = '.'
+
+        try:
+            if  self.flags & saga.filesystem.CREATE_PARENTS:
+                _mkdir_p(path)
+
+            elif self.flags & saga.filesystem.CREATE:
+                if  not os.path.isdir(path):
+                    os.mkdir(path)
+
+            if  not os.path.isdir(path):
+                raise OSError(errno.ENOTDIR, "no such directory", path)
+
+        except Exception as e:
+            raise saga.BadParameter("invalid dir '%s': %s" % (path, e))
+
+        self._logger.debug("initialized directory (%s)" % path)
+
+        self.valid = True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def finalize(self, kill=False):
+
+        self.valid = False
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def open(self, url, flags):
+
+        self._is_valid()
+
+        adaptor_state = {"from_open" : True,
+                         "cwd"       : saga.FrozenUrl(self.url) }
+
+        if  sumisc.url_is_relative(url):
+            url = sumisc.url_make_absolute(self.get_url(), url)
+
+        return saga.filesystem.File(url=url, flags=flags, session=self.session,
+                                     _adaptor=self._adaptor, _adaptor_state=adaptor_state)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def open_dir(self, url, flags):
+
+        self._is_valid()
+
+        adaptor_state = {"from_open" : True,
+                         "cwd"       : saga.FrozenUrl(self.url) }
+
+        if  sumisc.url_is_relative(url):
+            url = sumisc.url_make_absolute(self.get_url(), url)
+
+        return saga.filesystem.Directory(url=url, flags=flags, session=self.session,
+                                          _adaptor=self._adaptor, _adaptor_state=adaptor_state)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def change_dir(self, tgt, flags):
+
+        cwdurl = saga.FrozenUrl(self.url)
+        tgturl = saga.FrozenUrl(tgt)
+
+        if  not sumisc.url_is_compatible(cwdurl, tgturl):
+            raise saga.BadParameter("target dir outside of namespace '%s': %s"
+                                  % (cwdurl, tgturl))
+
+        path = self._get_path(tgturl)
+
+        try:
+            if  flags & saga.filesystem.CREATE_PARENTS:
+                _mkdir_p(path)
+
+            elif flags & saga.filesystem.CREATE:
+                if  not os.path.isdir(path):
+                    os.mkdir(path)
+
+            if  not os.path.isdir(path):
+                raise OSError(errno.ENOTDIR, "no such directory", path)
+
+        except Exception as e:
+            raise saga.BadParameter("invalid dir '%s': %s (%s)"
+                                   % (cwdurl, tgturl, e))
+
+        self._logger.debug("changed directory (%s)" % path)
+
+        self.url.path = os.path.normpath(path)
+        self.valid    = True
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def close(self, timeout=None):
+
+        if  timeout:
+            raise saga.BadParameter("timeout for close not supported")
+
+        self.finalize(kill=True)
+
+
+    # --------------------------------------------------------------------------
+    @SYNC_CALL
+    def get_url(self):
+
+        self._is_valid()
+
+        return saga.Url(self.url)  # deep copy
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def list(self, npat, flags):
+
+        self._is_valid()
+
+        flags = flags or 0
+        known = saga.filesystem.RECURSIVE | saga.filesystem.DEREFERENCE
+
+        if  flags & ~known:
+            raise saga.BadParameter("list() only supports the RECURSIVE and "
+                                    "DEREFERENCE flags (%s)" % flags)
+
+        path = self.url.path or '.'
+
+        try:
+            names = _list(path, npat,
+                          bool(flags & saga.filesystem.RECURSIVE),
+                          bool(flags & saga.filesystem.DEREFERENCE))
+
+        except Exception as e:
+            raise saga.NoSuccess("failed to list(): %s" % e)
+
+        self.entries = [saga.Url(name) for name in names]
+
+        return self.entries
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def copy_self(self, tgt, flags):
+
+        self._is_valid()
+
+        return self.copy(self.url, tgt, flags)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def copy(self, src_in, tgt_in, flags, _from_task=None):
+
+        self._is_valid()
+
+        src = self._get_url(src_in)
+        tgt = self._get_url(tgt_in)
+
+        files_copied = self._adaptor.copy(self.session, src, tgt, flags)
+
+        if  _from_task:
+            _from_task._set_metric('files_copied', files_copied)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def link_self(self, tgt, flags):
+
+        self._is_valid()
+
+        return self.link(self.url, tgt, flags)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def link(self, src_in, tgt_in, flags, _from_task=None):
+
+        # link will *only* work if src and tgt are on the local FS
+        self._is_valid()
+
+        src = self._get_url(src_in)
+        tgt = self._get_url(tgt_in)
+
+        if  flags & saga.filesystem.RECURSIVE:
+            raise saga.BadParameter("'RECURSIVE' flag not  supported for link()")
+
+        if  not _is_native(src) or not _is_native(tgt):
+            raise saga.BadParameter("link unsupported on FS other than cwd")
+
+        if  flags & saga.filesystem.CREATE_PARENTS:
+            self._adaptor.create_parent(self.session, tgt)
+
+        try:
+            _link(src.path, tgt.path)
+
+        except Exception as e:
+            raise saga.NoSuccess("link (%s -> %s) failed: %s" % (src, tgt, e))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def move_self(self, tgt_in, flags):
+
+        self._is_valid()
+
+        # relative targets are relative to the parent directory
+        parent = saga.FrozenUrl(self.url).with_path(
+                     os.path.dirname(os.path.normpath(self.url.path or '.')))
+        tgt    = saga.FrozenUrl(tgt_in)
+
+        if  sumisc.url_is_relative(tgt):
+            tgt = sumisc.url_make_absolute(parent, tgt)
+
+        tgt = self._move_url(self.url, tgt, flags | saga.filesystem.RECURSIVE)
+
+        # need to re-initialize for new location
+        self.url   = saga.Url(tgt)
+        self.flags = flags
+
+        if  _is_native(tgt):
+            self.initialize()
+        else:
+            self.finalize()
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def move(self, src_in, tgt_in, flags):
+
+        self._move_url(src_in, tgt_in, flags)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _move_url(self, src_in, tgt_in, flags):
+        """ move src to tgt, and return the new URL of src """
+
+        self._is_valid()
+
+        src = self._get_url(src_in)
+        tgt = self._get_url(tgt_in)
+
+        if  not _is_native(src) or not _is_native(tgt):
+            # staging to or from remote hosts is non-atomic, i.e. copy/remove
+            self.copy  (src, tgt, flags)
+            self.remove(src, flags)
+            return tgt
+
+        if  flags & saga.filesystem.CREATE_PARENTS:
+            self._adaptor.create_parent(self.session, tgt)
+
+        try:
+            tgt = tgt.with_path(_move(src.path, tgt.path,
+                                      flags & saga.filesystem.RECURSIVE))
+
+        except Exception as e:
+            raise saga.NoSuccess("move (%s -> %s) failed: %s" % (src, tgt, e))
+
+        return tgt
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def remove_self(self, flags):
+
+        self._is_valid()
+
+        self.remove(self.url, flags)
+        self.valid = False
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def remove(self, tgt_in, flags):
+
+        self._is_valid()
+
+        tgt = self._get_url(tgt_in)
+
+        if  not _is_native(tgt):
+            raise saga.BadParameter("remove of %s is not supported" % tgt)
+
+        try:
+            _remove(tgt.path, flags & saga.filesystem.RECURSIVE)
+
+        except Exception as e:
+            raise saga.NoSuccess("remove (%s) failed: %s" % (tgt, e))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def make_dir(self, tgt_in, flags):
+
+        self._is_valid()
+
+        path = self._get_path(tgt_in)
+
+        if  flags & saga.filesystem.EXCLUSIVE and os.path.isdir(path):
+            raise saga.AlreadyExists("make_dir target (%s) exists" % tgt_in)
+
+        try:
+            if  flags & saga.filesystem.CREATE_PARENTS:
+                _mkdir_p(path)
+            else:
+                os.mkdir(path)
+
+        except Exception as e:
+            raise saga.NoSuccess("make_dir (%s) failed: %s" % (tgt_in, e))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_size_self(self):
+
+        self._is_valid()
+
+        return self.get_size(self.url)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_size(self, tgt_in):
+
+        self._is_valid()
+
+        try:
+            return _get_size(self._get_path(tgt_in))
+
+        except Exception as e:
+            raise saga.NoSuccess("get size for (%s) failed: %s" % (tgt_in, e))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def exists_self(self):
+
+        self._is_valid()
+
+        return self.exists(self.url)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def exists(self, tgt_in):
+
+        self._is_valid()
+
+        return os.path.exists(self._get_path(tgt_in))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_dir_self(self):
+
+        self._is_valid()
+
+        return self.is_dir(self.url)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_dir(self, tgt_in):
+
+        self._is_valid()
+
+        path = self._get_path(tgt_in)
+
+        return os.path.isdir(path) and not os.path.islink(path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_entry_self(self):
+
+        self._is_valid()
+
+        return self.is_entry(self.url)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_entry(self, tgt_in):
+
+        self._is_valid()
+
+        path = self._get_path(tgt_in)
+
+        return os.path.isfile(path) and not os.path.islink(path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_link_self(self):
+
+        self._is_valid()
+
+        return self.is_link(self.url)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_link(self, tgt_in):
+
+        self._is_valid()
+
+        return os.path.islink(self._get_path(tgt_in))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_file_self(self):
+
+        return self.is_entry_self()
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_file(self, tgt_in):
+
+        return self.is_entry(tgt_in)
+
+
+###############################################################################
+#
+class LocalFile(saga.adaptors.cpi.filesystem.File):
+    """ Implements saga.adaptors.cpi.filesystem.File
+    """
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, api, adaptor):
+
+        _cpi_base = super (LocalFile, self)
+        _cpi_base.__init__(api, adaptor)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __del__(self):
+
+        self.finalize(kill=True)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _is_valid(self):
+
+        if  not self.valid:
+            raise saga.IncorrectState("this instance was closed or removed")
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_url(self, tgt_in):
+        """ return an absolute URL for the given (possibly relative) URL """
+
+        tgt = saga.FrozenUrl(tgt_in)
+
+        if  sumisc.url_is_relative(tgt):
+            tgt = sumisc.url_make_absolute(self.cwdurl, tgt)
+
+        return tgt
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def init_instance(self, adaptor_state, url, flags, session):
+
+        if  flags is None:
+            flags = 0
+
+        self._logger.info("init_instance %s" % url)
+
+        if  'from_open' in adaptor_state and adaptor_state['from_open']:
+
+            # comes from directory.open()
+            self.url         = saga.Url(url)  # deep copy
+            self.flags       = flags
+            self.session     = session
+            self.valid       = False  # will be set by initialize
+
+            self.cwdurl      = saga.FrozenUrl(adaptor_state["cwd"])
+            self.cwd         = self.cwdurl.path
+
+            if  sumisc.url_is_relative(self.url):
+                self.url = sumisc.url_make_absolute(self.cwdurl, self.url)
+
+        else:
+
+            if  sumisc.url_is_relative(url):
+                raise saga.BadParameter("cannot handle relative URL (%s)" % url)
+
+            self.url         = saga.Url(url)  # deep copy
+            self.flags       = flags
+            self.session     = session
+            self.valid       = False  # will be set by initialize
+
+            self.cwd         = sumisc.url_get_dirname(url)
+            self.cwdurl      = saga.FrozenUrl(url).with_path(self.cwd)
+
+        # Use `_set_session` method of the base class to set the session object
+        # `_set_session` and `get_session` methods are provided by `CPIBase`.
+        self._set_session(session)
+
+        # remote hosts are left to the shell file adaptor
+        if  not sumisc.host_is_local(self.url.host):
+            raise saga.NotImplemented("expect local host for '%s://', not '%s'"
+                                     % (self.url.schema, self.url.host))
+
+        self.initialize()
+
+        return self.get_api()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def initialize(self):
+
+        path = self.url.path
+
+        try:
+            if  self.flags & saga.filesystem.CREATE_PARENTS:
+                _mkdir_p(sumisc.url_get_dirname(self.url))
+                _touch(path)
+
+            elif self.flags & saga.filesystem.CREATE:
+                _touch(path)
+
+            if  self.flags & saga.filesystem.READ and \
+                not os.access(path, os.R_OK):
+                raise OSError(errno.EACCES, "not readable", path)
+
+            if  self.flags & saga.filesystem.WRITE and \
+                not os.access(path, os.W_OK):
+                raise OSError(errno.EACCES, "not writable", path)
+
+        except Exception as e:
+            if  self.flags & saga.filesystem.CREATE_PARENTS or \
+                self.flags & saga.filesystem.CREATE:
+                raise saga.BadParameter("cannot open/create: '%s' - %s"
+                                       % (path, e))
+            else:
+                raise saga.DoesNotExist("File does not exist: '%s' - %s"
+                                       % (path, e))
+
+        self._logger.info("file initialized (%s)" % path)
+
+        self.valid = True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def finalize(self, kill=False):
+
+        self.valid = False
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def close(self, timeout=None):
+
+        if  timeout:
+            raise saga.BadParameter("timeout for close not supported")
+
+        self.finalize(kill=True)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_url(self):
+
+        self._is_valid()
+
+        return saga.Url(self.url)  # deep copy
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def copy_self(self, tgt_in, flags):
+
+        self._is_valid()
+
+        src = self.url  # is absolute
+        tgt = self._get_url(tgt_in)
+
+        self._adaptor.copy(self.session, src, tgt, flags)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def link_self(self, tgt_in, flags, _from_task=None):
+
+        # link will *only* work if src and tgt are on the local FS
+        self._is_valid()
+
+        src = self.url
+        tgt = self._get_url(tgt_in)
+
+        if  flags & saga.filesystem.RECURSIVE:
+            raise saga.BadParameter("'RECURSIVE' flag unsupported for link()")
+
+        if  not _is_native(tgt):
+            raise saga.BadParameter("link only supported on same FS as cwd")
+
+        if  flags & saga.filesystem.CREATE_PARENTS:
+            self._adaptor.create_parent(self.session, tgt)
+
+        try:
+            _link(src.path, tgt.path)
+
+        except Exception as e:
+            raise saga.NoSuccess("link (%s -> %s) failed: %s" % (src, tgt, e))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def move_self(self, tgt_in, flags):
+
+        self._is_valid()
+
+        src = self.url  # is absolute
+        tgt = self._get_url(tgt_in)
+
+        if  _is_native(tgt):
+
+            if  flags & saga.filesystem.CREATE_PARENTS:
+                self._adaptor.create_parent(self.session, tgt)
+
+            try:
+                tgt = tgt.with_path(_move(src.path, tgt.path, False))
+
+            except Exception as e:
+                raise saga.NoSuccess("move (%s -> %s) failed: %s"
+                                   % (src, tgt, e))
+
+        else:
+            # staging to a remote host is non-atomic, i.e. copy/remove
+            self.copy_self  (tgt, flags)
+            self.remove_self(flags)
+
+        # we are not closed at this point, but need to re-initialize for the
+        # new location (if that is still ours)
+        self.url   = saga.Url(tgt)
+        self.flags = flags
+
+        if  _is_native(tgt):
+            self.initialize()
+        else:
+            self.finalize()
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def write(self, string, flags=None):
+        """
+        Write the given string to the file.  If the APPEND flag is set, the
+        string is appended to the current file content, otherwise the file
+        content is replaced.
+        """
+
+        self._is_valid()
+
+        if  flags is None:
+            flags = self.flags
+        else:
+            self.flags = flags
+
+        if  flags & saga.filesystem.APPEND: mode = 'ab'
+        else                              : mode = 'wb'
+
+        try:
+            with open(self.url.path, mode) as f:
+                f.write(string)
+
+        except Exception as e:
+            raise saga.NoSuccess("write to (%s) failed: %s" % (self.url, e))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def read(self, size=None):
+        """
+        Read (at most 'size' bytes of) the file content.  The file is memory
+        mapped, so that only the requested part of the file is actually paged
+        in.
+        """
+
+        self._is_valid()
+
+        try:
+            with open(self.url.path, 'rb') as f:
+
+                # empty files can't be mapped -- but some special files (think
+                # /proc) report a zero size and still have content
+                if  not os.fstat(f.fileno()).st_size:
+                    if  size is None: return f.read()
+                    else            : return f.read(size)
+
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    if  size is None: return m[:]
+                    else            : return m[:size]
+                finally:
+                    m.close()
+
+        except Exception as e:
+            raise saga.NoSuccess("read from (%s) failed: %s" % (self.url, e))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def remove_self(self, flags):
+
+        self._is_valid()
+
+        try:
+            _remove(self.url.path, flags & saga.filesystem.RECURSIVE)
+
+        except Exception as e:
+            raise saga.NoSuccess("remove (%s) failed: %s" % (self.url, e))
+
+        self.valid = False
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_size_self(self):
+
+        self._is_valid()
+
+        try:
+            return _get_size(self.url.path)
+
+        except Exception as e:
+            raise saga.NoSuccess("get size for (%s) failed: %s" % (self.url, e))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_dir_self(self):
+
+        self._is_valid()
+
+        path = self.url.path or '.'
+
+        return os.path.isdir(path) and not os.path.islink(path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_entry_self(self):
+
+        self._is_valid()
+
+        path = self.url.path
+
+        return os.path.isfile(path) and not os.path.islink(path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_link_self(self):
+
+        self._is_valid()
+
+        return os.path.islink(self.url.path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_file_self(self):
+
+        return self.is_entry_self()
+
+
+# ------------------------------------------------------------------------------
+
@@ -17,6 +17,8 @@ import saga.adaptors.base
 import saga.adaptors.cpi.job
 
 from saga.job.constants import *
+from saga.utils.job     import JobArray, script_submit_cmd
+from saga.utils.host_cache import HostCache
 
 import re
 import os 
@@ -129,7 +131,16 @@ def _lsfcript_generator(url, logger, jd, ppn, lsf_version, queue, span):
         for arg in jd.arguments:
             exec_n_args += "%s " % (arg)
 
-    if jd.name is not None:
+    # job arrays are specified as part of the job name: 'name[1-10:2]'
+    job_array = JobArray.from_description(jd)
+    if job_array:
+        name = jd.name
+        if name is None:
+            name = "saga"
+        lsf_params += '#BSUB -J "%s[%s]" \n' \
+            % (name, job_array.range_spec(min_start=1))
+        exec_n_args = job_array.index_export("$LSB_JOBINDEX") + exec_n_args
+    elif jd.name is not None:
         lsf_params += "#BSUB -J %s \n" % jd.name
 
     if jd.environment is not None:
@@ -202,15 +213,14 @@ def _lsfcript_generator(url, logger, jd, ppn, lsf_version, queue, span):
     if span:
         lsf_params += '#BSUB -R "span[%s]"\n' % span
 
-    # escape all double quotes and dollarsigns, otherwise 'echo |'
-    # further down won't work
+    # escape all dollarsigns, as the script is expanded by the shell when
+    # passed to bsub via a here-document further down.
     # only escape '$' in args and exe. not in the params
     #exec_n_args = workdir_directives exec_n_args
     exec_n_args = exec_n_args.replace('$', '\\$')
 
     lsfscript = "\n#!/bin/bash \n%s\n%s\n%s" % (lsf_params, env_variable_list, exec_n_args)
 
-    lsfscript = lsfscript.replace('"', '\\"')
     return lsfscript
 
 
@@ -243,7 +253,10 @@ _ADAPTOR_CAPABILITIES = {
                           saga.job.WORKING_DIRECTORY,
                           saga.job.SPMD_VARIATION, # TODO: 'hot'-fix for BigJob
                           saga.job.PROCESSES_PER_HOST,
-                          saga.job.TOTAL_CPU_COUNT],
+                          saga.job.TOTAL_CPU_COUNT,
+                          saga.job.ARRAY_START,
+                          saga.job.ARRAY_END,
+                          saga.job.ARRAY_STEP],
     "job_attributes":    [saga.job.EXIT_CODE,
                           saga.job.EXECUTION_HOSTS,
                           saga.job.CREATED,
@@ -435,6 +448,20 @@ class LSFJobService (saga.adaptors.cpi.job.Service):
     # ----------------------------------------------------------------
     #
     def initialize(self):
+
+        # the tool paths and versions may be known from an earlier job service
+        commands = HostCache().get(self.shell.url, _ADAPTOR_NAME, self.session)
+
+        if commands:
+            self._commands = commands
+            self._logger.info("Using cached LSF tools: %s" % self._commands)
+        else:
+            self._probe_commands()
+            HostCache().set(self.shell.url, _ADAPTOR_NAME, self._commands, self.session)
+
+    # ----------------------------------------------------------------
+    #
+    def _probe_commands(self):
         # check if all required lsf tools are available
         for cmd in self._commands.keys():
             ret, out, _ = self.shell.run_sync("which %s " % cmd)
@@ -513,26 +540,19 @@ class LSFJobService (saga.adaptors.cpi.job.Service):
         except Exception, ex:
             log_error_and_raise(str(ex), saga.BadParameter, self._logger)
 
-        # try to create the working directory (if defined)
+        # Now we want to execute the script.  In a single shell command, we
+        # create the working directory (if defined), and pipe the generated
+        # script into 'bsub' via a here-document.
         # WARNING: this assumes a shared filesystem between login node and
         #          compute nodes.
-        if jd.working_directory is not None:
-            self._logger.info("Creating working directory %s" % jd.working_directory)
-            ret, out, _ = self.shell.run_sync("mkdir -p %s" % (jd.working_directory))
-            if ret != 0:
-                # something went wrong
-                message = "Couldn't create working directory - %s" % (out)
-                log_error_and_raise(message, saga.NoSuccess, self._logger)
-
-        # Now we want to execute the script. This process consists of two steps:
-        # (1) we create a temporary file with 'mktemp' and write the contents of 
-        #     the generated PBS script into it
-        # (2) we call 'qsub <tmpfile>' to submit the script to the queueing system
-        cmdline = """SCRIPTFILE=`mktemp -t SAGA-Python-LSFJobScript.XXXXXX` && echo "%s" > $SCRIPTFILE && %s < $SCRIPTFILE && rm -f $SCRIPTFILE""" % (script, self._commands['bsub']['path'])
+        cmdline = script_submit_cmd(self._commands['bsub']['path'], script,
+                                    mkdirs=[jd.working_directory], expand=True)
         ret, out, _ = self.shell.run_sync(cmdline)
 
         if ret != 0:
-            # something went wrong
+            # something went wrong -- the cached tool paths may be stale, so
+            # probe again next time
+            HostCache().invalidate(self.shell.url, _ADAPTOR_NAME, self.session)
             message = "Error running job via 'bsub': %s. Commandline was: %s" \
                 % (out, cmdline)
             log_error_and_raise(message, saga.NoSuccess, self._logger)
@@ -557,7 +577,13 @@ class LSFJobService (saga.adaptors.cpi.job.Service):
 
             self._logger.info("Submitted LSF job with id: %s" % job_id)
 
-            # update job dictionary
+            # update job dictionary -- the array info needs to be in place
+            # before the job id, which triggers job monitoring
+            job_array = JobArray.from_description(jd)
+            if job_array:
+                self.jobs[job_obj]['array']        = job_array
+                self.jobs[job_obj]['array_states'] = job_array.initial_states()
+
             self.jobs[job_obj]['job_id'] = job_id
             self.jobs[job_obj]['submitted'] = job_id
 
@@ -649,6 +675,11 @@ class LSFJobService (saga.adaptors.cpi.job.Service):
         curr_info['end_time'   ] = prev_info.get ('end_time'   )
         curr_info['gone'       ] = prev_info.get ('gone'       )
 
+        # the state of a job array is derived from its elements
+        if prev_info.get('array'):
+            curr_info['array'] = prev_info['array']
+            return self._job_get_array_info(job_obj, prev_info, curr_info)
+
         rm, pid = self._adaptor.parse_id(job_obj._id)
 
         # run the LSF 'bjobs' command to get some infos about our job
@@ -687,6 +718,42 @@ class LSFJobService (saga.adaptors.cpi.job.Service):
         # return the new job info dict
         return curr_info
 
+    # ----------------------------------------------------------------
+    #
+    def _job_get_array_info(self, job_obj, prev_info, curr_info):
+        """ get the element states of a job array via bjobs, and derive the
+            state of the array from those
+        """
+        ja      = curr_info['array']
+        seen    = dict()
+        rm, pid = self._adaptor.parse_id(job_obj._id)
+
+        # bjobs lists one line per array element:
+        #   3,RUN
+        #   4,PEND
+        ret, out, _ = self.shell.run_sync("%s -noheader -o 'jobindex stat delimiter=\",\"' %s" \
+            % (self._commands['bjobs']['path'], pid))
+
+        if ret != 0 and "Illegal job ID" not in out:
+            message = "Error retrieving job array info via 'bjobs': %s" % out
+            log_error_and_raise(message, saga.NoSuccess, self._logger)
+
+        if ret == 0:
+            for line in out.split('\n'):
+                elems = line.strip().split(',')
+                if len(elems) != 2:
+                    continue
+                for idx in ja.parse_indices(elems[0]):
+                    seen[idx] = _lsf_to_saga_jobstate(elems[1])
+
+        curr_info['array_states'] = ja.merge_states(prev_info['array_states'], seen)
+        curr_info['state']        = ja.collapse_states(curr_info['array_states'])
+
+        if curr_info['state'] in [saga.job.DONE, saga.job.FAILED, saga.job.CANCELED]:
+            curr_info['gone'] = True
+
+        return curr_info
+
     # ----------------------------------------------------------------
     #
     def _job_get_state(self, job_obj):
@@ -751,6 +818,11 @@ class LSFJobService (saga.adaptors.cpi.job.Service):
         # assume the job was succesfully canceled
         self.jobs[job_obj]['state'] = saga.job.CANCELED
 
+        if self.jobs[job_obj].get('array'):
+            job_info = self.jobs[job_obj]
+            job_info['array_states'] = job_info['array'].cancel_states(
+                                                   job_info['array_states'])
+
     # ----------------------------------------------------------------
     #
     def _job_wait(self, job_obj, timeout):
@@ -943,6 +1015,26 @@ class LSFJob (saga.adaptors.cpi.job.Job):
         """
         return self.js._job_get_state(job_obj=self)
             
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_array_states(self):
+        """ implements saga.adaptors.cpi.job.Job.get_array_states()
+        """
+        job_info = self.js.jobs.get(self, {})
+
+        if not job_info.get('array'):
+            job_array = None
+            if self.jd:
+                job_array = JobArray.from_description(self.jd)
+            if not job_array:
+                log_error_and_raise("Job %s is not a job array" % self._id,
+                    saga.IncorrectState, self._logger)
+            return job_array.initial_states(saga.job.NEW)
+
+        # element states are updated by the job monitoring thread
+        return dict(job_info['array_states'])
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
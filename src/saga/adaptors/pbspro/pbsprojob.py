@@ -14,6 +14,8 @@ import saga.adaptors.base
 import saga.adaptors.cpi.job
 
 from saga.job.constants import *
+from saga.utils.job     import JobArray, JobTable, PollScheduler, script_submit_cmd
+from saga.utils.host_cache import HostCache
 
 import re
 import os 
@@ -25,8 +27,11 @@ from cgi  import parse_qs
 SYNC_CALL  = saga.adaptors.cpi.decorators.SYNC_CALL
 ASYNC_CALL = saga.adaptors.cpi.decorators.ASYNC_CALL
 
-SYNC_WAIT_UPDATE_INTERVAL =  1  # seconds
-MONITOR_UPDATE_INTERVAL   = 60  # seconds
+SYNC_WAIT_UPDATE_INTERVAL =  1  # seconds (minimal poll interval)
+MONITOR_UPDATE_INTERVAL   = 60  # seconds (maximal poll interval)
+
+# job array elements are listed by 'qstat -t' as '1234[7].server'
+_ARRAY_ELEMENT_RE = re.compile(r'^\d+\[(\d+)\]')
 
 
 # --------------------------------------------------------------------
@@ -53,38 +58,36 @@ class _job_state_monitor(threading.Thread):
         # a row...
         error_type_count = dict()
 
+        # poll quickly while job states change, and back off otherwise
+        interval = self.js.poller.interval()
+        states   = None
+
         while not self._stop.is_set ():
 
             try:
-                # FIXME: do bulk updates here! we don't want to pull information
-                # job by job. that would be too inefficient!
-                jobs = self.js.jobs
-
-                for job_id in jobs.keys() :
-
-                    job_info = jobs[job_id]
-
-                    # we only need to monitor jobs that are not in a
-                    # terminal state, so we can skip the ones that are 
-                    # either done, failed or canceled
-                    if  job_info['state'] not in [saga.job.DONE, saga.job.FAILED, saga.job.CANCELED] :
-
-                        # Store the current state since the current state 
-                        # variable is updated when _job_get_info is called
-                        pre_update_state = job_info['state']
-
-                        new_job_info = self.js._job_get_info(job_id, reconnect=False)
-                        self.logger.info ("Job monitoring thread updating Job "
-                                          "%s (old state: %s, new state: %s)" % 
-                                          (job_id, pre_update_state, new_job_info['state']))
-
-                        # fire job state callback if 'state' has changed
-                        if  new_job_info['state'] != pre_update_state:
-                            job_obj = job_info['obj']
-                            job_obj._attributes_i_set('state', new_job_info['state'], job_obj._UP, True)
-
-                        # update job info
-                        jobs[job_id] = new_job_info
+                # we only need to monitor jobs that are not in a terminal
+                # state, so we can skip the ones that are either done, failed
+                # or canceled.  All others are updated in a single qstat call
+                # (which also fires the state callbacks).
+                jobs    = self.js.jobs
+                jobs.purge()
+
+                job_ids = [job_id for job_id in jobs.keys()
+                           if jobs[job_id]['state'] not in [saga.job.DONE,
+                                                            saga.job.FAILED,
+                                                            saga.job.CANCELED]]
+                if  job_ids:
+                    self.js.poller.poll_many(job_ids)
+
+                # final jobs are not polled anymore
+                for job_id in job_ids:
+                    if  jobs[job_id]['state'] in [saga.job.DONE,
+                                                  saga.job.FAILED,
+                                                  saga.job.CANCELED]:
+                        self.js.poller.forget(job_id)
+
+                states = sorted([(job_id, jobs[job_id]['state'])
+                                 for job_id in job_ids])
 
             except Exception as e:
                 import traceback
@@ -103,7 +106,7 @@ class _job_state_monitor(threading.Thread):
                         return
 
             finally :
-                time.sleep (MONITOR_UPDATE_INTERVAL)
+                self._stop.wait (interval.next (states))
 
 
 # --------------------------------------------------------------------
@@ -347,15 +350,20 @@ def _pbscript_generator(url, logger, jd, ppn, gres, pbs_version, is_cray=False,
     if gres:
         pbs_params += "#PBS -l gres=%s\n" % gres
 
-    # escape all double quotes and dollarsigns, otherwise 'echo |'
-    # further down won't work
+    # job arrays
+    job_array = JobArray.from_description(jd)
+    if job_array:
+        pbs_params += "#PBS -J %s \n" % job_array.range_spec()
+        exec_n_args = job_array.index_export('$PBS_ARRAY_INDEX') + exec_n_args
+
+    # escape all dollarsigns, as the script is expanded by the shell when
+    # passed to qsub via a here-document further down.
     # only escape '$' in args and exe. not in the params
     exec_n_args = workdir_directives + exec_n_args
     exec_n_args = exec_n_args.replace('$', '\\$')
 
     pbscript = "\n#!/bin/bash \n%s%s" % (pbs_params, exec_n_args)
 
-    pbscript = pbscript.replace('"', '\\"')
     return pbscript
 
 
@@ -391,7 +399,10 @@ _ADAPTOR_CAPABILITIES = {
                           saga.job.WALL_TIME_LIMIT,
                           saga.job.PROCESSES_PER_HOST,
                           saga.job.SPMD_VARIATION,
-                          saga.job.TOTAL_CPU_COUNT],
+                          saga.job.TOTAL_CPU_COUNT,
+                          saga.job.ARRAY_START,
+                          saga.job.ARRAY_END,
+                          saga.job.ARRAY_STEP],
     "job_attributes":    [saga.job.EXIT_CODE,
                           saga.job.EXECUTION_HOSTS,
                           saga.job.CREATED,
@@ -535,9 +546,15 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
         self.is_cray = ""
         self.queue   = None
         self.shell   = None
-        self.jobs    = dict()
+        self.jobs    = JobTable()
         self.gres    = None
 
+        # job state updates of the monitoring thread and of waits are
+        # aggregated into bulk qstat calls
+        self.poller  = PollScheduler(self._job_update_infos,
+                                     min_interval=SYNC_WAIT_UPDATE_INTERVAL,
+                                     max_interval=MONITOR_UPDATE_INTERVAL)
+
         # the monitoring thread - one per service instance
         self.mt = _job_state_monitor(job_service=self)
         self.mt.start()
@@ -589,6 +606,54 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
     # ----------------------------------------------------------------
     #
     def initialize(self):
+
+        # the host capabilities may be known from an earlier job service
+        caps = HostCache().get(self.shell.url, _ADAPTOR_NAME, self.session)
+
+        if not caps:
+            caps = self._probe_host()
+            HostCache().set(self.shell.url, _ADAPTOR_NAME, caps, self.session)
+        else:
+            self._logger.debug("using cached PBSPro host capabilities")
+
+        self._commands = caps['commands']
+
+        # TODO: Get rid of this, as I dont think there is any justification that Cray's are special
+        #
+        # let's try to figure out if we're working on a Cray machine.
+        # naively, we assume that if we can find the 'aprun' command in the
+        # path that we're logged in to a Cray machine.
+        if self.is_cray == "":
+            self.is_cray = caps['is_cray']
+            if self.is_cray:
+                self._logger.info("Host '%s' seems to be a Cray machine." \
+                    % self.rm.host)
+        else: 
+            self._logger.info("Assuming host is a Cray since 'craytype' is set to: %s" % self.is_cray)
+
+        #
+        # Get number of processes per node
+        #
+        if self.ppn:
+            self._logger.debug("Using user specified 'ppn': %d" % self.ppn)
+            return
+
+        # the cached capabilities may come from a job service with user
+        # specified 'ppn' -- then we did not probe it, yet.
+        if caps.get('ppn') is None:
+            caps['ppn'] = self._probe_ppn()
+            HostCache().set(self.shell.url, _ADAPTOR_NAME, caps, self.session)
+
+        self.ppn = caps['ppn']
+
+    # ----------------------------------------------------------------
+    #
+    def _probe_host(self):
+        """
+        Checks the PBS installation on the target host, and returns the
+        detected capabilities (which are cached in the host cache).
+        """
+
         # check if all required pbs tools are available
         for cmd in self._commands.keys():
             ret, out, _ = self.shell.run_sync("which %s " % cmd)
@@ -619,29 +684,26 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
 
         self._logger.info("Found PBS tools: %s" % self._commands)
 
-        #
-        # TODO: Get rid of this, as I dont think there is any justification that Cray's are special
-        #
-        # let's try to figure out if we're working on a Cray machine.
-        # naively, we assume that if we can find the 'aprun' command in the
-        # path that we're logged in to a Cray machine.
-        if self.is_cray == "":
-            ret, out, _ = self.shell.run_sync('which aprun')
-            if ret != 0:
-                self.is_cray = ""
-            else:
-                self._logger.info("Host '%s' seems to be a Cray machine." \
-                    % self.rm.host)
-                self.is_cray = "unknowncray"
-        else: 
-            self._logger.info("Assuming host is a Cray since 'craytype' is set to: %s" % self.is_cray)
+        # check for the 'aprun' command (see initialize())
+        ret, out, _ = self.shell.run_sync('which aprun')
+        if ret != 0: is_cray = ""
+        else       : is_cray = "unknowncray"
 
-        #
-        # Get number of processes per node
-        #
-        if self.ppn:
-            self._logger.debug("Using user specified 'ppn': %d" % self.ppn)
-            return
+        # the ppn is only probed if it is not specified by the user
+        ppn = None
+        if not self.ppn:
+            ppn = self._probe_ppn()
+
+        return {'commands': self._commands,
+                'is_cray':  is_cray,
+                'ppn':      ppn}
+
+    # ----------------------------------------------------------------
+    #
+    def _probe_ppn(self):
+        """
+        Returns the number of processes per node, as reported by pbsnodes.
+        """
 
         # TODO: this is quite a hack. however, it *seems* to work quite
         #       well in practice.
@@ -671,9 +733,11 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
                         ppn_list[np] += 1
                     else:
                         ppn_list[np] = 1
-            self.ppn = max(ppn_list, key=ppn_list.get)
+            ppn = max(ppn_list, key=ppn_list.get)
             self._logger.debug("Found the following 'ppn' configurations: %s. "
-                "Using %s as default ppn."  % (ppn_list, self.ppn))
+                "Using %s as default ppn."  % (ppn_list, ppn))
+
+        return ppn
 
     # ----------------------------------------------------------------
     #
@@ -707,26 +771,19 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
         except Exception, ex:
             log_error_and_raise(str(ex), saga.BadParameter, self._logger)
 
-        # try to create the working directory (if defined)
+        # Now we want to execute the script.  In a single shell command, we
+        # create the working directory (if defined), and pipe the generated
+        # script into 'qsub' via a here-document.
         # WARNING: this assumes a shared filesystem between login node and
         #          compute nodes.
-        if jd.working_directory:
-            self._logger.info("Creating working directory %s" % jd.working_directory)
-            ret, out, _ = self.shell.run_sync("mkdir -p %s" % (jd.working_directory))
-            if ret != 0:
-                # something went wrong
-                message = "Couldn't create working directory - %s" % (out)
-                log_error_and_raise(message, saga.NoSuccess, self._logger)
-
-        # Now we want to execute the script. This process consists of two steps:
-        # (1) we create a temporary file with 'mktemp' and write the contents of 
-        #     the generated PBS script into it
-        # (2) we call 'qsub <tmpfile>' to submit the script to the queueing system
-        cmdline = """SCRIPTFILE=`mktemp -t SAGA-Python-PBSProJobScript.XXXXXX` &&  echo "%s" > $SCRIPTFILE && %s $SCRIPTFILE && rm -f $SCRIPTFILE""" %  (script, self._commands['qsub']['path'])
+        cmdline = script_submit_cmd(self._commands['qsub']['path'], script,
+                                    mkdirs=[jd.working_directory], expand=True)
         ret, out, _ = self.shell.run_sync(cmdline)
 
         if ret != 0:
-            # something went wrong
+            # something went wrong -- the cached host capabilities may be
+            # stale, so probe again next time
+            HostCache().invalidate(self.shell.url, _ADAPTOR_NAME, self.session)
             message = "Error running job via 'qsub': %s. Commandline was: %s" \
                 % (out, cmdline)
             log_error_and_raise(message, saga.NoSuccess, self._logger)
@@ -762,6 +819,11 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
                                  'gone'        : False
                                  }
 
+            job_array = JobArray.from_description(jd)
+            if job_array:
+                self.jobs[job_id]['array']        = job_array
+                self.jobs[job_id]['array_states'] = job_array.initial_states()
+
             self._logger.info ("assign job id  %s / %s / %s to watch list (%s)" \
                             % (job_name, job_id, job_obj, self.jobs.keys()))
 
@@ -833,6 +895,10 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
             # state again. it's gone forever
             if job_info['gone'] is True:
                 return job_info
+
+            # the state of a job array is derived from its elements
+            if job_info.get('array'):
+                return self._job_get_array_info(job_id, job_info)
         else:
             # Create a template data structure
             job_info = {
@@ -850,16 +916,124 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
         rm, pid = self._adaptor.parse_id(job_id)
 
         # run the PBS 'qstat' command to get some infos about our job
+        ret, out, _ = self.shell.run_sync("unset GREP_OPTIONS; %s %s %s | "
+                "grep -E -i '(job_state)|(Job_Name)|(exec_host)|(exit_status)|"
+                 "(ctime)|(start_time)|(stime)|(mtime)'"
+                % (self._commands['qstat']['path'], self._qstat_flag(), pid))
+
+        return self._job_parse_info(job_id, job_info, ret, out, reconnect)
+
+    # ----------------------------------------------------------------
+    #
+    def _qstat_flag(self):
+        """ flags for 'qstat' to get the full info for a job (also for
+            finished jobs on PBS Pro)
+        """
         # TODO: create a PBSPRO/TORQUE flag once
         if 'PBSPro_1' in self._commands['qstat']['version']:
-            qstat_flag = '-fx'
+            return '-fx'
         else:
-            qstat_flag ='-f1'
-            
+            return '-f1'
+
+    # ----------------------------------------------------------------
+    #
+    def _job_get_infos(self, job_ids):
+        """ Get job information attributes for several known jobs with
+            a single qstat call.  Returns a dict of updated job infos.
+        """
+
+        infos = dict()
+        pids  = dict()   # numeric part of pid --> job_id
+
+        for job_id in job_ids:
+
+            job_info = self.jobs[job_id]
+
+            # gone jobs and job arrays are handled individually, as above
+            if job_info['gone'] is True or job_info.get('array'):
+                infos[job_id] = self._job_get_info(job_id, reconnect=False)
+            else:
+                rm, pid = self._adaptor.parse_id(job_id)
+                pids[pid.split('.')[0]] = job_id
+
+        if not pids:
+            return infos
+
+        # the output contains a 'Job Id: <pid>' line before the attributes of
+        # each job, and 'qstat: Unknown Job Id <pid>' for jobs which are gone
         ret, out, _ = self.shell.run_sync("unset GREP_OPTIONS; %s %s %s | "
-                "grep -E -i '(job_state)|(Job_Name)|(exec_host)|(exit_status)|"
-                 "(ctime)|(start_time)|(stime)|(mtime)'"
-                % (self._commands['qstat']['path'], qstat_flag, pid))
+                "grep -E -i '(Job Id:)|(job_state)|(Job_Name)|(exec_host)|"
+                 "(exit_status)|(ctime)|(start_time)|(stime)|(mtime)'"
+                % (self._commands['qstat']['path'], self._qstat_flag(),
+                   ' '.join([self._adaptor.parse_id(pids[p])[1] for p in pids])))
+
+        chunks  = dict()   # job_id --> (ret, out) as for a single qstat
+        current = None
+
+        for line in out.split('\n'):
+
+            if 'Unknown Job Id' in line:
+                pid = line.split('Unknown Job Id')[-1].strip(' :').split('.')[0]
+                if pid in pids:
+                    chunks[pids[pid]] = (1, line)
+                current = None
+
+            elif line.strip().startswith('Job Id:'):
+                pid     = line.split(':', 1)[1].strip().split('.')[0]
+                current = pids.get(pid)
+                if current:
+                    chunks[current] = (0, '')
+
+            elif current:
+                chunks[current] = (0, chunks[current][1] + line + '\n')
+
+        for job_id in pids.values():
+
+            if job_id in chunks:
+                job_ret, job_out = chunks[job_id]
+                infos[job_id] = self._job_parse_info(job_id, self.jobs[job_id],
+                                                     job_ret, job_out, False)
+            else:
+                # no usable output for this job -- ask for it individually
+                infos[job_id] = self._job_get_info(job_id, reconnect=False)
+
+        return infos
+
+    # ----------------------------------------------------------------
+    #
+    def _job_update_infos(self, job_ids):
+        """ Update the infos of the given jobs, and fire state callbacks for
+            all jobs whose state changed.  Returns a dict of job states.  This
+            is the query function of the service's poll scheduler.
+        """
+
+        old_states = dict([(job_id, self.jobs[job_id]['state'])
+                           for job_id in job_ids])
+        infos      = self._job_get_infos(job_ids)
+        states     = dict()
+
+        for job_id, job_info in infos.iteritems():
+
+            self._logger.info ("Job monitoring updating Job %s (old state: %s, "
+                               "new state: %s)" % (job_id, old_states[job_id],
+                                                   job_info['state']))
+
+            # fire job state callback if 'state' has changed
+            if  job_info['state'] != old_states[job_id]:
+                job_obj = job_info['obj']
+                job_obj._attributes_i_set('state', job_info['state'], job_obj._UP, True)
+
+            # update job info
+            self.jobs[job_id] = job_info
+            states[job_id]    = job_info['state']
+
+        return states
+
+    # ----------------------------------------------------------------
+    #
+    def _job_parse_info(self, job_id, job_info, ret, out, reconnect):
+        """ Update the job info from the output of 'qstat' for that job.
+        """
 
         if ret != 0:
 
@@ -961,6 +1135,46 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
         # return the updated job info
         return job_info
 
+    def _job_get_array_info(self, job_id, job_info):
+        """ Get the element states of a job array via 'qstat -t', and derive
+            the state of the array from those.
+        """
+
+        ja      = job_info['array']
+        rm, pid = self._adaptor.parse_id(job_id)
+
+        # the element lines look like this:
+        #     1234[7].server   name-7   user   00:00:01 R batch
+        ret, out, _ = self.shell.run_sync("%s -t -x %s"
+                    % (self._commands['qstat']['path'], pid))
+
+        seen = dict()
+        if ret == 0:
+            for line in out.split('\n'):
+                elems = line.split()
+                if len(elems) < 3:
+                    continue
+                match = _ARRAY_ELEMENT_RE.match(elems[0])
+                if not match:
+                    continue
+                state = elems[-2]
+                if state == 'X':
+                    # finished subjob -- we don't know about the exit code,
+                    # but it was not canceled by us
+                    seen[int(match.group(1))] = saga.job.DONE
+                else:
+                    seen[int(match.group(1))] = _pbs_to_saga_jobstate(state, self._logger)
+
+        job_info['array_states'] = ja.merge_states(job_info['array_states'], seen)
+        job_info['state']        = ja.collapse_states(job_info['array_states'])
+
+        if job_info['state'] in [saga.job.DONE, saga.job.FAILED, saga.job.CANCELED]:
+            job_info['gone'] = True
+
+        return job_info
+
+    # ----------------------------------------------------------------
+    #
     def _parse_qstat(self, haystack, job_info):
 
 
@@ -1029,6 +1243,12 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
 
         # assume the job was succesfully canceled
         self.jobs[job_id]['state'] = saga.job.CANCELED
+        self.poller.forget(job_id)
+
+        if self.jobs[job_id].get('array'):
+            job_info = self.jobs[job_id]
+            job_info['array_states'] = job_info['array'].cancel_states(
+                                                   job_info['array_states'])
 
 
     # ----------------------------------------------------------------
@@ -1039,6 +1259,11 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
         time_start = time.time()
         time_now   = time_start
         rm, pid    = self._adaptor.parse_id(job_id)
+        interval   = self.poller.interval()
+        deadline   = None
+
+        if timeout >= 0:
+            deadline = time_start + timeout
 
         while True:
             state = self.jobs[job_id]['state']  # this gets updated in the bg.
@@ -1048,8 +1273,8 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
                state == saga.job.CANCELED:
                     return True
 
-            # avoid busy poll
-            time.sleep(SYNC_WAIT_UPDATE_INTERVAL)
+            # avoid busy poll -- poll less often while the state doesn't change
+            interval.sleep(state, deadline)
 
             # check if we hit timeout
             if timeout >= 0:
@@ -1057,6 +1282,15 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
                 if time_now - time_start > timeout:
                     return False
 
+            # don't wait for the monitoring thread -- concurrent waits are
+            # served by a single qstat call
+            self.poller.poll(job_id)
+
+            if  self.jobs[job_id]['state'] in [saga.job.DONE,
+                                               saga.job.FAILED,
+                                               saga.job.CANCELED]:
+                self.poller.forget(job_id)
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
@@ -1085,8 +1319,9 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
         """
 
         # If we already have the job info, we just pass the current info.
-        if job_id in self.jobs :
-            return self.jobs[job_id]['obj']
+        job_info = self.jobs.get(job_id)
+        if job_info and job_info['obj']:
+            return job_info['obj']
 
         # Try to get some initial information about this job (again)
         job_info = self._job_get_info(job_id, reconnect=True)
@@ -1118,6 +1353,14 @@ class PBSProJobService (saga.adaptors.cpi.job.Service):
         """
         return self.rm
 
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_poll_stats(self):
+        """ implements saga.adaptors.cpi.job.Service.get_poll_stats()
+        """
+        return self.poller.stats()
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
@@ -1346,4 +1589,26 @@ class PBSProJob (saga.adaptors.cpi.job.Job):
         """
         return self.jd
 
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_array_states(self):
+        """ implements saga.adaptors.cpi.job.Job.get_array_states()
+        """
+        job_info = self.js.jobs.get(self._id, {})
+
+        if not job_info.get('array'):
+            job_array = None
+            if self.jd:
+                job_array = JobArray.from_description(self.jd)
+            if not job_array:
+                log_error_and_raise("Job %s is not a job array" % self._id,
+                    saga.IncorrectState, self._logger)
+            return job_array.initial_states(saga.job.NEW)
+
+        # don't wait for the monitoring thread
+        job_info = self.js._job_get_info(job_id=self._id, reconnect=False)
+
+        return dict(job_info['array_states'])
+
 
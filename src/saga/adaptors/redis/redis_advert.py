@@ -26,7 +26,31 @@ ASYNC_CALL = saga.adaptors.cpi.decorators.ASYNC_CALL
 
 _ADAPTOR_NAME          = 'saga.adaptors.advert.redis'
 _ADAPTOR_SCHEMAS       = ['redis']
-_ADAPTOR_OPTIONS       = []
+_ADAPTOR_OPTIONS       = [
+    {
+    'category'         : _ADAPTOR_NAME,
+    'name'             : 'cache_ttl',
+    'type'             : float,
+    'default'          : rns.CACHE_TTL,
+    'documentation'    : '''Lifetime (in seconds) of client side cache entries.
+                          The cache is kept coherent via invalidation events
+                          published by all clients, so a long lifetime is
+                          safe.  Set to 0 to disable caching.''',
+    'env_variable'     : None
+    },
+    {
+    'category'         : _ADAPTOR_NAME,
+    'name'             : 'write_delay',
+    'type'             : float,
+    'default'          : 0.0,
+    'documentation'    : '''Time (in seconds) for which attribute updates are
+                          buffered.  Updates on the same entry within that
+                          time are written in a single transaction, with a
+                          single notification.  Reads on the same entry
+                          flush the buffer.  Set to 0 to write immediately.''',
+    'env_variable'     : None
+    }
+]
 _ADAPTOR_CAPABILITIES  = {}
 
 _ADAPTOR_DOC           = {
@@ -74,38 +98,28 @@ class Adaptor (saga.adaptors.base.Base):
         # the adaptor *singleton* creates a (single) instance of a bulk handler
         # (BulkDirectory), which implements container_* bulk methods.
         self._bulk  = BulkDirectory ()
-        self._redis = {}
+
+        self.opts      = self.get_config (_ADAPTOR_NAME)
+        self.cache_ttl   = self.opts['cache_ttl'  ].get_value ()
+        self.write_delay = self.opts['write_delay'].get_value ()
 
 
     # ----------------------------------------------------------------
     #
     def get_redis (self, url) :
+        """
+        Returns the (process wide) shared redis server instance for the url.
+        Needs to be released via `release_redis()`.
+        """
 
-        host     = None
-        port     = 6379
-        username = None
-        password = None
-     
-        if url.host     : host     = url.host
-        if url.port     : port     = url.port
-        if url.username : username = url.username
-        if url.password : password = url.password
-
-        if username :
-            if password :
-                hash = "redis://%s:%s@%s:%d"  %  (username, password, host, port)
-            else :
-                hash = "redis://%s@%s:%d"     %  (username,           host, port)
-        else :
-            if password :
-                hash = "redis://%s@%s:%d"     %  (password,       host, port)
-            else :
-                hash = "redis://%s:%d"        %  (                host, port)
-       
-        if not hash in self._redis :
-            self._redis[hash] = rns.redis_ns_server (url)
+        return rns.get_server (url, self.cache_ttl, self.write_delay)
+
+
+    # ----------------------------------------------------------------
+    #
+    def release_redis (self, r) :
 
-        return self._redis[hash]
+        rns.release_server (r)
 
 
     # ----------------------------------------------------------------
@@ -181,6 +195,34 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
         self._cpi_base = super  (RedisDirectory, self)
         self._cpi_base.__init__ (api, adaptor)
 
+        self._r     = None
+        self._nsdir = None
+
+
+    # ----------------------------------------------------------------
+    #
+    def __del__ (self) :
+
+        self.finalize ()
+
+
+    # ----------------------------------------------------------------
+    #
+    def finalize (self, kill=False) :
+
+        # the namespace entry uses the shared redis server, which may be gone
+        # once released
+        if  self._r :
+            try :
+                # callbacks of closed objects must not fire anymore, nor keep
+                # the api object alive
+                self._nsdir.drop_callbacks (self._api ())
+                self._nsdir.flush ()
+            finally :
+                self._adaptor.release_redis (self._r)
+                self._r     = None
+                self._nsdir = None
+
 
     # ----------------------------------------------------------------
     #
@@ -217,8 +259,17 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
     #
     def _init_check (self) :
 
-        self._r       = self._adaptor.get_redis (self._url)
-        self._nsdir   = rns.redis_ns_entry.opendir (self._r, self._url.path, self._flags)
+        r = self._adaptor.get_redis (self._url)
+
+        try :
+            nsdir = rns.redis_ns_entry.opendir (r, self._url.path, self._flags)
+        except Exception :
+            self._adaptor.release_redis (r)
+            raise
+
+        self.finalize ()
+        self._r       = r
+        self._nsdir   = nsdir
 
 
     # ----------------------------------------------------------------
@@ -227,7 +278,7 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
     def attribute_getter (self, key) :
 
         try :
-            return self._nsdir.get_key (key)
+            return self._ns ().get_key (key)
 
         except Exception as e :
             self._logger.error ("get_key failed: %s" % e)
@@ -240,7 +291,7 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
     def attribute_setter (self, key, val) :
 
         try :
-            self._nsdir.set_key (key, val)
+            self._ns ().set_key (key, val)
 
         except Exception as e :
             self._logger.error ("set_key failed: %s" % e)
@@ -252,7 +303,7 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
     @SYNC_CALL
     def attribute_lister (self) :
 
-        data = self._nsdir.get_data ()
+        data = self._ns ().get_data ()
 
         for key in data.keys () :
             self._api ()._attributes_i_set (key, data[key], self._api ()._UP)
@@ -263,7 +314,18 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
     @SYNC_CALL
     def attribute_caller (self, key, id, cb) :
 
-        self._nsdir.manage_callback (key, id, cb, self.get_api ())
+        self._ns ().manage_callback (key, id, cb, self.get_api ())
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def close (self, timeout=None) :
+
+        if  timeout :
+            raise se.BadParameter ("timeout for close not supported")
+
+        self.finalize (kill=True)
 
 
     # ----------------------------------------------------------------
@@ -279,12 +341,17 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
     @SYNC_CALL
     def is_dir (self, name) :
 
+        self._ns ()   # raises if closed
+
+        url = sumisc.url_make_absolute (self._url, name)
+
         try :
-            saga.advert.Directory (sumisc.url_make_absolute (self._url, name))
+            entry = rns.redis_ns_entry (self._r, url.path)
+            entry.fetch ()   # served from the cache if possible
         except Exception as e:
             return False
 
-        return True
+        return entry.is_dir ()
 
 
     # ----------------------------------------------------------------
@@ -300,34 +367,100 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
 
         if  not flags :
 
-            ret = self._nsdir.list ()
+            ret = self._ns ().list ()
 
 
         elif flags == saga.advert.RECURSIVE :
 
-            # ------------------------------------------------------------------
-            def get_kids (path) :
+            ret = self._ns ().list (recursive=True)
+
 
-                d    = saga.advert.Directory (path)
-                kids = d.list ()
+        else :
+            raise se.BadParameter ("list() only supports the RECURSIVE flag")
 
-                for kid in kids :
 
-                    kid_url      = self._url
-                    kid_url.path = kid
+        return ret
+
 
-                    if  d.is_dir (kid_url) :
-                        get_kids (kid_url)
+    # ----------------------------------------------------------------
+    #
+    def _ns (self) :
 
-                    ret.append (kid)
-            # ------------------------------------------------------------------
+        if  self._nsdir is None :
+            raise se.IncorrectState ("advert directory is closed")
 
-            get_kids (self._url)
+        return self._nsdir
 
 
-        else :
-            raise se.BadParameter ("list() only supports the RECURSIVE flag")
+    # ----------------------------------------------------------------
+    #
+    def _ns_entry (self, tgt) :
+
+        self._ns ()   # raises if closed
+
+        url = sumisc.url_make_absolute (self._url, tgt)
+        ret = rns.redis_ns_entry (self._r, url.path)
+        ret.fetch ()
+
+        return ret
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def set_ttl_self (self, ttl) :
+
+        self._ns ().set_ttl (ttl)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_ttl_self (self) :
+
+        return self._ns ().get_ttl ()
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def set_ttl (self, tgt, ttl) :
 
+        self._ns_entry (tgt).set_ttl (ttl)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_ttl (self, tgt) :
+
+        return self._ns_entry (tgt).get_ttl ()
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def find (self, pattern, flags) :
+
+        return self.find_adverts (pattern, None, None, flags)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def find_adverts (self, name_pattern, attr_pattern, obj_type, flags) :
+
+        if  obj_type :
+            raise se.BadParameter ("find() does not support object types")
+
+        recursive = bool(flags & saga.advert.RECURSIVE)
+        paths     = self._ns ().find (name_pattern, attr_pattern, recursive)
+
+        ret = []
+        for path in paths :
+            url      = saga.url.Url (self._url)
+            url.path = path
+            ret.append (url)
 
         return ret
 
@@ -337,6 +470,8 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
     @SYNC_CALL
     def change_dir (self, tgt) :
 
+        self._ns ()   # raises if closed
+
         # backup state
         orig_url = self._url
 
@@ -359,6 +494,8 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
     @SYNC_CALL
     def open (self, url, flags) :
 
+        self._ns ()   # raises if closed
+
         if not url.scheme and not url.host : 
             url = saga.url.Url (str(self._url) + '/' + str(url))
 
@@ -370,6 +507,8 @@ class RedisDirectory (saga.adaptors.cpi.advert.Directory) :
     @SYNC_CALL
     def open_dir (self, url, flags) :
 
+        self._ns ()   # raises if closed
+
         if not url.scheme and not url.host : 
             url = saga.url.Url (str(self._url) + '/' + str(url))
 
@@ -434,6 +573,34 @@ class RedisEntry (saga.adaptors.cpi.advert.Entry) :
         self._cpi_base = super  (RedisEntry, self)
         self._cpi_base.__init__ (api, adaptor)
 
+        self._r       = None
+        self._nsentry = None
+
+
+    # ----------------------------------------------------------------
+    #
+    def __del__ (self) :
+
+        self.finalize ()
+
+
+    # ----------------------------------------------------------------
+    #
+    def finalize (self, kill=False) :
+
+        # the namespace entry uses the shared redis server, which may be gone
+        # once released
+        if  self._r :
+            try :
+                # callbacks of closed objects must not fire anymore, nor keep
+                # the api object alive
+                self._nsentry.drop_callbacks (self._api ())
+                self._nsentry.flush ()
+            finally :
+                self._adaptor.release_redis (self._r)
+                self._r       = None
+                self._nsentry = None
+
 
     # ----------------------------------------------------------------
     #
@@ -461,8 +628,17 @@ class RedisEntry (saga.adaptors.cpi.advert.Entry) :
     #
     def _init_check (self) :
 
-        self._r       = self._adaptor.get_redis (self._url)
-        self._nsentry = rns.redis_ns_entry.open (self._r, self._url.path, self._flags)
+        r = self._adaptor.get_redis (self._url)
+
+        try :
+            nsentry = rns.redis_ns_entry.open (r, self._url.path, self._flags)
+        except Exception :
+            self._adaptor.release_redis (r)
+            raise
+
+        self.finalize ()
+        self._r       = r
+        self._nsentry = nsentry
 
 
     # ----------------------------------------------------------------
@@ -470,7 +646,7 @@ class RedisEntry (saga.adaptors.cpi.advert.Entry) :
     @SYNC_CALL
     def attribute_getter (self, key) :
 
-        return self._nsentry.get_key (key)
+        return self._ns ().get_key (key)
 
 
     # ----------------------------------------------------------------
@@ -478,7 +654,7 @@ class RedisEntry (saga.adaptors.cpi.advert.Entry) :
     @SYNC_CALL
     def attribute_setter (self, key, val) :
 
-        return self._nsentry.set_key (key, val)
+        return self._ns ().set_key (key, val)
 
 
     # ----------------------------------------------------------------
@@ -486,7 +662,7 @@ class RedisEntry (saga.adaptors.cpi.advert.Entry) :
     @SYNC_CALL
     def attribute_lister (self) :
 
-        data = self._nsentry.get_data ()
+        data = self._ns ().get_data ()
 
         for key in data.keys () :
             self._api ()._attributes_i_set (key, data[key], self._api ()._UP)
@@ -497,7 +673,44 @@ class RedisEntry (saga.adaptors.cpi.advert.Entry) :
     @SYNC_CALL
     def attribute_caller (self, key, id, cb) :
 
-        return self._nsentry.manage_callback (key, id, cb, self.get_api ())
+        return self._ns ().manage_callback (key, id, cb, self.get_api ())
+
+
+    # ----------------------------------------------------------------
+    #
+    def _ns (self) :
+
+        if  self._nsentry is None :
+            raise se.IncorrectState ("advert entry is closed")
+
+        return self._nsentry
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def set_ttl (self, ttl) :
+
+        self._ns ().set_ttl (ttl)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_ttl (self) :
+
+        return self._ns ().get_ttl ()
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def close (self, timeout=None) :
+
+        if  timeout :
+            raise se.BadParameter ("timeout for close not supported")
+
+        self.finalize (kill=True)
 
 
     # ----------------------------------------------------------------
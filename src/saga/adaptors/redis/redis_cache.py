@@ -4,53 +4,39 @@ __copyright__ = "Copyright 2012-2013, The SAGA Project"
 __license__   = "MIT"
 
 
-import time
-
-import threading
-import redis_ordered_dict    as rod
+import saga.utils.lru_cache  as slc
 
 CACHE_DEFAULT_SIZE = 10000
 CACHE_DEFAULT_TTL  = 1.0    # 1 second
 
-VAL = 'val'
-TTL = 'ttl'
 
 ######################################################################
 #
-class Cache :
+class Cache (slc.LRUCache) :
+    """
+    The redis namespace cache: an LRU cache which tracks invalidations (see
+    `epoch`), and which signals misses as `AttributeError`.
+    """
 
     # ----------------------------------------------------------------
     #
     def __init__ (self, logger, size=CACHE_DEFAULT_SIZE, ttl=CACHE_DEFAULT_TTL) :
 
-        if int (size) < 1 :
-            raise AttributeError ('size < 1 or not a number')
-
-        if int (ttl) < 0 :
-            raise AttributeError ('ttl < 0 or not a number')
+        slc.LRUCache.__init__ (self, size=size, ttl=ttl)
 
-        self.size   = size
-        self.ttl    = ttl
-        self.dict   = rod.OrderedDict ()
-        self.lock   = threading.RLock ()
         self.logger = logger
-        self.hit    = 0
-        self.miss   = 0
 
-        # start a thread which, with low priority, cleans out the dict now and
-        # then (pops items until a live one is found
+        # the epoch is incremented on every invalidation.  Cache fills which
+        # started before an invalidation pass the epoch they saw to `set()`,
+        # and are then dropped, as the fetched value may already be stale.
+        self.epoch  = 0
 
 
     # ----------------------------------------------------------------
     #
     def _dump (self) :
-        print " ---------------------------------------------- "
-        print " CACHE STATISTICS : "
-        print " size: %5d" % len(self.dict)
-        print " hit : %5d" % self.hit 
-        print " miss: %5d" % self.miss
-        print self.dict.keys()
-        print " ---------------------------------------------- "
+
+        self.logger.info ("redis cache stats: %s" % self.stats ())
 
 
     # ----------------------------------------------------------------
@@ -59,53 +45,51 @@ class Cache :
 
         self.logger.debug ("redis_cache_get %s", key)
 
-        with self.lock:
-
-            # check if we have a live entry
-            if key in self.dict :
-
-                now = time.time ()
+        try :
+            return slc.LRUCache.get (self, key)
 
-                if self.ttl and self.dict[key][TTL] > now :
-                    # if yes, cache hit!
-                    # return data -- doh!
-                    self.hit += 1
-                    return self.dict[key][VAL]
-
-                else :
-                    # entry timed out
-                    del self.dict[key]
-
-            # cache entry not found, or timed out
-            self.miss += 1
+        except KeyError :
             raise AttributeError ("cache miss for '%s' " % key)
 
 
     # ----------------------------------------------------------------
     #
-    def set (self, key, value) :
+    def set (self, key, value, epoch=None, ttl=None) :
+        """
+        `ttl` can shorten (but not extend) the lifetime of the entry.
+        """
 
-        with self.lock :
+        with self._lock :
 
-            # remove superfluous(?) entries
-            while len (self.dict) >= self.size :
-                self.dict.popitem (last=False)
+            # invalidated since the value was fetched?
+            if epoch is not None and epoch != self.epoch :
+                self.logger.debug ("redis_cache_set %s dropped (stale)", key)
+                return
 
-            self.dict[key]      = {}
-            self.dict[key][VAL] = value
-            self.dict[key][TTL] = time.time () + self.ttl
+            if ttl is not None and self.ttl is not None :
+                ttl = min (ttl, self.ttl)
+
+            slc.LRUCache.set (self, key, value, ttl)
 
 
     # ----------------------------------------------------------------
     #
-    def delete (self, key) :
+    def invalidate (self, key) :
+        """ like delete, but bumps the epoch """
 
-        with self.lock :
-            del self.dict[key]
+        with self._lock :
+            self.epoch += 1
+            self.delete (key)
 
 
     # ----------------------------------------------------------------
+    #
+    def flush (self) :
 
+        with self._lock :
+            self.epoch += 1
+            self.clear ()
 
 
+# ------------------------------------------------------------------------------
 
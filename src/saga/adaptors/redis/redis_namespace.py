@@ -34,6 +34,20 @@ The redis key layout is like the following::
     /vals:/etc/passwd:val_1  : [/keys/etc/passwd, ...]
     /vals:/etc/passwd:val_2  : [/keys/etc/passwd, ...]
 
+    # secondary index for attribute key/value pairs, used by find()
+    /attr:key_1=val_1        : [/etc/passwd, ...]
+    /attr:key_2=val_2        : [/etc/passwd, ...]
+
+    # the index sets an entry is listed in (for cleanup of expired entries)
+    /indx:/etc/passwd        : [keys:key_1, vals:val_1, attr:key_1=val_1, ...]
+
+    # expiry times of entries with a TTL
+    expr                     : {/etc/passwd : <expiry>, ...}
+
+Recursive listings are performed by a Lua script on the server side, which
+traverses the kids sets in a single round trip.  Attribute patterns without
+wildcards are resolved via the attr index, i.e. by set intersections.
+
 all wildcard lookup versions will be slow -- only solution (iiuc) would be to
 blow the indexes to cover for wildcard expansion - which is always incomplete
 anyway...
@@ -42,6 +56,29 @@ All parts of the above structure are set/get in a single pipelined transactional
 'MULTI' block.  One could consider to move the ops into a lua script, if
 performance is insufficient.  
 
+Entries are cached on the client side.  The cache is write-through (local
+mutations update the cache), and every mutation of a node, its data or its
+kids publishes an invalidation event on the monitoring channel, in the same
+'MULTI' block as the mutation itself::
+
+    INVALIDATE /etc/passwd [<client id>]
+
+All other clients drop their cache entries for that path when receiving the
+event.  Cached entries are thus coherent (up to the event propagation delay),
+and can live for a long time (see the adaptor's 'cache_ttl' option).  If the
+monitoring thread dies, the cache is disabled.
+
+Entry TTLs are mapped to redis key expiry (PEXPIRE) of the node and data
+keys.  Redis does not know about the references to an expired entry though
+(in its parent's kids set and in the indexes), nor about the entries below an
+expired directory -- those are removed by a cleanup script, which runs before
+listings and searches.  The kids set of a directory thus does not expire, so
+that the script can find the entries below it.
+
+Attribute updates can be buffered for a short time (see the adaptor's
+'write_delay' option), so that consecutive updates on the same entry are
+written in a single 'MULTI' block, with a single notification.
+
 TODO:
     - use locks to make thread safe(r)
 
@@ -50,7 +87,10 @@ TODO:
 import re
 import os
 import time
-import string
+import json
+import uuid
+import threading
+import fnmatch
 import redis
 
 import radical.utils         as ru
@@ -77,8 +117,82 @@ DATA   = 'data'
 KIDS   = 'kids'
 KEYS   = 'keys'
 VALS   = 'vals'
-
-MON    = 'saga-advert-events'
+ATTR   = 'attr'
+INDX   = 'indx'
+EXPR   = 'expr'
+
+MON    = 'saga-advert-events'   # global channel, per path: MON:<path>
+
+MON_BATCH = 1000  # max number of events handled at once
+
+MON_JOIN_TIMEOUT = 5.0  # max time close() waits for the monitor to stop
+
+CACHE_TTL = 60.0  # lifetime of cache entries, as we see invalidations
+
+CLEANUP_INTERVAL = 1.0  # min time between cleanups of expired entries
+
+# breadth-first traversal of the kids sets below a path (ARGV[1]), returning
+# the paths of all descendants.  Entries have no kids set -- SMEMBERS on them
+# is cheap, so we don't bother to check node types.
+LIST_RECURSIVE = '''
+    local ret   = {}
+    local queue = {ARGV[1]}
+    local idx   = 1
+    while idx <= #queue do
+        local kids = redis.call ('SMEMBERS', ARGV[2] .. ':' .. queue[idx])
+        for _, kid in ipairs (kids) do
+            table.insert (ret,   kid)
+            table.insert (queue, kid)
+        end
+        idx = idx + 1
+    end
+    return ret
+'''
+
+# removes all entries which expired before ARGV[2], and everything below them
+# (see module doc), invalidates them for other clients, and returns their
+# paths.  An entry which got re-created meanwhile (its node is live and does
+# not carry an expired 'expires' value) is kept.  Keys are passed in as ARGV,
+# so that we can keep the key prefixes in one place.
+CLEANUP = '''
+    local expr, now, node, data, kids, indx, mon, id = unpack (ARGV)
+    local ret   = {}
+    local seen  = {}
+    local paths = redis.call ('ZRANGEBYSCORE', expr, '-inf', now)
+    for _, path in ipairs (paths) do
+        local expires = redis.call ('HGET', node .. ':' .. path, 'expires')
+        if seen[path] then
+            -- removed as part of an expired subtree
+        elseif redis.call ('EXISTS', node .. ':' .. path) == 1 and
+               (not expires or tonumber (expires) > tonumber (now)) then
+            redis.call ('ZREM', expr, path)
+        else
+            local parent = string.match (path, '^(.*)/[^/]*$')
+            if parent == nil or parent == '' then parent = '/' end
+            redis.call ('SREM', kids .. ':' .. parent, path)
+            redis.call ('PUBLISH', mon, 'INVALIDATE ' .. parent .. ' [' .. id .. ']')
+            local queue = {path}
+            local idx   = 1
+            while idx <= #queue do
+                local p = queue[idx]
+                for _, kid in ipairs (redis.call ('SMEMBERS', kids .. ':' .. p)) do
+                    table.insert (queue, kid)
+                end
+                for _, i in ipairs (redis.call ('SMEMBERS', indx .. ':' .. p)) do
+                    redis.call ('SREM', i, p)
+                end
+                redis.call ('DEL', node .. ':' .. p, data .. ':' .. p,
+                                   kids .. ':' .. p, indx .. ':' .. p)
+                redis.call ('ZREM', expr, p)
+                redis.call ('PUBLISH', mon, 'INVALIDATE ' .. p .. ' [' .. id .. ']')
+                seen[p] = true
+                table.insert (ret, p)
+                idx = idx + 1
+            end
+        end
+    end
+    return ret
+'''
 
 # --------------------------------------------------------------------
 #
@@ -92,10 +206,24 @@ def redis_ns_name (path) :
     if path == '/' or path == '//' : return '/'
     return os.path.split (path)[1]
 
+def redis_ns_channel (path) :
+    return MON+':'+path
+
 
 # --------------------------------------------------------------------
 #
 class redis_ns_monitor (ru.Thread) :
+    """
+    The monitor thread receives the events published on the channels the
+    server is subscribed to: the global `MON` channel, which carries the
+    cache invalidation events, and one `MON:<path>` channel per path with
+    registered callbacks, which carries the 'ATTRIBUTE' events for that path.
+
+    Messages are handled in batches: after a blocking receive, all messages
+    already queued on the connection are drained (up to `MON_BATCH`).
+    Invalidations in a batch are applied once per path, and callbacks are
+    only invoked with the last value per path and key.
+    """
 
     # ----------------------------------------------------------------
     #
@@ -105,9 +233,6 @@ class redis_ns_monitor (ru.Thread) :
         self.pub    = pub
         self.logger = r.logger
 
-        self.pat = {}
-        self.pat['ATTRIBUTE'] = re.compile ('\s*\[(?P<key>[^=]+)=(?P<val>.+)]\s*')
-
         rut.Thread.__init__ (self, self.work)
         self.setDaemon (True)
 
@@ -118,69 +243,107 @@ class redis_ns_monitor (ru.Thread) :
 
         try :
         
-            callbacks = self.r.callbacks
-            sub       = self.pub.listen ()
+            sub = self.pub.listen ()
 
             while sub :
 
-                info = sub.next ()
-                data = info['data']
+                try :
+                    batch = [sub.next ()]
 
-                if not type (data) == type ("") :
-                    self.logger.warn ("ignoring event : %s"  %  data)
-                    continue
+                except StopIteration :
+                    # all channels are unsubscribed -- server got closed
+                    self.logger.debug ("redis monitoring thread stops")
+                    return
 
-                # FIXME: need proper regex parsing
-                elems = data.split ()
-                if not len (elems) == 3 :
-                    self.logger.warn ("ignoring event args : %s"  %  data)
-                    continue
+                while len (batch) < MON_BATCH :
+                    info = self.pub.get_message ()
+                    if not info :
+                        break
+                    batch.append (info)
 
+                self._handle (batch)
 
-                self.logger.debug ("sub %s"  %  data)
-                event = elems[0]
-                path  = elems[1]
-                args  = elems[2:]
+        except Exception as e :
 
-                if path in callbacks :
-                    
-                    if event == 'ATTRIBUTE' :
+            if  self.r.closed :
+                # the connection went away while the server got closed
+                self.logger.debug ("redis monitoring thread stops (%s)" % e)
+                return
 
-                        for arg in args :
-                            
-                            # args are formatted like '[key=val]'
-                            match = self.pat[event].match (string.join (args, ' '))
+            self.logger.critical ("redis monitoring thread crashed - disable " \
+                                  "callback handling and caching (%s)" % str(e))
 
-                            if  not match :
-                                self.logger.warn ("event parse error for %s" % args)
-                                continue
+            # without invalidation events, cached entries can't be trusted
+            self.r.cache.ttl = 0
+            self.r.cache.flush ()
+            return
 
-                            # FIXME: error check
-                            key     = match.group ('key')
-                            val     = match.group ('val')
 
-                            if key in callbacks[path] :
-                                for idx in callbacks[path][key] :
+    # ----------------------------------------------------------------
+    #
+    def _handle (self, batch) :
 
-                                    cb  = callbacks[path][key][idx][0]
-                                    obj = callbacks[path][key][idx][1]
+        invalid = set()    # paths to invalidate
+        updates = dict()   # (path, key) : val
 
-                                    obj.set_attribute (key, val, obj._UP)
+        for info in batch :
 
-                    if event == 'ATTRIBUTES' :
-                        self.logger.warn ("unknown event type %s" % event)
-                        pass
+            data = info['data']
 
-        except Exception as e :
-            self.logger.critical ("redis monitoring thread crashed - disable callback handling (%s)") % str(e)
-            return
+            if  info['type'] != 'message' or not isinstance (data, basestring) :
+                continue   # subscription confirmations etc.
+
+            self.logger.debug ("sub %s"  %  data)
+
+            # events are formatted like 'EVENT path [args]'
+            elems = data.split (' ', 2)
+            if  len (elems) != 3 or elems[2][:1] != '[' or elems[2][-1:] != ']' :
+                self.logger.warn ("ignoring event : %s"  %  data)
+                continue
+
+            event, path, args = elems
+            args = args[1:-1]
+
+            if  event == 'INVALIDATE' :
+                # we don't need to invalidate our own (write-through) updates
+                if  args != self.r.id :
+                    invalid.add (path)
+
+            elif event == 'ATTRIBUTE' :
+                key, sep, val = args.partition ('=')
+                if  not sep :
+                    self.logger.warn ("event parse error for %s" % data)
+                    continue
+                updates[(path, key)] = val
+
+            elif event == 'ATTRIBUTES' :
+                try :
+                    for key, val in json.loads (args).iteritems () :
+                        updates[(path, key)] = val
+                except ValueError :
+                    self.logger.warn ("event parse error for %s" % data)
+
+        for path in invalid :
+            self.r.invalidate (path)
+
+        for (path, key), val in updates.iteritems () :
+
+            # don't hold the lock while calling back
+            with self.r.cb_lock :
+                cbs = self.r.callbacks.get (path, {}).get (key, {}).values ()
+
+            for cb, obj in cbs :
+                try :
+                    obj.set_attribute (key, val, obj._UP)
+                except Exception as e :
+                    self.logger.error ("advert callback failed: %s" % e)
 
 
 # --------------------------------------------------------------------
 #
 class redis_ns_server (redis.Redis) :
 
-    def __init__ (self, url) :
+    def __init__ (self, url, cache_ttl=CACHE_TTL, write_delay=0.0) :
 
         if url.scheme != 'redis' :
             raise BadParameter ("scheme in url is not supported (%s != redis://...)" %  url)
@@ -189,6 +352,7 @@ class redis_ns_server (redis.Redis) :
         self.host       = 'localhost'
         self.port       = 6379
         self.db         = 0
+        self.username   = None
         self.password   = None
         self.errors     = 'strict'
 
@@ -197,47 +361,186 @@ class redis_ns_server (redis.Redis) :
         if url.username : self.username = url.username
         if url.password : self.password = url.password
 
-        # create redis client 
-        t1 = time.time ()
-        redis.Redis.__init__   (self, 
-                                host      = self.host,
-                                port      = self.port,
-                                db        = self.db,
-                                password  = self.password,
-                                 errors    = self.errors)
-        t2 = time.time ()
+        # the id tags the invalidation events we publish
+        self.id         = uuid.uuid4 ().hex
+
+        # buffer time for attribute updates (see redis_ns_entry.set_key)
+        self.write_delay  = write_delay
+        self.last_cleanup = 0.0
+        self.closed       = False
+
+        # create redis client.  All connections (incl. the one for pubsub) are
+        # taken from a single pool.
+        self.pool = redis.ConnectionPool (host            = self.host,
+                                          port            = self.port,
+                                          db              = self.db,
+                                          password        = self.password,
+                                          encoding_errors = self.errors)
+        redis.Redis.__init__   (self, connection_pool = self.pool)
 
         # add a logger 
         self.logger = ru.Logger('radical.saga')
 
-        # create a cache dict and attach to redis client instance.  Cache
-        # lifetime is set to 10 times the redis-connect latency.
-        self.cache = redis_cache.Cache (logger=self.logger, ttl=((t2-t1)*10))
-
-        # create a second client to manage the (blocking) 
-        # pubsub communication for event notifications
-        self.r2 = redis.Redis  (host      = self.host,
-                                port      = self.port,
-                                db        = self.db,
-                                password  = self.password,
-                                errors    = self.errors)
+        # create a cache dict and attach to redis client instance.  The cache
+        # is kept coherent by invalidation events (see the monitor thread).
+        self.cache = redis_cache.Cache (logger=self.logger, ttl=cache_ttl)
 
-        # set up pubsub endpoint, and start a thread to monitor channels
+        # set up pubsub endpoint, and start a thread to monitor channels.
+        # Channels for individual paths are subscribed when the first
+        # callback for that path is registered (see subscribe()).
         self.callbacks = {}
-        self.pub = self.r2.pubsub ()
+        self.cb_lock   = threading.RLock ()
+        self.pub = self.pubsub ()
         self.pub.subscribe (MON)
-        # FIXME: create one pubsub channel per path (for paths which have
-        #        callbacks registered)
 
         self.monitor = redis_ns_monitor (self, self.pub)
         self.monitor.start ()
 
+        # server side scripts
+        self.list_recursive = self.register_script (LIST_RECURSIVE)
+        self.cleanup_script = self.register_script (CLEANUP)
+
+
+    # ----------------------------------------------------------------
+    #
+    def cleanup (self, force=False) :
+        """
+        Removes the references to expired entries -- at most once per
+        `CLEANUP_INTERVAL`, unless forced.
+        """
+
+        now = time.time ()
+
+        if  not force and now - self.last_cleanup < CLEANUP_INTERVAL :
+            return 0
+
+        self.last_cleanup = now
+
+        paths = self.cleanup_script (args=[EXPR, now, NODE, DATA, KIDS, INDX, 
+                                           MON, self.id])
+
+        # our own monitor ignores the invalidation events tagged with our id
+        # -- so we invalidate the removed entries and their parents here.
+        for path in paths :
+            self.invalidate (path)
+            self.invalidate (redis_ns_parent (path))
+
+        if  paths :
+            self.logger.debug ("cleaned up %s expired entries" % len(paths))
+
+        return len(paths)
+
+
+    # ----------------------------------------------------------------
+    #
+    def invalidate (self, path) :
+        """
+        Drops all cached state of the given path.
+        """
+
+        self.cache.invalidate (NODE+':'+path)
+        self.cache.invalidate (DATA+':'+path)
+        self.cache.invalidate (KIDS+':'+path)
+
+
+    # ----------------------------------------------------------------
+    #
+    def subscribe (self, path) :
+
+        self.logger.debug ("subscribe %s" % redis_ns_channel (path))
+        self.pub.subscribe (redis_ns_channel (path))
+
+
+    # ----------------------------------------------------------------
+    #
+    def unsubscribe (self, path) :
+
+        self.logger.debug ("unsubscribe %s" % redis_ns_channel (path))
+        self.pub.unsubscribe (redis_ns_channel (path))
+
+
+    # ----------------------------------------------------------------
+    #
+    def close (self) :
+        """
+        Unsubscribing from all channels terminates the monitor thread -- we
+        wait for it to stop before the connections get closed.  Don't call this
+        directly, but use `release_server()`.
+        """
+
+        self.closed = True
+
+        if  self.pub :
+            self.pub.unsubscribe ()
+            self.pub = None
+
+        if  self.monitor is not threading.current_thread () :
+            self.monitor.join (MON_JOIN_TIMEOUT)
 
+        self.pool.disconnect ()
 
+
+    # ----------------------------------------------------------------
+    #
     def __del__ (self) :
 
         if self.pub :
-            self.pub.unsubscribe (MON)
+            self.pub.unsubscribe ()
+
+
+# --------------------------------------------------------------------
+#
+# redis_ns_server instances are shared by all advert directories and entries
+# in the process which use the same redis server and credentials -- so all of
+# those share one connection pool, one pubsub connection, one monitor thread,
+# and one cache.
+#
+_servers      = dict()   # key : [server, refcount]
+_servers_lock = threading.RLock ()
+
+def _server_key (url) :
+
+    # the server always uses db 0 (see redis_ns_server)
+    return (url.host or 'localhost', url.port or 6379,
+            url.username, url.password)
+
+
+def get_server (url, cache_ttl=CACHE_TTL, write_delay=0.0) :
+    """
+    Returns the shared server instance for the given url.  Every call must be
+    matched by a call to `release_server()`.
+    """
+
+    key = _server_key (url)
+
+    with _servers_lock :
+
+        if  key not in _servers :
+            _servers[key] = [redis_ns_server (url, cache_ttl, write_delay), 0]
+
+        _servers[key][1] += 1
+
+        return _servers[key][0]
+
+
+def release_server (r) :
+    """
+    Drops a reference to a shared server instance, and closes it once it is not
+    used anymore.
+    """
+
+    key = _server_key (r.url)
+
+    with _servers_lock :
+
+        if  key not in _servers or _servers[key][0] is not r :
+            return
+
+        _servers[key][1] -= 1
+
+        if  _servers[key][1] <= 0 :
+            del _servers[key]
+            r.close ()
 
 
 # --------------------------------------------------------------------
@@ -258,20 +561,30 @@ class redis_ns_entry :
         self.cache     = r.cache
         self.callbacks = r.callbacks
 
+        self.lock      = threading.RLock ()
+        self.pending   = dict()   # buffered attribute updates
+        self.timer     = None     # flushes the buffer
+
 
     # ----------------------------------------------------------------
     #
     def _dump (self) :
 
-        print "self.r         : %s" % str(self.r        )
-        print "self.path      : %s" % str(self.path     )
-        print "self.node      : %s" % str(self.node     )
-        print "self.data      : %s" % str(self.data     )
-        print "self.kids      : %s" % str(self.kids     )
-        print "self.valid     : %s" % str(self.valid    )
-        print "self.logger    : %s" % str(self.logger   )
-        print "self.cache     : %s" % str(self.cache    )
-        print "self.callbacks : %s" % str(self.callbacks)
+        self.logger.debug ("redis_ns_entry %s: node %s, data %s, kids %s, " \
+                           "valid %s" % (self.path, self.node, self.data,
+                                         self.kids, self.valid))
+
+
+    # ----------------------------------------------------------------
+    #
+    def _invalidate (self, p, path) :
+        """
+        add an invalidation event for the given path to the pipeline, so that
+        other clients drop their cache entries once the mutation is executed.
+        """
+
+        self.logger.debug ("pub INVALIDATE %s [%s]"  %  (path, self.r.id))
+        p.publish (MON, "INVALIDATE %s [%s]"  %  (path, self.r.id))
 
 
     # ----------------------------------------------------------------
@@ -415,6 +728,12 @@ class redis_ns_entry :
     
         self.node['mtime'] = now
         self.node['ctime'] = now
+
+        # an expired incarnation of the entry may still be waiting for cleanup
+        # -- remove it (and its index entries and kids) before we re-create it,
+        # so that the next cleanup does not remove the new entry.
+        if  self.r.zscore (EXPR, path) is not None :
+            self.r.cleanup (force=True)
     
         p = self.r.pipeline ()
         # FIXME: add guard
@@ -426,29 +745,62 @@ class redis_ns_entry :
         # FIXME: avoid duplicated entries!
         if path != '/' :
             p.sadd (KIDS+':'+parent, path)
+
+        # the new entry does not expire (see set_ttl)
+        p.zrem (EXPR, path)
     
         # add new index entries
         for key in self.data :
             val = self.data[key]
             p.sadd (KEYS+':'+str(key), path)
             p.sadd (VALS+':'+str(val), path)
+            p.sadd (ATTR+':'+str(key)+'='+str(val), path)
+            p.sadd (INDX+':'+path, KEYS+':'+str(key), VALS+':'+str(val),
+                                   ATTR+':'+str(key)+'='+str(val))
     
-    
+        self._invalidate (p, path)
+        if path != '/' :
+            self._invalidate (p, parent)
+
         # FIXME: eval vals
+        epoch = self.cache.epoch
         p.execute ()
     
-        # issue notification about entry creation to parent dir
+        # issue notification about entry creation on the parent dir's channel
+        # -- the global channel only carries cache invalidations
         self.logger.debug ("pub CREATE %s [%s]"  %  (parent, name))
-        self.r.publish   (MON, "CREATE %s [%s]"  %  (parent, name))
+        self.r.publish   (redis_ns_channel (parent),
+                          "CREATE %s [%s]"  %  (parent, name))
     
-        # refresh cache state
-        self.cache.set (NODE+':'+path, self.node)
-        self.cache.set (DATA+':'+path, self.data)
-        self.cache.set (KIDS+':'+path, self.kids)
+        # refresh cache state (unless other clients changed things meanwhile)
+        self._cache_set (epoch)
+
+        # the parent's list of kids is stale now
+        if path != '/' :
+            self.cache.invalidate (KIDS+':'+parent)
 
         self.valid = True
     
 
+    # ----------------------------------------------------------------
+    #
+    def _cache_set (self, epoch) :
+        """
+        cache node, data and kids -- entries which expire are not cached for
+        longer than they live
+        """
+
+        path = self.path
+        ttl  = None
+
+        if  'expires' in self.node :
+            ttl = max (0.0, float (self.node['expires']) - time.time ())
+
+        self.cache.set (NODE+':'+path, self.node, epoch, ttl)
+        self.cache.set (DATA+':'+path, self.data, epoch, ttl)
+        self.cache.set (KIDS+':'+path, self.kids, epoch, ttl)
+
+
     # ----------------------------------------------------------------
     #
     def __str__ (self) :
@@ -469,22 +821,129 @@ class redis_ns_entry :
 
     # ----------------------------------------------------------------
     #
-    def list (self) :
+    def list (self, recursive=False) :
         
         if  not self.node[TYPE] == DIR :
             raise IncorrectState ("'list()' is only supported on directories")
+
+        self.r.cleanup ()
+
+        if  recursive :
+            # one round trip, no matter how deep the tree is
+            return self.r.list_recursive (args=[self.path, KIDS])
         
         self.fetch ()
 
         return self.kids
 
 
+    # ----------------------------------------------------------------
+    #
+    def find (self, name_pattern=None, attr_pattern=None, recursive=True) :
+        """
+        Returns the paths of all entries below this directory whose name matches
+        `name_pattern`, and whose attributes match all `attr_pattern`s (a list
+        of, or a comma separated string of, 'key=val' or 'key' patterns).
+        Name patterns and attribute values can contain shell style wildcards,
+        attribute keys can not.
+        """
+
+        if  not self.node[TYPE] == DIR :
+            raise IncorrectState ("'find()' is only supported on directories")
+
+        self.logger.debug ("redis_ns_entry.find %s %s %s" \
+                        % (self.path, name_pattern, attr_pattern))
+
+        if  isinstance (attr_pattern, basestring) :
+            attr_pattern = attr_pattern.split (',')
+
+        self.r.cleanup ()
+
+        # for exact matches we can use the attr index.  Keys without value
+        # and wildcard values are looked up via the keys index, and the values
+        # are checked afterwards.
+        sets    = list()
+        filters = list()
+
+        for pat in attr_pattern or [] :
+
+            pat = pat.strip ()
+            if  not pat :
+                continue
+
+            if  '=' in pat :
+                key, val = pat.split ('=', 1)
+            else :
+                key, val = pat, None
+
+            if  val is None or val == '*' :
+                sets.append (KEYS+':'+key)
+
+            elif not re.search (r'[*?\[]', val) :
+                sets.append (ATTR+':'+key+'='+val)
+
+            else :
+                sets.append (KEYS+':'+key)
+                filters.append ((key, val))
+
+        if  sets :
+            candidates = self.r.sinter (sets)
+        else :
+            candidates = self.list (recursive=recursive)
+
+        # restrict to our subtree
+        prefix = self.path.rstrip ('/') + '/'
+        ret    = list()
+
+        for path in candidates :
+
+            if  not path.startswith (prefix) :
+                continue
+
+            if  not recursive and \
+                redis_ns_parent (path).rstrip ('/') != prefix[:-1] :
+                continue
+
+            if  name_pattern and \
+                not fnmatch.fnmatchcase (redis_ns_name (path), name_pattern) :
+                continue
+
+            ret.append (path)
+
+        if  filters and ret :
+
+            p = self.r.pipeline ()
+            for path in ret :
+                p.hmget (DATA+':'+path, [key for key, val in filters])
+            values = p.execute ()
+
+            matches = list()
+            for path, vals in zip (ret, values) :
+
+                match = True
+                for (key, pat), val in zip (filters, vals) :
+                    if  val is None or not fnmatch.fnmatchcase (val, pat) :
+                        match = False
+                        break
+
+                if  match :
+                    matches.append (path)
+
+            ret = matches
+
+        return ret
+
+
     # ----------------------------------------------------------------
     #
     def fetch (self) :
 
         self.logger.debug ("redis_ns_entry.fetch %s" % self.path)
 
+        # make sure we read our own (buffered) writes
+        if  self.pending :
+            self.flush ()
+
         path = self.path
 
         try :
@@ -504,6 +963,10 @@ class redis_ns_entry :
 
 
         try :
+            # remember the cache epoch -- if an invalidation event arrives
+            # while we fetch, we can't cache the (possibly stale) result
+            epoch = self.cache.epoch
+
             p = self.r.pipeline ()
             p.hgetall  (NODE+':'+path)
             p.hgetall  (DATA+':'+path)
@@ -526,9 +989,7 @@ class redis_ns_entry :
                 raise IncorrectState ("backend entry seems to be gone or corrupted")
 
             # cache our newly found entries
-            self.cache.set (NODE+':'+path, self.node)
-            self.cache.set (DATA+':'+path, self.data)
-            self.cache.set (KIDS+':'+path, self.kids)
+            self._cache_set (epoch)
 
             # fetched from redis ok
             self.valid = True
@@ -575,88 +1036,300 @@ class redis_ns_entry :
         if not key in self.data :
             raise BadParameter ("no such attribute (%s)" %  key)
 
-        val = self.data[key]
+        return self.data[key]
 
-        if key == 'foo' and val == 'stop' :
-            self.cache._dump ()
 
-        return val
+    # ----------------------------------------------------------------
+    #
+    def set_key (self, key, val) :
+        """
+        Sets an attribute.  If the server has a `write_delay`, the update is
+        buffered for that time, and coalesced with other updates on the same
+        entry (see `set_keys()`).  Reads on this entry flush the buffer.  If
+        the delayed write fails, the updates are kept, and the next read (or
+        `flush()`) retries them and raises the error.
+        """
+    
+        if  not self.r.write_delay :
+            self.set_keys ({key : val})
+            return
+
+        with self.lock :
+
+            self.pending[key] = val
+
+            if  not self.timer :
+                self.timer = threading.Timer (self.r.write_delay,
+                                              self._delayed_flush)
+                self.timer.setDaemon (True)
+                self.timer.start ()
 
 
     # ----------------------------------------------------------------
     #
-    def set_key (self, key, val) :
+    def flush (self) :
+        """
+        Writes all buffered attribute updates.
+        """
+
+        with self.lock :
+
+            if  self.timer :
+                self.timer.cancel ()
+                self.timer = None
+
+            pending, self.pending = self.pending, dict()
+
+        if  not pending :
+            return
+
+        try :
+            self.set_keys (pending)
+
+        except Exception :
+            # keep the updates for the next flush -- newer updates win
+            with self.lock :
+                pending.update (self.pending)
+                self.pending = pending
+            raise
+
+
+    # ----------------------------------------------------------------
+    #
+    def _delayed_flush (self) :
+        """
+        Timer callback for `set_key()` -- nobody would see errors raised here.
+        """
+
+        try :
+            self.flush ()
+
+        except Exception as e :
+            self.logger.error ("cannot write buffered updates for %s: %s" \
+                            % (self.path, e))
+
+
+    # ----------------------------------------------------------------
+    #
+    def set_keys (self, updates) :
+        """
+        Sets a number of attributes in a single MULTI block, which also
+        publishes a single notification about all of them.
+        """
     
         path = self.path
-        self.logger.debug ("set_key %s: %s" % (path, key))
+        self.logger.debug ("set_keys %s: %s" % (path, updates.keys ()))
     
         self.fetch () # refresh cache/state as needed
 
         # FIXME: we only fetch() for the indexes - we should optimize that again
         # by moving index consolidation into a separate thread (p.srem below)
 
-        if key in self.data and self.data[key] == val :
+        changed = dict()
+        for key, val in updates.iteritems () :
+            if  key not in self.data or self.data[key] != val :
+                changed[key] = val
+
+        # unchanged values still trigger the set event
+        if  len (updates) == 1 :
+            key, val = updates.items ()[0]
+            event    = "ATTRIBUTE %s [%s=%s]"  %  (path, key, val)
+        else :
+            event    = "ATTRIBUTES %s [%s]"    %  (path, json.dumps (updates))
+
+        if  not changed :
 
             # nothing changed - so just trigger the set event
-            self.logger.debug ("Pub ATTRIBUTE %s [%s=%s]"  %  (path, key, val))
-            self.r.publish   (MON, "ATTRIBUTE %s [%s=%s]"  %  (path, key, val))
+            self.logger.debug ("pub %s" % event)
+            self.r.publish (redis_ns_channel (path), event)
 
             # nothing else to do
             return
 
 
-        # need to set the key, and update the key/val indexes
-        p = self.r.pipeline ()
+        # need to set the keys, and update the key/val indexes
+        now = time.time ()
+        p   = self.r.pipeline ()
         # FIXME: add guard
-        p.hmset  (NODE+':'+path, {'mtime': time.time()})
-        p.hmset  (DATA+':'+path, {key    : val})
-    
-        # delete old invalid index entry
-        if key in self.data :
-            # we keep the key index entry around
-            p.srem (VALS+':'+str(self.data[key]), path)
-        else :
-            # new key: add new key index entry
-            p.sadd (KEYS+':'+str(key), path)
+        p.hmset  (NODE+':'+path, {'mtime': now})
+        p.hmset  (DATA+':'+path, changed)
+
+        for key, val in changed.iteritems () :
     
-        # always add new value index entry
-        p.sadd (VALS+':'+str(val), path)
+            # delete old invalid index entry
+            if key in self.data :
+                # we keep the key index entry around
+                old = self.data[key]
+                p.srem (VALS+':'+str(old), path)
+                p.srem (ATTR+':'+str(key)+'='+str(old), path)
+                p.srem (INDX+':'+path, VALS+':'+str(old), 
+                                       ATTR+':'+str(key)+'='+str(old))
+            else :
+                # new key: add new key index entry
+                p.sadd (KEYS+':'+str(key), path)
+                p.sadd (INDX+':'+path, KEYS+':'+str(key))
     
-        # FIXME: eval return types / values
-        vals = p.execute ()
+            # always add new value index entries
+            p.sadd (VALS+':'+str(val), path)
+            p.sadd (ATTR+':'+str(key)+'='+str(val), path)
+            p.sadd (INDX+':'+path, VALS+':'+str(val), 
+                                   ATTR+':'+str(key)+'='+str(val))
+
+        # the data hash may have been created just now -- it needs to expire
+        # along with the entry
+        if  'expires' in self.node :
+            p.pexpireat (DATA+':'+path, int (float (self.node['expires']) * 1000))
     
+        self._invalidate (p, path)
+
         # issue notification about key creation/update
-        self.logger.debug ("PUB ATTRIBUTE %s [%s=%s]"  %  (path, key, val))
-        self.r.publish   (MON, "ATTRIBUTE %s [%s=%s]"  %  (path, key, val))
+        self.logger.debug ("pub %s" % event)
+        p.publish (redis_ns_channel (path), event)
+
+        # FIXME: eval return types / values
+        epoch = self.cache.epoch
+        vals  = p.execute ()
     
-        # update cache
-        self.data[key] = val
-        self.cache.set (DATA+':'+path, self.data)
+        # update cache -- copies, as the cached dicts may be shared with other
+        # entry instances
+        self.node = dict (self.node)
+        self.data = dict (self.data)
+        self.node['mtime'] = now
+        self.data.update (changed)
+        self._cache_set (epoch)
+
+
+    # ----------------------------------------------------------------
+    #
+    def set_ttl (self, ttl) :
+        """
+        Lets the entry expire after `ttl` seconds (on the server side, via
+        PEXPIRE on the entry's node and data keys).  A negative `ttl` removes
+        the expiry.  The references to expired entries (in the parent's kids
+        set and in the attribute indexes), and the entries below expired
+        directories, are removed by `cleanup()`.
+        """
+
+        path = self.path
+        self.logger.debug ("set_ttl %s: %s" % (path, ttl))
+
+        self.fetch ()
+
+        keys = [NODE+':'+path, DATA+':'+path]
+        p    = self.r.pipeline ()
+
+        self.node = dict (self.node)
+
+        if  ttl is None or ttl < 0 :
+            for key in keys :
+                p.persist (key)
+            p.hdel (NODE+':'+path, 'expires')
+            p.zrem (EXPR, path)
+            self.node.pop ('expires', None)
+
+        else :
+            expires = time.time () + ttl
+            for key in keys :
+                p.pexpire (key, int (ttl * 1000))
+            p.hset (NODE+':'+path, 'expires', expires)
+            p.execute_command ('ZADD', EXPR, expires, path)
+            self.node['expires'] = expires
+
+        self._invalidate (p, path)
+
+        epoch = self.cache.epoch
+        p.execute ()
+
+        self._cache_set (epoch)
+
+
+    # ----------------------------------------------------------------
+    #
+    def get_ttl (self) :
+        """
+        Returns the remaining lifetime of the entry in seconds, or -1 if the
+        entry does not expire.
+        """
+
+        self.fetch ()
+
+        if  'expires' not in self.node :
+            return -1
+
+        return max (0, int (float (self.node['expires']) - time.time ()))
 
 
     # ----------------------------------------------------------------
     #
     def manage_callback (self, key, id, cb, obj) :
-        # FIXME: this needs a shared lock with the monitor thread!
+        """
+        Adds a callback (`cb` is set), removes a callback (`cb` is None), or
+        removes all callbacks for `key` (`id` is None).  The channel for the
+        entry's events is subscribed as long as any callbacks are registered.
+        """
     
         self.logger.debug ("redis_ns_entry.manage__callback %s : %s" % (self.path, key))
+
+        path = self.path
     
-        if not self.path in self.callbacks :
-            self.callbacks[self.path] = {}
-            if not key in self.callbacks[self.path] :
-                self.callbacks[self.path][key] = {}
-    
-        if id == None :
-            del self.callbacks[self.path][key]
+        with self.r.cb_lock :
+
+            if not path in self.callbacks :
+                self.callbacks[path] = {}
+                self.r.subscribe (path)
+
+            keys = self.callbacks[path]
     
-        if cb :
-            self.callbacks[self.path][key][id] = [cb, obj]
-        else :
-            # cb == None: remove that callback
-            # FIXME: if we have no callbacks for key, remove [key]
-            # FIXME: if we have no keys for path, remove [path]
-            # FIXME: if we remove a [path], unsubscribe for its notifications
-            del self.callbacks[self.path][key][id]
+            if id == None :
+                keys.pop (key, None)
+
+            elif cb :
+                keys.setdefault (key, {})[id] = [cb, obj]
+
+            else :
+                # cb == None: remove that callback
+                cbs = keys.get (key)
+                if cbs is not None :
+                    cbs.pop (id, None)
+                    if not cbs :
+                        del keys[key]
+
+            if not keys :
+                del self.callbacks[path]
+                self.r.unsubscribe (path)
+
+
+    # ----------------------------------------------------------------
+    #
+    def drop_callbacks (self, obj) :
+        """
+        Removes all callbacks which were registered for `obj` on this entry,
+        and unsubscribes the entry's channel if no callbacks are left.
+        """
+
+        path = self.path
+
+        with self.r.cb_lock :
+
+            keys = self.callbacks.get (path)
+
+            if  keys is None :
+                return
+
+            for key in keys.keys () :
+
+                cbs = keys[key]
+
+                for id in cbs.keys () :
+                    if  cbs[id][1] is obj :
+                        del cbs[id]
+
+                if  not cbs :
+                    del keys[key]
+
+            if not keys :
+                del self.callbacks[path]
+                self.r.unsubscribe (path)
 
   
 
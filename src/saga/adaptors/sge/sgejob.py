@@ -15,6 +15,8 @@ import saga.adaptors.base
 import saga.adaptors.cpi.job
 
 from saga.job.constants import *
+from saga.utils.job     import JobArray, JobTable, PollScheduler, script_submit_cmd
+from saga.utils.host_cache import HostCache
 
 import os
 import re
@@ -165,7 +167,10 @@ _ADAPTOR_CAPABILITIES = {
                           saga.job.TOTAL_CPU_COUNT,
                           saga.job.PROCESSES_PER_HOST,
                           saga.job.CANDIDATE_HOSTS,
-                          saga.job.TOTAL_PHYSICAL_MEMORY],
+                          saga.job.TOTAL_PHYSICAL_MEMORY,
+                          saga.job.ARRAY_START,
+                          saga.job.ARRAY_END,
+                          saga.job.ARRAY_STEP],
     "job_attributes":    [saga.job.EXIT_CODE,
                           saga.job.EXECUTION_HOSTS,
                           saga.job.CREATED,
@@ -286,7 +291,7 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         self.rm      = rm_url
         self.session = session
         self.pe_list = list()
-        self.jobs    = dict()
+        self.jobs    = JobTable()
         self.queue   = None
         self.memreqs = None
         self.shell   = None
@@ -294,6 +299,11 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         self.accounting = False
         self.temp_path = self._adaptor.base_workdir
 
+        # concurrent state polls of the same jobs are served by a single
+        # query round
+        self.poller  = PollScheduler(self._job_update_states,
+                                     min_interval=0.5, max_interval=30.0)
+
 
         rm_scheme = rm_url.scheme
         pty_url   = surl.Url (rm_url)
@@ -345,6 +355,69 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
     # ----------------------------------------------------------------
     #
     def initialize(self):
+
+        # the host capabilities may be known from an earlier job service
+        caps = HostCache().get(self.shell.url, _ADAPTOR_NAME, self.session)
+
+        if not caps:
+            caps = self._probe_host()
+            HostCache().set(self.shell.url, _ADAPTOR_NAME, caps, self.session)
+        else:
+            self._logger.debug("using cached SGE host capabilities")
+
+        self._commands  = caps['commands']
+        self.pe_list    = caps['pe_list']
+        self.accounting = caps['accounting']
+        mandatory_attrs = caps['mandatory_attrs']
+        optional_attrs  = caps['optional_attrs']
+
+        self._logger.info("Found SGE tools: %s" % self._commands)
+        self._logger.info("Accounting is %sabled" % ("en" if self.accounting else "dis"))
+
+        # find out user specified memory attributes in job.Service URL
+        if self.memreqs is None:
+            flags = []
+        else:
+            flags, _ = self.__parse_memreqs(self.memreqs)
+        # if there are mandatory memory attributes store them and check that they were specified in the job.Service URL
+        if not (mandatory_attrs == []):
+            self.mandatory_memreqs = mandatory_attrs
+            missing_flags = []
+            for attr in mandatory_attrs:
+                if not attr in flags:
+                    missing_flags.append(attr)
+            if not (missing_flags == []):
+                message = "The following memory attribute(s) are mandatory in your SGE environment and thus " \
+                          "must be specified in the job service URL: %s" % ' '.join(missing_flags)
+                log_error_and_raise(message, saga.BadParameter, self._logger) 
+        # if memory attributes were specified in the job.Service URL, check that they correspond to existing optional or mandatory memory attributes
+        invalid_attrs = []
+        for f in flags:
+            if not (f in optional_attrs or f in mandatory_attrs):
+                invalid_attrs.append(f)
+        if not (invalid_attrs == []):
+            message = "The following memory attribute(s) were specified in the job.Service URL but are not valid " \
+                      "memory attributes in your SGE environment: %s" % ' '.join(invalid_attrs)
+            log_error_and_raise(message, saga.BadParameter, self._logger)
+
+        # purge temporary files
+        if self._adaptor.purge_on_start:
+            cmd = "find " + self.temp_path + \
+                  " -type f -mtime +%d -print -delete | wc -l" % self._adaptor.purge_older_than
+            ret, out, _ = self.shell.run_sync(cmd)
+            if ret == 0 and out != "0":
+                self._logger.info("Purged %s temporary files" % out)
+
+    # ----------------------------------------------------------------
+    #
+    def _probe_host(self):
+        """
+        Checks the SGE installation on the target host, and returns the
+        detected capabilities (which are cached in the host cache).
+        """
+
+        pe_list = list()
+
         # check if all required sge tools are available
         for cmd in self._commands.keys():
             ret, out, _ = self.shell.run_sync("which %s " % cmd)
@@ -374,8 +447,6 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
                     self._commands[cmd] = {"path":    "unset GREP_OPTIONS; %s" % path,
                                            "version": version}
 
-        self._logger.info("Found SGE tools: %s" % self._commands)
-
         # determine the available processing elements
         ret, out, _ = self.shell.run_sync('%s -spl' %
                       (self._commands['qconf']['path']))
@@ -385,9 +456,9 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         else:
             for pe in out.split('\n'):
                 if pe != '':
-                    self.pe_list.append(pe)
+                    pe_list.append(pe)
             self._logger.debug("Available processing elements: %s" %
-                (self.pe_list))
+                (pe_list))
 
         # find out mandatory and optional memory attributes 
         ret, out, _ = self.shell.run_sync('%s -sc' % (self._commands['qconf']['path']))
@@ -406,44 +477,16 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
                         mandatory_attrs.append(name)
             self._logger.debug("Optional memory attributes: %s" % (optional_attrs))
             self._logger.debug("Mandatory memory attributes: %s" % (mandatory_attrs))
-        # find out user specified memory attributes in job.Service URL
-        if self.memreqs is None:
-            flags = []
-        else:
-            flags, _ = self.__parse_memreqs(self.memreqs)
-        # if there are mandatory memory attributes store them and check that they were specified in the job.Service URL
-        if not (mandatory_attrs == []):
-            self.mandatory_memreqs = mandatory_attrs
-            missing_flags = []
-            for attr in mandatory_attrs:
-                if not attr in flags:
-                    missing_flags.append(attr)
-            if not (missing_flags == []):
-                message = "The following memory attribute(s) are mandatory in your SGE environment and thus " \
-                          "must be specified in the job service URL: %s" % ' '.join(missing_flags)
-                log_error_and_raise(message, saga.BadParameter, self._logger) 
-        # if memory attributes were specified in the job.Service URL, check that they correspond to existing optional or mandatory memory attributes
-        invalid_attrs = []
-        for f in flags:
-            if not (f in optional_attrs or f in mandatory_attrs):
-                invalid_attrs.append(f)
-        if not (invalid_attrs == []):
-            message = "The following memory attribute(s) were specified in the job.Service URL but are not valid " \
-                      "memory attributes in your SGE environment: %s" % ' '.join(invalid_attrs)
-            log_error_and_raise(message, saga.BadParameter, self._logger)
 
         # check if accounting is activated
         qres = self.__kvcmd_results('qconf', '-sconf', filter_keys=["reporting_params"])
-        self.accounting = "reporting_params" in qres and "accounting=true" in qres["reporting_params"]
-        self._logger.info("Accounting is %sabled" % ("en" if self.accounting else "dis"))
+        accounting = "reporting_params" in qres and "accounting=true" in qres["reporting_params"]
 
-        # purge temporary files
-        if self._adaptor.purge_on_start:
-            cmd = "find " + self.temp_path + \
-                  " -type f -mtime +%d -print -delete | wc -l" % self._adaptor.purge_older_than
-            ret, out, _ = self.shell.run_sync(cmd)
-            if ret == 0 and out != "0":
-                self._logger.info("Purged %s temporary files" % out)
+        return {'commands':        self._commands,
+                'pe_list':         pe_list,
+                'mandatory_attrs': mandatory_attrs,
+                'optional_attrs':  optional_attrs,
+                'accounting':      accounting}
 
     # ----------------------------------------------------------------
     #
@@ -520,22 +563,6 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
             return SgeKeyValueParser(out, *args, **kwargs).as_dict()
         return None
 
-    def __remote_mkdir(self, path):
-        """
-        Creates a directory on the remote host.
-        :param path: the remote directory to be created.
-        """
-        # check if the path exists
-        ret, out, _ = self.shell.run_sync(
-                        "(test -d %s && echo -n 0) || (mkdir -p %s && echo -n 1)" % (path, path))
-
-        if ret == 0 and out == "1":
-            self._logger.info("Remote directory created: %s" % path)
-        elif ret != 0:
-            # something went wrong
-            message = "Couldn't create remote directory - %s" % (out)
-            log_error_and_raise(message, saga.NoSuccess, self._logger)
-
     def __job_info_from_accounting(self, sge_job_id, max_retries=10):
         """ Returns job information from the SGE accounting using qacct.
         It may happen that when the job exits from the queue system the results in
@@ -729,13 +756,22 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         if jd.candidate_hosts:
             sge_params.append('#$ -l h="%s"' % '|'.join(jd.candidate_hosts))
 
+        # job arrays - SGE task ids start at 1
+        job_array = JobArray.from_description(jd)
+        if job_array:
+            sge_params.append("#$ -t %s" % job_array.range_spec(min_start=1))
+
 
         # convert sge params into an string
         sge_params = "\n".join(sge_params)
 
         # Job info, executable and arguments
 
-        job_info_path = self.__remote_job_info_path()
+        # array elements need to keep their job info apart
+        if job_array:
+            job_info_path = self.__remote_job_info_path("$JOB_ID.$SGE_TASK_ID")
+        else:
+            job_info_path = self.__remote_job_info_path()
 
         script_body = [
             'function aborted() {',
@@ -761,6 +797,9 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         elif jd.arguments is not None:
             raise Exception("jd.arguments defined without jd.executable being defined")
 
+        if job_array:
+            script_body += [job_array.index_export("$SGE_TASK_ID").strip()]
+
         if exec_n_args is not None:
             script_body += [exec_n_args]
 
@@ -770,14 +809,14 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         ]
 
         # convert exec and args into an string and
-        # escape all double quotes and dollar signs, otherwise 'echo |'
-        # further down won't work.
+        # escape all dollar signs, as the script is expanded by the shell when
+        # passed to qsub via a here-document further down.
         # only escape '$' in args and exe. not in the params
         script_body = "\n".join(script_body).replace('$', '\\$')
 
         sgescript = "\n#!/bin/bash \n%s \n%s" % (sge_params, script_body)
 
-        return sgescript.replace('"', '\\"')
+        return sgescript
 
     # ----------------------------------------------------------------
     #
@@ -810,35 +849,39 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         # try to create the working/output/error directories (if defined)
         # WARNING: this assumes a shared filesystem between login node and
         #           compute nodes.
+        mkdirs = list()
+
         if jd.working_directory is not None and len(jd.working_directory) > 0:
-            self.__remote_mkdir(jd.working_directory)
+            mkdirs.append(jd.working_directory)
 
         if jd.output is not None and len(jd.output) > 0:
-            self.__remote_mkdir(os.path.dirname(jd.output))
+            mkdirs.append(os.path.dirname(jd.output))
 
         if jd.error is not None and len(jd.error) > 0:
-            self.__remote_mkdir(os.path.dirname(jd.output))
+            mkdirs.append(os.path.dirname(jd.error))
 
         # submit the SGE script
-        # Now we want to execute the script. This process consists of two steps:
-        # (1) we create a temporary file with 'mktemp' and write the contents of 
-        #     the generated PBS script into it
-        # (2) we call 'qsub <tmpfile>' to submit the script to the queueing system
-        cmdline = """SCRIPTFILE=`mktemp -t SAGA-Python-SGEJobScript.XXXXXX` &&  echo "%s" > $SCRIPTFILE && %s -notify $SCRIPTFILE && rm -f $SCRIPTFILE""" %  (script, self._commands['qsub']['path'])
-        #cmdline = 'echo "%s" | %s -notify' % (script, self._commands['qsub']['path'])
+        # Now we want to execute the script.  In a single shell command, we
+        # create the directories, and pipe the generated script into 'qsub'
+        # via a here-document.
+        cmdline = script_submit_cmd("%s -notify" % self._commands['qsub']['path'],
+                                    script, mkdirs=mkdirs, expand=True)
         ret, out, _ = self.shell.run_sync(cmdline)
 
         if ret != 0:
-            # something went wrong
+            # something went wrong -- the cached host capabilities may be
+            # stale, so probe again next time
+            HostCache().invalidate(self.shell.url, _ADAPTOR_NAME, self.session)
             message = "Error running job via 'qsub': %s. Commandline was: %s" % (out, cmdline)
             log_error_and_raise(message, saga.NoSuccess, self._logger)
 
         # stdout contains the job id:
         # Your job 1036608 ("testjob") has been submitted
+        # Your job-array 1036609.1-10:1 ("testjob") has been submitted
         sge_job_id = None
         for line in out.split('\n'):
             if line.find("Your job") != -1:
-                sge_job_id = line.split()[2]
+                sge_job_id = line.split()[2].split('.')[0]
         if sge_job_id is None:
             message = "Couldn't parse job id from 'qsub' output: %s" % out
             log_error_and_raise(message, saga.NoSuccess, self._logger)
@@ -846,7 +889,9 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         job_id = "[%s]-[%s]" % (self.rm, sge_job_id)
         self._logger.info("Submitted SGE job with id: %s" % job_id)
 
-        # add job to internal list of known jobs.
+        # add job to internal list of known jobs (and forget about jobs which
+        # finished a while ago)
+        self.jobs.purge()
         self.jobs[job_id] = {
             'state':        saga.job.PENDING,
             'name':         jd.name,
@@ -858,6 +903,11 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
             'gone':         False
         }
 
+        job_array = JobArray.from_description(jd)
+        if job_array:
+            self.jobs[job_id]['array']        = job_array
+            self.jobs[job_id]['array_states'] = job_array.initial_states()
+
         return job_id
 
     # ----------------------------------------------------------------
@@ -971,6 +1021,10 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         if prev_info["state"] in [saga.job.CANCELED, saga.job.FAILED, saga.job.DONE]:
             return prev_info
 
+        # the state of a job array is derived from its elements
+        if prev_info.get('array'):
+            return self._job_get_array_info(job_id)
+
         # retrieve updated job information
         curr_info = self._retrieve_job(job_id)
         if curr_info is None:
@@ -981,6 +1035,93 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         self.jobs[job_id] = curr_info
         return curr_info
 
+    # ----------------------------------------------------------------
+    #
+    def _job_get_array_info(self, job_id):
+        """ get the element states of a job array, and derive the state of the
+            array from those.  Elements still in the queue are listed by qstat,
+            finished elements have left their job info file.
+        """
+
+        job_info = self.jobs[job_id]
+        ja       = job_info['array']
+        rm, pid  = self._adaptor.parse_id(job_id)
+        seen     = dict()
+
+        # qstat lists running elements individually, waiting elements as
+        # ranges in the last (ja-task-ID) column:
+        #   r 8
+        #   qw 9-10:1
+        ret, out, _ = self.shell.run_sync(
+                        "%s | tail -n+3 | awk '($1==%s) {print $5,$NF}'" % (
+                            self._commands['qstat']['path'], pid))
+        if ret == 0:
+            for line in out.split('\n'):
+                elems = line.split()
+                if len(elems) != 2:
+                    continue
+                for idx in ja.parse_indices(elems[1]):
+                    seen[idx] = self.__sge_to_saga_jobstate(elems[0])
+
+        # the job info files of finished elements contain lines like
+        #   /tmp/saga/1036609.3:exit_status: 0
+        ret, out, _ = self.shell.run_sync(
+                        "grep -H -E '^(exit_status|signal):' %s.* 2>/dev/null" % (
+                            self.__remote_job_info_path(pid)))
+        if ret == 0:
+            for line in out.split('\n'):
+                if line.count(':') < 2:
+                    continue
+                path, key, val = line.split(':', 2)
+                for idx in ja.parse_indices(path.rsplit('.', 1)[-1]):
+                    if key == 'signal':
+                        seen[idx] = saga.job.CANCELED
+                    elif seen.get(idx) != saga.job.CANCELED:
+                        if val.strip() == '0':
+                            seen[idx] = saga.job.DONE
+                        else:
+                            seen[idx] = saga.job.FAILED
+
+        job_info['array_states'] = ja.merge_states(job_info['array_states'], seen)
+        job_info['state']        = ja.collapse_states(job_info['array_states'])
+
+        return job_info
+
+    # ----------------------------------------------------------------
+    #
+    def _job_update_states(self, job_ids):
+        """ update the infos of the given jobs, and return a dict of their
+            states.  This is the query function of the service's poll
+            scheduler.  A single qstat call lists the queued jobs -- the full
+            job info is only retrieved for jobs whose state changed, or which
+            left the queue.
+        """
+        states = dict()
+        pids   = dict()   # pid --> job_id
+
+        for job_id in job_ids:
+            if not self.jobs[job_id].get('array'):
+                rm, pid = self._adaptor.parse_id(job_id)
+                pids[pid] = job_id
+
+        queued = dict()   # job_id --> saga state
+        if pids:
+            ret, out, _ = self.shell.run_sync(
+                            "%s | tail -n+3 | awk '{print $1,$5}'" % (
+                                self._commands['qstat']['path']))
+            if ret == 0:
+                for line in out.split('\n'):
+                    elems = line.split()
+                    if len(elems) == 2 and elems[0] in pids:
+                        queued[pids[elems[0]]] = self.__sge_to_saga_jobstate(elems[1])
+
+        for job_id in job_ids:
+            if queued.get(job_id) != self.jobs[job_id]['state']:
+                self.jobs[job_id] = self._job_get_info(job_id=job_id)
+            states[job_id] = self.jobs[job_id]['state']
+
+        return states
+
     # ----------------------------------------------------------------
     #
     def _job_get_state(self, job_id):
@@ -992,9 +1133,15 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         or self.jobs[job_id]['state'] == saga.job.DONE:
             return self.jobs[job_id]['state']
 
-        # check if we can / should update
+        # check if we can / should update -- concurrent polls are aggregated
         if (self.jobs[job_id]['gone'] is not True):
-            self.jobs[job_id] = self._job_get_info(job_id=job_id)
+            self.poller.poll(job_id)
+
+        # final jobs are not polled anymore
+        if self.jobs[job_id]['state'] in [saga.job.CANCELED,
+                                          saga.job.FAILED,
+                                          saga.job.DONE]:
+            self.poller.forget(job_id)
 
         return self.jobs[job_id]['state']
 
@@ -1081,6 +1228,12 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         # assume the job was succesfully canceld
         self.jobs[job_id]['state'] = saga.job.CANCELED
 
+        if self.jobs[job_id].get('array'):
+            job_info = self.jobs[job_id]
+            job_info['array_states'] = job_info['array'].cancel_states(
+                                                   job_info['array_states'])
+            self.shell.run_sync("rm -f %s.*" % self.__remote_job_info_path(pid))
+
     # ----------------------------------------------------------------
     #
     def _job_wait(self, job_id, timeout):
@@ -1090,6 +1243,11 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         time_start = time.time()
         time_now   = time_start
         rm, pid    = self._adaptor.parse_id(job_id)
+        interval   = self.poller.interval()
+        deadline   = None
+
+        if timeout >= 0:
+            deadline = time_start + timeout
 
         while True:
             state = self._job_get_state(job_id=job_id)
@@ -1102,8 +1260,8 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
                state == saga.job.CANCELED:
                     self.__clean_remote_job_info(pid)
                     return True
-            # avoid busy poll
-            time.sleep(0.5)
+            # avoid busy poll -- poll less often while the state doesn't change
+            interval.sleep(state, deadline)
 
             # check if we hit timeout
             if timeout >= 0:
@@ -1162,6 +1320,14 @@ class SGEJobService (saga.adaptors.cpi.job.Service):
         """
         return self.rm
 
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_poll_stats(self):
+        """ implements saga.adaptors.cpi.job.Service.get_poll_stats()
+        """
+        return self.poller.stats()
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
@@ -1236,6 +1402,7 @@ class SGEJob (saga.adaptors.cpi.job.Job):
             self._id      = job_info['reconnect_jobid']
             self._name    = self.jd.name
             self._started = True
+            self.js.jobs.attach(self._id, self.get_api())
         else:
             self._id      = None
             self._name    = self.jd.name
@@ -1249,6 +1416,28 @@ class SGEJob (saga.adaptors.cpi.job.Job):
     def get_description (self):
         return self.jd
 
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_array_states(self):
+        """ implements saga.adaptors.cpi.job.Job.get_array_states()
+        """
+        job_info = self.js.jobs.get(self._id, {})
+
+        if not job_info.get('array'):
+            job_array = None
+            if self.jd:
+                job_array = JobArray.from_description(self.jd)
+            if not job_array:
+                log_error_and_raise("Job %s is not a job array" % self._id,
+                    saga.IncorrectState, self._logger)
+            return job_array.initial_states(saga.job.NEW)
+
+        # a state update also updates the element states
+        self.js._job_get_state(self._id)
+
+        return dict(job_info['array_states'])
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
@@ -1294,6 +1483,8 @@ class SGEJob (saga.adaptors.cpi.job.Job):
         self._id = self.js._job_run(self.jd)
         self._started = True
 
+        self.js.jobs.attach(self._id, self.get_api())
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
@@ -200,10 +200,8 @@ class Adaptor(saga.adaptors.base.Base):
         shells (we don't care about the path while leasing copy shells)
         """
 
-        lease_tgt = saga.Url(tgt)
-        lease_tgt.path = '/shell_file_adaptor_command_shell/'
-
-        return lease_tgt
+        # FrozenUrl caches the derived URL, so this is cheap for repeated calls
+        return saga.FrozenUrl(tgt).with_path('/shell_file_adaptor_command_shell/')
 
 
 ###############################################################################
@@ -314,6 +312,27 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
             return cmd_shell.run_sync("%s cd %s && %s" % (pre_cmd, location.path, command))
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _command_batch(self, commands, location=None):
+        """
+        like _command, but runs all commands (each in location) in a single
+        round trip
+        """
+
+        if  not location:
+            location = self.url
+        else:
+            location = saga.FrozenUrl(location)
+
+        lease_tgt = self._adaptor.get_lease_target(location)
+        with self.lm.lease(lease_tgt, self.shell_creator, location) \
+             as cmd_shell:
+
+            return cmd_shell.run_batch(["cd %s && %s" % (location.path, cmd.strip())
+                                        for cmd in commands])
+
+
     # --------------------------------------------------------------------------
     #
     def initialize(self):
@@ -369,7 +388,7 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
         self._is_valid()
 
         adaptor_state = {"from_open" : True,
-                         "cwd"       : saga.Url(self.url) }  # deep copy
+                         "cwd"       : saga.FrozenUrl(self.url) }
 
         if  sumisc.url_is_relative(url):
             url = sumisc.url_make_absolute(self.get_url(), url)
@@ -386,7 +405,7 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
         self._is_valid()
 
         adaptor_state = {"from_open" : True,
-                         "cwd"       : saga.Url(self.url) }  # deep copy
+                         "cwd"       : saga.FrozenUrl(self.url) }
 
         if  sumisc.url_is_relative(url):
             url = sumisc.url_make_absolute(self.get_url(), url)
@@ -399,8 +418,8 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
     @SYNC_CALL
     def change_dir(self, tgt, flags):
 
-        cwdurl = saga.Url(self.url)
-        tgturl = saga.Url(tgt)
+        cwdurl = saga.FrozenUrl(self.url)
+        tgturl = saga.FrozenUrl(tgt)
         path   = tgturl.path
         if not path:
             path = '.'
@@ -504,9 +523,9 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
 
         # FIXME: eval flags
 
-        cwdurl = saga.Url(self.url)  # deep copy
-        src    = saga.Url(src_in)    # deep copy
-        tgt    = saga.Url(tgt_in)    # deep copy
+        cwdurl = saga.FrozenUrl(self.url)
+        src    = saga.FrozenUrl(src_in)
+        tgt    = saga.FrozenUrl(tgt_in)
 
         if  sumisc.url_is_relative(src): src = sumisc.url_make_absolute(cwdurl, src)
         if  sumisc.url_is_relative(tgt): tgt = sumisc.url_make_absolute(cwdurl, tgt)
@@ -643,9 +662,9 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
         # even then may fail)
         self._is_valid()
 
-        cwdurl = saga.Url(self.url)  # deep copy
-        src    = saga.Url(src_in)    # deep copy
-        tgt    = saga.Url(tgt_in)    # deep copy
+        cwdurl = saga.FrozenUrl(self.url)
+        src    = saga.FrozenUrl(src_in)
+        tgt    = saga.FrozenUrl(tgt_in)
 
         if  flags & saga.filesystem.RECURSIVE:
             raise saga.BadParameter("'RECURSIVE' flag not  supported for link()")
@@ -720,8 +739,8 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
         # FIXME: eval flags
         # FIXME: check if tgt remove happens to affect cwd... :-P
 
-        cwdurl = saga.Url(self.url)  # deep copy
-        tgt    = saga.Url(tgt_in)    # deep copy
+        cwdurl = saga.FrozenUrl(self.url)
+        tgt    = saga.FrozenUrl(tgt_in)
 
         rec_flag = ""
         if  flags & saga.filesystem.RECURSIVE:
@@ -746,7 +765,7 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
 
         self._is_valid()
 
-        tgt    = saga.Url(tgt_in)   # deep copy
+        tgt    = saga.FrozenUrl(tgt_in)
         chk    = ''
         opt    = ''
 
@@ -791,16 +810,32 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
 
         self._is_valid()
 
-        tgt = saga.Url(tgt_in)   # deep copy
-        ret, out, err = self._command(" du -ks '%s' | xargs | cut -f 1 -d ' '\n"
-                                     % tgt.path)
+        tgt  = saga.FrozenUrl(tgt_in)
+        path = tgt.path
+        if not path:
+            path = '.'
+
+        # 'du' reports disk usage, which is only what we want for directories.
+        # Check the type and get both size flavors in one round trip -- the
+        # one which does not apply to the entry type is simply ignored
+        res = self._command_batch([" test -d '%s' && test ! -h '%s'" % (path, path),
+                                   " du -ks '%s' | xargs | cut -f 1 -d ' '" % path,
+                                   " wc -c '%s' | xargs | cut -f 1 -d ' '"  % path])
+
+        if  res[0][0] == 0:
+            size_mult     = 1024  # see '-k' option to 'du'
+            ret, out, err = res[1]
+        else:
+            size_mult     = 1
+            ret, out, err = res[2]
+
         if  ret:
             raise saga.NoSuccess("get size for (%s) failed (%s): %s [%s]"
                                % (tgt, ret, out, err))
 
         size = None
         try:
-            size = int(out) * 1024  # see '-k' option to 'du'
+            size = int(out) * size_mult
         except Exception as e:
             raise saga.NoSuccess("could not get file size: %s (%s)" % (out, e))
 
@@ -824,7 +859,7 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
 
         self._is_valid()
 
-        tgt = saga.Url(tgt_in)    # deep copy
+        tgt = saga.FrozenUrl(tgt_in)
 
         ret, out, _ = self._command(" test -e '%s'" % tgt.path)
 
@@ -848,7 +883,7 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
 
         self._is_valid()
 
-        tgt  = saga.Url(tgt_in)   # deep copy
+        tgt  = saga.FrozenUrl(tgt_in)
         path = tgt.path
         if not path:
             path = '.'
@@ -876,7 +911,7 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
 
         self._is_valid()
 
-        tgt = saga.Url(tgt_in)  # deep copy
+        tgt = saga.FrozenUrl(tgt_in)
 
         ret, out, _ = self._command(" test -f '%s' && test ! -h '%s'" 
                                    % (tgt.path, tgt.path))
@@ -902,7 +937,7 @@ class ShellDirectory(saga.adaptors.cpi.filesystem.Directory):
 
         self._is_valid()
 
-        tgt = saga.Url(tgt_in)   # deep copy
+        tgt = saga.FrozenUrl(tgt_in)
 
         ret, out, _ = self._command(" test -h '%s'" % tgt.path)
 
@@ -994,6 +1029,23 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
             return shell.run_sync("cd %s && %s\n" % (cwd_path, cmd))
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _run_batch(self, cmds):
+        """
+        lease the shell, run all commands (each in $PWD) in a single round
+        trip, and release shell again
+        """
+
+        lease_tgt = self._adaptor.get_lease_target(self.cwdurl)
+        cwd_path  = self.cwdurl.path
+
+        with self.lm.lease(lease_tgt, self.shell_creator, self.cwdurl) as shell:
+
+            return shell.run_batch(["cd %s && %s" % (cwd_path, cmd.strip())
+                                    for cmd in cmds])
+
+
     # --------------------------------------------------------------------------
     #
     @SYNC_CALL
@@ -1014,7 +1066,7 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
             self.valid       = False  # will be set by initialize
             self.lm          = session._lease_manager
 
-            self.cwdurl      = saga.Url(adaptor_state["cwd"])
+            self.cwdurl      = saga.FrozenUrl(adaptor_state["cwd"])
             self.cwd         = self.cwdurl.path
 
             if  sumisc.url_is_relative(self.url):
@@ -1032,8 +1084,7 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
             self.lm          = session._lease_manager
 
             self.cwd         = sumisc.url_get_dirname(url)
-            self.cwdurl      = saga.Url(url)  # deep copy
-            self.cwdurl.path = self.cwd
+            self.cwdurl      = saga.FrozenUrl(url).with_path(self.cwd)
 
             if  not self.flags:
                 self.flags = 0
@@ -1146,9 +1197,9 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
 
         # print "copy self %s -> %s" % (self.url, tgt_in)
 
-        cwdurl = saga.Url(self.cwdurl)  # deep copy
-        src    = saga.Url(self.url)     # deep copy
-        tgt    = saga.Url(tgt_in)       # deep copy
+        cwdurl = saga.FrozenUrl(self.cwdurl)
+        src    = saga.FrozenUrl(self.url)
+        tgt    = saga.FrozenUrl(tgt_in)
 
         if sumisc.url_is_relative(src): src = sumisc.url_make_absolute(cwdurl, src)
         if sumisc.url_is_relative(tgt): tgt = sumisc.url_make_absolute(cwdurl, tgt)
@@ -1258,9 +1309,9 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
         # even then may fail)
         self._is_valid()
 
-        cwdurl = saga.Url(self.url)    # deep copy
-        src    = saga.Url(self.url)    # deep copy
-        tgt    = saga.Url(tgt_in)      # deep copy
+        cwdurl = saga.FrozenUrl(self.url)
+        src    = saga.FrozenUrl(self.url)
+        tgt    = saga.FrozenUrl(tgt_in)
 
         if  flags & saga.filesystem.RECURSIVE:
             raise saga.BadParameter("'RECURSIVE' flag unsupported for link()")
@@ -1318,7 +1369,7 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
         else:
             self.flags = flags
 
-        tgt = saga.Url(self.url)  # deep copy, is absolute
+        tgt = saga.FrozenUrl(self.url)  # is absolute
 
         # FIXME: AM: this is stupid and wrong
         if  flags == saga.filesystem.APPEND:
@@ -1348,7 +1399,7 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
         self._is_valid()
 
         lease_tgt = self._adaptor.get_lease_target(self.cwdurl)
-        tgt       = saga.Url(self.url)  # deep copy, is absolute
+        tgt       = saga.FrozenUrl(self.url)  # is absolute
 
         with self.lm.lease(lease_tgt, self.shell_creator, self.cwdurl) as shell:
             out = shell.read_from_remote(tgt.path)
@@ -1370,7 +1421,7 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
         # FIXME: eval flags
         # FIXME: check if tgt remove happens to affect cwd... :-P
 
-        tgt = saga.Url(self.url)  # deep copy, is absolute
+        tgt = saga.FrozenUrl(self.url)  # is absolute
 
         rec_flag = ""
         if  flags & saga.filesystem.RECURSIVE:
@@ -1393,13 +1444,21 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
         ret       = None
         out       = None
 
-        if  self.is_dir_self():
+        path = self.url.path
+        if not path:
+            path = '.'
+
+        # check the type and get both size flavors in one round trip -- the
+        # one which does not apply to the entry type is simply ignored
+        res = self._run_batch([" test -d '%s' && test ! -h '%s'" % (path, path),
+                               " du -ks '%s' | xargs | cut -f 1 -d ' '" % path,
+                               " wc -c '%s' | xargs | cut -f 1 -d ' '"  % path])
+
+        if  res[0][0] == 0:
             size_mult   = 1024   # see '-k' option to 'du'
-            ret, out, _ = self._run_sync(" du -ks '%s'  | xargs | cut -f 1 -d ' '\n"
-                                           % self.url.path)
+            ret, out, _ = res[1]
         else:
-            ret, out, _ = self._run_sync(" wc -c '%s' | xargs | cut -f 1 -d ' '\n"
-                                           % self.url.path)
+            ret, out, _ = res[2]
             if ret:
                 raise saga.NoSuccess("get size for (%s) failed (%s): (%s)"
                                    % (self.url, ret, out))
@@ -1419,7 +1478,7 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
 
         self._is_valid()
 
-        cwdurl = saga.Url(self.url)  # deep copy
+        cwdurl = saga.FrozenUrl(self.url)
         path   = cwdurl.path
         if not path:
             path = '.'
@@ -1438,7 +1497,7 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
 
         self._is_valid()
 
-        cwdurl = saga.Url(self.url)  # deep copy
+        cwdurl = saga.FrozenUrl(self.url)
 
         ret, out, _ = self._run_sync(" test -f '%s' && test ! -h '%s'" 
                                     % (cwdurl.path, cwdurl.path))
@@ -1453,7 +1512,7 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
 
         self._is_valid()
 
-        cwdurl = saga.Url(self.url)  # deep copy
+        cwdurl = saga.FrozenUrl(self.url)
 
         ret, out, _ = self._run_sync(" test -h '%s'" % cwdurl.path)
 
@@ -1467,7 +1526,7 @@ class ShellFile(saga.adaptors.cpi.filesystem.File):
 
         self._is_valid()
 
-        cwdurl = saga.Url(self.url)  # deep copy
+        cwdurl = saga.FrozenUrl(self.url)
 
         ret, out, _ = self._run_sync(" test -f '%s' && test ! -h '%s'" 
                                     % (cwdurl.path, cwdurl.path))
@@ -13,9 +13,14 @@ import saga.adaptors.cpi.job
 
 from   saga.job.constants import *
 from   saga.utils.job     import TransferDirectives
+from   saga.utils.job     import JobArray, ARRAY_INDEX_ENV
+from   saga.utils.job     import PollScheduler
 
 import re
+import os
 import time
+import uuid
+import hashlib
 import threading
 
 import shell_wrapper
@@ -23,11 +28,18 @@ import shell_wrapper
 SYNC_CALL  = saga.adaptors.cpi.decorators.SYNC_CALL
 ASYNC_CALL = saga.adaptors.cpi.decorators.ASYNC_CALL
 
+# reported on bootstrap if the wrapper script needs to be installed
+_WRAPPER_MISSING = "SAGA_WRAPPER_MISSING"
+
 
 # ------------------------------------------------------------------------------
 #
 class _job_state_monitor (threading.Thread) :
-    """ thread that periodically monitors job states """
+    """
+    thread that periodically monitors job states.  If the pty reactor is
+    enabled, no thread is started -- the reactor passes the monitoring channel's
+    output to us line by line (see :func:`subscribe`).
+    """
 
     # --------------------------------------------------------------------------
     #
@@ -39,6 +51,7 @@ class _job_state_monitor (threading.Thread) :
         self.logger  = logger
         self.stop    = False
         self.events  = dict()
+        self.running = False   # MONITOR command has been started
 
         super (_job_state_monitor, self).__init__ ()
 
@@ -51,6 +64,51 @@ class _job_state_monitor (threading.Thread) :
 
         self.stop = True
 
+        try :
+            self.channel.unsubscribe ()
+        except Exception as e :
+            self.logger.debug ("ignore unsubscribe error: %s" % e)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def subscribe (self) :
+        """
+        Start monitoring via a line callback on the monitoring channel.  Returns
+        `False` if that is not supported, and the thread needs to be started
+        instead.
+        """
+
+        # the monitoring output is buffered until we subscribe, so nothing
+        # gets lost in between
+        self.channel.run_async ("MONITOR")
+        self.running = True
+
+        return self.channel.subscribe (self._on_line)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _on_line (self, line) :
+
+        if  self.stop :
+            return
+
+        if  line is None :
+            self.logger.error ("monitoring channel closed -- disable notifications")
+            self.stop = True
+            return
+
+        try :
+            if  not self._handle (line.strip ()) :
+                self.finalize ()
+
+        except Exception as e:
+
+            self.logger.error ("Exception in job monitoring: %s" % e)
+            self.logger.error ("Cancel job monitoring for %s" % self.rm)
+            self.finalize ()
+
 
     # --------------------------------------------------------------------------
     #
@@ -60,7 +118,9 @@ class _job_state_monitor (threading.Thread) :
 
         try:
 
-            self.channel.run_async ("MONITOR")
+            if  not self.running :
+                self.channel.run_async ("MONITOR")
+                self.running = True
 
             while self.channel.alive () :
 
@@ -76,49 +136,74 @@ class _job_state_monitor (threading.Thread) :
                         return
                     pass
 
-
-                elif line == 'EXIT' or line == "Killed" :
-                    self.logger.error ("monitoring channel failed -- disable notifications")
+                elif not self._handle (line) :
                     return
 
 
-                elif not ':' in line :
-                    self.logger.warn ("monitoring channel noise: %s" % line)
+        except Exception as e:
 
+            self.logger.error ("Exception in job monitoring thread: %s" % e)
+            self.logger.error ("Cancel job monitoring for %s" % self.rm)
 
-                else :
-                    job_pid, state, data = line.split (':', 2)
-                    job_id = "[%s]-[%s]" % (self.rm, job_pid)
 
-                    state = self.js._adaptor.string_to_state (state)
+    # --------------------------------------------------------------------------
+    #
+    def _handle (self, line) :
+        """
+        evaluate a line of monitoring output -- returns `False` if monitoring
+        should stop
+        """
 
-                    try :
-                        job = self.js.get_job (job_id, no_reconnect=True)
+        if  not line :
+            pass
 
-                        if  not job :
-                            # job not yet known -- keep event for later
-                            if  not job_id in self.events :
-                                self.events[job_id] = list()
-                            self.events[job_id].append (state)
 
-                        else :
+        elif line == 'EXIT' or line == "Killed" :
+            self.logger.error ("monitoring channel failed -- disable notifications")
+            return False
 
-                            # check for previous events :
-                            if  job_id in self.events :
-                                for event in self.events[job_id] :
-                                    job._adaptor._set_state (event)
-                                del (self.events[job_id])
-                            job._adaptor._set_state (state)
 
+        elif not ':' in line :
+            self.logger.warn ("monitoring channel noise: %s" % line)
 
-                    except saga.DoesNotExist as e :
-                        self.logger.error ("event for unknown job '%s'" % job_id)
 
+        else :
+            job_pid, state, data = line.split (':', 2)
+            job_id = "[%s]-[%s]" % (self.rm, job_pid)
 
-        except Exception as e:
+            state = self.js._adaptor.string_to_state (state)
 
-            self.logger.error ("Exception in job monitoring thread: %s" % e)
-            self.logger.error ("Cancel job monitoring for %s" % self.rm)
+            # events for job array elements are routed to the array
+            if  job_pid in self.js.array_elements :
+                array_id, idx = self.js.array_elements[job_pid]
+                array = self.js.jobs.get (array_id)
+                if  array :
+                    array._adaptor._set_element_state (idx, state)
+                return True
+
+            try :
+                job = self.js.get_job (job_id, no_reconnect=True)
+
+                if  not job :
+                    # job not yet known -- keep event for later
+                    if  not job_id in self.events :
+                        self.events[job_id] = list()
+                    self.events[job_id].append (state)
+
+                else :
+
+                    # check for previous events :
+                    if  job_id in self.events :
+                        for event in self.events[job_id] :
+                            job._adaptor._set_state (event)
+                        del (self.events[job_id])
+                    job._adaptor._set_state (state)
+
+
+            except saga.DoesNotExist :
+                self.logger.error ("event for unknown job '%s'" % job_id)
+
+        return True
 
 
 # --------------------------------------------------------------------
@@ -208,6 +293,9 @@ _ADAPTOR_CAPABILITIES  = {
                           saga.job.TOTAL_GPU_COUNT,
                           saga.job.PROCESSES_PER_HOST,
                           saga.job.SPMD_VARIATION,
+                          saga.job.ARRAY_START,
+                          saga.job.ARRAY_END,
+                          saga.job.ARRAY_STEP,
                          ],
     "job_attributes"   : [saga.job.EXIT_CODE,
                           saga.job.EXECUTION_HOSTS,
@@ -498,6 +586,10 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
         self.jobs    = dict()
         self.njobs   = 0
 
+        # job array elements are individual jobs on the wrapper -- this maps
+        # their pids to (array job id, array index)
+        self.array_elements = dict()
+
         # Use `_set_session` method of the base class to set the session object.
         # `_set_session` and `get_session` methods are provided by `CPIBase`.
         self._set_session(session)
@@ -515,6 +607,9 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
                                                       self._logger, opts=self.opts)
         self.initialize ()
 
+        # concurrent state queries are folded into single (BULK) STATS calls
+        self.poller  = PollScheduler (self._job_query_stats)
+
         # the monitoring thread - one per service instance.  We wait for
         # initialize to finish to make sure that the shell_wrapper is set
         # up...
@@ -522,7 +617,8 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
                                            channel = self.channel, 
                                            rm      = self.rm, 
                                            logger  = self._logger)
-        self.monitor.start ()
+        if  not self.monitor.subscribe () :
+            self.monitor.start ()
 
         return self.get_api ()
 
@@ -561,32 +657,15 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
 
         base = self._adaptor.base_workdir
 
-        ret, out, _ = self.shell.run_sync (" mkdir -p %s" % base)
-        if  ret != 0 :
-            raise saga.NoSuccess ("host setup failed (%s): (%s)" % (ret, out))
-
         # TODO: replace some constants in the script with values from config
         # files, such as 'timeout' or 'purge_on_quit' ...
-        tgt = "%s/wrapper.sh" % base
+        src = shell_wrapper._WRAPPER_SCRIPT
+        src = src.replace('%(PURGE_ON_START)s', str(self._adaptor.purge_on_start))
 
-        # lets check if we actually need to stage the wrapper script.  We need
-        # an adaptor lock on this one.
-        with self._adaptor._lock :
-
-            ret, out, _ = self.shell.run_sync (" test -f %s" % tgt)
-            if  ret != 0 :
-                # yep, need to stage...
-              # src = shell_wrapper._WRAPPER_SCRIPT % ({ 'PURGE_ON_START' : str(self._adaptor.purge_on_start) })
-                src = shell_wrapper._WRAPPER_SCRIPT
-                src = src.replace('%(PURGE_ON_START)s', str(self._adaptor.purge_on_start))
-                
-                # If the target directory begins with $HOME or ${HOME} then we
-                # need to remove this since scp won't expand the variable and
-                # the copy will end up attempting to copy the file to 
-                # /<path_to_home_dir>/$HOME/.....
-                if tgt.startswith("$HOME") or tgt.startswith("${HOME}"):
-                    tgt = tgt[tgt.find('/')+1:]
-                self.shell.write_to_remote (src, tgt)
+        # the wrapper is installed under a name which contains the hash of its
+        # content -- so a wrapper from a different saga-python version (or with
+        # different settings) is never mistaken for the one we need.
+        tgt = "%s/wrapper.%s.sh" % (base, hashlib.md5 (src).hexdigest ()[:12])
 
         # ----------------------------------------------------------------------
         # we run the script.  In principle, we should set a new / different
@@ -602,30 +681,74 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
         # Well, actually, we do not use exec, as that does not give us good
         # feedback on failures (the shell just quits) -- so we replace it with
         # this poor-man's version...
-        ret, out, _ = self.shell.run_sync (" /bin/sh %s/wrapper.sh %s" % (base,
-            base))
+        #
+        # Usually the wrapper is already installed, so we just run it, on the
+        # command and monitoring channel concurrently -- that makes bootstrap
+        # a single round trip.  Only if the wrapper is missing, we report that,
+        # install it, and try again.
+        run     = " /bin/sh %s %s" % (tgt, base)
+        try_run = " test -f %s || echo %s; test -f %s && %s" \
+                % (tgt, _WRAPPER_MISSING, tgt, run)
 
-        # shell_wrapper.sh will report its own PID -- we use that to sync prompt
-        # detection, too.
-        if  ret != 0 :
-            raise saga.NoSuccess ("failed to run bootstrap: (%s)(%s)" % (ret, out))
+        self.shell.run_async   (try_run)
+        self.channel.run_async (try_run)
 
-        id_pattern = re.compile ("\s*PID:\s+(\d+)\s*$")
-        id_match   = id_pattern.search (out)
+        cmd_ret, cmd_out = self.shell.find_prompt   ()
+        mon_ret, mon_out = self.channel.find_prompt ()
 
-        if  not id_match :
-            self.shell.run_async (" exit")
-            self._logger.error   ("host bootstrap failed - no pid (%s)" % out)
-            raise saga.NoSuccess ("host bootstrap failed - no pid (%s)" % out)
+        if  _WRAPPER_MISSING in cmd_out or \
+            _WRAPPER_MISSING in mon_out :
 
-        # we actually don't care much about the PID :-P
-        
-        self._logger.debug ("got cmd prompt (%s)(%s)" % (ret, out.strip ()))
+            self._install_wrapper (src, tgt)
 
+            if  _WRAPPER_MISSING in cmd_out :
+                cmd_ret, cmd_out, _ = self.shell.run_sync   (run)
 
-        # ----------------------------------------------------------------------
-        # now do the same for the monitoring shell
-        ret, out, _ = self.channel.run_sync (" /bin/sh %s/wrapper.sh %s" % (base, base))
+            if  _WRAPPER_MISSING in mon_out :
+                mon_ret, mon_out, _ = self.channel.run_sync (run)
+
+        self._check_bootstrap (self.shell,   cmd_ret, cmd_out, 'cmd')
+        self._check_bootstrap (self.channel, mon_ret, mon_out, 'mon')
+
+
+    # ----------------------------------------------------------------
+    #
+    def _install_wrapper (self, src, tgt) :
+        """
+        Stages the wrapper script to the given target path.  The script is
+        staged to a temporary file and then moved into place, so that other
+        job services (of this or other processes) never run a partial copy.
+        """
+
+        base = os.path.dirname (tgt)
+        tmp  = "%s.%s.tmp" % (tgt, uuid.uuid4 ().hex[:8])
+
+        # we need an adaptor lock on this one.
+        with self._adaptor._lock :
+
+            ret, out, _ = self.shell.run_sync (" mkdir -p %s" % base)
+            if  ret != 0 :
+                raise saga.NoSuccess ("host setup failed (%s): (%s)" % (ret, out))
+
+            # If the target directory begins with $HOME or ${HOME} then we
+            # need to remove this since scp won't expand the variable and
+            # the copy will end up attempting to copy the file to 
+            # /<path_to_home_dir>/$HOME/.....
+            stage_tgt = tmp
+            if  stage_tgt.startswith("$HOME") or stage_tgt.startswith("${HOME}"):
+                stage_tgt = stage_tgt[stage_tgt.find('/')+1:]
+            self.shell.write_to_remote (src, stage_tgt)
+
+            ret, out, _ = self.shell.run_sync (" mv -f %s %s" % (tmp, tgt))
+            if  ret != 0 :
+                raise saga.NoSuccess ("failed to install wrapper (%s): (%s)" % (ret, out))
+
+        self._logger.info ("installed shell wrapper at %s" % tgt)
+
+
+    # ----------------------------------------------------------------
+    #
+    def _check_bootstrap (self, shell, ret, out, name) :
 
         # shell_wrapper.sh will report its own PID -- we use that to sync prompt
         # detection, too.
@@ -636,22 +759,27 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
         id_match   = id_pattern.search (out)
 
         if  not id_match :
-            self.channel.run_async (" exit")
-            self._logger.error     ("host bootstrap failed - no pid (%s)" % out)
-            raise saga.NoSuccess   ("host bootstrap failed - no pid (%s)" % out)
+            shell.run_async    (" exit")
+            self._logger.error ("host bootstrap failed - no pid (%s)" % out)
+            raise saga.NoSuccess ("host bootstrap failed - no pid (%s)" % out)
 
         # we actually don't care much about the PID :-P
         
-        self._logger.debug ("got mon prompt (%s)(%s)" % (ret, out.strip ()))
+        self._logger.debug ("got %s prompt (%s)(%s)" % (name, ret, out.strip ()))
 
 
     # ----------------------------------------------------------------
     #
     #
-    def _jd2cmd (self, jd) :
+    def _jd2cmd (self, jd, index=None) :
 
         cmd = "true"
 
+        # job array elements get their index exported first, so that it can
+        # be used in the environment, arguments and file names
+        if  index is not None :
+            cmd += " && export %s=%d" % (ARRAY_INDEX_ENV, index)
+
         if  jd.attribute_exists (ENVIRONMENT) :
             for e in jd.environment :
                 cmd += " && export %s=%s"  %  (e, jd.environment[e])
@@ -746,14 +874,235 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
         return job_id
         
 
+    # ----------------------------------------------------------------
+    #
+    #
+    def _job_run_array (self, jd, job_array) :
+        """ 
+        Job arrays are emulated: all array elements are started as individual
+        jobs, in a single BULK operation.  The array job id lists the element
+        pids.  Returns the job id and a dict mapping array indices to pids.
+        """
+
+        # stage data once, for all elements
+        self._adaptor.stage_input (self.shell, jd)
+
+        bulk = "BULK\n"
+
+        for idx in job_array.indices :
+
+            cmd = self._jd2cmd (jd, index=idx)
+
+            if not "\n" in cmd : bulk += "RUN %s\n" % cmd
+            else                : bulk += "LRUN\n%s\nLRUN_EOT\n" % cmd
+
+        bulk += "BULK_RUN\n"
+        bulk  = bulk.replace ("\\", "\\\\\\\\") # hello MacOS
+
+        self.shell.run_async (bulk)
+
+        pids   = dict()
+        errors = list()
+
+        for idx in job_array.indices :
+
+            ret, out = self.shell.find_prompt ()
+            lines    = filter (None, out.split ("\n"))
+
+            if  ret != 0 or len (lines) < 2 or lines[-2] != "OK" :
+                errors.append ("%s: (%s)(%s)" % (idx, ret, out))
+                continue
+
+            # FIXME: verify format of returned pid (\d+)!
+            pids[idx] = lines[-1].strip ()
+
+        # we also need to find the output of the bulk op itself
+        ret, out = self.shell.find_prompt ()
+        lines    = filter (None, out.split ("\n"))
+
+        if  ret != 0 or len (lines) < 2 or lines[-2] != "OK" :
+            errors.append ("bulk: (%s)(%s)" % (ret, out))
+
+        if  errors :
+            # don't leave a partial array behind
+            if  pids :
+                self._job_bulk_cmd ("CANCEL", pids.values ())
+            raise saga.NoSuccess ("failed to run job array: %s" % errors)
+
+        pid_list = [pids[idx] for idx in job_array.indices]
+        job_id   = "[%s]-[%s]" % (self.rm, ','.join (pid_list))
+
+        for idx in job_array.indices :
+            self.array_elements[pids[idx]] = (job_id, idx)
+
+        self._logger.debug ("started job array %s" % job_id)
+
+        self.njobs += len (pid_list)
+
+        return job_id, pids
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def _array_pids (self, job_id) :
+        """
+        Returns the element pids of an (emulated) job array id, i.e. of an id
+        '[rm]-[pid_1,pid_2,...]', or `None` if the id refers to a single job.
+        """
+
+        rm, pid = self._adaptor.parse_id (job_id)
+
+        if  ',' not in pid :
+            return None
+
+        return [p.strip () for p in pid.split (',')]
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def _job_get_array (self, pids) :
+        """
+        Recovers a job array from its element pids, for reconnecting to an array
+        which was started by another service instance.  The element indices are
+        read from the job scripts of the elements, which export them (see
+        `_jd2cmd()`).  Returns the JobArray and a dict mapping array indices to
+        pids, like `_job_run_array()`.
+        """
+
+        base    = self._adaptor.base_workdir.rstrip ('/')
+        scripts = ["%s/%s/cmd" % (base, pid) for pid in pids]
+        outs    = self._job_bulk_cmd ("grep -h -o %s=[0-9]*" % ARRAY_INDEX_ENV,
+                                      scripts)
+        job_array = None
+
+        try :
+            indices = [int (out.split ('=')[1]) for out in outs]
+            step    = 1
+            if  len (indices) > 1 :
+                step = indices[1] - indices[0]
+
+            job_array = JobArray (indices[0], indices[-1], step)
+
+            if  job_array.indices != indices :
+                job_array = None
+
+        except Exception as e :
+            self._logger.debug ("cannot parse job array indices %s: %s" % (outs, e))
+
+        if  not job_array :
+            # we can still handle the array, but need to number the elements
+            self._logger.warning ("cannot recover job array indices for %s" % pids)
+            job_array = JobArray (0, len (pids) - 1)
+
+        return job_array, dict (zip (job_array.indices, pids))
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def _job_bulk_cmd (self, cmd, pids) :
+        """ 
+        Runs the given wrapper command (STATE, RESULT, CANCEL, ...) for all given
+        pids in a single BULK operation, and returns the last line of each
+        result, in pid order (`None` for failed operations).
+        """
+
+        pids    = list(pids)
+        results = list()
+
+        for pid, (ret, out) in zip (pids, self._job_bulk_run (["%s %s" % (cmd, pid)
+                                                               for pid in pids])) :
+
+            lines = filter (None, out.split ("\n"))
+
+            if  ret != 0 or len (lines) < 2 or lines[-2] != "OK" :
+                self._logger.warning ("failed to %s job %s: (%s)(%s)" % (cmd, pid, ret, out))
+                results.append (None)
+            else :
+                results.append (lines[-1].strip ())
+
+        return results
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def _job_bulk_run (self, cmds) :
+        """ 
+        Runs the given wrapper commands in a single BULK operation, and returns
+        exit code and output of each of them, in command order.
+        """
+
+        bulk = "BULK\n"
+
+        for cmd in cmds :
+            bulk += "%s\n" % cmd
+
+        bulk += "BULK_RUN\n"
+        self.shell.run_async (bulk)
+
+        results = list()
+
+        for cmd in cmds :
+            results.append (self.shell.find_prompt ())
+
+        # we also need to find the output of the bulk op itself
+        ret, out = self.shell.find_prompt ()
+        lines    = filter (None, out.split ("\n"))
+
+        if  ret != 0 or len (lines) < 2 or lines[-2] != "OK" :
+            self._logger.error ("failed to run (parts of the) bulk commands %s: (%s)(%s)" \
+                             % (cmds, ret, out))
+
+        return results
+
+
     # ----------------------------------------------------------------
     #
     #
     def _job_get_stats (self, id) :
         """ get the job stats from the wrapper shell """
 
-        rm, pid     = self._adaptor.parse_id (id)
-        ret, out, _ = self.shell.run_sync ("STATS %s\n" % pid)
+        return self.poller.poll (id)
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def _job_query_stats (self, ids) :
+        """ 
+        get the job stats of the given jobs from the wrapper shell, in
+        a single STATS call or BULK operation.  This is the query function of
+        the service's poll scheduler -- failures are reported per job.
+        """
+
+        if  len (ids) == 1 :
+            rm, pid     = self._adaptor.parse_id (ids[0])
+            ret, out, _ = self.shell.run_sync ("STATS %s\n" % pid)
+            results     = [(ret, out)]
+
+        else :
+            results = self._job_bulk_run (["STATS %s" % self._adaptor.parse_id (id)[1]
+                                           for id in ids])
+
+        stats = dict()
+
+        for id, (ret, out) in zip (ids, results) :
+            try :
+                stats[id] = self._job_parse_stats (id, ret, out)
+            except saga.SagaException as e :
+                stats[id] = e
+
+        return stats
+
+
+    # ----------------------------------------------------------------
+    #
+    #
+    def _job_parse_stats (self, id, ret, out) :
+        """ parse the output of the wrapper's STATS command """
 
         if  ret != 0 :
             raise saga.NoSuccess ("failed to get job stats for '%s': (%s)(%s)" \
@@ -958,6 +1307,15 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
         return self.rm
 
 
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_poll_stats (self) :
+        """ Implements saga.adaptors.cpi.job.Service.get_poll_stats()
+        """
+        return self.poller.stats ()
+
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
@@ -990,6 +1348,16 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
                 self._logger.debug ("Ignore ill-formatted job id (%s) (%s)" % (line, e))
                 continue
 
+        # the elements of emulated job arrays are listed as individual jobs --
+        # the arrays known to this service are listed, too.
+        for array_id in sorted (set ([a for a, _ in self.array_elements.values ()])) :
+
+            elements = ["[%s]-[%s]" % (self.rm, pid) 
+                        for pid in self._array_pids (array_id)]
+
+            if  all ([e in job_ids for e in elements]) :
+                job_ids.append (array_id)
+
         return job_ids
    
    
@@ -1009,10 +1377,16 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
 
         known_jobs = self.list ()
 
-        if  job_id not in known_jobs :
-            # can't reconnect
-            raise saga.BadParameter._log (self._logger, "job id '%s' unknown"
-                                       % job_id)
+        # for job arrays, all elements need to be known
+        pids = self._array_pids (job_id)
+        if  pids : ids = ["[%s]-[%s]" % (self.rm, pid) for pid in pids]
+        else     : ids = [job_id]
+
+        for id in ids :
+            if  id not in known_jobs :
+                # can't reconnect
+                raise saga.BadParameter._log (self._logger, "job id '%s' unknown"
+                                           % job_id)
 
         # this dict is passed on to the job adaptor class -- use it to pass any
         # state information you need there.
@@ -1023,6 +1397,90 @@ class ShellJobService (saga.adaptors.cpi.job.Service) :
         return saga.job.Job (_adaptor=self._adaptor, _adaptor_state=adaptor_state)
 
 
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_jobs (self, job_ids):
+        """ Implements saga.adaptors.cpi.job.Service.get_jobs()
+
+        The job records are fetched with a single BULK of INFO commands.  For
+        emulated job arrays, the records of all elements are fetched.
+        """
+
+        if  not job_ids :
+            return list()
+
+        elements = list()  # element pids per job id
+        pids     = list()
+
+        for job_id in job_ids :
+            elements.append (self._array_pids (job_id) or 
+                             [self._adaptor.parse_id (job_id)[1]])
+            pids += elements[-1]
+
+        infos   = iter (self._job_bulk_cmd ("INFO", pids))
+        handles = list()
+
+        for job_id, job_pids in zip (job_ids, elements) :
+
+            records = [self._parse_info (job_id, infos.next ()) for _ in job_pids]
+
+            if  len (records) == 1 :
+                state, start, stop, exit_code = records[0]
+
+            else :
+                # an array runs from its first element start to its last
+                # element stop, and reports the first non-zero exit code
+                job_array = JobArray (0, len (records) - 1)
+                states    = dict (enumerate ([r[0] for r in records]))
+                state     = job_array.collapse_states (states)
+                starts    = [r[1] for r in records if r[1]]
+                stops     = [r[2] for r in records if r[2]]
+                codes     = [r[3] for r in records if r[3] is not None]
+                start     = min (starts) if starts else None
+                stop      = None
+                exit_code = None
+
+                if  state in [saga.job.DONE, saga.job.FAILED, saga.job.CANCELED] :
+                    stop      = max (stops) if stops else None
+                    exit_code = ([c for c in codes if c] + [0])[0]
+
+            handles.append (saga.job.Handle (self.get_api (), job_id, state,
+                                             created   = start,
+                                             started   = start,
+                                             finished  = stop,
+                                             exit_code = exit_code))
+
+        return handles
+
+
+    # ----------------------------------------------------------------
+    #
+    def _parse_info (self, job_id, info) :
+        """
+        Parses the result of the wrapper's INFO command into a tuple (state,
+        start, stop, exit_code).
+        """
+
+        if  not info :
+            raise saga.BadParameter._log (self._logger, "job id '%s' unknown"
+                                       % job_id)
+
+        # 'STATE START STOP EXIT', with '-' for unknown values
+        elems = [None if e == '-' else e for e in info.split ()]
+
+        if  len (elems) != 4 :
+            raise saga.NoSuccess ("invalid job info for %s: %s" % (job_id, info))
+
+        state, start, stop, exit_code = elems
+
+        if  start     : start     = float (start)
+        if  stop      : stop      = float (stop)
+        if  exit_code : exit_code = int   (exit_code)
+
+        return (self._adaptor.string_to_state (state), start, stop, exit_code)
+
+
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
@@ -1341,6 +1799,7 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
             self._name            = self.jd.name
             self._started         = None
             self._finished        = None
+            self._array           = None
 
             self._set_state (saga.job.NEW)
 
@@ -1358,6 +1817,18 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
             self._name            = None
             self._started         = None
             self._finished        = None
+            self._array           = None
+
+            # reconnect to an emulated job array
+            pids = self.js._array_pids (self._id)
+            if  pids :
+                self._array, self._array_pids = self.js._job_get_array (pids)
+                self._array_states = self._array.initial_states (saga.job.RUNNING)
+
+                # route element events to this job (see run())
+                for idx, pid in self._array_pids.iteritems () :
+                    self.js.array_elements[pid] = (self._id, idx)
+                self.js.jobs[self._id] = self._api ()
 
         else :
             # don't know what to do...
@@ -1408,7 +1879,24 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
             self._state == saga.job.CANCELED     :
                 return self._state
 
-        stats = self.js._job_get_stats (self._id)
+        if  self._array :
+            indices = self._array.indices
+            states  = self.js._job_bulk_cmd ("STATE", 
+                          [self._array_pids[idx] for idx in indices])
+            for idx, state in zip (indices, states) :
+                if  state :
+                    self._set_element_state (idx, self._adaptor.string_to_state (state))
+            return self._state
+
+        self._set_stats (self.js._job_get_stats (self._id))
+
+        return self._state
+
+
+    # ----------------------------------------------------------------
+    #
+    def _set_stats (self, stats) :
+        """ update job times and state from the wrapper's job stats """
 
         if 'start' in stats : self._started  = stats['start']
         if 'stop'  in stats : self._finished = stats['stop']
@@ -1422,7 +1910,44 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
 
         self._update_state (self._adaptor.string_to_state (stats['state']))
 
-        return self._state
+
+    # ----------------------------------------------------------------
+    #
+    def _set_element_state (self, idx, state) :
+
+        # final element states are not changed anymore
+        if  self._array_states.get (idx) in [saga.job.DONE, 
+                                             saga.job.FAILED, 
+                                             saga.job.CANCELED] :
+            return
+
+        self._array_states[idx] = state
+
+        new_state = self._array.collapse_states (self._array_states)
+        if  new_state != self._state :
+            self._update_state (new_state)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_array_states (self):
+        """ Implements saga.adaptors.cpi.job.Job.get_array_states() """
+
+        if  not self._array :
+
+            job_array = None
+            if  self.jd :
+                job_array = JobArray.from_description (self.jd)
+
+            if  not job_array :
+                raise saga.IncorrectState ("Job %s is not a job array" % self._id)
+
+            return job_array.initial_states (saga.job.NEW)
+
+        self.get_state () # refresh element states
+
+        return dict(self._array_states)
 
 
     # ----------------------------------------------------------------
@@ -1480,65 +2005,60 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
     @SYNC_CALL
     def get_stdout (self) : 
 
-        state = self.get_state () # refresh stats
-
-        if  state == saga.job.NEW      or \
-            state == saga.job.PENDING  :
-            raise saga.IncorrectState ("Job output is only available after the job started")
-
-        if  not self._id :
-            raise saga.IncorrectState ("Job output is only available after the job started")
-
-        rm, pid     = self._adaptor.parse_id (self._id)
-        ret, out, _ = self.js.shell.run_sync ("STDOUT %s\n" % pid)
+        return _decode('\n'.join (self._get_output ("STDOUT", "stdout")))
 
-        if  ret != 0 :
-            raise saga.NoSuccess ("failed to get job stdout for '%s': (%s)(%s)" \
-                               % (self._id, ret, out))
-
-        lines = filter (None, out.split ("\n"))
 
-        if lines[0] != "OK" :
-            raise saga.NoSuccess ("failed to get valid job stdout for '%s' (%s)" % (self._id, lines))
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_stderr (self) : 
 
-        return _decode('\n'.join (lines[1:]))
+        return _decode('\n'.join (self._get_output ("STDERR", "stderr")))
 
 
     # ----------------------------------------------------------------
     #
     @SYNC_CALL
-    def get_stderr (self) : 
+    def get_log (self) : 
 
-        state = self.get_state () # refresh stats
+        ret  = '\n'.join(self._log)  # pre-pend all local log messages
+        ret += _decode('\n'.join (self._get_output ("LOG", "log")))
 
-        if  state == saga.job.NEW      or \
-            state == saga.job.PENDING  :
-            raise saga.IncorrectState ("Job output is only available after the job started")
+        return ret
 
-        if  not self._id :
-            raise saga.IncorrectState ("Job output is only available after the job started")
 
-        rm, pid     = self._adaptor.parse_id (self._id)
-        ret, out, _ = self.js.shell.run_sync ("STDERR %s\n" % pid)
+    # ----------------------------------------------------------------
+    #
+    def _get_output (self, cmd, name) :
+        """
+        Refresh the job state, and fetch the job's STDOUT, STDERR or LOG from
+        the wrapper -- both in a single BULK round trip.  Returns the output
+        lines.
+        """
 
-        if  ret != 0 :
-            raise saga.NoSuccess ("failed to get job stderr for '%s': (%s)(%s)" \
-                               % (self._id, ret, out))
+        results = None
 
-        lines = filter (None, out.split ("\n"))
+        if  not self._id or self._array :
+            # nothing to fetch -- the checks below will complain
+            state = self.get_state ()
 
-        if lines[0] != "OK" :
-            raise saga.NoSuccess ("failed to get valid job stderr for '%s' (%s)" % (self._id, lines))
+        else :
+            rm, pid = self._adaptor.parse_id (self._id)
+            cmds    = ["%s %s" % (cmd, pid)]
 
-        return _decode('\n'.join (lines[1:]))
+            # no need to re-fetch final states
+            if  self._state not in [saga.job.DONE, 
+                                    saga.job.FAILED, 
+                                    saga.job.CANCELED] :
+                cmds.insert (0, "STATS %s" % pid)
 
+            results = self.js._job_bulk_run (cmds)
 
-    # ----------------------------------------------------------------
-    #
-    @SYNC_CALL
-    def get_log (self) : 
+            if  len (results) > 1 :
+                stats_ret, stats_out = results[0]
+                self._set_stats (self.js._job_parse_stats (self._id, stats_ret, stats_out))
 
-        state = self.get_state () # refresh stats
+            state = self._state
 
         if  state == saga.job.NEW      or \
             state == saga.job.PENDING  :
@@ -1547,22 +2067,21 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
         if  not self._id :
             raise saga.IncorrectState ("Job output is only available after the job started")
 
-        rm, pid     = self._adaptor.parse_id (self._id)
-        ret, out, _ = self.js.shell.run_sync ("LOG %s\n" % pid)
+        if  self._array :
+            raise saga.IncorrectState ("Job %s is not available for job arrays" % name)
+
+        ret, out = results[-1]
 
         if  ret != 0 :
-            raise saga.NoSuccess ("failed to get job log for '%s': (%s)(%s)" \
-                               % (self._id, ret, out))
+            raise saga.NoSuccess ("failed to get job %s for '%s': (%s)(%s)" \
+                               % (name, self._id, ret, out))
 
         lines = filter (None, out.split ("\n"))
 
         if lines[0] != "OK" :
-            raise saga.NoSuccess ("failed to get valid job stderr for '%s' (%s)" % (self._id, lines))
+            raise saga.NoSuccess ("failed to get valid job %s for '%s' (%s)" % (name, self._id, lines))
 
-        ret  = '\n'.join(self._log)  # pre-pend all local log messages
-        ret += _decode('\n'.join(lines[1:]))
-
-        return ret
+        return lines[1:]
 
 
     # ----------------------------------------------------------------
@@ -1643,6 +2162,17 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
                                       saga.job.CANCELED] :
             raise saga.IncorrectState ("Cannot get exit code, job is not in final state")
 
+        if  self._array :
+            # the exit code of an array is the first non-zero element exit
+            # code, in index order
+            pids = [self._array_pids[idx] for idx in self._array.indices]
+            self._exit_code = 0
+            for ret in self.js._job_bulk_cmd ("RESULT", pids) :
+                if  ret and ret.isdigit () and int(ret) != 0 :
+                    self._exit_code = int(ret)
+                    break
+            return self._exit_code
+
         self._exit_code = self.js._job_get_exit_code (self._id)
 
         return self._exit_code
@@ -1663,7 +2193,16 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
     @SYNC_CALL
     def run (self): 
 
-        self._id = self.js._job_run (self.jd)
+        job_array = JobArray.from_description (self.jd)
+
+        if  job_array :
+            self._array        = job_array
+            self._array_states = job_array.initial_states (saga.job.RUNNING)
+            self._id, self._array_pids = self.js._job_run_array (self.jd, job_array)
+
+        else :
+            self._id = self.js._job_run (self.jd)
+
         self.js.jobs[self._id] = self._api ()
 
         self._set_state (saga.job.RUNNING)
@@ -1677,6 +2216,10 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
         if  self.get_state () != saga.job.RUNNING :
             raise saga.IncorrectState ("Cannot suspend, job is not RUNNING")
 
+        if  self._array :
+            self.js._job_bulk_cmd ("SUSPEND", self._array_pids.values ())
+            return
+
         self.js._job_suspend (self._id)
    
    
@@ -1688,6 +2231,10 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
         if  self.get_state () != saga.job.SUSPENDED :
             raise saga.IncorrectState ("Cannot resume, job is not SUSPENDED")
 
+        if  self._array :
+            self.js._job_bulk_cmd ("RESUME", self._array_pids.values ())
+            return
+
         self.js._job_resume (self._id)
    
    
@@ -1709,6 +2256,12 @@ class ShellJob (saga.adaptors.cpi.job.Job) :
             self._set_state (saga.job.CANCELED)
             return
 
+        if  self._array :
+            self.js._job_bulk_cmd ("CANCEL", self._array_pids.values ())
+            self._array_states = self._array.cancel_states (self._array_states)
+            self._set_state (self._array.collapse_states (self._array_states))
+            return
+
         self.js._job_cancel (self._id)
    
    
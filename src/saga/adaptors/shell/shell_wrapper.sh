@@ -540,6 +540,24 @@ cmd_state () {
 }
 
 
+# --------------------------------------------------------------------
+#
+# print a compact job record on a single line: state, start time, stop time and
+# exit code ('-' for unknown values).  Used for bulk reconnects.
+#
+cmd_info () {
+  verify_state $1 || return
+
+  DIR="$BASE/$1"
+  STATE=`\grep -e ' $' "$DIR/state" | \tail -n 1 | \tr -d ' '`
+  START=`\grep -e '^START' "$DIR/stats" 2>/dev/null | \tail -n 1 | \cut -f 2 -d ':' | \tr -d ' '`
+  STOP=`\grep  -e '^STOP'  "$DIR/stats" 2>/dev/null | \tail -n 1 | \cut -f 2 -d ':' | \tr -d ' '`
+  EXIT=`\cat "$DIR/exit" 2>/dev/null`
+
+  RETVAL="${STATE:-UNKNOWN} ${START:--} ${STOP:--} ${EXIT:--}"
+}
+
+
 # --------------------------------------------------------------------
 #
 # retrieve job stats
@@ -949,6 +967,7 @@ listen() {
         RESULT    ) cmd_result  "$ARGS"  ;;
         STATE     ) cmd_state   "$ARGS"  ;;
         STATS     ) cmd_stats   "$ARGS"  ;;
+        INFO      ) cmd_info    "$ARGS"  ;;
         WAIT      ) cmd_wait    "$ARGS"  ;;
         STDIN     ) cmd_stdin   "$ARGS"  ;;
         STDOUT    ) cmd_stdout  "$ARGS"  ;;
@@ -971,6 +990,7 @@ listen() {
         RESUME  <id>       - resume job after suspend
         STATE   <id>       - print state of job
         STATS   <id>       - print stats of job
+        INFO    <id>       - print state, times and exit code of job
         STDERR  <id>       - print stderr of job
         STDOUT  <id>       - print stdout of job
         STDIN   <id> <txt> - send txt to stdin of job
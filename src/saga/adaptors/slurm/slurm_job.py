@@ -11,14 +11,15 @@ __license__   = "MIT"
 
 import saga.utils.pty_shell
 
+from   saga.utils.job import JobArray, PollScheduler, script_submit_cmd
+from   saga.utils.host_cache import HostCache
+
 import saga.adaptors.base
 import saga.adaptors.cpi.job
 
 import re
-import os
 import math
 import time
-import tempfile
 
 SYNC_CALL  = saga.adaptors.cpi.decorators.SYNC_CALL
 ASYNC_CALL = saga.adaptors.cpi.decorators.ASYNC_CALL
@@ -75,7 +76,10 @@ _ADAPTOR_CAPABILITIES  = {
                           saga.job.CANDIDATE_HOSTS,
                           saga.job.QUEUE,
                           saga.job.PROJECT,
-                          saga.job.JOB_CONTACT],
+                          saga.job.JOB_CONTACT,
+                          saga.job.ARRAY_START,
+                          saga.job.ARRAY_END,
+                          saga.job.ARRAY_STEP],
     "job_attributes"   : [saga.job.EXIT_CODE,
                           saga.job.EXECUTION_HOSTS,
                           saga.job.CREATED,
@@ -292,6 +296,10 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
         self.jobs = {}
         self._open()
 
+        # concurrent state polls are served by a single squeue call
+        self.poller = PollScheduler(self._job_get_states,
+                                    min_interval=0.5, max_interval=30.0)
+
         return self.get_api()
 
 
@@ -344,6 +352,33 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
                                                     self.session,
                                                     self._logger)
 
+        # the host capabilities may be known from an earlier job service
+        caps = HostCache().get(shell_url, _ADAPTOR_NAME, self.session)
+
+        if not caps:
+            caps = self._probe_host()
+            HostCache().set(shell_url, _ADAPTOR_NAME, caps, self.session)
+        else:
+            self._logger.debug("using cached SLURM host capabilities")
+
+        self.rm.detected_username = self.rm.username or caps['username']
+        self._version             = caps['version']
+        self._ppn                 = caps['ppn']
+
+        self._logger.info('slurm version: %s' % self._version)
+        self._logger.info(" === ppn: %s", self._ppn)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _probe_host (self) :
+        """
+        Checks the SLURM installation on the target host, and returns the
+        detected capabilities (which are cached in the host cache).
+        """
+
+        caps = dict()
+
         # verify our SLURM environment contains the commands we need for this
         # adaptor to work properly
         self._logger.debug("Verifying existence of remote SLURM tools.")
@@ -359,21 +394,19 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
 
         self._logger.debug ("got cmd prompt (%s)(%s)" % (ret, out))
 
-        self.rm.detected_username = self.rm.username
         # figure out username if it wasn't made explicit
         # important if .ssh/config info read+connected with
         # a different username than what we expect
+        caps['username'] = self.rm.username
         if not self.rm.username:
             self._logger.debug ("No username provided in URL %s, so we are"
                                 " going to find it with whoami" % self.rm)
             ret, out, _ = self.shell.run_sync("whoami")
-            self.rm.detected_username = out.strip()
-            self._logger.debug("Username detected as: %s",
-                               self.rm.detected_username)
+            caps['username'] = out.strip()
+            self._logger.debug("Username detected as: %s", caps['username'])
 
         _, out, _ = self.shell.run_sync('scontrol --version')
-        self._version = out.split()[1].strip()
-        self._logger.info('slurm version: %s' % self._version)
+        caps['version'] = out.split()[1].strip()
 
         ppn_pat   = '\'s/.*\\(CPUTot=[0-9]*\\).*/\\1/g\'' 
         ppn_cmd   = 'scontrol show nodes ' + \
@@ -385,10 +418,10 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
                     '| xargs echo'
         _, out, _ = self.shell.run_sync(ppn_cmd)
         ppn_vals  = [o.strip() for o in out.split() if o.strip()]
-        if len(ppn_vals) == 1: self._ppn = int(ppn_vals[0])
-        else                 : self._ppn = None
+        if len(ppn_vals) == 1: caps['ppn'] = int(ppn_vals[0])
+        else                 : caps['ppn'] = None
 
-        self._logger.info(" === ppn: %s", self._ppn)
+        return caps
 
 
     # --------------------------------------------------------------------------
@@ -430,21 +463,15 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
         cpu_arch            = jd.as_dict().get(saga.job.CPU_ARCHITECTURE)
         job_contact         = jd.as_dict().get(saga.job.JOB_CONTACT)
         candidate_hosts     = jd.as_dict().get(saga.job.CANDIDATE_HOSTS)
+        job_array           = JobArray.from_description(jd)
+
+        # array elements should not share the default output file
+        if job_array and saga.job.OUTPUT not in jd.as_dict():
+            output = "radical.saga.default.%a.out"
 
         # check to see what's available in our job description
         # to override defaults
 
-        # try to create the working directory (if defined)
-        # NOTE: this assumes a shared filesystem between login node and
-        #       comnpute nodes.
-        if cwd:
-            self._logger.info("Creating working directory %s" % cwd)
-            ret, out, _ = self.shell.run_sync("mkdir -p %s"   % cwd)
-            if ret:
-                # something went wrong
-                message = "Couldn't create working directory - %s" % (out)
-                log_error_and_raise(message, saga.NoSuccess, self._logger)
-
 
         if isinstance(candidate_hosts, list):
             candidate_hosts = ','.join(candidate_hosts)
@@ -524,10 +551,15 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
         if wall_time_limit: slurm_script += "#SBATCH --time %02d:%02d:00\n" \
                                           % (wall_time_limit / 60,wall_time_limit % 60)
         if total_gpu_count: slurm_script += "#SBATCH --gpus=%s\n"        % total_gpu_count
+        if job_array:       slurm_script += "#SBATCH --array=%s\n"       % job_array.range_spec()
 
         # TODO: right now we only support the `--gpus=[n]` variant.  That is
         #       likely insufficient.
 
+        if job_array:
+            slurm_script += "\n## JOB ARRAY\n"
+            slurm_script += job_array.index_export('$SLURM_ARRAY_TASK_ID')
+
         if env:
             slurm_script += "\n## ENVIRONMENT\n"
             for key,val in env.iteritems():
@@ -546,16 +578,16 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
             slurm_script += "\n## POST_EXEC\n" + '\n'.join(post)
             slurm_script += '\n'
 
-        # write script into a tmp file for staging
         self._logger.info ("SLURM script generated:\n%s" % slurm_script)
 
-        tgt = os.path.basename (tempfile.mktemp (suffix='.slurm', prefix='tmp_'))
-        self.shell.write_to_remote (src=slurm_script, tgt=tgt)
-
-        # submit the job
-        ret, out, _ = self.shell.run_sync ("sbatch '%s'; rm -vf '%s'" % (tgt, tgt))
+        # create the working directory (if defined) and submit the job, with
+        # the script passed verbatim on stdin -- all in a single round trip.
+        # NOTE: this assumes a shared filesystem between login node and
+        #       comnpute nodes.
+        ret, out, _ = self.shell.run_sync (script_submit_cmd ('sbatch', slurm_script, 
+                                                              mkdirs=[cwd]))
 
-        self._logger.debug ("staged/submit SLURM script (%s) (%s)" % (tgt, ret))
+        self._logger.debug ("submitted SLURM script (%s)" % ret)
 
         # find out what our job ID is
         # TODO: Could make this more efficient
@@ -568,6 +600,8 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
 
         # if we have no job ID, there's a failure...
         if not self.job_id:
+            # the cached host capabilities may be stale -- probe next time
+            HostCache().invalidate(self.shell.url, _ADAPTOR_NAME, self.session)
             raise saga.NoSuccess._log(self._logger,
                              "Couldn't get job id from submitted job!"
                               " sbatch output:\n%s" % out)
@@ -584,9 +618,100 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
                                   'exec_hosts' : None,
                                   'gone'       : False}
 
+        if job_array:
+            self.jobs[self.job_id]['array']        = job_array
+            self.jobs[self.job_id]['array_states'] = job_array.initial_states()
+
         return self.job_id
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _job_get_states (self, pids):
+        """
+        get the SLURM states of all given jobs with a single squeue call.  Jobs
+        which squeue does not list (anymore) are missing in the returned dict.
+        """
+
+        ret, out, _ = self.shell.run_sync("squeue -h -t all -j %s -o '%%i %%T'"
+                                         % ','.join(pids))
+
+        states = dict()
+
+        if ret != 0:
+            # squeue fails if any of the ids is unknown, i.e. as soon as one
+            # job left the queue -- so we list all jobs of the user instead,
+            # and pick ours.  Only the jobs which are missing are then looked
+            # up individually by the callers.
+            ret, out, _ = self.shell.run_sync("squeue -h -t all -u $(id -un) "
+                                             "-o '%i %T'")
+            if ret != 0:
+                return states
+
+        for line in out.split('\n'):
+            elems = line.split()
+            if len(elems) == 2 and elems[0] in pids:
+                states[elems[0]] = elems[1]
+
+        return states
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _job_get_array_states (self, job_id):
+        """
+        get the states of all elements of a job array.  Elements which are
+        still known to the scheduler are listed by squeue, all others are
+        looked up in the slurm accounting data.
+        """
+
+        info = self.jobs[job_id]
+        ja   = info['array']
+
+        rm, pid = self._adaptor.parse_id(job_id)
+        seen    = dict()
+
+        # squeue -r lists one line per element, like:
+        #   3 RUNNING
+        #   4 PENDING
+        ret, out, _ = self.shell.run_sync("squeue -h -r -j %s -o '%%K %%T'" % pid)
+        if ret == 0:
+            for line in out.strip().split('\n'):
+                elems = line.split()
+                if len(elems) != 2:
+                    continue
+                for idx in ja.parse_indices(elems[0]):
+                    seen[idx] = self._slurm_to_saga_jobstate(elems[1])
+
+        missing = [idx for idx in ja.indices if idx not in seen and
+                   info['array_states'].get(idx) not in [saga.job.DONE,
+                                                         saga.job.FAILED,
+                                                         saga.job.CANCELED]]
+        if missing:
+            # sacct output looks like:
+            #   500723_1|COMPLETED
+            #   500723_1.batch|COMPLETED
+            #   500723_[2-10]|PENDING
+            ret, out, _ = self.shell.run_sync(
+                "sacct --format=JobID,State --parsable2 --noheader --jobs=%s" % pid)
+            if ret == 0:
+                for line in out.strip().split('\n'):
+                    if '|' not in line:
+                        continue
+                    slurm_id, slurm_state = line.split('|', 1)
+                    if '.' in slurm_id or '_' not in slurm_id:
+                        continue
+                    spec = slurm_id.split('_', 1)[1].strip('[]')
+                    for idx in ja.parse_indices(spec.split('%')[0]):
+                        if idx not in seen and slurm_state:
+                            seen[idx] = self._slurm_to_saga_jobstate(
+                                                 slurm_state.split()[0])
+
+        info['array_states'] = ja.merge_states(info['array_states'], seen)
+
+        return info['array_states']
+
+
     # --------------------------------------------------------------------------
     #
     # FROM STAMPEDE'S SQUEUE MAN PAGE
@@ -663,6 +788,12 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
                     "Could not cancel job %s because: %s" % (pid, out))
 
         job._state = saga.job.CANCELED
+        self.poller.forget(pid)
+
+        # canceling an array cancels all elements which are not yet final
+        info = self.jobs.get(job._id, {})
+        if info.get('array'):
+            info['array_states'] = info['array'].cancel_states(info['array_states'])
 
 
     # --------------------------------------------------------------------------
@@ -754,6 +885,15 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
         return self.rm
 
 
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_poll_stats (self) :
+        """ Implements saga.adaptors.cpi.job.Service.get_poll_stats()
+        """
+        return self.poller.stats()
+
+
     # --------------------------------------------------------------------------
     #
     @SYNC_CALL
@@ -794,6 +934,36 @@ class SLURMJobService (saga.adaptors.cpi.job.Service) :
                             _adaptor_state=adaptor_state)
 
 
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_jobs (self, jobids):
+        """
+        Implements saga.adaptors.cpi.job.Service.get_jobs() -- the states of
+        all jobs are fetched by a single (shared) squeue poll.  Jobs which
+        squeue does not list (anymore) are reported in UNKNOWN state.
+        """
+
+        pids   = [self._adaptor.parse_id(jobid)[1] for jobid in jobids]
+        states = self.poller.poll_many(pids)
+
+        handles = list()
+        for jobid, pid in zip(jobids, pids):
+
+            state = saga.job.UNKNOWN
+            if states.get(pid):
+                state = self._slurm_to_saga_jobstate(states[pid])
+
+            # don't keep poll results for jobs nobody waits for
+            if state in [saga.job.UNKNOWN, saga.job.DONE, saga.job.FAILED,
+                         saga.job.CANCELED]:
+                self.poller.forget(pid)
+
+            handles.append(saga.job.Handle(self.get_api(), jobid, state))
+
+        return handles
+
+
     # --------------------------------------------------------------------------
     #
     def container_run(self, jobs):
@@ -1007,15 +1177,28 @@ class SLURMJob(saga.adaptors.cpi.job.Job):
         if self._state in [saga.job.CANCELED, saga.job.FAILED, saga.job.DONE]:
             return self._state
 
+        # the state of a job array is derived from the states of its elements
+        info = self.js.jobs.get(job_id, {})
+        if info.get('array'):
+            states = self.js._job_get_array_states(job_id)
+            return info['array'].collapse_states(states)
+
         rm, pid = self._adaptor.parse_id (job_id)
 
         try:
-            ret, out, _ = self.js.shell.run_sync('scontrol show job %s' % pid)
-            match       = self.js.scontrol_jobstate_re.search(out)
+            slurm_state = self.js.poller.poll(pid)
 
-            if match:
-                slurm_state = match.group(1)
-            else:
+            if not slurm_state:
+                # squeue does not know the job (anymore) -- ask scontrol, and
+                # don't keep the empty poll result around
+                self.js.poller.forget(pid)
+                ret, out, _ = self.js.shell.run_sync('scontrol show job %s' % pid)
+                match       = self.js.scontrol_jobstate_re.search(out)
+
+                if match:
+                    slurm_state = match.group(1)
+
+            if not slurm_state:
                 # no jobstate found from scontrol
                 # the job may have finished a while back, use sacct to
                 # look at the full slurm history
@@ -1024,7 +1207,13 @@ class SLURMJob(saga.adaptors.cpi.job.Job):
                     # no jobstate found in slurm
                     return saga.job.UNKNOWN
 
-            return self.js._slurm_to_saga_jobstate(slurm_state)
+            state = self.js._slurm_to_saga_jobstate(slurm_state)
+
+            # final jobs are not polled anymore
+            if state in [saga.job.DONE, saga.job.FAILED, saga.job.CANCELED]:
+                self.js.poller.forget(pid)
+
+            return state
 
         except Exception, ex:
             self._logger.exception('failed to get job state')
@@ -1074,6 +1263,29 @@ class SLURMJob(saga.adaptors.cpi.job.Job):
         return self._state
 
 
+    # --------------------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_array_states(self):
+        """ Implements saga.adaptors.cpi.job.Job.get_array_states()
+        """
+
+        info = self.js.jobs.get(self._id, {})
+
+        if not info.get('array'):
+            ja = None
+            if self.jd:
+                ja = JobArray.from_description(self.jd)
+            if not ja:
+                raise saga.IncorrectState("job %s is not a job array" % self._id)
+            return ja.initial_states(saga.job.NEW)
+
+        # a state update also updates the element states
+        self._state = self._job_get_state(self._id)
+
+        return dict(info['array_states'])
+
+
     # --------------------------------------------------------------------------
     #
     @SYNC_CALL
@@ -1097,6 +1309,11 @@ class SLURMJob(saga.adaptors.cpi.job.Job):
     def wait(self, timeout):
         time_start = time.time()
         rm, pid    = self._adaptor.parse_id(self._id)
+        interval   = self.js.poller.interval()
+        deadline   = None
+
+        if timeout >= 0:
+            deadline = time_start + timeout
 
         while True:
             state = self._job_get_state(self._id)
@@ -1114,8 +1331,8 @@ class SLURMJob(saga.adaptors.cpi.job.Job):
                 if time.time() - time_start > timeout:
                     return False
 
-            # avoid busy poll
-            time.sleep(0.5)
+            # avoid busy poll -- poll less often while the state doesn't change
+            interval.sleep(state, deadline)
 
 
     # --------------------------------------------------------------------------
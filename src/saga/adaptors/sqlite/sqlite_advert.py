@@ -0,0 +1,583 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" SQLite advert adaptor implementation """
+
+import os
+import urlparse
+
+import saga.url
+import saga.adaptors.base
+import saga.adaptors.cpi.advert
+import saga.exceptions as se
+import saga.utils.misc as sumisc
+
+import sqlite_namespace as sns
+
+SYNC_CALL  = saga.adaptors.cpi.decorators.SYNC_CALL
+ASYNC_CALL = saga.adaptors.cpi.decorators.ASYNC_CALL
+
+
+# ------------------------------------------------------------------------------
+#
+def _keep_query (url, orig) :
+    """
+    `url_normalize()` and `url_make_absolute()` drop the URL query, which
+    selects the database (`?db=...`) -- this copies it over from `orig`.
+    """
+
+    ret = saga.url.Url (url)
+
+    if  orig.query and not ret.query :
+        ret.query = orig.query
+
+    return ret
+
+
+###############################################################################
+# adaptor info
+#
+
+_ADAPTOR_NAME          = 'saga.adaptors.advert.sqlite'
+_ADAPTOR_SCHEMAS       = ['sqlite']
+_ADAPTOR_OPTIONS       = [
+    {
+    'category'         : _ADAPTOR_NAME,
+    'name'             : 'database',
+    'type'             : str,
+    'default'          : '$HOME/.saga/adverts.db',
+    'documentation'    : '''The database file which holds the advert namespace.
+                          Can be overwritten per URL, via the 'db' query
+                          parameter (sqlite://localhost/path/?db=/tmp/a.db).''',
+    'env_variable'     : None
+    },
+    {
+    'category'         : _ADAPTOR_NAME,
+    'name'             : 'poll_delay',
+    'type'             : float,
+    'default'          : sns.POLL_DELAY,
+    'documentation'    : '''Time (in seconds) between checks for attribute
+                          updates by other processes, i.e. the maximal
+                          latency for callbacks on such updates.''',
+    'env_variable'     : None
+    }
+]
+_ADAPTOR_CAPABILITIES  = {}
+
+_ADAPTOR_DOC           = {
+    'name'             : _ADAPTOR_NAME,
+    'cfg_options'      : _ADAPTOR_OPTIONS,
+    'capabilities'     : _ADAPTOR_CAPABILITIES,
+    'description'      : 'The sqlite advert adaptor.',
+    'details'          : """This adaptor stores the advert namespace in an
+                            embedded sqlite database.  It does not need any
+                            server, and is intended for the coordination of
+                            processes on a single node (or on a shared file
+                            system with working locks).""",
+    'schemas'          : {'sqlite' : 'embedded sqlite backend.'}
+}
+
+_ADAPTOR_INFO          = {
+    'name'             : _ADAPTOR_NAME,
+    'version'          : 'v0.1',
+    'schemas'          : _ADAPTOR_SCHEMAS,
+    'cpis'             : [{
+        'type'         : 'saga.advert.Directory',
+        'class'        : 'SQLiteDirectory'
+        },
+        {
+        'type'         : 'saga.advert.Entry',
+        'class'        : 'SQLiteEntry'
+        }
+    ]
+}
+
+
+###############################################################################
+# The adaptor class
+
+class Adaptor (saga.adaptors.base.Base):
+    """
+    This is the actual adaptor class, which gets loaded by SAGA (i.e. by the
+    SAGA engine), and which registers the CPI implementation classes which
+    provide the adaptor's functionality.
+    """
+
+    # ----------------------------------------------------------------
+    #
+    def __init__ (self) :
+
+        saga.adaptors.base.Base.__init__ (self, _ADAPTOR_INFO, _ADAPTOR_OPTIONS)
+
+        self.opts       = self.get_config (_ADAPTOR_NAME)
+        self.database   = self.opts['database'  ].get_value ()
+        self.poll_delay = self.opts['poll_delay'].get_value ()
+
+
+    # ----------------------------------------------------------------
+    #
+    def get_db (self, url) :
+        """
+        Returns the (process wide) shared database instance for the url.
+        Needs to be released via `release_db()`.
+        """
+
+        if  not sumisc.host_is_local (url.host) :
+            raise se.BadParameter ("sqlite adverts are only supported on "
+                                   "localhost, not on %s" % url.host)
+
+        dbpath = self.database
+
+        if  url.query :
+            query  = urlparse.parse_qs (str(url.query))
+            dbpath = query.get ('db', [dbpath])[0]
+
+        dbpath = os.path.expanduser (os.path.expandvars (dbpath))
+
+        return sns.get_db (dbpath, self.poll_delay)
+
+
+    # ----------------------------------------------------------------
+    #
+    def release_db (self, db) :
+
+        sns.release_db (db)
+
+
+    # ----------------------------------------------------------------
+    #
+    def sanity_check (self) :
+        # nothing to check for, the sqlite module is part of python
+        pass
+
+
+
+###############################################################################
+#
+class SQLiteDirectory (saga.adaptors.cpi.advert.Directory) :
+
+    # ----------------------------------------------------------------
+    #
+    def __init__ (self, api, adaptor) :
+
+        self._cpi_base = super  (SQLiteDirectory, self)
+        self._cpi_base.__init__ (api, adaptor)
+
+        self._db = None
+
+
+    # ----------------------------------------------------------------
+    #
+    def __del__ (self) :
+
+        self.finalize ()
+
+
+    # ----------------------------------------------------------------
+    #
+    def finalize (self, kill=False) :
+
+        if  self._db :
+            self._adaptor.release_db (self._db)
+            self._db = None
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def init_instance (self, adaptor_state, url, flags, session) :
+
+        self._url       = _keep_query (sumisc.url_normalize (url), url)
+        self._flags     = flags
+
+        self._set_session (session)
+        self._init_check  ()
+
+        return self.get_api ()
+
+
+    # ----------------------------------------------------------------
+    #
+    @ASYNC_CALL
+    def init_instance_async (self, adaptor_state, url, flags, session, ttype) :
+
+        self._url     = _keep_query (sumisc.url_normalize (url), url)
+        self._flags   = flags
+
+        self._set_session (session)
+
+        c = { 'url'     : self._url,
+              'flags'   : self._flags }
+
+        return saga.task.Task (self, 'init_instance', c, ttype)
+
+
+    # ----------------------------------------------------------------
+    #
+    def _init_check (self) :
+
+        db = self._adaptor.get_db (self._url)
+
+        try :
+            nsdir = sns.sqlite_ns_entry.opendir (db, self._url.path, self._flags)
+        except Exception :
+            self._adaptor.release_db (db)
+            raise
+
+        self.finalize ()
+        self._db      = db
+        self._nsdir   = nsdir
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def attribute_getter (self, key) :
+
+        try :
+            return self._nsdir.get_key (key)
+
+        except Exception as e :
+            self._logger.error ("get_key failed: %s" % e)
+            raise e
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def attribute_setter (self, key, val) :
+
+        try :
+            self._nsdir.set_key (key, val)
+
+        except Exception as e :
+            self._logger.error ("set_key failed: %s" % e)
+            raise e
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def attribute_lister (self) :
+
+        data = self._nsdir.get_data ()
+
+        for key in data.keys () :
+            self._api ()._attributes_i_set (key, data[key], self._api ()._UP)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def attribute_caller (self, key, id, cb) :
+
+        self._nsdir.manage_callback (key, id, cb, self.get_api ())
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def close (self, timeout=None) :
+
+        if  timeout :
+            raise se.BadParameter ("timeout for close not supported")
+
+        self.finalize (kill=True)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_url (self) :
+
+        return self._url
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def is_dir (self, name) :
+
+        try :
+            entry = self._ns_entry (name)
+        except Exception:
+            return False
+
+        return entry.is_dir ()
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def list (self, pattern, flags) :
+
+        if  flags and flags != saga.advert.RECURSIVE :
+            raise se.BadParameter ("list() only supports the RECURSIVE flag")
+
+        recursive = bool(flags & saga.advert.RECURSIVE)
+
+        if  pattern :
+            return self._nsdir.find (pattern, None, recursive)
+
+        return self._nsdir.list (recursive)
+
+
+    # ----------------------------------------------------------------
+    #
+    def _ns_entry (self, tgt) :
+
+        url = sumisc.url_make_absolute (self._url, tgt)
+        ret = sns.sqlite_ns_entry (self._db, url.path)
+        ret.fetch ()
+
+        return ret
+
+
+    # ----------------------------------------------------------------
+    #
+    def _make_url (self, path) :
+        """ a url in this namespace (and database), for the given path """
+
+        url      = saga.url.Url (self._url)
+        url.path = path
+
+        return _keep_query (url, self._url)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def set_ttl_self (self, ttl) :
+
+        self._nsdir.set_ttl (ttl)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_ttl_self (self) :
+
+        return self._nsdir.get_ttl ()
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def set_ttl (self, tgt, ttl) :
+
+        self._ns_entry (tgt).set_ttl (ttl)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_ttl (self, tgt) :
+
+        return self._ns_entry (tgt).get_ttl ()
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def find (self, pattern, flags) :
+
+        return self.find_adverts (pattern, None, None, flags)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def find_adverts (self, name_pattern, attr_pattern, obj_type, flags) :
+
+        if  obj_type :
+            raise se.BadParameter ("find() does not support object types")
+
+        recursive = bool(flags & saga.advert.RECURSIVE)
+        paths     = self._nsdir.find (name_pattern, attr_pattern, recursive)
+
+        return [self._make_url (path) for path in paths]
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def change_dir (self, tgt) :
+
+        # backup state
+        orig_url = self._url
+
+        try :
+            if  not sumisc.url_is_compatible (tgt, self._url) :
+                raise se.BadParameter ("cannot chdir to %s, leaves namespace" % tgt)
+
+            self._url = _keep_query (sumisc.url_make_absolute (self._url, tgt),
+                                     self._url)
+            self._init_check ()
+
+        except Exception :
+            # restore state on error
+            self._url = orig_url
+            raise
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def open (self, url, flags) :
+
+        if not url.scheme and not url.host :
+            url = _keep_query (sumisc.url_make_absolute (self._url, url),
+                               self._url)
+
+        return saga.advert.Entry (url, flags, self._session, _adaptor=self._adaptor)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def open_dir (self, url, flags) :
+
+        if not url.scheme and not url.host :
+            url = _keep_query (sumisc.url_make_absolute (self._url, url),
+                               self._url)
+
+        return saga.advert.Directory (url, flags, self._session, _adaptor=self._adaptor)
+
+
+
+######################################################################
+#
+# entry adaptor class
+#
+class SQLiteEntry (saga.adaptors.cpi.advert.Entry) :
+
+    # ----------------------------------------------------------------
+    #
+    def __init__ (self, api, adaptor) :
+
+        self._cpi_base = super  (SQLiteEntry, self)
+        self._cpi_base.__init__ (api, adaptor)
+
+        self._db = None
+
+
+    # ----------------------------------------------------------------
+    #
+    def __del__ (self) :
+
+        self.finalize ()
+
+
+    # ----------------------------------------------------------------
+    #
+    def finalize (self, kill=False) :
+
+        if  self._db :
+            self._adaptor.release_db (self._db)
+            self._db = None
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def init_instance (self, adaptor_state, url, flags, session) :
+
+        self._url     = url
+        self._flags   = flags
+
+        self._set_session (session)
+        self._init_check  ()
+
+        return self
+
+
+    # ----------------------------------------------------------------
+    #
+    def _init_check (self) :
+
+        db = self._adaptor.get_db (self._url)
+
+        try :
+            nsentry = sns.sqlite_ns_entry.open (db, self._url.path, self._flags)
+        except Exception :
+            self._adaptor.release_db (db)
+            raise
+
+        self.finalize ()
+        self._db      = db
+        self._nsentry = nsentry
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def attribute_getter (self, key) :
+
+        return self._nsentry.get_key (key)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def attribute_setter (self, key, val) :
+
+        return self._nsentry.set_key (key, val)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def attribute_lister (self) :
+
+        data = self._nsentry.get_data ()
+
+        for key in data.keys () :
+            self._api ()._attributes_i_set (key, data[key], self._api ()._UP)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def attribute_caller (self, key, id, cb) :
+
+        return self._nsentry.manage_callback (key, id, cb, self.get_api ())
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def set_ttl (self, ttl) :
+
+        self._nsentry.set_ttl (ttl)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_ttl (self) :
+
+        return self._nsentry.get_ttl ()
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def close (self, timeout=None) :
+
+        if  timeout :
+            raise se.BadParameter ("timeout for close not supported")
+
+        self.finalize (kill=True)
+
+
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_url (self) :
+
+        return self._url
+
+
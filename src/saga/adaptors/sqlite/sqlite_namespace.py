@@ -0,0 +1,835 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" A collection of utilities which maps a namespace structure to an embedded
+sqlite database.  It mirrors the API of the redis namespace utilities, to some
+extent.
+
+The database layout is like the following::
+
+    # namespace tree
+    nodes      : path        | parent | name   | type  | ctime | mtime | expires
+                 /           | /      | /      | dir   | ...
+                 /etc        | /      | etc    | dir   | ...
+                 /etc/passwd | /etc   | passwd | entry | ...
+
+    # attribute storage for ns entries, aka adverts
+    attributes : path        | key    | val
+                 /etc/passwd | key_1  | val_1
+
+    # attribute updates, for notifications across processes
+    events     : id | time | origin | path | key | val
+
+Paths are the primary key of the nodes table -- all entries below a directory
+are found by a range scan over that key.  Attributes are indexed by key and
+value, so that searches for attributes are index lookups.
+
+The database runs in WAL mode: readers (in other processes) do not block
+writers, and vice versa.  Entries with a TTL are ignored once they expire, and
+are eventually removed (with all entries below them) by `cleanup()`.
+Events are kept for `EVENT_RETENTION` seconds, and are pruned by writers.
+
+Callbacks on attribute updates are invoked by a monitor thread.  Updates
+performed by this process are handed to the monitor directly.  Updates by
+other processes are recorded in the events table: the monitor checks
+`PRAGMA data_version` (which changes whenever another connection commits), and
+reads new events only if it did change.
+"""
+
+import os
+import time
+import uuid
+import Queue
+import atexit
+import sqlite3
+import threading
+import contextlib
+
+import radical.utils         as ru
+
+from   saga.exceptions       import *
+from   saga.advert.constants import *
+
+
+TYPE   = 'type'
+
+DIR    = 'dir'
+ENTRY  = 'entry'
+
+POLL_DELAY       = 0.05   # max latency for notifications from other processes
+EVENT_RETENTION  = 60.0   # time for which events are kept in the database
+CLEANUP_INTERVAL = 1.0    # min time between cleanups of expired entries/events
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS nodes (
+        path       TEXT PRIMARY KEY,
+        parent     TEXT NOT NULL,
+        name       TEXT NOT NULL,
+        type       TEXT NOT NULL,
+        ctime      REAL,
+        mtime      REAL,
+        expires    REAL);
+    CREATE INDEX IF NOT EXISTS nodes_parent  ON nodes (parent);
+    CREATE INDEX IF NOT EXISTS nodes_expires ON nodes (expires);
+
+    CREATE TABLE IF NOT EXISTS attributes (
+        path       TEXT NOT NULL,
+        key        TEXT NOT NULL,
+        val        TEXT,
+        PRIMARY KEY (path, key));
+    CREATE INDEX IF NOT EXISTS attributes_kv ON attributes (key, val);
+
+    CREATE TABLE IF NOT EXISTS events (
+        id         INTEGER PRIMARY KEY AUTOINCREMENT,
+        time       REAL,
+        origin     TEXT,
+        path       TEXT,
+        key        TEXT,
+        val        TEXT);
+    CREATE INDEX IF NOT EXISTS events_time   ON events (time);
+'''
+
+# condition for entries which did not expire
+_LIVE = '(expires IS NULL OR expires > ?)'
+
+
+# --------------------------------------------------------------------
+#
+# POSIX allows two leading slashes, but we need path names to be unique (they
+# are used as keys...)
+def sqlite_ns_path (path) :
+    path = os.path.normpath ('/' + (path or ''))
+    if path.startswith ('//') : path = '/' + path.lstrip ('/')
+    return path
+
+def sqlite_ns_parent (path) :
+    if path == '/' : return '/'
+    return os.path.dirname (path)
+
+def sqlite_ns_name (path) :
+    if path == '/' : return '/'
+    return os.path.basename (path)
+
+def sqlite_ns_subtree (path) :
+    # all paths below 'path' are within (path/, path0) -- '0' follows '/'
+    prefix = path.rstrip ('/') + '/'
+    return prefix, prefix[:-1] + '0'
+
+
+# --------------------------------------------------------------------
+#
+class sqlite_ns_monitor (threading.Thread) :
+    """
+    Invokes callbacks for the attribute updates of this process (passed in via
+    `db.events`), and for the updates of other processes (found in the events
+    table).  Updates are handled in batches, and callbacks are only invoked
+    with the last value per path and key.
+    """
+
+    # ----------------------------------------------------------------
+    #
+    def __init__ (self, db) :
+
+        self.db      = db
+        self.logger  = db.logger
+        self.stopped = False
+
+        threading.Thread.__init__ (self, name='saga.advert.sqlite')
+        self.setDaemon (True)
+
+
+    # ----------------------------------------------------------------
+    #
+    def run (self) :
+
+        try :
+            conn    = self.db.connect ()
+            version = conn.execute ('PRAGMA data_version').fetchone ()[0]
+            last    = conn.execute ('SELECT MAX(id) FROM events').fetchone ()[0] or 0
+
+            while not self.stopped :
+
+                updates = list()
+
+                try :
+                    updates.append (self.db.events.get (timeout=self.db.poll_delay))
+                    while True :
+                        updates.append (self.db.events.get_nowait ())
+                except Queue.Empty :
+                    pass
+
+                # did any other connection commit?
+                new = conn.execute ('PRAGMA data_version').fetchone ()[0]
+
+                if  new != version :
+                    version = new
+                    rows    = conn.execute ('SELECT id, path, key, val FROM events '
+                                            'WHERE id > ? AND origin != ? '
+                                            'ORDER BY id', (last, self.db.id))
+                    for row in rows.fetchall () :
+                        last = row[0]
+                        updates.append (row[1:])
+
+                if  updates :
+                    self._dispatch (updates)
+
+            conn.close ()
+
+        except Exception as e :
+            self.logger.critical ("sqlite monitoring thread crashed - disable "
+                                  "callback handling (%s)" % e)
+
+
+    # ----------------------------------------------------------------
+    #
+    def _dispatch (self, updates) :
+
+        latest = dict()
+        for path, key, val in updates :
+            latest[(path, key)] = val
+
+        for (path, key), val in latest.iteritems () :
+
+            # don't hold the lock while calling back
+            with self.db.cb_lock :
+                cbs = self.db.callbacks.get (path, {}).get (key, {}).values ()
+
+            for cb, obj in cbs :
+                try :
+                    obj.set_attribute (key, val, obj._UP)
+                except Exception as e :
+                    self.logger.error ("advert callback failed: %s" % e)
+
+
+# --------------------------------------------------------------------
+#
+class sqlite_ns_db (object) :
+    """
+    Wraps the connection to a database file.  The connection is shared by all
+    threads (and advert objects) of the process, and is guarded by a lock.
+    """
+
+    def __init__ (self, dbpath, poll_delay=POLL_DELAY) :
+
+        self.dbpath       = dbpath
+        self.poll_delay   = poll_delay
+        self.id           = uuid.uuid4 ().hex
+        self.logger       = ru.Logger ('radical.saga')
+        self.lock         = threading.RLock ()
+        self.last_cleanup = 0.0
+        self.last_prune   = 0.0
+
+        dirname = os.path.dirname (dbpath)
+        if  dirname and not os.path.isdir (dirname) :
+            try :
+                os.makedirs (dirname)
+            except OSError :
+                pass  # created concurrently?
+
+        self.conn = self.connect ()
+
+        with self.lock :
+            self.conn.executescript (_SCHEMA)
+
+        # callbacks are invoked by a monitor thread, which is started on demand
+        self.callbacks = dict()
+        self.cb_lock   = threading.RLock ()
+        self.events    = Queue.Queue ()
+        self.monitor   = None
+
+
+    # ----------------------------------------------------------------
+    #
+    def connect (self) :
+
+        try :
+            conn = sqlite3.connect (self.dbpath, timeout=30.0,
+                                    isolation_level=None,
+                                    check_same_thread=False)
+            conn.text_factory = str
+            conn.execute ('PRAGMA journal_mode=WAL')
+            conn.execute ('PRAGMA synchronous=NORMAL')
+
+        except sqlite3.Error as e :
+            raise NoSuccess ("cannot open advert database %s: %s" % (self.dbpath, e))
+
+        return conn
+
+
+    # ----------------------------------------------------------------
+    #
+    @contextlib.contextmanager
+    def transaction (self) :
+
+        with self.lock :
+
+            self.conn.execute ('BEGIN IMMEDIATE')
+
+            try :
+                yield self.conn
+
+            except :
+                self.conn.execute ('ROLLBACK')
+                raise
+
+            else :
+                self.conn.execute ('COMMIT')
+
+
+    # ----------------------------------------------------------------
+    #
+    def query (self, sql, args=()) :
+
+        with self.lock :
+            return self.conn.execute (sql, args).fetchall ()
+
+
+    # ----------------------------------------------------------------
+    #
+    def notify (self, path, updates) :
+        """ hand local updates to the monitor thread """
+
+        if  path in self.callbacks :
+            for key, val in updates.iteritems () :
+                self.events.put ((path, key, val))
+
+
+    # ----------------------------------------------------------------
+    #
+    def prune_events (self, conn, now, force=False) :
+        """
+        Removes events older than `EVENT_RETENTION` -- at most once per
+        `CLEANUP_INTERVAL`, unless forced.  Needs to be called within
+        a transaction.
+        """
+
+        if  not force and now - self.last_prune < CLEANUP_INTERVAL :
+            return
+
+        self.last_prune = now
+
+        conn.execute ('DELETE FROM events WHERE time < ?',
+                      (now - EVENT_RETENTION,))
+
+
+    # ----------------------------------------------------------------
+    #
+    def cleanup (self, force=False) :
+        """
+        Removes expired entries (and everything below them), and old events --
+        at most once per `CLEANUP_INTERVAL`, unless forced.
+        """
+
+        now = time.time ()
+
+        if  not force and now - self.last_cleanup < CLEANUP_INTERVAL :
+            return 0
+
+        self.last_cleanup = now
+
+        with self.transaction () as conn :
+
+            expired = [row[0] for row in conn.execute (
+                       'SELECT path FROM nodes WHERE expires <= ?', (now,))]
+
+            for path in expired :
+                lo, hi = sqlite_ns_subtree (path)
+                for table in ['nodes', 'attributes'] :
+                    conn.execute ('DELETE FROM %s WHERE path = ? OR '
+                                  '(path > ? AND path < ?)' % table, (path, lo, hi))
+
+            self.prune_events (conn, now, force=True)
+
+        if  expired :
+            self.logger.debug ("cleaned up %s expired entries" % len(expired))
+
+        return len(expired)
+
+
+    # ----------------------------------------------------------------
+    #
+    def stop_monitor (self) :
+
+        monitor = self.monitor
+
+        if  monitor :
+            self.monitor    = None
+            monitor.stopped = True
+
+            if  monitor is not threading.current_thread () :
+                monitor.join (10 * self.poll_delay)
+
+
+    # ----------------------------------------------------------------
+    #
+    def close (self) :
+        """
+        Don't call this directly, but use `release_db()`.
+        """
+
+        self.stop_monitor ()
+
+        with self.lock :
+            self.conn.close ()
+
+
+# --------------------------------------------------------------------
+#
+# sqlite_ns_db instances are shared by all advert directories and entries in
+# the process which use the same database file.
+#
+_dbs      = dict()   # path : [db, refcount]
+_dbs_lock = threading.RLock ()
+
+def get_db (dbpath, poll_delay=POLL_DELAY) :
+    """
+    Returns the shared db instance for the given file.  Every call must be
+    matched by a call to `release_db()`.
+    """
+
+    key = os.path.realpath (os.path.expanduser (dbpath))
+
+    with _dbs_lock :
+
+        if  key not in _dbs :
+            _dbs[key] = [sqlite_ns_db (key, poll_delay), 0]
+
+        _dbs[key][1] += 1
+
+        return _dbs[key][0]
+
+
+def release_db (db) :
+    """
+    Drops a reference to a shared db instance, and closes it once it is not
+    used anymore.
+    """
+
+    with _dbs_lock :
+
+        if  db.dbpath not in _dbs or _dbs[db.dbpath][0] is not db :
+            return
+
+        _dbs[db.dbpath][1] -= 1
+
+        if  _dbs[db.dbpath][1] <= 0 :
+            del _dbs[db.dbpath]
+            db.close ()
+
+
+@atexit.register
+def _stop_monitors () :
+    # the monitor threads would otherwise run into the interpreter shutdown
+    with _dbs_lock :
+        for db, _ in _dbs.values () :
+            db.stop_monitor ()
+
+
+# --------------------------------------------------------------------
+#
+class sqlite_ns_entry (object) :
+
+    # ----------------------------------------------------------------
+    #
+    def __init__ (self, db, path) :
+
+        self.db        = db
+        self.path      = sqlite_ns_path (path)
+        self.node      = {TYPE : None}
+        self.valid     = False # not initialized
+        self.logger    = db.logger
+
+
+    # ----------------------------------------------------------------
+    #
+    @classmethod
+    def opendir (self, db, path, flags) :
+
+        db.logger.debug ("sqlite_ns_entry.opendir %s" % path)
+
+        e = sqlite_ns_entry (db, path)
+
+        try :
+            e.fetch ()
+
+        except IncorrectState :
+
+            if  CREATE         & flags or \
+                CREATE_PARENTS & flags    :
+                e.mkdir (flags)
+
+            else :
+                raise BadParameter ("Cannot open %s (no such directory)" % path)
+
+        if not e.is_dir () :
+            raise BadParameter ("Cannot open %s (not a directory)" % path)
+
+        return e
+
+
+    # ----------------------------------------------------------------
+    #
+    @classmethod
+    def open (self, db, path, flags) :
+
+        db.logger.debug ("sqlite_ns_entry.open %s" % path)
+
+        path = sqlite_ns_path (path)
+
+        # make sure parent dir exists
+        try :
+            self.opendir (db, sqlite_ns_parent (path), flags)
+
+        except Exception as e :
+            raise BadParameter ("Cannot open parent of %s (%s)" % (path, e))
+
+        # try to open entry itself
+        e = sqlite_ns_entry (db, path)
+
+        try :
+            e.fetch ()
+
+        except IncorrectState :
+
+            if  CREATE & flags :
+                e.create (ENTRY)
+
+            else :
+                raise BadParameter ("Cannot open %s (no such entry)" % path)
+
+        return e
+
+
+    # ----------------------------------------------------------------
+    #
+    def mkdir (self, flags) :
+        """
+        Don't call this directly -- to create a dir, call opendir with
+        'create'/'create_parents'.
+        """
+
+        path = self.path
+
+        self.logger.debug ("sqlite_ns_entry.mkdir %s" % path)
+
+        with self.db.transaction () as conn :
+
+            # find the missing parents, bottom up
+            missing = list()
+            parent  = sqlite_ns_parent (path)
+
+            while path != '/' :
+
+                rows = conn.execute ('SELECT type FROM nodes WHERE path = ? AND '
+                                     + _LIVE, (parent, time.time ())).fetchall ()
+                if  rows :
+                    if  rows[0][0] != DIR :
+                        raise BadParameter ("mkdir %s fails, parent is no directory: %s"
+                                         %  (path, parent))
+                    break
+
+                if  parent != '/' and not CREATE_PARENTS & flags :
+                    # the root dir is always created on demand
+                    raise BadParameter ("mkdir %s fails, parent does not exist: %s"
+                                     %  (path, parent))
+
+                missing.insert (0, parent)
+
+                if  parent == '/' :
+                    break
+
+                parent = sqlite_ns_parent (parent)
+
+            for p in missing + [path] :
+                self._insert (conn, p, DIR)
+
+        self.node  = {TYPE : DIR}
+        self.valid = True
+
+
+    # ----------------------------------------------------------------
+    #
+    def create (self, ntype) :
+        """
+        This assumes that the target entry does not exist (or is expired).
+        """
+
+        self.logger.debug ("sqlite_ns_entry.create %s" % self.path)
+
+        with self.db.transaction () as conn :
+            self._insert (conn, self.path, ntype)
+
+        self.node  = {TYPE : ntype}
+        self.valid = True
+
+
+    # ----------------------------------------------------------------
+    #
+    def _insert (self, conn, path, ntype) :
+        """
+        create a node, replacing any expired incarnation, but keeping a live
+        one (which may have been created concurrently) -- needs transaction
+        """
+
+        now = time.time ()
+
+        if  conn.execute ('SELECT 1 FROM nodes WHERE path = ? AND expires <= ?',
+                          (path, now)).fetchall () :
+            conn.execute ('DELETE FROM attributes WHERE path = ?', (path,))
+            conn.execute ('DELETE FROM nodes      WHERE path = ?', (path,))
+
+        conn.execute ('INSERT OR IGNORE INTO nodes (path, parent, name, type, ctime, mtime) '
+                      'VALUES (?, ?, ?, ?, ?, ?)',
+                      (path, sqlite_ns_parent (path), sqlite_ns_name (path),
+                       ntype, now, now))
+
+
+    # ----------------------------------------------------------------
+    #
+    def __str__ (self) :
+
+        return "[%-5s] %-25s %s" % (self.node[TYPE], self.path, self.node)
+
+
+    # ----------------------------------------------------------------
+    #
+    def is_dir (self) :
+
+        return self.node[TYPE] == DIR
+
+
+    # ----------------------------------------------------------------
+    #
+    def fetch (self) :
+
+        rows = self.db.query ('SELECT type, ctime, mtime, expires FROM nodes '
+                              'WHERE path = ? AND ' + _LIVE, (self.path, time.time ()))
+
+        if  not rows :
+            self.valid = False
+            raise IncorrectState ("backend entry %s does not exist" % self.path)
+
+        ntype, ctime, mtime, expires = rows[0]
+
+        self.node = {TYPE : ntype, 'ctime' : ctime, 'mtime' : mtime}
+        if  expires is not None :
+            self.node['expires'] = expires
+
+        self.valid = True
+
+
+    # ----------------------------------------------------------------
+    #
+    def list (self, recursive=False) :
+
+        if  not self.is_dir () :
+            raise IncorrectState ("'list()' is only supported on directories")
+
+        return self.find (recursive=recursive)
+
+
+    # ----------------------------------------------------------------
+    #
+    def find (self, name_pattern=None, attr_pattern=None, recursive=True) :
+        """
+        Returns the paths of all entries below this directory whose name matches
+        `name_pattern`, and whose attributes match all `attr_pattern`s (a list
+        of, or a comma separated string of, 'key=val' or 'key' patterns).
+        Name patterns and attribute values can contain shell style wildcards,
+        attribute keys can not.
+        """
+
+        if  not self.is_dir () :
+            raise IncorrectState ("'find()' is only supported on directories")
+
+        self.db.cleanup ()
+
+        lo, hi = sqlite_ns_subtree (self.path)
+
+        sql  = 'SELECT path FROM nodes WHERE path > ? AND path < ? AND ' + _LIVE
+        args = [lo, hi, time.time ()]
+
+        if  not recursive :
+            sql += ' AND parent = ?'
+            args.append (self.path)
+
+        if  name_pattern :
+            sql += ' AND name GLOB ?'
+            args.append (name_pattern)
+
+        if  isinstance (attr_pattern, basestring) :
+            attr_pattern = attr_pattern.split (',')
+
+        for pat in attr_pattern or [] :
+
+            pat = pat.strip ()
+            if  not pat :
+                continue
+
+            key, sep, val = pat.partition ('=')
+
+            sql += ' AND path IN (SELECT path FROM attributes WHERE key = ?'
+            args.append (key)
+
+            if  sep and val != '*' :
+                if  any ([c in val for c in '*?[']) :
+                    sql += ' AND val GLOB ?'
+                else :
+                    sql += ' AND val = ?'
+                args.append (val)
+
+            sql += ')'
+
+        sql += ' ORDER BY path'
+
+        return [row[0] for row in self.db.query (sql, args)]
+
+
+    # ----------------------------------------------------------------
+    #
+    def get_data (self) :
+
+        self.fetch ()
+
+        rows = self.db.query ('SELECT key, val FROM attributes WHERE path = ?',
+                              (self.path,))
+        return dict (rows)
+
+
+    # ----------------------------------------------------------------
+    #
+    def get_key (self, key) :
+
+        self.fetch ()
+
+        rows = self.db.query ('SELECT val FROM attributes WHERE path = ? AND key = ?',
+                              (self.path, key))
+        if  not rows :
+            raise BadParameter ("no such attribute (%s)" %  key)
+
+        return rows[0][0]
+
+
+    # ----------------------------------------------------------------
+    #
+    def set_key (self, key, val) :
+
+        self.set_keys ({key : val})
+
+
+    # ----------------------------------------------------------------
+    #
+    def set_keys (self, updates) :
+        """
+        Sets a number of attributes in a single transaction.
+        """
+
+        path    = self.path
+        now     = time.time ()
+        updates = dict ([(key, str(val)) for key, val in updates.iteritems ()])
+
+        self.logger.debug ("set_keys %s: %s" % (path, updates.keys ()))
+
+        with self.db.transaction () as conn :
+
+            cur = conn.execute ('UPDATE nodes SET mtime = ? WHERE path = ? AND '
+                                + _LIVE, (now, path, now))
+            if  not cur.rowcount :
+                raise IncorrectState ("backend entry %s does not exist" % path)
+
+            conn.executemany ('INSERT OR REPLACE INTO attributes (path, key, val) '
+                              'VALUES (?, ?, ?)',
+                              [(path, key, val) for key, val in updates.iteritems ()])
+            conn.executemany ('INSERT INTO events (time, origin, path, key, val) '
+                              'VALUES (?, ?, ?, ?, ?)',
+                              [(now, self.db.id, path, key, val)
+                               for key, val in updates.iteritems ()])
+
+            # writers which never list or find would grow the events table
+            self.db.prune_events (conn, now)
+
+        self.node['mtime'] = now
+        self.db.notify (path, updates)
+
+
+    # ----------------------------------------------------------------
+    #
+    def set_ttl (self, ttl) :
+        """
+        Lets the entry expire after `ttl` seconds.  A negative `ttl` removes
+        the expiry.
+        """
+
+        if  ttl is None or ttl < 0 : expires = None
+        else                       : expires = time.time () + ttl
+
+        with self.db.transaction () as conn :
+
+            cur = conn.execute ('UPDATE nodes SET expires = ? WHERE path = ? AND '
+                                + _LIVE, (expires, self.path, time.time ()))
+            if  not cur.rowcount :
+                raise IncorrectState ("backend entry %s does not exist" % self.path)
+
+        if  expires is None : self.node.pop ('expires', None)
+        else                : self.node['expires'] = expires
+
+
+    # ----------------------------------------------------------------
+    #
+    def get_ttl (self) :
+        """
+        Returns the remaining lifetime of the entry in seconds, or -1 if the
+        entry does not expire.
+        """
+
+        self.fetch ()
+
+        if  'expires' not in self.node :
+            return -1
+
+        return max (0, int (self.node['expires'] - time.time ()))
+
+
+    # ----------------------------------------------------------------
+    #
+    def manage_callback (self, key, id, cb, obj) :
+        """
+        Adds a callback (`cb` is set), removes a callback (`cb` is None), or
+        removes all callbacks for `key` (`id` is None).
+        """
+
+        self.logger.debug ("sqlite_ns_entry.manage_callback %s : %s" % (self.path, key))
+
+        path = self.path
+
+        with self.db.cb_lock :
+
+            keys = self.db.callbacks.setdefault (path, {})
+
+            if  id == None :
+                keys.pop (key, None)
+
+            elif cb :
+                keys.setdefault (key, {})[id] = [cb, obj]
+
+            else :
+                # cb == None: remove that callback
+                cbs = keys.get (key)
+                if  cbs is not None :
+                    cbs.pop (id, None)
+                    if  not cbs :
+                        del keys[key]
+
+            if  not keys :
+                del self.db.callbacks[path]
+
+            if  self.db.callbacks and not self.db.monitor :
+                self.db.monitor = sqlite_ns_monitor (self.db)
+                self.db.monitor.start ()
+
+
+# --------------------------------------------------------------------
+
@@ -15,6 +15,8 @@ import saga.adaptors.base
 import saga.adaptors.cpi.job
 
 from saga.job.constants import *
+from saga.utils.job     import JobArray, JobTable, script_submit_cmd
+from saga.utils.host_cache import HostCache
 
 import re
 import os 
@@ -29,6 +31,9 @@ ASYNC_CALL = saga.adaptors.cpi.decorators.ASYNC_CALL
 SYNC_WAIT_UPDATE_INTERVAL =  1  # seconds
 MONITOR_UPDATE_INTERVAL   = 60  # seconds
 
+# job array elements are listed by 'qstat -t' as '1234[7].server'
+_ARRAY_ELEMENT_RE = re.compile(r'^\d+\[(\d+)\]')
+
 
 # --------------------------------------------------------------------
 #
@@ -60,6 +65,7 @@ class _job_state_monitor(threading.Thread):
                 # FIXME: do bulk updates here! we don't want to pull information
                 # job by job. that would be too inefficient!
                 jobs = self.js.jobs
+                jobs.purge()
 
                 for job_id in jobs.keys() :
 
@@ -360,18 +366,24 @@ def _torquescript_generator(url, logger, jd, ppn, gpn, gres, torque_version,
     if gres:
         pbs_params += "#PBS -l gres=%s\n" % gres
 
+    # job arrays -- TORQUE has no steps in index ranges, so we list the
+    # indices explicitly in that case
+    job_array = JobArray.from_description(jd)
+    if job_array:
+        pbs_params += "#PBS -t %s \n" % job_array.list_spec()
+        exec_n_args = job_array.index_export('$PBS_ARRAYID') + exec_n_args
+
     exec_n_args += 'export SAGA_PPN=%d\n' % ppn
     exec_n_args += 'export SAGA_GPN=%d\n' % gpn
 
-    # escape all double quotes and dollarsigns, otherwise 'echo |'
-    # further down won't work
+    # escape all dollarsigns, as the script is expanded by the shell when
+    # passed to qsub via a here-document further down.
     # only escape '$' in args and exe. not in the params
     exec_n_args = workdir_directives + exec_n_args
     exec_n_args = exec_n_args.replace('$', '\\$')
 
     pbscript = "\n#!/bin/bash \n%s%s" % (pbs_params, exec_n_args)
 
-    pbscript = pbscript.replace('"', '\\"')
     return pbscript
 
 
@@ -409,6 +421,9 @@ _ADAPTOR_CAPABILITIES = {
                           saga.job.SPMD_VARIATION,
                           saga.job.TOTAL_CPU_COUNT,
                           saga.job.TOTAL_GPU_COUNT,
+                          saga.job.ARRAY_START,
+                          saga.job.ARRAY_END,
+                          saga.job.ARRAY_STEP,
                           ],
     "job_attributes":    [saga.job.EXIT_CODE,
                           saga.job.EXECUTION_HOSTS,
@@ -554,7 +569,7 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
         self.is_cray = ""
         self.queue   = None
         self.shell   = None
-        self.jobs    = dict()
+        self.jobs    = JobTable()
         self.gres    = None
 
         # the monitoring thread - one per service instance
@@ -609,23 +624,16 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
     #
     def initialize(self):
 
-        # check if all required pbs tools are available
-        ret, out, _ = self.shell.run_sync("qstat --version")
-        if ret:
-            message = "Error finding PBS tools: %s" % out
-            log_error_and_raise(message, saga.NoSuccess, self._logger)
-        version = out.strip()
-        self._logger.info("Found PBS version: %s" % version)
+        # the host capabilities may be known from an earlier job service
+        caps = HostCache().get(self.shell.url, _ADAPTOR_NAME, self.session)
 
-        for cmd in self._commands.keys():
-            ret, out, _ = self.shell.run_sync("which %s " % cmd)
-            if ret:
-                message = "Error finding PBS tools: %s (version: %s)" % (out, version)
-                log_error_and_raise(message, saga.NoSuccess, self._logger)
-            self._commands[cmd] = {"path"   : out.strip(), 
-                                   "version": version}
-            self._logger.info("Found PBS %s: %s" % (cmd, out.strip()))
+        if not caps:
+            caps = self._probe_host()
+            HostCache().set(self.shell.url, _ADAPTOR_NAME, caps, self.session)
+        else:
+            self._logger.debug("using cached Torque host capabilities")
 
+        self._commands = caps['commands']
 
         # TODO: Get rid of this, as I dont think there is any justification that Cray's are special
         #
@@ -633,13 +641,10 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
         # naively, we assume that if we can find the 'aprun' command in the
         # path that we're logged in to a Cray machine.
         if self.is_cray == "":
-            ret, out, _ = self.shell.run_sync('which aprun')
-            if ret != 0:
-                self.is_cray = ""
-            else:
+            self.is_cray = caps['is_cray']
+            if self.is_cray:
                 self._logger.info("Host '%s' seems to be a Cray machine." \
                     % self.rm.host)
-                self.is_cray = "unknowncray"
         else: 
             self._logger.info("Assuming host is a Cray since 'craytype' is set to: %s" % self.is_cray)
 
@@ -650,6 +655,60 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
             self._logger.debug("Using user specified 'ppn': %d" % self.ppn)
             return
 
+        # the cached capabilities may come from a job service with user
+        # specified 'ppn' -- then we did not probe it, yet.
+        if caps.get('ppn') is None:
+            caps['ppn'] = self._probe_ppn()
+            HostCache().set(self.shell.url, _ADAPTOR_NAME, caps, self.session)
+
+        self.ppn = caps['ppn']
+
+    # ----------------------------------------------------------------
+    #
+    def _probe_host(self):
+        """
+        Checks the PBS installation on the target host, and returns the
+        detected capabilities (which are cached in the host cache).
+        """
+
+        # check if all required pbs tools are available
+        ret, out, _ = self.shell.run_sync("qstat --version")
+        if ret:
+            message = "Error finding PBS tools: %s" % out
+            log_error_and_raise(message, saga.NoSuccess, self._logger)
+        version = out.strip()
+        self._logger.info("Found PBS version: %s" % version)
+
+        for cmd in self._commands.keys():
+            ret, out, _ = self.shell.run_sync("which %s " % cmd)
+            if ret:
+                message = "Error finding PBS tools: %s (version: %s)" % (out, version)
+                log_error_and_raise(message, saga.NoSuccess, self._logger)
+            self._commands[cmd] = {"path"   : out.strip(), 
+                                   "version": version}
+            self._logger.info("Found PBS %s: %s" % (cmd, out.strip()))
+
+        # check for the 'aprun' command (see initialize())
+        ret, out, _ = self.shell.run_sync('which aprun')
+        if ret != 0: is_cray = ""
+        else       : is_cray = "unknowncray"
+
+        # the ppn is only probed if it is not specified by the user
+        ppn = None
+        if not self.ppn:
+            ppn = self._probe_ppn()
+
+        return {'commands': self._commands,
+                'is_cray':  is_cray,
+                'ppn':      ppn}
+
+    # ----------------------------------------------------------------
+    #
+    def _probe_ppn(self):
+        """
+        Returns the number of processes per node, as reported by pbsnodes.
+        """
+
         ret, out, _ = self.shell.run_sync('unset GREP_OPTIONS; %s -a | grep -E "(np|pcpu)[[:blank:]]*=" ' % \
                 self._commands['pbsnodes']['path'])
         if ret != 0:
@@ -672,9 +731,11 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
                         ppn_list[np] += 1
                     else:
                         ppn_list[np] = 1
-            self.ppn = max(ppn_list, key=ppn_list.get)
+            ppn = max(ppn_list, key=ppn_list.get)
             self._logger.debug("Found the following 'ppn' configurations: %s. "
-                "Using %s as default ppn."  % (ppn_list, self.ppn))
+                "Using %s as default ppn."  % (ppn_list, ppn))
+
+        return ppn
 
     # ----------------------------------------------------------------
     #
@@ -709,26 +770,19 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
         except Exception, ex:
             log_error_and_raise(str(ex), saga.BadParameter, self._logger)
 
-        # try to create the working directory (if defined)
+        # Now we want to execute the script.  In a single shell command, we
+        # create the working directory (if defined), and pipe the generated
+        # script into 'qsub' via a here-document.
         # WARNING: this assumes a shared filesystem between login node and
         #          compute nodes.
-        if jd.working_directory:
-            self._logger.info("Creating working directory %s" % jd.working_directory)
-            ret, out, _ = self.shell.run_sync("mkdir -p %s" % (jd.working_directory))
-            if ret != 0:
-                # something went wrong
-                message = "Couldn't create working directory - %s" % (out)
-                log_error_and_raise(message, saga.NoSuccess, self._logger)
-
-        # Now we want to execute the script. This process consists of two steps:
-        # (1) we create a temporary file with 'mktemp' and write the contents of 
-        #     the generated PBS script into it
-        # (2) we call 'qsub <tmpfile>' to submit the script to the queueing system
-        cmdline = """SCRIPTFILE=`mktemp -t SAGA-Python-TORQUEJobScript.XXXXXX` &&  echo "%s" > $SCRIPTFILE && %s $SCRIPTFILE && rm -f $SCRIPTFILE""" %  (script, self._commands['qsub']['path'])
+        cmdline = script_submit_cmd(self._commands['qsub']['path'], script,
+                                    mkdirs=[jd.working_directory], expand=True)
         ret, out, _ = self.shell.run_sync(cmdline)
 
         if ret != 0:
-            # something went wrong
+            # something went wrong -- the cached host capabilities may be
+            # stale, so probe again next time
+            HostCache().invalidate(self.shell.url, _ADAPTOR_NAME, self.session)
             message = "Error running job via 'qsub': %s. Commandline was: %s" \
                 % (out, cmdline)
             log_error_and_raise(message, saga.NoSuccess, self._logger)
@@ -764,6 +818,11 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
                                  'gone'        : False
                                  }
 
+            job_array = JobArray.from_description(jd)
+            if job_array:
+                self.jobs[job_id]['array']        = job_array
+                self.jobs[job_id]['array_states'] = job_array.initial_states()
+
             self._logger.info ("assign job id  %s / %s / %s to watch list (%s)" \
                             % (job_name, job_id, job_obj, self.jobs.keys()))
 
@@ -795,6 +854,10 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
             # state again. it's gone forever
             if job_info['gone'] is True:
                 return job_info
+
+            # the state of a job array is derived from its elements
+            if job_info.get('array'):
+                return self._job_get_array_info(job_id, job_info)
         else:
             # Create a template data structure
             job_info = {
@@ -921,6 +984,46 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
         # return the updated job info
         return job_info
 
+    def _job_get_array_info(self, job_id, job_info):
+        """ Get the element states of a job array via 'qstat -t', and derive
+            the state of the array from those.
+        """
+
+        ja      = job_info['array']
+        rm, pid = self._adaptor.parse_id(job_id)
+
+        # the element lines look like this:
+        #     1234[7].server   name-7   user   00:00:01 R batch
+        ret, out, _ = self.shell.run_sync("%s -t %s"
+                    % (self._commands['qstat']['path'], pid))
+
+        seen = dict()
+        if ret == 0:
+            for line in out.split('\n'):
+                elems = line.split()
+                if len(elems) < 3:
+                    continue
+                match = _ARRAY_ELEMENT_RE.match(elems[0])
+                if not match:
+                    continue
+                state = elems[-2]
+                if state == 'X':
+                    # finished subjob -- we don't know about the exit code,
+                    # but it was not canceled by us
+                    seen[int(match.group(1))] = saga.job.DONE
+                else:
+                    seen[int(match.group(1))] = _torque_to_saga_jobstate(state)
+
+        job_info['array_states'] = ja.merge_states(job_info['array_states'], seen)
+        job_info['state']        = ja.collapse_states(job_info['array_states'])
+
+        if job_info['state'] in [saga.job.DONE, saga.job.FAILED, saga.job.CANCELED]:
+            job_info['gone'] = True
+
+        return job_info
+
+    # ----------------------------------------------------------------
+    #
     def _parse_qstat(self, haystack, job_info):
 
 
@@ -990,6 +1093,11 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
         # assume the job was succesfully canceled
         self.jobs[job_id]['state'] = saga.job.CANCELED
 
+        if self.jobs[job_id].get('array'):
+            job_info = self.jobs[job_id]
+            job_info['array_states'] = job_info['array'].cancel_states(
+                                                   job_info['array_states'])
+
 
     # ----------------------------------------------------------------
     #
@@ -1045,8 +1153,9 @@ class TORQUEJobService (saga.adaptors.cpi.job.Service):
         """
 
         # If we already have the job info, we just pass the current info.
-        if job_id in self.jobs :
-            return self.jobs[job_id]['obj']
+        job_info = self.jobs.get(job_id)
+        if job_info and job_info['obj']:
+            return job_info['obj']
 
         # Try to get some initial information about this job (again)
         job_info = self._job_get_info(job_id, reconnect=True)
@@ -1310,4 +1419,26 @@ class TORQUEJob (saga.adaptors.cpi.job.Job):
         """
         return self.jd
 
+    # ----------------------------------------------------------------
+    #
+    @SYNC_CALL
+    def get_array_states(self):
+        """ implements saga.adaptors.cpi.job.Job.get_array_states()
+        """
+        job_info = self.js.jobs.get(self._id, {})
+
+        if not job_info.get('array'):
+            job_array = None
+            if self.jd:
+                job_array = JobArray.from_description(self.jd)
+            if not job_array:
+                log_error_and_raise("Job %s is not a job array" % self._id,
+                    saga.IncorrectState, self._logger)
+            return job_array.initial_states(saga.job.NEW)
+
+        # don't wait for the monitoring thread
+        job_info = self.js._job_get_info(job_id=self._id, reconnect=False)
+
+        return dict(job_info['array_states'])
+
 
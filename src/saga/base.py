@@ -12,6 +12,7 @@ import radical.utils              as ru
 import radical.utils.signatures   as rus
 import radical.utils.logger       as rul
 
+import saga.exceptions            as se
 import saga.engine.engine
 import saga.adaptors.base         as sab
 
@@ -89,8 +90,12 @@ class Base (SimpleBase) :
 
         _engine       = saga.engine.engine.Engine ()
 
+        # the engine caches binding results per host and session
+        host, session = self._get_bind_hints (args, kwargs)
+
         self._adaptor = adaptor
-        self._adaptor = _engine.bind_adaptor (self, self._apitype, schema, adaptor)
+        self._adaptor = _engine.bind_adaptor (self, self._apitype, schema, adaptor,
+                                              host=host, session=session)
 
         # Sync creation (normal __init__) will simply call the adaptor's
         # init_instance at this point.  _init_task should *not* be evaluated,
@@ -101,7 +106,42 @@ class Base (SimpleBase) :
         # on CPI level to provide the task instance itself, and point the task's
         # workload to the adaptor level init_instance method.
 
-        self._init_task = self._adaptor.init_instance (adaptor_state, *args, **kwargs)
+        if 'ttype' in kwargs and kwargs['ttype'] :
+            self._init_task = self._adaptor.init_instance (adaptor_state, *args, **kwargs)
+
+        else :
+            # in the sync case, an adaptor can still decline to handle the
+            # object (NotImplemented) -- we then try the next adaptor, and let
+            # the engine know, so that it can skip that adaptor next time.
+            excluded = list()
+
+            while True :
+
+                try :
+                    self._init_task = self._adaptor.init_instance (adaptor_state, *args, **kwargs)
+                    break
+
+                except se.NotImplemented as e :
+
+                    name = self._adaptor._adaptor.get_name ()
+                    _engine.bind_failed (self._apitype, schema, name, e,
+                                         host=host, session=session)
+
+                    if  adaptor or name in excluded :
+                        # no other adaptor to try
+                        raise
+
+                    excluded.append (name)
+
+                    try :
+                        self._adaptor = _engine.bind_adaptor (self, self._apitype, 
+                                                              schema, adaptor,
+                                                              host=host, 
+                                                              session=session,
+                                                              exclude=excluded)
+                    except se.SagaException :
+                        # no other adaptor left
+                        raise e
 
         if 'ttype' in kwargs and kwargs['ttype'] :
             # in this case we in in fact need the init_task later on, to return
@@ -113,6 +153,28 @@ class Base (SimpleBase) :
             self._init_task = None
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _get_bind_hints (self, args, kwargs) :
+        """
+        Returns the host and session among the constructor arguments (or
+        `None`), as hints for the adaptor binding cache.
+        """
+
+        import saga.session
+
+        host    = None
+        session = kwargs.get ('session')
+
+        for arg in args :
+            if  host    is None and isinstance (arg, ru.Url) :
+                host    = arg.host
+            if  session is None and isinstance (arg, saga.session.Session) :
+                session = arg
+
+        return host, session
+
+
     # --------------------------------------------------------------------------
     #
     @rus.takes   ('Base')
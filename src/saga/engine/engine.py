@@ -8,15 +8,18 @@ __license__   = "MIT"
 
 import re
 import sys
+import time
 import pprint
 import string
 import inspect
+import threading
 
 import radical.utils         as ru
 import radical.utils.config  as ruc
 import radical.utils.logger  as rul
 
 import saga.exceptions      as se
+import saga.utils.lru_cache as sulc
 
 import saga.engine.registry  # adaptors to load
 
@@ -42,6 +45,10 @@ except Exception as e:
     pass
 
 
+# max number of (type, schema, host, session) keys in the bind cache
+BIND_CACHE_SIZE = 1000
+
+
 ############# These are all supported options for saga.engine ####################
 ##
 _config_options = [
@@ -62,6 +69,16 @@ _config_options = [
     'documentation' : 'colon separated list of python module pathes to load adaptors from',
     'env_variable'  : 'SAGA_ADAPTOR_PATH'
     },
+    {
+    'category'      : 'saga.engine',
+    'name'          : 'bind_cache_ttl',
+    'type'          : int,
+    'default'       : 60,
+    'documentation' : 'skip adaptors which failed to bind within that many '
+                      'seconds, if other adaptors are available.  0 disables '
+                      'the adaptor binding cache.',
+    'env_variable'  : 'SAGA_BIND_CACHE_TTL'
+    },
     # FIXME: is there a better place to register util level options?
     {
     'category'      : 'saga.utils.pty',
@@ -92,6 +109,25 @@ _config_options = [
     },
     {
     'category'      : 'saga.utils.pty',
+    'name'          : 'ssh_ctrl_dir',
+    'type'          : str,
+    'default'       : '$HOME/.saga/ssh/',
+    'documentation' : 'private directory for the ssh ControlMaster sockets -- '
+                      'masters found there are shared between processes',
+    'env_variable'  : 'SAGA_PTY_SSH_CTRL_DIR'
+    },
+    {
+    'category'      : 'saga.utils.pty',
+    'name'          : 'ssh_persist',
+    'type'          : int,
+    'default'       : 60,
+    'documentation' : 'keep idle ssh master connections alive for that many '
+                      'seconds (ControlPersist), so that later processes can '
+                      'reuse them.  0 disables that.',
+    'env_variable'  : 'SAGA_PTY_SSH_PERSIST'
+    },
+    {
+    'category'      : 'saga.utils.pty',
     'name'          : 'ssh_timeout',
     'type'          : float,
     'default'       : 10.0,
@@ -122,6 +158,56 @@ _config_options = [
     'default'       : 10*60,
     'documentation' : 'maximum number of seconds to wait for any connection in the connection pool to become available before raising a timeout error',
     'env_variable'  : 'SAGA_PTY_CONN_POOL_WAIT'
+    },
+    {
+    'category'      : 'saga.utils.pty',
+    'name'          : 'reactor',
+    'type'          : bool,
+    'default'       : False,
+    'valid_options' : [True, False],
+    'documentation' : 'use a single reactor thread (epoll based) to read from '
+                      'all pty processes, and to deliver asynchronous '
+                      'notifications (like job state events) without '
+                      'dedicated threads',
+    'env_variable'  : 'SAGA_PTY_REACTOR'
+    },
+    {
+    'category'      : 'saga.utils.host_cache',
+    'name'          : 'ttl',
+    'type'          : int,
+    'default'       : 24*60*60,
+    'documentation' : 'number of seconds probed host capabilities (tool paths, '
+                      'versions, ppn, ...) are cached on disk -- 0 disables '
+                      'the cache',
+    'env_variable'  : 'SAGA_HOST_CACHE_TTL'
+    },
+    {
+    'category'      : 'saga.utils.host_cache',
+    'name'          : 'path',
+    'type'          : str,
+    'default'       : '$HOME/.saga/cache/hosts/',
+    'documentation' : 'directory to store the host capability cache in',
+    'env_variable'  : 'SAGA_HOST_CACHE_PATH'
+    },
+    {
+    'category'      : 'saga.utils.host_metrics',
+    'name'          : 'probe',
+    'type'          : bool,
+    'default'       : False,
+    'valid_options' : [True, False],
+    'documentation' : 'probe the latency of remote hosts (via a TCP connect) '
+                      'for ranking them -- if disabled, a constant WAN '
+                      'latency is assumed.  Probes can block on name '
+                      'resolution.',
+    'env_variable'  : 'SAGA_LATENCY_PROBE'
+    },
+    {
+    'category'      : 'saga.utils.host_metrics',
+    'name'          : 'ttl',
+    'type'          : int,
+    'default'       : 10*60,
+    'documentation' : 'number of seconds probed host latencies are cached',
+    'env_variable'  : 'SAGA_LATENCY_TTL'
     }
 ]
 
@@ -218,10 +304,17 @@ class Engine(ruc.Configurable):
         # Engine manages cpis from adaptors
         self._adaptor_registry = {}
 
+        self._bind_lock  = threading.RLock ()
+
         # set the configuration options for this object
         ruc.Configurable.__init__       (self, 'saga')
         ruc.Configurable.config_options (self, 'saga.engine', _config_options)
         self._cfg = self.get_config('saga.engine')
+        self._bind_ttl = self._cfg['bind_cache_ttl'].get_value ()
+
+        # outcome of recent adaptor bindings, see bind_adaptor()
+        self._bind_cache = sulc.LRUCache (size=BIND_CACHE_SIZE,
+                                          ttl=max (self._bind_ttl, 0))
 
         # Initialize the logging, and log version (this is a singleton!)
         self._logger = ru.Logger('radical.saga')
@@ -229,6 +322,16 @@ class Engine(ruc.Configurable):
         # load adaptors
         self._load_adaptors ()
 
+        # the bind lock may be held by another thread when forking
+        ru.atfork (child=self._atfork_child)
+
+
+    #-----------------------------------------------------------------
+    #
+    def _atfork_child (self) :
+
+        self._bind_lock = threading.RLock ()
+
 
     #-----------------------------------------------------------------
     #
@@ -584,6 +687,13 @@ class Engine(ruc.Configurable):
         If 'preferred_adaptor' is not 'None', only that given adaptors is
         considered, and adaptor classes are only created from that specific
         adaptor.
+
+        The outcome of the binding is cached per ctype, schema, and the
+        optional 'host' and 'session' keyword arguments: the adaptor which
+        bound last is tried first, and adaptors which failed within the last
+        'bind_cache_ttl' seconds are skipped -- unless no other adaptor is left
+        to try.  Adaptors listed in the optional 'exclude' keyword argument are
+        not considered at all.
         '''
 
         if not ctype in self._adaptor_registry:
@@ -599,44 +709,69 @@ class Engine(ruc.Configurable):
             raise se.NotImplemented(error_msg)
 
 
+        key     = self._bind_key (ctype, schema, kwargs.get ('host'), 
+                                                 kwargs.get ('session'))
+        exclude = kwargs.get ('exclude') or []
+
+        # collect all applicable adaptors
+        candidates = list()
+        for info in self._adaptor_registry[ctype][schema] :
+
+            # is this adaptor acceptable?
+            if  preferred_adaptor != None         and \
+                preferred_adaptor != info['adaptor_instance'] :
+
+                # ignore this adaptor
+                self._logger.debug ("bind_adaptor for %s : %s != %s - ignore adaptor" \
+                                 % (info['cpi_cname'], preferred_adaptor, 
+                                    info['adaptor_instance']))
+                continue
+
+            if  info['adaptor_name'] in exclude :
+                continue
+
+            candidates.append (info)
+
+
         # cycle through all applicable adaptors, and try to instantiate
         # a matching one.
         exception = saga.NoSuccess ("binding adaptor failed", api_instance)
-        for info in self._adaptor_registry[ctype][schema] :
 
-            cpi_cname        = info['cpi_cname']
+        candidates, skipped = self._bind_order (key, candidates)
+
+        for adaptor_name, e in skipped :
+            self._logger.debug ("bind_adaptor skips %s (failed recently: %s)" \
+                             % (adaptor_name, e))
+            exception._add_exception (e)
+
+        for info in candidates :
+
             cpi_class        = info['cpi_class']
             adaptor_name     = info['adaptor_name']
             adaptor_instance = info['adaptor_instance']
 
             try :
 
-                # is this adaptor acceptable?
-                if  preferred_adaptor != None         and \
-                    preferred_adaptor != adaptor_instance :
-
-                    # ignore this adaptor
-                    self._logger.debug ("bind_adaptor for %s : %s != %s - ignore adaptor" \
-                                     % (cpi_cname, preferred_adaptor, adaptor_instance))
-                    continue
-
-
                 # instantiate cpi
                 cpi_instance = cpi_class (api_instance, adaptor_instance)
 
               # self._logger.debug("Successfully bound %s.%s to %s" \
               #                  % (adaptor_name, cpi_cname, api_instance))
+                self._bind_result (key, adaptor_name)
                 return cpi_instance
 
 
             except se.SagaException as e :
                 # adaptor class initialization failed - try next one
                 exception._add_exception (e)
+                self._bind_result (key, adaptor_name, e)
                 self._logger.info  ("bind_adaptor adaptor class ctor failed : %s.%s: %s" \
                                  % (adaptor_name, cpi_class, str(e)))
                 continue
             except Exception as e :
-                exception._add_exception (saga.NoSuccess (str(e), api_instance))
+                se_e = saga.NoSuccess (str(e), api_instance)
+                exception._add_exception (se_e)
+                self._bind_result (key, adaptor_name, se_e)
                 self._logger.info ("bind_adaptor adaptor class ctor failed : %s.%s: %s" \
                                 % (adaptor_name, cpi_class, str(e)))
                 continue
@@ -647,6 +782,117 @@ class Engine(ruc.Configurable):
         raise exception._get_exception_stack ()
 
 
+    #-----------------------------------------------------------------
+    #
+    def bind_failed (self, ctype, schema, adaptor_name, exception,
+                     host=None, session=None) :
+        '''
+        API objects report adaptors which were bound, but which failed to
+        initialize the object after all -- those are then skipped on the next
+        bind_adaptor() calls for the same key (see there).
+        '''
+
+        key = self._bind_key (ctype, schema, host, session)
+        self._bind_result (key, adaptor_name, exception)
+
+
+    #-----------------------------------------------------------------
+    #
+    def _bind_key (self, ctype, schema, host, session) :
+
+        # sessions are identified by their uid -- object ids get reused once
+        # a session is garbage collected
+        sid = getattr (session, '_id', None)
+
+        return (ctype, schema, host, sid)
+
+
+    #-----------------------------------------------------------------
+    #
+    def _bind_order (self, key, candidates) :
+        '''
+        Sorts the given candidate adaptors by their recent binding outcome, and
+        returns them, and a list of (adaptor_name, exception) tuples for
+        adaptors which are skipped due to recent failures.
+        '''
+
+        if  self._bind_ttl <= 0 :
+            return candidates, []
+
+        with self._bind_lock :
+
+            try :
+                entry = self._bind_cache.get (key)
+            except KeyError :
+                return candidates, []
+
+            now    = time.time ()
+            failed = entry['failed']
+            bound  = list()
+            good   = list()
+            bad    = list()
+
+            for info in candidates :
+
+                name = info['adaptor_name']
+
+                if  name in failed and now - failed[name][0] < self._bind_ttl :
+                    bad.append (info)
+                elif name == entry['bound'] :
+                    bound.append (info)
+                else :
+                    good.append (info)
+
+            if  not bound and not good :
+                # all adaptors failed recently -- try them all again
+                return bad, []
+
+            # the cache only keeps exception type and message -- recreate the
+            # exception for the error stack of the caller
+            skipped = list()
+            for info in bad :
+                name = info['adaptor_name']
+                _, etype, emsg = failed[name]
+                skipped.append ((name, etype (emsg)))
+
+            return bound + good, skipped
+
+
+    #-----------------------------------------------------------------
+    #
+    def _bind_result (self, key, adaptor_name, exception=None) :
+
+        if  self._bind_ttl <= 0 :
+            return
+
+        with self._bind_lock :
+
+            try :
+                entry = self._bind_cache.get (key)
+            except KeyError :
+                entry = {'bound'  : None, 
+                         'failed' : {}}
+
+            if  exception :
+                # don't keep the exception itself alive: it references the
+                # api object and (via its traceback) the frames it was raised in
+                if  isinstance (exception, se.SagaException) :
+                    emsg = exception._plain_message
+                else :
+                    emsg = str(exception)
+                entry['failed'][adaptor_name] = (time.time (), 
+                                                 type(exception), emsg)
+                if  entry['bound'] == adaptor_name :
+                    entry['bound'] = None
+
+            else :
+                entry['bound'] = adaptor_name
+                entry['failed'].pop (adaptor_name, None)
+
+            # (re)setting the entry refreshes its lifetime
+            self._bind_cache.set (key, entry)
+
+
     #-----------------------------------------------------------------
     #
     def loaded_adaptors (self):
@@ -23,9 +23,11 @@ adaptor_registry = [
                     "saga.adaptors.context.ssh",
                     "saga.adaptors.context.userpass",
                     "saga.adaptors.shell.shell_job",
+                    "saga.adaptors.local.local_file",
                     "saga.adaptors.shell.shell_file",
                     "saga.adaptors.shell.shell_resource",
                     "saga.adaptors.redis.redis_advert",
+                    "saga.adaptors.sqlite.sqlite_advert",
                     "saga.adaptors.sge.sgejob",
                     "saga.adaptors.pbs.pbsjob",
                     "saga.adaptors.lsf.lsfjob",
@@ -10,6 +10,7 @@ __license__   = "MIT"
 import sys
 import weakref
 import operator
+import linecache
 import traceback
 
 # We have the choice of doing signature checks in exceptions, or to raise saga
@@ -20,6 +21,61 @@ import traceback
 # import saga.base             as sb
 
 
+# ------------------------------------------------------------------------------
+#
+def _capture_stack (frame) :
+    """
+    Returns a cheap representation of the call stack which ends in the given
+    frame: a list of (filename, lineno, function) tuples, outermost call first.
+    Other than traceback.extract_stack(), this does not read any source files --
+    that only happens once the stack is formatted (see _format_entry).
+    """
+
+    stack = list()
+
+    while frame :
+        stack.append ((frame.f_code.co_filename, frame.f_lineno, 
+                       frame.f_code.co_name))
+        frame = frame.f_back
+
+    stack.reverse ()
+
+    return stack
+
+
+# ------------------------------------------------------------------------------
+#
+def _capture_tb (tb) :
+    """
+    Like _capture_stack(), but for the frames of a traceback object, innermost
+    call last.  The traceback (and thus its frames) is not referenced anymore
+    once this returns.
+    """
+
+    stack = list()
+
+    while tb :
+        stack.append ((tb.tb_frame.f_code.co_filename, tb.tb_lineno,
+                       tb.tb_frame.f_code.co_name))
+        tb = tb.tb_next
+
+    return stack
+
+
+# ------------------------------------------------------------------------------
+#
+def _format_entry (entry) :
+    """
+    Converts a stack entry from _capture_stack() into the format used by
+    the traceback module: (filename, lineno, function, source line).
+    """
+
+    fname, lineno, name = entry
+    line = linecache.getline (fname, lineno).strip () or None
+
+    return (fname, lineno, name, line)
+
+
 # ------------------------------------------------------------------------------
 #
 class SagaException (Exception) :
@@ -69,15 +125,31 @@ class SagaException (Exception) :
         Exception.__init__(self, msg)
 
         self._plain_message = msg
+        self._parent        = parent
         self._exceptions    = [self]
         self._top_exception = self
         self._ptype         = type(parent).__name__   # parent exception type
         self._stype         = type(self  ).__name__   # own exception    type 
 
-        ignore_stack = 2
+        # exceptions are frequently raised and catched, so we only capture
+        # a cheap version of the call stack here -- the message and traceback
+        # strings are rendered when they are first needed.
+        self._msg           = None
+        self._msgs          = None
+        self._tb            = None
+        self._exc_stack     = None
+
+        ignore_stack = 3
         if  from_log : 
             ignore_stack += 1
 
+        # the last stack frame is this constructor, the frame before is the
+        # constructor of the exception subclass -- the code location we report
+        # in the message is the one which created the exception.
+        self._stack = _capture_stack (sys._getframe ())
+        self._frame = self._stack[-min (ignore_stack, len(self._stack))]
+        self._stack = self._stack[:-1]
+
 
         if api_object : 
             self._object    = weakref.ref (api_object)
@@ -86,7 +158,24 @@ class SagaException (Exception) :
 
 
         # did we get a parent exception?
-        if  parent :
+        if  parent and not isinstance (parent, SagaException) :
+
+            # if parent is a native (or any other) exception type, we don't
+            # have a traceback really -- so we dig it out of sys.exc_info
+            # (and format it later on).  We don't keep the traceback object
+            # itself, as it references all frames and their locals.
+            self._exc_stack = _capture_tb (sys.exc_info ()[2])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _render_message (self) :
+
+        line = "%s +%s (%s)  :  %s" % _format_entry (self._frame)
+        msg  = self._plain_message
+
+        # did we get a parent exception?
+        if  self._parent :
 
             # if so, then this exception is likely created in some 'except'
             # clause, as a reaction on a previously catched exception (the
@@ -94,49 +183,77 @@ class SagaException (Exception) :
             # message, but keep the parent's traceback (after all, the original
             # exception location is what we are interested in).
             #
-            if  isinstance (parent, SagaException) :
+            if  isinstance (self._parent, SagaException) :
                 # that all works nicely when parent is our own exception type...
-                self._traceback = parent.traceback
-
-                frame           = traceback.extract_stack ()[- ignore_stack]
-                line            = "%s +%s (%s)  :  %s" % frame 
-                self._message   = "  %-20s: %s (%s)\n%s" \
-                                % (self._stype, msg, line, parent.msg)
+                return "  %-20s: %s (%s)\n%s" \
+                     % (self._stype, msg, line, self._parent.message)
 
             else :
-                if self._stype != "NoneType" :
-                    # ... but if parent is a native (or any other) exception type,
-                    # we don't have a traceback really -- so we dig it out of
-                    # sys.exc_info. 
-                    trace           = sys.exc_info ()[2]
-                    stack           = traceback.extract_tb  (trace)
-                    traceback_list  = traceback.format_list (stack)
-                    self._traceback = "".join (traceback_list)
-
-                    # the message composition is very similar -- we just inject the
-                    # parent exception type inconspicuously somewhere (above that
-                    # was part of 'parent.message' already).
-                    frame           = traceback.extract_stack ()[- ignore_stack]
-                    line            = "%s +%s (%s)  :  %s" % frame 
-                    self._message   = "  %-20s: %s (%s)\n  %-20s: %s" \
-                                    % (self._stype, msg, line, self._ptype, parent)
+                # the message composition is very similar -- we just inject the
+                # parent exception type inconspicuously somewhere (above that
+                # was part of 'parent.message' already).
+                return "  %-20s: %s (%s)\n  %-20s: %s" \
+                     % (self._stype, msg, line, self._ptype, self._parent)
 
         else :
 
             # if we don't have a parent, we are a 1st principle exception,
-            # i.e. a reaction to some genuine code error.  Thus we extract the
-            # traceback from exactly where we are in the code (the last stack
-            # frame will be the call to this exception constructor), and we
-            # create the original exception message from 'stype' and 'message'.
-            stack           = traceback.extract_stack ()
-            traceback_list  = traceback.format_list (stack)
-            self._traceback = "".join (traceback_list[:-1])
-            frame           = traceback.extract_stack ()[- ignore_stack -1]
-            line            = "%s +%s (%s)  :  %s" % frame 
-            self._message   = "%s (%s)" % (msg, line)
+            # i.e. a reaction to some genuine code error.  Thus we report
+            # exactly where the exception was created, and we create the
+            # original exception message from 'stype' and 'message'.
+            return "%s (%s)" % (msg, line)
 
-        # we can't do that earlier as _msg was not set up before
-        self._messages = [self._message]
+
+    # --------------------------------------------------------------------------
+    #
+    def _render_traceback (self) :
+
+        if  self._parent :
+
+            if  isinstance (self._parent, SagaException) :
+                return self._parent.traceback
+
+            else :
+                stack = [_format_entry (entry) for entry in self._exc_stack or []]
+                return "".join (traceback.format_list (stack))
+
+        # we report the stack from where the exception was created (the last
+        # stack frame will be the call to this exception constructor).
+        stack = [_format_entry (entry) for entry in self._stack]
+        return "".join (traceback.format_list (stack))
+
+
+    # --------------------------------------------------------------------------
+    #
+    # message, traceback and message list are rendered on first access
+    #
+    def _get_msg (self) :
+        if  self._msg is None :
+            self._msg = self._render_message ()
+        return self._msg
+
+    def _set_msg (self, msg) :
+        self._msg = msg
+
+    def _get_tb (self) :
+        if  self._tb is None :
+            self._tb = self._render_traceback ()
+        return self._tb
+
+    def _set_tb (self, tb) :
+        self._tb = tb
+
+    def _get_msgs (self) :
+        if  self._msgs is None :
+            return [e._message for e in self._exceptions]
+        return self._msgs
+
+    def _set_msgs (self, msgs) :
+        self._msgs = msgs
+
+    _message   = property (_get_msg,  _set_msg)
+    _traceback = property (_get_tb,   _set_tb)
+    _messages  = property (_get_msgs, _set_msgs)
 
 
     # --------------------------------------------------------------------------
@@ -160,13 +277,19 @@ class SagaException (Exception) :
 
         clone._parent    = self._parent
         clone._object    = self._object
-        clone._message   = self._message
         clone._messages  = self._messages
         clone._exception = self._exceptions
-        clone._traceback = self._traceback
         clone._stype     = self._stype
         clone._ptype     = self._ptype
 
+        # copy the (possibly not yet rendered) message and traceback state
+        clone._plain_message = self._plain_message
+        clone._frame         = self._frame
+        clone._stack         = self._stack
+        clone._exc_stack     = self._exc_stack
+        clone._msg           = self._msg
+        clone._tb            = self._tb
+
         return clone
 
     # --------------------------------------------------------------------------
@@ -256,7 +379,11 @@ class SagaException (Exception) :
         """
 
         self._exceptions.append (e)
-        self._messages.append   (e.message)
+
+        # the message list is derived from the exception list, unless it was
+        # explicitly set
+        if  self._msgs is not None :
+            self._msgs.append (e.message)
 
         if e._rank > self._top_exception._rank :
             self._top_exception = e
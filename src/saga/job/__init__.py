@@ -8,6 +8,7 @@ from saga.job.constants   import *
 from saga.job.job         import Job
 from saga.job.job         import Self
 from saga.job.service     import Service
+from saga.job.handle      import Handle
 from saga.job.container   import Container
 from saga.job.description import Description
 
@@ -76,6 +76,16 @@ PROCESSES_PER_HOST    = 'ProcessesPerHost';    """ :todo: docstring """
 THREADS_PER_PROCESS   = 'ThreadsPerProcess';   """ :todo: docstring """ 
 JOB_CONTACT           = 'JobContact';          """ :todo: docstring """
 NAME                  = 'Name';                """ The name of your job """ # non-GFD.90
+ARRAY_START           = 'ArrayStart';          """ First index of a job array
+                                                   (default: 1) """ # non-GFD.90
+ARRAY_END             = 'ArrayEnd';            """ Last index of a job array
+                                                   (inclusive) -- setting this
+                                                   turns the job into an array
+                                                   of jobs, and each element
+                                                   finds its index in
+                                                   $SAGA_ARRAY_INDEX """ # non-GFD.90
+ARRAY_STEP            = 'ArrayStep';           """ Index stride of a job array
+                                                   (default: 1) """ # non-GFD.90
 
 
 ################################################################################
@@ -59,6 +59,9 @@ class Description (saga.Attributes) :
         self._attributes_register  (saga.job.PROJECT              , None, sa.STRING, sa.SCALAR, sa.WRITEABLE)
         self._attributes_register  (saga.job.JOB_CONTACT          , None, sa.STRING, sa.VECTOR, sa.WRITEABLE)
         self._attributes_register  (saga.job.SPMD_VARIATION       , None, sa.ENUM,   sa.SCALAR, sa.WRITEABLE)
+        self._attributes_register  (saga.job.ARRAY_START          , None, sa.INT,    sa.SCALAR, sa.WRITEABLE)
+        self._attributes_register  (saga.job.ARRAY_END            , None, sa.INT,    sa.SCALAR, sa.WRITEABLE)
+        self._attributes_register  (saga.job.ARRAY_STEP           , None, sa.INT,    sa.SCALAR, sa.WRITEABLE)
       # self._attributes_set_enums (saga.job.SPMD_VARIATION,      ['MPI', 'OpenMP', 'MPICH-G'])
 
         self._env_is_list = False
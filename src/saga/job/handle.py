@@ -0,0 +1,121 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" SAGA job handle interface """
+
+
+import saga.exceptions       as se
+
+from   saga.job.constants    import UNKNOWN
+
+
+# ------------------------------------------------------------------------------
+#
+class Handle (object) :
+    """
+    A job handle is a lightweight record of a job: its ID, its state, and the
+    time stamps and exit code known at the time the handle was created.  Job
+    handles are returned by :func:`saga.job.Service.get_jobs`, which fetches
+    the records of many jobs with a single backend query.
+
+    Unlike :class:`saga.job.Job` instances, handles are not connected to an
+    adaptor, and thus do not update their state.  A full job object (to wait
+    for the job, to cancel it, etc.) is created on demand::
+
+        js      = saga.job.Service ("fork://localhost")
+        handles = js.get_jobs (job_ids)
+
+        for h in handles :
+            if  h.state == saga.job.RUNNING :
+                h.get_job ().cancel ()
+
+    Handles can be pickled -- they then reconnect to the job (when needed) via
+    a job service which uses the default session.
+    """
+
+    __slots__ = ('id', 'state', 'created', 'started', 'finished', 'exit_code',
+                 '_url', '_service', '_job')
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self, service, job_id, state=UNKNOWN, created=None,
+                  started=None, finished=None, exit_code=None, _job=None) :
+
+        self.id        = job_id
+        self.state     = state
+        self.created   = created
+        self.started   = started
+        self.finished  = finished
+        self.exit_code = exit_code
+
+        self._service  = service
+        self._url      = str(service.get_url ()) if service else None
+        self._job      = _job
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __str__ (self) :
+
+        return str(self.id)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __repr__ (self) :
+
+        return "<saga.job.Handle %s (%s)>" % (self.id, self.state)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __reduce__ (self) :
+
+        return (_unpickle, (self._url, self.id, self.state, self.created,
+                            self.started, self.finished, self.exit_code))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_job (self) :
+        """
+        get_job()
+
+        Returns the :class:`saga.job.Job` instance for this handle.  The job
+        object is created on the first call, and reused afterwards.
+        """
+
+        if  not self._job :
+
+            if  not self._service :
+
+                if  not self._url :
+                    raise se.IncorrectState ("job handle %s has no job service"
+                                            % self.id)
+
+                import service as jsvc   # avoid circular import
+                self._service = jsvc._get_shared_service (self._url)
+
+            self._job = self._service.get_job (self.id)
+
+        return self._job
+
+
+# ------------------------------------------------------------------------------
+#
+def _unpickle (url, job_id, state, created, started, finished, exit_code) :
+    """ unpickle a job handle -- the job service is resolved on demand """
+
+    handle      = Handle (None, job_id, state, created, started, finished,
+                          exit_code)
+    handle._url = url
+
+    return handle
+
+
+# ------------------------------------------------------------------------------
+
@@ -142,6 +142,27 @@ class Job (sb.Base, st.Task, sasync.Async) :
         return str (self.id)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def __reduce__ (self) :
+        """
+        Jobs are pickled as handles, i.e. as job service URL and job ID.  On
+        unpickling, the job is reconnected via a job service which is shared by
+        all job handles for that URL in the unpickling process -- that service
+        uses the default session.  This way, jobs can be passed to other
+        processes, such as the workers of a `multiprocessing` pool.
+        """
+
+        import service as jsvc   # avoid circular import
+
+        job_id = self.get_id ()
+
+        if  not job_id :
+            raise se.IncorrectState ("cannot pickle a job which was not started")
+
+        return (jsvc._reconnect_job, (str(self._get_service_url ()), job_id))
+
+
     # --------------------------------------------------------------------------
     #
     @rus.takes   ('Job',
@@ -623,6 +644,39 @@ class Job (sb.Base, st.Task, sasync.Async) :
         return self._adaptor.get_state (ttype=ttype)
 
 
+    # --------------------------------------------------------------------------
+    #
+    @rus.takes    ('Job',
+                   rus.optional (rus.one_of (SYNC, ASYNC, TASK)))
+    @rus.returns  ((dict, st.Task))
+    def get_array_states (self, ttype=None) :
+        """
+        get_array_states()
+
+        For a job array (see `saga.job.ARRAY_END`), return the states of the
+        individual array elements, as a dict which maps the array indices to
+        job states.  The job's own state reflects the array as a whole: it is
+        'Running' while any element is running, and becomes final once all
+        elements are final.
+
+        **Example**::
+
+          js = saga.job.Service("slurm://localhost")
+          jd = saga.job.Description ()
+          jd.executable  = '/bin/echo'
+          jd.arguments   = ['$SAGA_ARRAY_INDEX']
+          jd.array_start = 1
+          jd.array_end   = 10
+
+          j = js.create_job(jd)
+          j.run()
+
+          for idx, state in j.get_array_states().iteritems() :
+              print "%3d: %s" % (idx, state)
+        """
+        return self._adaptor.get_array_states (ttype=ttype)
+
+
     # --------------------------------------------------------------------------
     #
     @rus.takes     ('Job',
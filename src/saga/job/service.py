@@ -7,6 +7,10 @@ __license__   = "MIT"
 """ SAGA job service interface """
 
 
+import os
+import threading
+
+import radical.utils            as ru
 import radical.utils.signatures as rus
 
 import saga.adaptors.base    as sab
@@ -18,6 +22,7 @@ import saga.exceptions       as se
 import saga.session          as ss
 
 import job                   as j
+import handle                as hdl
 import description           as descr
 
 from   saga.constants        import SYNC, ASYNC, TASK
@@ -163,6 +168,18 @@ class Service (sb.Base, sasync.Async) :
         return ""
 
 
+    # --------------------------------------------------------------------------
+    #
+    def __reduce__ (self) :
+        """
+        Job services are pickled by URL -- unpickling yields the job service
+        for that URL which is shared by all unpickled job handles in that
+        process (see :func:`saga.job.Job.__reduce__`).
+        """
+
+        return (_get_shared_service, (str(self.get_url ()),))
+
+
     # --------------------------------------------------------------------------
     #
     @rus.takes     ('Service')
@@ -453,5 +470,148 @@ class Service (sb.Base, sasync.Async) :
 
         return self._adaptor.get_job (job_id, ttype=ttype)
 
+
+    # --------------------------------------------------------------------------
+    #
+    @rus.takes   ('Service',
+                  rus.list_of (basestring),
+                  rus.optional (rus.one_of (SYNC, ASYNC, TASK)))
+    @rus.returns ((rus.list_of (hdl.Handle), st.Task))
+    def get_jobs (self, job_ids, ttype=None) :
+        """
+        get_jobs(job_ids)
+
+        Return lightweight handles for the jobs with the given ids.
+
+        :param job_ids: The ids of the jobs to retrieve
+        :rtype:         list of :class:`saga.job.Handle`
+
+        Reconnecting to many jobs via :func:`get_job` creates a full job object
+        per job, and (depending on the backend) costs one or more round trips
+        per job.  `get_jobs()` instead returns a list of
+        :class:`saga.job.Handle` records (id, state, time stamps, exit code),
+        which adaptors can fetch with a single backend query.  Full job objects
+        are only created when requested via :func:`saga.job.Handle.get_job`::
+
+            service = saga.job.Service("fork://localhost")
+
+            for handle in service.get_jobs(service.list()) :
+                print "%s: %s" % (handle.id, handle.state)
+
+        Unknown job ids cause a `BadParameter` exception.  For backends which
+        do not support bulk queries, the call falls back to :func:`get_job`.
+        """
+
+        if not self.valid :
+            raise se.IncorrectState ("This instance was already closed.")
+
+        try :
+            return self._adaptor.get_jobs (job_ids, ttype=ttype)
+
+        except se.NotImplemented :
+
+            if  ttype :
+                raise
+
+        # no bulk support in the adaptor -- reconnect job by job
+        handles = list()
+
+        for job_id in job_ids :
+            job = self.get_job (job_id)
+            handles.append (hdl.Handle (self, job_id, job.state, _job=job))
+
+        return handles
+
+
+    # --------------------------------------------------------------------------
+    #
+    @rus.takes   ('Service',
+                  rus.optional (rus.one_of (SYNC, ASYNC, TASK)))
+    @rus.returns ((dict, st.Task))
+    def get_poll_stats (self, ttype=None) :
+        """
+        get_poll_stats()
+
+        Return statistics about the job state polls of this service.
+
+        :rtype: dict
+
+        Batch system adaptors poll the backend for job state changes.  Polls of
+        all threads which concurrently wait for jobs of the same service are
+        served by a single backend query.  The returned dict reports how well
+        that works, and the resulting load on the backend::
+
+            service = saga.job.Service("slurm+ssh://cluster.example.org")
+            ...
+            stats   = service.get_poll_stats()
+
+            print "%(queries)d queries for %(polls)d polls" % stats
+            print "%(rate).2f queries/sec" % stats
+
+        The dict contains the keys `queries` (number of backend queries),
+        `polls` (number of job polls served by them), `polls_per_query`, and
+        `rate` (backend queries per second, averaged over the last minute).
+        Adaptors which do not poll raise a `NotImplemented` exception.
+        """
+
+        if not self.valid :
+            raise se.IncorrectState ("This instance was already closed.")
+
+        return self._adaptor.get_poll_stats (ttype=ttype)
+
 # FIXME: add get_self()
 
+
+# ------------------------------------------------------------------------------
+#
+# Job services used to reconnect unpickled job handles, by URL.  Those services
+# belong to the process which created them -- a forked child will create its
+# own services when needed.
+#
+_shared_services = dict()
+_shared_pid      = None
+_shared_lock     = threading.RLock ()
+
+
+def _atfork_child () :
+    global _shared_lock
+    _shared_lock = threading.RLock ()
+
+ru.atfork (child=_atfork_child)
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_shared_service (url) :
+    """
+    Returns the job service for the given URL which is shared by all unpickled
+    job handles in this process.
+    """
+
+    global _shared_pid
+
+    with _shared_lock :
+
+        if  _shared_pid != os.getpid () :
+            _shared_services.clear ()
+            _shared_pid = os.getpid ()
+
+        service = _shared_services.get (url)
+
+        if  not service or not service.valid :
+            service = Service (url)
+            _shared_services[url] = service
+
+        return service
+
+
+# ------------------------------------------------------------------------------
+#
+def _reconnect_job (url, job_id) :
+    """ unpickle a job handle """
+
+    return _get_shared_service (url).get_job (job_id)
+
+
+# ------------------------------------------------------------------------------
+
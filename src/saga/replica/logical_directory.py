@@ -195,6 +195,63 @@ class LogicalDirectory (nsdir.Directory, sa.Attributes) :
         if attr_pattern  :  return self._adaptor.find_replicas (name_pattern, attr_pattern, flags, ttype=ttype)
         else             :  return self._nsdirec.find          (name_pattern,               flags, ttype=ttype)
 
+
+    # --------------------------------------------------------------------------
+    # non-GFD.90
+    #
+    @rus.takes   ('LogicalDirectory', 
+                  rus.list_of ((surl.Url, basestring)), 
+                  (surl.Url, basestring), 
+                  rus.optional (int, rus.nothing),
+                  rus.optional (rus.one_of (SYNC, ASYNC, TASK)))
+    @rus.returns ((dict, st.Task))
+    def replicate_bulk (self, tgts, name, flags=None, ttype=None) :
+        '''
+        replicate_bulk(tgts, name, flags=None)
+
+        Replicate several logical files in this directory to the location
+        `name`.  The replications run concurrently where the backend supports
+        that.
+
+        tgts:           list [saga.Url]
+        name:           saga.Url
+        flags:          flags enum
+        ttype:          saga.task.type enum
+        ret:            dict / saga.Task
+
+        The returned dict reports the individual transfers, and their aggregate
+        throughput -- see :func:`LogicalFile.replicate_bulk`.
+        '''
+        if not flags : flags = 0
+        return self._adaptor.replicate_bulk (tgts, name, flags, ttype=ttype)
     
 
+    # --------------------------------------------------------------------------
+    # non-GFD.90
+    #
+    @rus.takes   ('LogicalDirectory', 
+                  rus.list_of ((surl.Url, basestring)), 
+                  rus.optional ((surl.Url, basestring)),
+                  rus.optional (int, rus.nothing),
+                  rus.optional (rus.one_of (SYNC, ASYNC, TASK)))
+    @rus.returns ((dict, st.Task))
+    def upload_bulk (self, names, tgt=None, flags=None, ttype=None) :
+        '''
+        upload_bulk(names, tgt=None, flags=None)
+
+        Upload several physical files into this directory.  `tgt` can specify
+        the target location, like for :func:`LogicalFile.upload`.  The uploads
+        run concurrently where the backend supports that.
 
+        names:          list [saga.Url]
+        tgt:            saga.Url
+        flags:          flags enum
+        ttype:          saga.task.type enum
+        ret:            dict / saga.Task
+
+        The returned dict reports the individual transfers, and their aggregate
+        throughput -- see :func:`LogicalFile.replicate_bulk`.
+        '''
+        if not flags : flags = 0
+        return self._adaptor.upload_bulk (names, tgt, flags, ttype=ttype)
+    
@@ -266,7 +266,32 @@ class LogicalFile (nsentry.Entry, sa.Attributes) :
         '''
         if not flags : flags = 0
         return self._adaptor.download (name, src, flags, ttype=ttype)
-    
-  
 
 
+    # --------------------------------------------------------------------------
+    # non-GFD.90
+    #
+    @rus.takes   ('LogicalFile', 
+                  rus.list_of ((surl.Url, basestring)), 
+                  rus.optional (int, rus.nothing),
+                  rus.optional (rus.one_of (SYNC, ASYNC, TASK)))
+    @rus.returns ((dict, st.Task))
+    def replicate_bulk (self, names, flags=None, ttype=None) :
+        '''
+        replicate_bulk(names, flags=None)
+
+        Replicate a logical file to several locations at once.  The
+        replications run concurrently where the backend supports that.
+
+        names:          list [saga.Url]
+        flags:          flags enum
+        ttype:          saga.task.type enum
+        ret:            dict / saga.Task
+
+        The returned dict reports the individual transfers ('transfers': a list
+        of dicts with 'source', 'target', 'state', 'size', 'time' and 'error'),
+        and their aggregate 'size', 'time' and 'throughput' (bytes per second).
+        '''
+        if not flags : flags = 0
+        return self._adaptor.replicate_bulk (names, flags, ttype=ttype)
+    
@@ -3,6 +3,7 @@ __author__    = "Andre Merzky, Ole Weidner"
 __copyright__ = "Copyright 2012-2013, The SAGA Project"
 __license__   = "MIT"
 
+import os
 import copy
 
 import radical.utils            as ru
@@ -183,23 +184,52 @@ class Session (saga.base.SimpleBase) :
 
         # a session also has a lease manager, for adaptors in this session to use.
 
+        self._lm     = None
+        self._lm_pid = None
+
         if  default :
-            default_session     = DefaultSession (uid=self._id)
-            self.contexts       = copy.deepcopy(default_session.contexts)
-            self._lease_manager = default_session._lease_manager
+            default_session       = DefaultSession (uid=self._id)
+            self.contexts         = copy.deepcopy(default_session.contexts)
+            self._default_session = default_session
         else :
-            self.contexts       = _ContextList (session=self)
+            self.contexts         = _ContextList (session=self)
+            self._default_session = None
+
+            # create the lease manager right away, for this process
+            self._lease_manager
+
+
+    # ----------------------------------------------------------------
+    #
+    @property
+    def _lease_manager (self) :
+        """
+        The lease manager for adaptors in this session -- default sessions
+        share the lease manager of the default session singleton.
+
+        The leased objects (shells) are bound to the process which created
+        them, so a forked child (like a multiprocessing worker) gets a fresh
+        lease manager on first use.
+        """
+
+        if  self._default_session :
+            return self._default_session._lease_manager
+
+        if  self._lm_pid != os.getpid () :
 
             # FIXME: at the moment, the lease manager is owned by the session.  
             # Howevwer, the pty layer is the main user of the lease manager,
             # and we thus keep the lease manager options in the pty subsection.  
             # So here we are, in the session, evaluating the pty config options...
             config = self.get_config ('saga.utils.pty')
-            self._lease_manager = ru.LeaseManager (
+            self._lm = ru.LeaseManager (
                     max_pool_size = config['connection_pool_size'].get_value (),
                     max_pool_wait = config['connection_pool_wait'].get_value (),
                     max_obj_age   = config['connection_pool_ttl'].get_value ()
                     )
+            self._lm_pid = os.getpid ()
+
+        return self._lm
 
 
     # ----------------------------------------------------------------
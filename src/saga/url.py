@@ -4,6 +4,8 @@ __copyright__ = "Copyright 2012-2013, The SAGA Project"
 __license__   = "MIT"
 
 
+import os
+
 import radical.utils            as ru
 import radical.utils.signatures as rus
 
@@ -74,5 +76,160 @@ class Url (ru.Url) :
 
 # ------------------------------------------------------------------------------
 #
+class FrozenUrl (str) :
+    """
+    An immutable, hashable variant of :class:`Url`.
+
+    A FrozenUrl is a string (the normalized URL), and exposes the URL elements
+    as read-only attributes.  The URL is parsed once, and instances are
+    interned: creating a FrozenUrl from an equal string returns the same
+    instance.  Adaptors can thus pass FrozenUrls around (and use them as dict
+    keys) without defensive copies::
+
+      url = saga.FrozenUrl ("sftp://host.net/tmp/data/")
+      url.host                          # 'host.net'
+      url.with_path ('/tmp/other/')     # sftp://host.net/tmp/other/
+      saga.Url (url)                    # mutable copy
+
+    Derived URLs (like the normalized URL or URLs with a different path) are
+    cached on the instance, too -- up to a limited number per instance.
+    """
+
+    # we keep a limited number of instances, and of derived URLs per instance
+    _interned     = dict()
+    _interned_max = 10000
+    _derived_max  = 16
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __new__ (cls, url_in='') :
+
+        if  isinstance (url_in, FrozenUrl) :
+            return url_in
+
+        if  not url_in :
+            url_in = ''
+
+        key = str(url_in)
+        ret = cls._interned.get (key)
+
+        if  ret is None :
+
+            # parse once, with the same semantics as Url
+            u   = Url (key)
+            ret = cls._interned.get (str(u))
+
+            if  ret is None :
+
+                ret = str.__new__ (cls, str(u))
+
+                ret.scheme   = u.scheme
+                ret.host     = u.host
+                ret.port     = u.port
+                ret.username = u.username
+                ret.password = u.password
+                ret.path     = u.path
+                ret.query    = u.query
+                ret.fragment = u.fragment
+                ret._derived = dict()
+
+            if  len (cls._interned) >= cls._interned_max :
+                cls._interned.clear ()
+
+            cls._interned[key]      = ret
+            cls._interned[str(ret)] = ret
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __setattr__ (self, key, val) :
+
+        if  key in self.__dict__ :
+            raise AttributeError ("FrozenUrl is immutable (%s)" % key)
+
+        str.__setattr__ (self, key, val)
+
+
+    def __copy__ (self) :
+        return self
+
+    def __deepcopy__ (self, memo) :
+        return self
+
+    def __reduce__ (self) :
+        return (FrozenUrl, (str(self),))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def schema (self) :
+        return self.scheme
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _derive (self, key, create) :
+
+        ret = self._derived.get (key)
+
+        if  ret is None :
+            ret = FrozenUrl (create ())
+
+            if  len (self._derived) >= self._derived_max :
+                self._derived.clear ()
+
+            self._derived[key] = ret
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def with_path (self, path) :
+        """
+        Returns a FrozenUrl which equals this one, but has the given path.
+        """
+
+        def _create () :
+            u      = Url (self)
+            u.path = path
+            return u
+
+        return self._derive (('path', path), _create)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def normalized (self) :
+        """
+        This URL, with a normalized path element.
+        """
+
+        return self.with_path (os.path.normpath (self.path))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def is_path_only (self) :
+        """
+        True if the URL contains nothing but a path element.
+        """
+
+        ret = self._derived.get ('path_only')
+
+        if  ret is None :
+            ret = (os.path.normpath (self.path) == os.path.normpath (self))
+            self._derived['path_only'] = ret
+
+        return ret
+
+
+# ------------------------------------------------------------------------------
+#
+
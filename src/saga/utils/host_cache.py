@@ -0,0 +1,275 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+"""
+Provides a persistent cache for host capabilities.
+
+Job adaptors probe the target host when a job service is created: they look up
+the paths and versions of the batch system tools, the number of cores per
+node, the available queues, etc.  Those information rarely change, but probing
+them costs several round trips to the (remote) host for every job service.
+This module keeps probed capabilities on disk, one file per host and remote
+user, so that later job services (also in other processes) can skip the probes.
+The remote user is taken from the URL, or else from the user_id of the
+session's ssh or userpass contexts -- like for the shell which connects to the
+host.
+
+Entries expire after ``ttl`` seconds (see the ``saga.utils.host_cache`` config
+section), and can explicitly be invalidated, for example when an adaptor finds
+that a cached command does not work anymore::
+
+    cache = HostCache ()
+    caps  = cache.get (url, 'saga.adaptor.slurm_job', session)
+
+    if  not caps :
+        caps = probe_host ()
+        cache.set (url, 'saga.adaptor.slurm_job', caps, session)
+
+    ...
+
+    cache.invalidate (url, 'saga.adaptor.slurm_job', session)
+
+Cached values must be JSON serializable.
+"""
+
+import os
+import re
+import json
+import time
+import getpass
+import threading
+
+import radical.utils as ru
+
+import saga
+
+# schemas for which the remote user can be set via security contexts (see
+# saga.utils.pty_shell_factory)
+_CONTEXT_SCHEMAS = ['ssh', 'scp', 'sftp', 'gsissh', 'gsiscp', 'gsisftp']
+
+
+# ------------------------------------------------------------------------------
+#
+class HostCache (object) :
+    """
+    The host cache is a singleton, which keeps the cache entries of all hosts
+    seen by this process in memory, and writes them through to disk.
+    """
+
+    __metaclass__ = ru.Singleton
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self) :
+
+        self._lock    = threading.RLock ()
+        self._entries = dict()   # in-memory copy of the cache files, per key
+        self._logger  = ru.Logger ('radical.saga')
+
+        cfg = saga.engine.engine.Engine ().get_config ('saga.utils.host_cache')
+
+        self._ttl  = int(cfg['ttl'].get_value ())
+        self._path = os.path.expandvars (os.path.expanduser (cfg['path'].get_value ()))
+
+        # the lock may be held by another thread when forking
+        ru.atfork (child=self._atfork_child)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _atfork_child (self) :
+
+        self._lock = threading.RLock ()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _key (self, url, session=None) :
+        """
+        Host capabilities are cached per host, port and remote user, and are
+        independent of the access schema (`slurm+ssh://` and `ssh://` refer to
+        the same host).
+        """
+
+        url  = saga.Url (url)
+        host = url.host or 'localhost'
+        user = url.username                      \
+            or self._context_user (url, session) \
+            or getpass.getuser ()
+
+        if  url.port : return "%s@%s:%s" % (user, host, url.port)
+        else         : return "%s@%s"    % (user, host)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _context_user (self, url, session) :
+        """
+        Returns the user_id the shell factory would use to connect to the given
+        URL, if any is set in the session's contexts.
+        """
+
+        if  not session :
+            return None
+
+        if  url.schema.split ('+')[-1] not in _CONTEXT_SCHEMAS :
+            return None
+
+        user = None
+        for context in session.contexts :
+
+            # the last matching context wins, as in the shell factory
+            if  context.type.lower () in ['ssh', 'userpass'] :
+                if  context.attribute_exists ('user_id') and context.user_id :
+                    user = context.user_id
+
+        return user
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _fname (self, key) :
+
+        return os.path.join (self._path, "%s.json" % re.sub (r'[^\w@.:-]', '_', key))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _load (self, key) :
+
+        if  key in self._entries :
+            return self._entries[key]
+
+        entries = dict()
+        fname   = self._fname (key)
+
+        if  os.path.exists (fname) :
+            try :
+                with open (fname, 'r') as f :
+                    entries = json.load (f)
+            except Exception as e :
+                # a broken cache file is as good as no cache file
+                self._logger.warning ("ignore host cache %s: %s" % (fname, e))
+                entries = dict()
+
+        self._entries[key] = entries
+
+        return entries
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _store (self, key) :
+
+        fname = self._fname (key)
+        tmp   = "%s.%d.tmp" % (fname, os.getpid ())
+
+        try :
+            if  not os.path.isdir (self._path) :
+                os.makedirs (self._path)
+
+            # write to a tmp file first, and rename -- so that concurrent
+            # processes never see a partial file
+            with open (tmp, 'w') as f :
+                json.dump (self._entries.get (key, {}), f)
+
+            os.rename (tmp, fname)
+
+        except Exception as e :
+            # failing to write the cache only costs performance
+            self._logger.warning ("cannot write host cache %s: %s" % (fname, e))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get (self, url, name, session=None) :
+        """
+        Returns the value cached for the given host and name, or `None` if no
+        such value exists or if it has expired.  The session is used to find
+        the remote user if the URL does not specify one.
+        """
+
+        if  self._ttl <= 0 :
+            return None
+
+        with self._lock :
+
+            key   = self._key (url, session)
+            entry = self._load (key).get (name)
+
+            if  not entry :
+                return None
+
+            if  time.time () - entry.get ('time', 0) > self._ttl :
+                self._logger.debug ("host cache entry expired: %s %s" % (key, name))
+                return None
+
+            return entry.get ('value')
+
+
+    # --------------------------------------------------------------------------
+    #
+    def set (self, url, name, value, session=None) :
+        """
+        Caches the given value for the given host and name.
+        """
+
+        if  self._ttl <= 0 :
+            return
+
+        with self._lock :
+
+            key = self._key (url, session)
+
+            # pick up updates from other processes before writing
+            self._entries.pop (key, None)
+            self._load (key)[name] = {'time'  : time.time (),
+                                      'value' : value}
+            self._store (key)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def invalidate (self, url=None, name=None, session=None) :
+        """
+        Removes the entry for the given name from the cache of the given host.
+        If no name is given, all entries for that host are removed -- if no host
+        is given either, the complete cache is removed.
+        """
+
+        with self._lock :
+
+            if  url is None :
+
+                self._entries = dict()
+
+                if  os.path.isdir (self._path) :
+                    for fname in os.listdir (self._path) :
+                        if  fname.endswith ('.json') :
+                            try :
+                                os.unlink (os.path.join (self._path, fname))
+                            except OSError :
+                                pass
+                return
+
+            key = self._key (url, session)
+
+            if  name is None :
+                self._entries[key] = dict()
+                try :
+                    os.unlink (self._fname (key))
+                except OSError :
+                    pass
+                return
+
+            self._entries.pop (key, None)
+            if  self._load (key).pop (name, None) is not None :
+                self._store (key)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,216 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+"""
+Provides per-host network metrics: latency and transfer bandwidth.
+
+The latency of a host is measured as the time to establish a TCP connection
+(to the default port of the URL scheme, see ``DEFAULT_PORTS``, unless the URL
+specifies a port).  Probes use a short timeout -- a host which cannot be
+probed (blocked port, firewall, ...) is assumed to have a WAN latency of
+``DEFAULT_LATENCY``.  Results are cached for ``ttl`` seconds.  Probing is
+disabled by default (see the ``saga.utils.host_metrics`` config section), and
+the metrics are only used to rank hosts -- shell connections always assume
+``DEFAULT_LATENCY`` (see ``saga.utils.misc.get_host_latency``).
+
+Bandwidth is not probed, but learned from the transfers adaptors perform: they
+report the bytes moved and the time it took, and the metrics keep an
+exponentially weighted average per host::
+
+    metrics = HostMetrics ()
+
+    start = time.time ()
+    transfer (url, data)
+    metrics.record_transfer (url, len(data), time.time () - start)
+
+    # order replica hosts by expected transfer time
+    hosts = metrics.rank (['gsiftp://a.org/', 'gsiftp://b.org/'], nbytes)
+"""
+
+import time
+import socket
+import threading
+
+import radical.utils   as ru
+
+import saga
+import saga.utils.misc as sumisc
+
+
+DEFAULT_LATENCY   = 0.25         # approximately a random WAN link
+DEFAULT_BANDWIDTH = 10 * 1024**2 # bytes/sec assumed for hosts without history
+PROBE_TIMEOUT     = 1.0          # max time spent on a latency probe
+BANDWIDTH_WEIGHT  = 0.3          # weight of the latest transfer in the average
+
+# ports probed for the latency of a host, by URL scheme -- others probe ssh
+DEFAULT_PORTS     = {'irods'  : 1247,
+                     'gsiftp' : 2811,
+                     'http'   : 80,
+                     'https'  : 443}
+
+
+# ------------------------------------------------------------------------------
+#
+class HostMetrics (object) :
+    """
+    The host metrics are a singleton, which keeps the metrics of all hosts seen
+    by this process in memory.
+    """
+
+    __metaclass__ = ru.Singleton
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self) :
+
+        self._lock       = threading.RLock ()
+        self._latencies  = dict()   # host:port --> (latency, time of probe)
+        self._bandwidths = dict()   # host      --> bytes/sec
+        self._logger     = ru.Logger ('radical.saga')
+
+        cfg = saga.engine.engine.Engine ().get_config ('saga.utils.host_metrics')
+
+        self._probe = bool (cfg['probe'].get_value ())
+        self._ttl   = int  (cfg['ttl'  ].get_value ())
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _host (self, url) :
+
+        return saga.Url (url).host or 'localhost'
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_latency (self, url) :
+        """
+        Returns the (cached) TCP latency of the given host, in seconds.
+        """
+
+        url  = saga.Url (url)
+        host = self._host (url)
+        port = url.port or DEFAULT_PORTS.get (url.schema, 22)
+
+        if  sumisc.host_is_local (url.host) :
+            return 0.0
+
+        if  not self._probe :
+            return DEFAULT_LATENCY
+
+        key = "%s:%s" % (host, port)
+
+        with self._lock :
+
+            if  key in self._latencies :
+                latency, probed = self._latencies[key]
+                if  time.time () - probed < self._ttl :
+                    return latency
+
+        # probe without holding the lock
+        try :
+            start = time.time ()
+            s     = socket.create_connection ((host, port), PROBE_TIMEOUT)
+            latency = time.time () - start
+            s.close ()
+
+        except Exception as e :
+            self._logger.debug ("cannot probe latency for %s: %s" % (key, e))
+            latency = DEFAULT_LATENCY
+
+        with self._lock :
+            self._latencies[key] = (latency, time.time ())
+
+        return latency
+
+
+    # --------------------------------------------------------------------------
+    #
+    def record_transfer (self, url, nbytes, seconds) :
+        """
+        Records a transfer of `nbytes` bytes from or to the given host, which
+        took `seconds` seconds.
+        """
+
+        if  not nbytes or not seconds or nbytes <= 0 or seconds <= 0 :
+            return
+
+        host = self._host (url)
+        bw   = float (nbytes) / seconds
+
+        with self._lock :
+
+            if  host in self._bandwidths :
+                old = self._bandwidths[host]
+                bw  = BANDWIDTH_WEIGHT * bw + (1 - BANDWIDTH_WEIGHT) * old
+
+            self._bandwidths[host] = bw
+
+        self._logger.debug ("bandwidth for %s: %.0f bytes/sec" % (host, bw))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_bandwidth (self, url) :
+        """
+        Returns the average bandwidth observed for transfers from or to the
+        given host (in bytes/sec), or `None` if no transfers were recorded.
+        """
+
+        with self._lock :
+            return self._bandwidths.get (self._host (url))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def estimate (self, url, nbytes=0) :
+        """
+        Returns the expected time (in seconds) to transfer `nbytes` bytes from
+        or to the given host.
+        """
+
+        bw = self.get_bandwidth (url) or DEFAULT_BANDWIDTH
+
+        return self.get_latency (url) + float (nbytes or 0) / bw
+
+
+    # --------------------------------------------------------------------------
+    #
+    def rank (self, urls, nbytes=0) :
+        """
+        Returns the given URLs, ordered by the expected time to transfer
+        `nbytes` bytes (fastest first).
+        """
+
+        return sorted (urls, key=lambda url : self.estimate (url, nbytes))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def invalidate (self, url=None) :
+        """
+        Drops all metrics for the given host, or for all hosts.
+        """
+
+        with self._lock :
+
+            if  url is None :
+                self._latencies  = dict()
+                self._bandwidths = dict()
+                return
+
+            host = self._host (url)
+
+            self._bandwidths.pop (host, None)
+
+            for key in self._latencies.keys () :
+                if  key.rsplit (':', 1)[0] == host :
+                    del self._latencies[key]
+
+
+# ------------------------------------------------------------------------------
+
@@ -5,6 +5,10 @@ __license__   = "MIT"
 
 
 from transfer_directives import TransferDirectives
+from job_array           import JobArray, ARRAY_INDEX_ENV
+from script_submit       import script_submit_cmd
+from poll_scheduler      import PollInterval, PollScheduler
+from job_table           import JobTable, JobInfo
 
 
 
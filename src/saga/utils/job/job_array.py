@@ -0,0 +1,306 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+''' Provides a helper class for job arrays, i.e. for job descriptions which
+    specify an index range via `ArrayStart`, `ArrayEnd` and `ArrayStep`.
+
+    Batch system adaptors use this class to translate the index range into the
+    native array notation of their backend, to export the per-element index
+    into the job's environment, and to track the state of the individual array
+    elements.
+'''
+
+import re
+
+import saga.exceptions    as se
+import saga.job.constants as sjc
+
+
+# The environment variable which holds the array index for each element.  It is
+# exported from the backend specific variable (SLURM_ARRAY_TASK_ID, PBS_ARRAYID,
+# SGE_TASK_ID, LSB_JOBINDEX, ...), and can thus be used in arguments, output
+# file names etc., as '$SAGA_ARRAY_INDEX'.
+ARRAY_INDEX_ENV = 'SAGA_ARRAY_INDEX'
+
+_FINAL_STATES   = [sjc.DONE, sjc.FAILED, sjc.CANCELED]
+_INDEX_VAR_RE   = re.compile (r'\$\{?%s\}?' % ARRAY_INDEX_ENV)
+
+
+# ------------------------------------------------------------------------------
+#
+class JobArray (object) :
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self, start, end, step=None) :
+
+        if  start is None : start = 1
+        if  step  is None : step  = 1
+
+        try :
+            self._start = int(start)
+            self._end   = int(end)
+            self._step  = int(step)
+        except (TypeError, ValueError) :
+            raise se.BadParameter ("invalid job array range (%s-%s:%s)" \
+                                % (start, end, step))
+
+        if  self._start < 0 :
+            raise se.BadParameter ("job array start index must be >= 0, not %s" \
+                                % self._start)
+
+        if  self._end < self._start :
+            raise se.BadParameter ("job array end index (%s) is smaller than "
+                                   "start index (%s)" % (self._end, self._start))
+
+        if  self._step < 1 :
+            raise se.BadParameter ("job array step must be >= 1, not %s" \
+                                % self._step)
+
+        self._indices   = range (self._start, self._end + 1, self._step)
+        self._index_set = set   (self._indices)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def from_description (cls, jd) :
+        """
+        Returns a JobArray instance for the given job description, or `None` if
+        the description does not specify a job array.
+        """
+
+        d = jd.as_dict ()
+
+        if  d.get (sjc.ARRAY_END) is None :
+
+            if  d.get (sjc.ARRAY_START) is not None or \
+                d.get (sjc.ARRAY_STEP)  is not None :
+                raise se.BadParameter ("job array needs '%s' to be set" \
+                                    % sjc.ARRAY_END)
+            return None
+
+        return cls (d.get (sjc.ARRAY_START),
+                    d.get (sjc.ARRAY_END),
+                    d.get (sjc.ARRAY_STEP))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def start (self) :
+        return self._start
+
+    @property
+    def end (self) :
+        return self._end
+
+    @property
+    def step (self) :
+        return self._step
+
+    @property
+    def indices (self) :
+        return list(self._indices)
+
+    def __len__ (self) :
+        return len(self._indices)
+
+    def __str__ (self) :
+        return self.range_spec ()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def range_spec (self, min_start=0, with_step=True, step_sep=':') :
+        """
+        Returns the index range in the common 'start-end:step' notation.
+        Backends which do not support index 0 can pass `min_start=1`, and
+        backends which do not support steps can pass `with_step=False` -- an
+        array outside of those constraints is rejected with BadParameter.
+        """
+
+        if  self._start < min_start :
+            raise se.BadParameter ("job array start index must be >= %s for "
+                                   "this backend, not %s" % (min_start, self._start))
+
+        spec = "%d-%d" % (self._start, self._end)
+
+        if  self._step != 1 :
+            if  not with_step :
+                raise se.BadParameter ("job array steps are not supported by "
+                                       "this backend (%s)" % self._step)
+            spec += "%s%d" % (step_sep, self._step)
+
+        return spec
+
+
+    # --------------------------------------------------------------------------
+    #
+    def list_spec (self, sep=',') :
+        """
+        Returns the array indices as explicit list, like '1,3,5'.  This is used
+        for backends which do not support steps in index ranges.
+        """
+
+        if  self._step == 1 :
+            return "%d-%d" % (self._start, self._end)
+
+        return sep.join ([str(idx) for idx in self._indices])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def index_export (self, native_expr) :
+        """
+        Returns a shell statement which exports the element index, as given by
+        the backend's native variable or expression, as `$SAGA_ARRAY_INDEX`.
+        """
+
+        return "export %s=%s\n" % (ARRAY_INDEX_ENV, native_expr)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def substitute (self, text, index) :
+        """
+        Replaces `$SAGA_ARRAY_INDEX` and `${SAGA_ARRAY_INDEX}` in the given text
+        by the given index.  This is used by backends which do not evaluate the
+        job environment before expanding arguments etc.
+        """
+
+        if  not text :
+            return text
+
+        return _INDEX_VAR_RE.sub (str(index), text)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def parse_indices (self, spec) :
+        """
+        Expands a backend index specification like '3', '2-10:2' or '2,4-6'
+        into the list of array indices it denotes (i.e. into the indices which
+        are also part of this array).  Unparsable parts are ignored.
+        """
+
+        ret = list()
+
+        for part in spec.strip ().split (',') :
+
+            part = part.strip ()
+            if  not part :
+                continue
+
+            step = 1
+            if  ':' in part :
+                part, step = part.split (':', 1)
+
+            try :
+                if  '-' in part :
+                    first, last = part.split ('-', 1)
+                    ret += range (int(first), int(last) + 1, int(step))
+                else :
+                    ret.append (int(part))
+
+            except ValueError :
+                # not an index spec (like 'N/A') -- ignore
+                continue
+
+        return [idx for idx in ret if idx in self._index_set]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def initial_states (self, state=sjc.PENDING) :
+        """
+        Returns a per-element state dict, all elements set to the given state.
+        """
+
+        return dict ([(idx, state) for idx in self._indices])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def merge_states (self, prev, seen) :
+        """
+        Merges the element states observed on the backend (`seen`) into the
+        previously known element states (`prev`).  Elements which are final
+        remain final.  Elements which are not final and which were not observed
+        anymore have disappeared from the backend -- like for individual jobs,
+        we assume that they completed successfully.
+        """
+
+        ret = dict()
+
+        for idx in self._indices :
+
+            old = prev.get (idx, sjc.PENDING)
+
+            if  old in _FINAL_STATES : ret[idx] = old
+            elif idx in seen         : ret[idx] = seen[idx]
+            else                     : ret[idx] = sjc.DONE
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel_states (self, states) :
+        """
+        Returns a copy of the element states where all elements which are not
+        yet final are marked as CANCELED.
+        """
+
+        ret = dict()
+
+        for idx in self._indices :
+
+            old = states.get (idx, sjc.PENDING)
+
+            if  old in _FINAL_STATES : ret[idx] = old
+            else                     : ret[idx] = sjc.CANCELED
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def collapse_states (self, states) :
+        """
+        Derives the state of the array as a whole from its element states: the
+        array is RUNNING while any element runs, and is final once all elements
+        are final.  A final array is FAILED if any element failed, CANCELED if
+        any element was canceled, and DONE otherwise.
+        """
+
+        values = [states.get (idx, sjc.UNKNOWN) for idx in self._indices]
+
+        if  not values :
+            return sjc.UNKNOWN
+
+        if  sjc.RUNNING in values :
+            return sjc.RUNNING
+
+        if  all ([v in _FINAL_STATES for v in values]) :
+            if  sjc.FAILED   in values : return sjc.FAILED
+            if  sjc.CANCELED in values : return sjc.CANCELED
+            return sjc.DONE
+
+        if  sjc.PENDING in values :
+            if  any ([v in _FINAL_STATES for v in values]) :
+                # some elements are through, others wait for resources
+                return sjc.RUNNING
+            return sjc.PENDING
+
+        if  sjc.SUSPENDED in values :
+            return sjc.SUSPENDED
+
+        return sjc.UNKNOWN
+
+
+# ------------------------------------------------------------------------------
+
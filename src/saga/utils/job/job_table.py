@@ -0,0 +1,295 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+''' Provides the table of known jobs for batch system adaptors.
+
+    Batch system adaptors keep a record per job (state, execution hosts, exit
+    code, time stamps, ...), which is updated whenever the backend is polled.
+    With plain dicts, every record carries its own hash table, and many
+    adaptors re-create the records on every poll.  For managers which track
+    many (historic) jobs, that adds up.
+
+    `JobTable` is a dict of job ids to `JobInfo` records.  Those records use
+    `__slots__`, but support the dict protocol the adaptors use
+    (`info['state']`, `info.get('array')`, ...), so that they can be used as
+    drop-in replacements.  Assigning a dict to a table entry updates the
+    existing record in place.  State strings and execution host names are
+    interned.
+
+    Jobs in a final state are purged from the table after a retention period,
+    once the application does not hold the respective job object anymore.
+'''
+
+import time
+import weakref
+import threading
+
+import saga.job.constants as sjc
+
+
+_FINAL = [sjc.DONE, sjc.FAILED, sjc.CANCELED]
+
+
+# ------------------------------------------------------------------------------
+#
+def _intern (val) :
+
+    if  isinstance (val, str) :
+        return intern (val)
+
+    return val
+
+
+# ------------------------------------------------------------------------------
+#
+class JobInfo (object) :
+
+    # 'extra' holds keys which have no slot (created on demand), '_obj' holds
+    # the job object (or a weakref to it, for purgeable jobs), 'final_time' is
+    # the time the job was first seen in a final state.
+    __slots__ = ('job_id', 'name', 'state', 'exec_hosts', 'returncode',
+                 'create_time', 'start_time', 'end_time', 'gone', 'array',
+                 'array_states', 'td', 'final_time', '_obj', '_extra')
+
+    _keys     = frozenset (__slots__[:-3] + ('obj',))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self, info=None) :
+
+        for key in JobInfo.__slots__ :
+            setattr (self, key, None)
+
+        self.gone = False
+
+        if  info :
+            self.update (info)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __getitem__ (self, key) :
+
+        if  key == 'obj' :
+            obj = self._obj
+            if  isinstance (obj, weakref.ref) :
+                obj = obj ()
+            return obj
+
+        if  key in JobInfo._keys :
+            return getattr (self, key)
+
+        if  self._extra and key in self._extra :
+            return self._extra[key]
+
+        raise KeyError (key)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __setitem__ (self, key, val) :
+
+        if  key == 'state' :
+            val = _intern (val)
+            if  val in _FINAL :
+                if  self.final_time is None :
+                    self.final_time = time.time ()
+            else :
+                self.final_time = None
+
+        elif key == 'exec_hosts' and val :
+            val = [_intern (host) for host in val]
+
+        if  key == 'obj' :
+            self._obj = val
+
+        elif key in JobInfo._keys :
+            setattr (self, key, val)
+
+        else :
+            if  self._extra is None :
+                self._extra = dict()
+            self._extra[key] = val
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __contains__ (self, key) :
+
+        return key in JobInfo._keys or bool(self._extra and key in self._extra)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get (self, key, default=None) :
+
+        try :
+            return self[key]
+        except KeyError :
+            return default
+
+
+    # --------------------------------------------------------------------------
+    #
+    def keys (self) :
+
+        ret = list(JobInfo._keys)
+        if  self._extra :
+            ret += self._extra.keys ()
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def items (self) :
+
+        return [(key, self[key]) for key in self.keys ()]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def update (self, info) :
+
+        if  info is self :
+            return
+
+        for key in info.keys () :
+
+            val = info[key]
+
+            # records without job object don't detach the job
+            if  key == 'obj' and val is None :
+                continue
+
+            self[key] = val
+
+
+    # --------------------------------------------------------------------------
+    #
+    def copy (self) :
+
+        return JobInfo (self)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __repr__ (self) :
+
+        return "JobInfo(%s)" % dict(self.items ())
+
+
+# ------------------------------------------------------------------------------
+#
+class JobTable (dict) :
+    """
+    A dict of job ids to :class:`JobInfo` records.  Records of jobs which are
+    in a final state for longer than `retention` seconds are purged (see
+    :func:`purge`).  `retention=None` disables purging.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self, retention=3600.0) :
+
+        dict.__init__ (self)
+
+        self._retention  = retention
+        self._last_purge = time.time ()
+        self._lock       = threading.RLock ()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __setitem__ (self, job_id, info) :
+        """
+        Dicts (and records) assigned to existing entries update those entries
+        in place.
+        """
+
+        with self._lock :
+
+            record = self.get (job_id)
+
+            if  record is None :
+                if  not isinstance (info, JobInfo) :
+                    info = JobInfo (info)
+                dict.__setitem__ (self, job_id, info)
+
+            else :
+                record.update (info)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def attach (self, job_id, obj) :
+        """
+        Registers the job object for a job id -- jobs are not purged as long
+        as their job object is alive.  Unknown job ids are ignored.
+        """
+
+        record = self.get (job_id)
+
+        if  record is not None :
+            record['obj'] = obj
+
+
+    # --------------------------------------------------------------------------
+    #
+    def purge (self, force=False) :
+        """
+        Removes the records of jobs which are final for longer than the
+        retention period, and whose job object is gone.  The table only holds
+        weak references to the job objects of such jobs -- so a job object
+        which is still used by the application keeps its record alive.
+
+        Unless `force` is set, a purge is skipped if the last one ran less
+        than a tenth of the retention period (or a minute, whichever is less)
+        ago.  Returns the number of purged records.
+        """
+
+        if  self._retention is None :
+            return 0
+
+        now = time.time ()
+
+        if  not force and \
+            now - self._last_purge < min (60.0, self._retention / 10.0) :
+            return 0
+
+        purged = 0
+
+        with self._lock :
+
+            self._last_purge = now
+            limit            = now - self._retention
+
+            for job_id, record in self.items () :
+
+                if  record.final_time is None or record.final_time > limit :
+                    continue
+
+                obj = record._obj
+
+                if  obj is not None and not isinstance (obj, weakref.ref) :
+                    try :
+                        record._obj = weakref.ref (obj)
+                    except TypeError :
+                        pass   # not weak-referenceable -- keep it
+                    obj = record['obj']
+
+                elif obj is not None :
+                    obj = obj ()
+
+                if  obj is None :
+                    dict.__delitem__ (self, job_id)
+                    purged += 1
+
+        return purged
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,260 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+''' Provides helpers for polling job states on batch systems.
+
+    Batch system adaptors have no way to get notified about job state changes,
+    so they poll the backend.  Polling at a fixed interval is either slow to
+    notice state changes, or puts a lot of load on the (shared) batch system
+    frontend for jobs which sit in the queue for hours.
+
+    `PollInterval` adapts the poll interval of a job to its observed behavior:
+    after submission and after each state change, the job is re-polled quickly,
+    and the interval then grows exponentially (with some jitter, so that many
+    jobs don't poll in lock step) while the state remains unchanged.
+
+    `PollScheduler` aggregates the polls of all threads which concurrently
+    wait for jobs of the same job service into a single bulk query, and keeps
+    track of the resulting poll rate of that service.
+'''
+
+import time
+import random
+import threading
+import collections
+
+
+# ------------------------------------------------------------------------------
+#
+class PollInterval (object) :
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self, min_interval=0.1, max_interval=30.0, factor=1.5,
+                  jitter=0.1) :
+
+        self._min    = float(min_interval)
+        self._max    = float(max(min_interval, max_interval))
+        self._factor = float(factor)
+        self._jitter = float(jitter)
+
+        self._state  = None
+        self._next   = self._min
+
+
+    # --------------------------------------------------------------------------
+    #
+    def reset (self) :
+        """
+        Poll quickly again, like after a state change.
+        """
+
+        self._next = self._min
+
+
+    # --------------------------------------------------------------------------
+    #
+    def next (self, state) :
+        """
+        Returns the number of seconds to wait before polling again, given the
+        state observed by the last poll.
+        """
+
+        if  state != self._state :
+            self._state = state
+            self._next  = self._min
+
+        ret        = self._next
+        self._next = min (self._max, self._next * self._factor)
+
+        if  self._jitter :
+            ret *= random.uniform (1.0 - self._jitter, 1.0 + self._jitter)
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def sleep (self, state, deadline=None) :
+        """
+        Sleeps until the next poll is due, but not beyond the given deadline
+        (an absolute time stamp, as returned by `time.time()`).
+        """
+
+        delay = self.next (state)
+
+        if  deadline is not None :
+            delay = min (delay, deadline - time.time ())
+
+        if  delay > 0 :
+            time.sleep (delay)
+
+
+# ------------------------------------------------------------------------------
+#
+class PollScheduler (object) :
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self, query, min_interval=0.1, max_interval=30.0,
+                  rate_window=60.0) :
+        """
+        `query` is called with a list of job ids, and is expected to return
+        a dict which maps those ids to their states (or to any other per-job
+        information).  Ids missing in that dict are reported as `None`.
+
+        `min_interval` and `max_interval` bound the poll intervals of the jobs
+        of this service (see :func:`interval`).
+        """
+
+        self._query    = query
+        self._min      = min_interval
+        self._max      = max_interval
+        self._window   = rate_window
+
+        self._cond     = threading.Condition ()
+        self._pending  = set()     # ids to be included in the next query
+        self._results  = dict()    # id --> result of the last query
+        self._round    = 0         # number of the next query round
+        self._done     = 0         # number of completed query rounds
+        self._busy     = False     # query in progress
+
+        self._queries  = 0
+        self._polls    = 0
+        self._stamps   = collections.deque (maxlen=1024)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def interval (self) :
+        """
+        Returns a new `PollInterval` instance for a job of this service.
+        """
+
+        return PollInterval (self._min, self._max)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def poll (self, job_id) :
+        """
+        Returns the result of a query which includes the given job id.  If
+        a query is already in progress, the call waits for it to finish, and
+        then runs a single query for all ids which were requested meanwhile.
+        Exceptions raised by the query are raised to all callers.
+        """
+
+        return self.poll_many ([job_id])[job_id]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def poll_many (self, job_ids) :
+        """
+        Like :func:`poll`, but for a list of job ids -- returns a dict of
+        results.
+        """
+
+        with self._cond :
+
+            self._pending.update (job_ids)
+            my_round = self._round
+
+            while self._done <= my_round :
+
+                if  not self._busy : self._run_round ()
+                else               : self._cond.wait ()
+
+            ret = dict([(job_id, self._results.get (job_id)) for job_id in job_ids])
+
+        for val in ret.values () :
+            if  isinstance (val, Exception) :
+                raise val
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _run_round (self) :
+        """ run one query for all pending ids -- needs to hold self._cond """
+
+        ids           = list(self._pending)
+        this_round    = self._round
+        self._pending = set()
+        self._round  += 1
+        self._busy    = True
+
+        result = dict()
+        error  = None
+
+        # don't block other pollers from queuing up while we query
+        self._cond.release ()
+        try :
+            result = self._query (ids) or dict()
+        except Exception as e :
+            error  = e
+        finally :
+            self._cond.acquire ()
+
+        for job_id in ids :
+            if  error : self._results[job_id] = error
+            else      : self._results[job_id] = result.get (job_id)
+
+        self._queries += 1
+        self._polls   += len(ids)
+        self._stamps.append (time.time ())
+
+        self._busy = False
+        self._done = this_round + 1
+        self._cond.notify_all ()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def forget (self, job_id) :
+        """
+        Drops the cached result for the given job id (for final jobs).
+        """
+
+        with self._cond :
+            self._results.pop (job_id, None)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def rate (self) :
+        """
+        The number of backend queries per second, averaged over the last
+        `rate_window` seconds.
+        """
+
+        with self._cond :
+            start = time.time () - self._window
+            return len([s for s in self._stamps if s > start]) / self._window
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stats (self) :
+        """
+        Returns a dict with the number of backend queries, the number of job
+        polls served by them, and the current query rate.
+        """
+
+        with self._cond :
+            queries = self._queries
+            polls   = self._polls
+
+        return {'queries'         : queries,
+                'polls'           : polls,
+                'polls_per_query' : float(polls) / queries if queries else 0.0,
+                'rate'            : self.rate}
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,85 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+''' Provides a helper to submit a batch script in a single shell command.
+
+    Batch system adaptors used to create the job's directories, stage the
+    generated script into a temporary file, submit that file, and remove it
+    again -- each step being a separate round trip to the (possibly remote)
+    shell.  The command created here creates the directories and pipes the
+    script into the submission command's stdin via a here-document, so that
+    submission requires a single round trip.
+'''
+
+
+# the delimiter of the here-document.  If the submitted script happens to
+# contain it, a numbered variant is used instead (see `_script_eof()`).
+SCRIPT_EOF = 'SAGA_JOB_SCRIPT_EOF'
+
+
+# ------------------------------------------------------------------------------
+#
+def _script_eof (script) :
+    """
+    Returns a here-document delimiter which does not occur in the given script
+    -- a script line equal to the delimiter would otherwise end the
+    here-document early, and the remainder of the script would be run by the
+    submitting shell.
+    """
+
+    eof = SCRIPT_EOF
+    idx = 0
+
+    while eof in script :
+        idx += 1
+        eof  = "%s_%d" % (SCRIPT_EOF, idx)
+
+    return eof
+
+
+# ------------------------------------------------------------------------------
+#
+def script_submit_cmd (submit, script, mkdirs=None, expand=False) :
+    """
+    Returns a shell command which creates the given directories (if any), and
+    then runs the given submission command with the script on stdin, like::
+
+        mkdir -p /tmp/work && sbatch <<'SAGA_JOB_SCRIPT_EOF'
+        #!/bin/sh
+        ...
+        SAGA_JOB_SCRIPT_EOF
+
+    The script is passed on verbatim, unless `expand` is set -- in that case,
+    the shell performs parameter and command substitution on the script, just
+    like it would for a double quoted string (but without removing escapes of
+    double quotes).  Directory names are also subject to shell expansion.
+
+    The returned command spans multiple lines and ends with the delimiter line,
+    so it must be run without any stdio redirection appended (i.e. with
+    `iomode=None` on `PTYShell.run_sync()`).
+    """
+
+    cmd = ""
+    eof = _script_eof (script)
+
+    dirs = [d for d in (mkdirs or []) if d]
+    if  dirs :
+        cmd += "mkdir -p %s && " % ' '.join (dirs)
+
+    if  expand : cmd += "%s <<%s\n"   % (submit, eof)
+    else       : cmd += "%s <<'%s'\n" % (submit, eof)
+
+    cmd += script
+    if  not script.endswith ('\n') :
+        cmd += '\n'
+
+    cmd += eof
+
+    return cmd
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,220 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+"""
+Provides an in-memory LRU cache with entry lifetimes.
+
+Adaptors often cache backend state (advert entries, directory listings, file
+stats, ...) to avoid round trips.  The cache is bound by the number of entries
+and, optionally, by the (estimated) size of the cached values in bytes.  When
+a bound is exceeded, the least recently *used* entries are evicted.  Entries
+expire ``ttl`` seconds after they have been set -- expired entries are removed
+lazily, when they are looked up or evicted::
+
+    cache = LRUCache (size=1000, ttl=10.0)
+    cache.set ('/etc/passwd', data)
+
+    try :
+        data = cache.get ('/etc/passwd')
+    except KeyError :
+        data = fetch ('/etc/passwd')
+
+    print cache.stats ()  # {'hits': 1, 'misses': 0, 'evictions': 0, ...}
+
+A ``ttl`` of ``None`` disables expiry, a ``ttl`` of ``0`` disables caching.
+The cache is thread safe.
+"""
+
+import sys
+import time
+import threading
+import collections
+
+import saga.exceptions as se
+
+
+# ------------------------------------------------------------------------------
+#
+class LRUCache (object) :
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self, size=10000, ttl=None, max_bytes=None, sizeof=None) :
+        """
+        `size` limits the number of entries, `max_bytes` the sum of the value
+        sizes, as estimated by the `sizeof` callable (`sys.getsizeof` by
+        default -- which does not account for nested objects).
+        """
+
+        if  size is None or int(size) < 1 :
+            raise se.BadParameter ("cache size must be >= 1 (%s)" % size)
+
+        if  ttl is not None and float(ttl) < 0 :
+            raise se.BadParameter ("cache ttl must be >= 0 (%s)" % ttl)
+
+        self.size      = int(size)
+        self.ttl       = ttl
+        self.max_bytes = max_bytes
+        self._sizeof   = sizeof or sys.getsizeof
+
+        self._lock     = threading.RLock ()
+        self._entries  = collections.OrderedDict ()  # key --> (val, expiry, nbytes)
+        self._bytes    = 0
+
+        self._hits      = 0
+        self._misses    = 0
+        self._evictions = 0
+        self._expired   = 0
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__ (self) :
+
+        return len(self._entries)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __contains__ (self, key) :
+        """ checks for a live entry -- does not count as a hit or miss """
+
+        with self._lock :
+
+            entry = self._entries.get (key)
+
+            return bool(entry and (entry[1] is None or entry[1] > time.time ()))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get (self, key) :
+        """
+        Returns the cached value for `key`, and marks the entry as recently
+        used.  Raises `KeyError` if there is no live entry.
+        """
+
+        with self._lock :
+
+            entry = self._entries.pop (key, None)
+
+            if  entry is None :
+                self._misses += 1
+                raise KeyError (key)
+
+            if  entry[1] is not None and entry[1] <= time.time () :
+                self._bytes   -= entry[2]
+                self._expired += 1
+                self._misses  += 1
+                raise KeyError (key)
+
+            # re-insertion moves the entry to the MRU end
+            self._entries[key] = entry
+            self._hits += 1
+
+            return entry[0]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def set (self, key, val, ttl=None) :
+        """
+        Caches `val` for `key`.  `ttl` overrides the cache's entry lifetime.
+        """
+
+        if  ttl is None :
+            ttl = self.ttl
+
+        if  ttl == 0 :
+            self.delete (key)
+            return
+
+        if  ttl is None : expiry = None
+        else            : expiry = time.time () + ttl
+
+        nbytes = 0
+        if  self.max_bytes :
+            nbytes = self._sizeof (val)
+
+        with self._lock :
+
+            old = self._entries.pop (key, None)
+            if  old :
+                self._bytes -= old[2]
+
+            self._entries[key] = (val, expiry, nbytes)
+            self._bytes       += nbytes
+
+            self._evict ()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _evict (self) :
+        """ drop LRU entries until the cache is within bounds -- needs lock """
+
+        while len(self._entries) > self.size or \
+              (self.max_bytes and self._bytes > self.max_bytes and
+               len(self._entries) > 1) :
+
+            key, entry   = self._entries.popitem (last=False)
+            self._bytes -= entry[2]
+
+            if  entry[1] is not None and entry[1] <= time.time () :
+                self._expired   += 1
+            else :
+                self._evictions += 1
+
+
+    # --------------------------------------------------------------------------
+    #
+    def delete (self, key) :
+        """
+        Removes the entry for `key`, if any.  Returns `True` if there was one.
+        """
+
+        with self._lock :
+
+            entry = self._entries.pop (key, None)
+
+            if  entry is None :
+                return False
+
+            self._bytes -= entry[2]
+            return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def clear (self) :
+
+        with self._lock :
+            self._entries.clear ()
+            self._bytes = 0
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stats (self) :
+        """
+        Returns a dict with the number of cache hits, misses, evictions (live
+        entries dropped to stay within bounds) and expired entries, and with
+        the current number of entries and their size in bytes (if the cache
+        is bound by size).
+        """
+
+        with self._lock :
+
+            return {'hits'      : self._hits,
+                    'misses'    : self._misses,
+                    'evictions' : self._evictions,
+                    'expired'   : self._expired,
+                    'entries'   : len(self._entries),
+                    'bytes'     : self._bytes}
+
+
+# ------------------------------------------------------------------------------
+
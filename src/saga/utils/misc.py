@@ -16,8 +16,6 @@ import saga
 
 """ Provides an assortment of utilities """
 
-_latencies = {}
-
 
 # --------------------------------------------------------------------
 #
@@ -75,57 +73,45 @@ def host_is_valid (host) :
 #
 def get_host_latency (host_url) :
     """ 
-    This call measures the base tcp latency for a connection to the target
-    host.  Note that port 22 is used for connection tests, unless the URL
-    explicitly specifies a different port.  If the used port is blocked, the
-    returned latency can be wrong by orders of magnitude.
+    Returns the assumed base tcp latency for a connection to the target host,
+    which is used to size prompt timeouts of shell connections.
     """
 
-    try :
-
-        # FIXME see comments to #62bebc9 -- this breaks for some cases, or is at
-        # least annoying.  Thus we disable latency checking for the time being,
-        # and return a constant assumed latency of 250ms (which approximately 
-        # represents a random WAN link).
-        return 0.25
-
-
-        global _latencies
-
-        if  host_url in _latencies :
-            return _latencies[host_url]
+    # FIXME see comments to #62bebc9 -- probing breaks for some cases (blocked
+    # ports, ssh config aliases, slow DNS), and timeouts derived from a LAN
+    # latency are too short.  Thus we don't probe here, but return a constant
+    # assumed latency of 250ms (which approximately represents a random WAN
+    # link).  Measured latencies are only used for ranking hosts, see
+    # :class:`saga.utils.host_metrics.HostMetrics`.
+    import saga.utils.host_metrics as suhm
 
-        u = saga.Url (host_url)
+    return suhm.DEFAULT_LATENCY
 
-        if u.host : host = u.host
-        else      : host = 'localhost'
-        if u.port : port = u.port
-        else      : port = 22  #  FIXME: we should guess by protocol 
 
-        import socket
-        import time
 
-        # ensure host is valid
-        ip   = socket.gethostbyname (host)
-
-        start = time.time ()
-
-        s = socket.socket (socket.AF_INET, socket.SOCK_STREAM)
-        s.connect  ((host, port))
-        s.shutdown (socket.SHUT_RDWR)
-
-        stop = time.time ()
+# --------------------------------------------------------------------
+#
+def _as_url (arg) :
+    """
+    Returns the given URL as `Url` or `FrozenUrl` instance, for read-only
+    access.  URL instances are returned as they are (no copy), strings are
+    converted into (interned and thus cached) FrozenUrls.
+    """
 
-        latency = stop - start
+    if  isinstance (arg, (saga.Url, saga.FrozenUrl)) :
+        return arg
 
-        _latencies[host_url] = latency
+    return saga.FrozenUrl (arg)
 
-        return latency
 
-    except :
+# --------------------------------------------------------------------
+#
+def _path_only (u) :
 
-        raise
+    if  isinstance (u, saga.FrozenUrl) :
+        return u.is_path_only
 
+    return os.path.normpath (u.path) == os.path.normpath (str(u))
 
 
 # --------------------------------------------------------------------
@@ -147,7 +133,7 @@ def url_is_local (arg) :
     (altough I can't think of any right now).
     """
     
-    u = saga.Url (arg)
+    u = _as_url (arg)
 
     if  not host_is_local (u.host) :
         return False
@@ -175,7 +161,7 @@ def url_is_relative (url_1) :
     that path element does not start with '/'.
     """
 
-    u1 = saga.Url (url_1)
+    u1 = _as_url (url_1)
 
     if  str (u1) == str(u1.path) :
         if  not u1.path :
@@ -195,7 +181,7 @@ def url_get_dirname (url_1) :
     paths.
     """
 
-    u1 = saga.Url (url_1)
+    u1 = _as_url (url_1)
     p1 = u1.path
 
     return re.sub (r"[^/]*$", "", p1)
@@ -210,7 +196,7 @@ def url_get_filename (url_1) :
     paths.
     """
 
-    u1 = saga.Url (url_1)
+    u1 = _as_url (url_1)
     p1 = u1.path
 
     if '/' in p1 :
@@ -223,9 +209,13 @@ def url_get_filename (url_1) :
 #
 def url_normalize (url_1) :
     """ 
-    The path element of the URL is normalized
+    The path element of the URL is normalized.  For a `FrozenUrl`, the
+    (cached) normalized FrozenUrl is returned.
     """
 
+    if  isinstance (url_1, saga.FrozenUrl) :
+        return url_1.normalized
+
     ret      = saga.Url (url_1)
     ret.path = os.path.normpath (ret.path)
 
@@ -241,30 +231,34 @@ def url_make_absolute (url_1, url_2) :
     same.  Unless it is a relative path in the first place: then it is
     interpreted as relative to url_2.path, and is made absolute.
     protocol/port/user etc.
+
+    If url_1 is a `FrozenUrl`, the result is a (cached) FrozenUrl, too.
     """
 
-    if  not isinstance(url_1, saga.Url):
-        url_1 = saga.Url(url_1)
+    frozen = isinstance (url_1, saga.FrozenUrl)
 
-    if  not isinstance(url_2, saga.Url):
-        url_2 = saga.Url(url_2)
+    url_1 = _as_url (url_1)
+    url_2 = _as_url (url_2)
 
     if  not url_is_compatible (url_1, url_2) :
         raise saga.BadParameter ("Cannot interpret url %s in the context of url %s" \
                               % (url_2, url_1))
 
     # re-interpret path of url_2, using url_1 as base directory
-    ret = saga.Url (url_1)
-
     if  url_is_relative (url_2) :
         # note that we have no means if 'file://localhost/tmp/test.txt' refers
         # to a file or an directory -- so we have to trust that url_1 is
         # a dir...
-        ret.path = url_1.path + '/' + url_2.path
+        path = url_1.path + '/' + url_2.path
     else :
         # absolute path, replace url path...
-        ret.path = url_2.path
+        path = url_2.path
 
+    if  frozen :
+        return url_1.with_path (path)
+
+    ret      = saga.Url (url_1)
+    ret.path = path
 
     return ret
 
@@ -278,12 +272,12 @@ def url_is_compatible (url_1, url_2) :
     considered compatible with any other URL.
     """
     
-    u1 = saga.Url (url_1)
-    u2 = saga.Url (url_2)
+    u1 = _as_url (url_1)
+    u2 = _as_url (url_2)
 
     # if either one url only contains a path, it is compatible to anything.
-    if os.path.normpath(u1.path) == os.path.normpath (str(u1)) : return True
-    if os.path.normpath(u2.path) == os.path.normpath (str(u2)) : return True
+    if _path_only (u1) : return True
+    if _path_only (u2) : return True
 
     # more than path in both URLs -- check compatibility for all elements
     if u1.scheme   and     u2.scheme   and u1.scheme   != u2.scheme   : return False 
@@ -15,6 +15,7 @@ import shlex
 import select
 import signal
 import termios
+import weakref
 
 import radical.utils         as ru
 import radical.utils.logger  as rul
@@ -22,6 +23,7 @@ import radical.utils.logger  as rul
 import saga.exceptions       as se
 
 import pty_exceptions        as ptye
+import pty_reactor           as ptyr
 
 # --------------------------------------------------------------------
 #
@@ -29,6 +31,30 @@ _CHUNKSIZE = 1024*1024  # default size of each read
 _POLLDELAY = 0.01       # seconds in between read attempts
 _DEBUG_MAX = 600
 
+# all process instances, for the fork handler below
+_instances = weakref.WeakSet ()
+
+
+# --------------------------------------------------------------------
+#
+def _atfork_child () :
+    """
+    A forked child inherits the pty fds of all PTYProcess instances, but it
+    does not own their child processes -- it must never read from their ptys,
+    nor kill the processes (which would happen on garbage collection).  We thus
+    close the child's copies of the fds, and forget about the processes.  The
+    instances can still recover (i.e. start a new process) in the child.
+
+    Note that this runs in the child right after the fork: we cannot acquire
+    any locks here, as they may have been held by other threads of the parent.
+    """
+
+    for instance in list(_instances) :
+        instance._forget ()
+
+
+ru.atfork (child=_atfork_child)
+
 
 # --------------------------------------------------------------------
 #
@@ -114,6 +140,7 @@ class PTYProcess (object) :
             raise se.BadParameter ("PTYProcess expects non-empty command")
 
         self.rlock   = ru.RLock ("pty process %s" % command)
+        _instances.add (self)
 
         self.command = command # list of strings too run()
 
@@ -122,6 +149,7 @@ class PTYProcess (object) :
         self.tail    = ""      # tail of data data cache for error messages
         self.child   = None    # the process as created by subprocess.Popen
         self.ptyio   = None    # the process' io channel, from pty.fork()
+        self.reactor = None    # reads on our behalf, if enabled
 
         self.exit_code        = None  # child died with code (may be revived)
         self.exit_signal      = None  # child kill by signal (may be revived)
@@ -247,6 +275,31 @@ class PTYProcess (object) :
                 self.parent_in  = self.child_fd
                 self.parent_out = self.child_fd
 
+                self.reactor = ptyr.get_reactor ()
+                if  self.reactor :
+                    self.reactor.register (self.parent_out)
+
+
+    # --------------------------------------------------------------------
+    #
+    def _forget (self) :
+        """
+        drop the process without killing it -- see `_atfork_child`
+        """
+
+        try :
+            if  getattr (self, 'parent_out', None) :
+                os.close (self.parent_out)
+        except OSError :
+            pass
+
+        self.child      = None
+        self.parent_in  = None
+        self.parent_out = None
+        self.reactor    = None
+        self.cache      = ""
+        self.rlock      = ru.RLock ("pty process %s" % self.command)
+
 
     # --------------------------------------------------------------------
     #
@@ -312,6 +365,8 @@ class PTYProcess (object) :
 
             try :
                 if  self.parent_out :
+                    if  self.reactor :
+                        self.reactor.unregister (self.parent_out)
                     os.close (self.parent_out)
                     self.parent_out = None
             except OSError :
@@ -587,7 +642,14 @@ class PTYProcess (object) :
 
                     # otherwise we need to read some more data, right?
                     # idle wait 'til the next data chunk arrives, or 'til _POLLDELAY
-                    rlist, _, _ = select.select ([self.parent_out], [], [], _POLLDELAY)
+                    if  self.reactor :
+                        # the reactor reads for us -- we just pick up the data
+                        buf = self.reactor.read (self.parent_out, _POLLDELAY)
+                        if  buf :
+                            self._cache (self.parent_out, buf)
+                        rlist = []
+                    else :
+                        rlist, _, _ = select.select ([self.parent_out], [], [], _POLLDELAY)
 
                     # got some data?
                     for f in rlist:
@@ -606,19 +668,7 @@ class PTYProcess (object) :
                             raise se.NoSuccess ("unexpected EOF (%s)" % self.tail)
 
 
-                        self.cache += buf.replace ('\r', '')
-                        log         = buf.replace ('\r', '')
-                        log         = log.replace ('\n', '\\n')
-                      # print "buf: --%s--" % buf
-                      # print "log: --%s--" % log
-                        if  len(log) > _DEBUG_MAX :
-                            self.logger.debug ("read : [%5d] [%5d] (%s ... %s)" \
-                                            % (f, len(log), log[:30], log[-30:]))
-                        else :
-                            self.logger.debug ("read : [%5d] [%5d] (%s)" \
-                                            % (f, len(log), log))
-                          # for c in log :
-                          #     print '%s' % c
+                        self._cache (f, buf)
 
 
                     # lets see if we still got any data in the cache we can return
@@ -679,6 +729,65 @@ class PTYProcess (object) :
                                  % (e, self.tail))
 
 
+    # ----------------------------------------------------------------
+    #
+    def _cache (self, fd, buf) :
+        """
+        add data read from the child to the data cache
+        """
+
+        self.cache += buf.replace ('\r', '')
+        log         = buf.replace ('\r', '')
+        log         = log.replace ('\n', '\\n')
+      # print "buf: --%s--" % buf
+      # print "log: --%s--" % log
+        if  len(log) > _DEBUG_MAX :
+            self.logger.debug ("read : [%5d] [%5d] (%s ... %s)" \
+                            % (fd, len(log), log[:30], log[-30:]))
+        else :
+            self.logger.debug ("read : [%5d] [%5d] (%s)" \
+                            % (fd, len(log), log))
+
+
+    # ----------------------------------------------------------------
+    #
+    def subscribe (self, callback) :
+        """
+        Have all further output of the child passed, line by line, to the given
+        callback (see :mod:`saga.utils.pty_reactor`), instead of collecting it
+        for :func:`read` and :func:`find`.  Data which are already cached are
+        passed on, too.  The callback is invoked with `None` once the child's
+        I/O channel gets closed.
+
+        This requires the pty reactor to be enabled -- the method returns
+        `False` if it is not, and the caller needs to read the child's output
+        itself.
+        """
+
+        with self.rlock :
+
+            if  not self.reactor or not self.parent_out :
+                return False
+
+            self.reactor.subscribe (self.parent_out, callback, self.cache)
+            self.cache = ""
+
+            return True
+
+
+    # ----------------------------------------------------------------
+    #
+    def unsubscribe (self) :
+        """
+        Collect the child's output for :func:`read` and :func:`find` again.
+        """
+
+        with self.rlock :
+
+            if  self.reactor and self.parent_out :
+                self.reactor.unsubscribe (self.parent_out)
+
+
     # ----------------------------------------------------------------
     #
     def find (self, patterns, timeout=0) :
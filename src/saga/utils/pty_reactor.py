@@ -0,0 +1,400 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+"""
+Provides an optional I/O reactor for pty processes.
+
+By default, every :class:`saga.utils.pty_process.PTYProcess` polls its own pty
+via `select`, and every channel which waits for asynchronous output (like the
+monitoring channel of the shell job adaptor) needs its own thread which blocks
+in `find()`.  With many hosts, that results in many threads which wake up on
+timers.
+
+If the ``reactor`` option in the ``saga.utils.pty`` config section is enabled
+(and the platform supports `epoll`), a single reactor thread owns the read ends
+of all pty processes.  It reads data as soon as they arrive, and either buffers
+them for the next `PTYProcess.read()` (which then just waits for the reactor to
+hand over data), or splits them into lines which are passed to a subscribed
+callback::
+
+    def monitor_cb (line) :
+        if  line is None :
+            print "channel closed"
+        else :
+            print "event: %s" % line
+
+    pty_process.subscribe (monitor_cb)
+
+Callbacks are invoked by a single dispatcher thread which is shared by all
+subscriptions -- they thus must not block for long, but can perform I/O on
+other pty processes.
+"""
+
+import os
+import errno
+import select
+import threading
+import Queue
+
+import radical.utils         as ru
+
+import saga.exceptions       as se
+
+
+_CHUNKSIZE = 1024*1024  # size of each read
+
+_enabled   = None       # reactor enabled by configuration?  (evaluated once)
+
+
+# ------------------------------------------------------------------------------
+#
+def available () :
+    """
+    The reactor is only available on platforms which support `epoll`.
+    """
+
+    return hasattr (select, 'epoll')
+
+
+# ------------------------------------------------------------------------------
+#
+def get_reactor () :
+    """
+    Returns the process' reactor instance if the reactor is enabled and
+    available, `None` otherwise.
+    """
+
+    global _enabled
+
+    if  _enabled is None :
+
+        import saga.engine.engine as see
+
+        cfg      = see.Engine ().get_config ('saga.utils.pty')
+        _enabled = bool(cfg['reactor'].get_value ())
+
+        if  _enabled and not available () :
+            ru.Logger ('radical.saga.pty').warning ("pty reactor needs epoll "
+                                                    "-- using select instead")
+            _enabled = False
+
+    if  not _enabled :
+        return None
+
+    return PTYReactor ()
+
+
+# ------------------------------------------------------------------------------
+#
+class _Channel (object) :
+    """ reactor state for a single pty file descriptor """
+
+    def __init__ (self, fd) :
+
+        self.fd       = fd
+        self.cond     = threading.Condition ()
+        self.data     = ""      # data read but not yet consumed
+        self.eof      = False   # pty is closed (or broken)
+        self.callback = None    # line callback, if subscribed
+
+
+# ------------------------------------------------------------------------------
+#
+class PTYReactor (object) :
+    """
+    The reactor is a singleton, which runs one thread to read from all
+    registered file descriptors, and one thread to dispatch line callbacks.
+    """
+
+    __metaclass__ = ru.Singleton
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__ (self) :
+
+        self._logger = ru.Logger ('radical.saga.pty')
+        self._epoll  = None
+
+        self._setup ()
+
+        # a forked child neither has the reactor threads, nor should it share
+        # the epoll instance with the parent -- it gets a fresh reactor state.
+        ru.atfork (child=self._setup)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _setup (self) :
+        """
+        (re)set the reactor state -- the threads are started on demand
+        """
+
+        if  self._epoll :
+            try :
+                self._epoll.close ()
+            except Exception :
+                pass
+
+        self._lock     = threading.RLock ()
+        self._channels = dict()             # fd --> _Channel
+        self._events   = Queue.Queue ()     # (callback, line) for dispatcher
+        self._epoll    = select.epoll ()
+        self._running  = False
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _start (self) :
+        """ start reader and dispatcher threads -- needs self._lock """
+
+        if  self._running :
+            return
+
+        self._reader     = threading.Thread (target=self._read_loop,
+                                             name='saga.pty.reactor')
+        self._dispatcher = threading.Thread (target=self._dispatch_loop,
+                                             name='saga.pty.dispatcher')
+        self._reader.setDaemon     (True)
+        self._dispatcher.setDaemon (True)
+        self._reader.start     ()
+        self._dispatcher.start ()
+
+        self._running = True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def register (self, fd) :
+        """
+        From now on, the reactor reads all data from the given fd.
+        """
+
+        with self._lock :
+
+            if  fd in self._channels :
+                raise se.IncorrectState ("fd %s is already registered" % fd)
+
+            self._start ()
+
+            self._channels[fd] = _Channel (fd)
+            self._epoll.register (fd, select.EPOLLIN | select.EPOLLPRI)
+
+            self._logger.debug ("reactor : [%5d] registered" % fd)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def unregister (self, fd) :
+        """
+        Stop reading from the given fd -- this must be called *before* the fd
+        is closed.  Data not consumed so far are discarded.
+        """
+
+        with self._lock :
+
+            chan = self._channels.pop (fd, None)
+
+            if  not chan :
+                return
+
+            self._close (chan)
+
+            self._logger.debug ("reactor : [%5d] unregistered" % fd)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _close (self, chan) :
+        """ mark channel as closed, and wake up all parties waiting on it """
+
+        if  not chan.eof :
+
+            try :
+                self._epoll.unregister (chan.fd)
+            except (IOError, OSError, ValueError) :
+                pass  # fd is already gone
+
+            with chan.cond :
+                chan.eof = True
+                chan.cond.notify_all ()
+
+            if  chan.callback :
+                self._events.put ((chan.callback, None))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def read (self, fd, timeout) :
+        """
+        Returns the data read from the given fd so far.  If there are none,
+        the call waits up to `timeout` seconds for data to arrive, and returns
+        an empty string if none did.  A closed fd raises `NoSuccess` once all
+        data have been consumed.
+        """
+
+        with self._lock :
+            chan = self._channels.get (fd)
+
+        if  not chan :
+            raise se.IncorrectState ("fd %s is not registered" % fd)
+
+        with chan.cond :
+
+            if  not chan.data and not chan.eof :
+                chan.cond.wait (timeout)
+
+            ret       = chan.data
+            chan.data = ""
+
+            if  not ret and chan.eof :
+                raise se.NoSuccess ("unexpected EOF on fd %s" % fd)
+
+            return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def subscribe (self, fd, callback, data="") :
+        """
+        Instead of buffering data for `read()`, split them into lines and pass
+        each line (sans newline) to the callback.  `data` are passed as
+        initial (previously read) data.  Once the fd gets closed, the callback
+        is invoked with `None`.
+        """
+
+        with self._lock :
+
+            chan = self._channels.get (fd)
+
+            if  not chan :
+                raise se.IncorrectState ("fd %s is not registered" % fd)
+
+            with chan.cond :
+                chan.callback = callback
+                chan.data     = data + chan.data
+                self._emit_lines (chan)
+
+            if  chan.eof :
+                self._events.put ((callback, None))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def unsubscribe (self, fd) :
+        """
+        Switch back to buffering data for `read()`.  Incomplete lines remain
+        in the buffer.
+        """
+
+        with self._lock :
+
+            chan = self._channels.get (fd)
+
+            if  chan :
+                with chan.cond :
+                    chan.callback = None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _emit_lines (self, chan) :
+        """ pass complete lines to the channel's callback -- needs chan.cond """
+
+        if  not chan.callback or not '\n' in chan.data :
+            return
+
+        lines, chan.data = chan.data.rsplit ('\n', 1)
+
+        for line in lines.split ('\n') :
+            self._events.put ((chan.callback, line))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _read_loop (self) :
+
+        while True :
+
+            try :
+                events = self._epoll.poll ()
+
+            except IOError as e :
+                if  e.errno == errno.EINTR :
+                    continue
+                self._logger.exception ("reactor poll failed")
+                self._fail ()
+
+                # continue with a fresh epoll instance for the fds registered
+                # from now on
+                with self._lock :
+                    try :
+                        self._epoll.close ()
+                    except Exception :
+                        pass
+                    self._epoll = select.epoll ()
+                continue
+
+            # we hold the lock while reading, so that no fd gets closed (and
+            # possibly reused) while we are at it.  Reads don't block, as epoll
+            # reported the fds as readable.
+            with self._lock :
+
+                for fd, event in events :
+
+                    chan = self._channels.get (fd)
+
+                    if  not chan or chan.eof :
+                        continue
+
+                    buf = ""
+                    try :
+                        buf = os.read (fd, _CHUNKSIZE)
+                    except OSError as e :
+                        # EIO signals that the child closed the pty
+                        self._logger.debug ("reactor : [%5d] read failed: %s" % (fd, e))
+
+                    if  not buf :
+                        self._close (chan)
+                        continue
+
+                    with chan.cond :
+                        chan.data += buf.replace ('\r', '')
+                        self._emit_lines (chan)
+                        chan.cond.notify_all ()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _fail (self) :
+        """
+        The epoll instance is broken: close all channels, so that nobody waits
+        for data which will never arrive.
+        """
+
+        with self._lock :
+
+            for chan in self._channels.values () :
+                self._close (chan)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _dispatch_loop (self) :
+
+        while True :
+
+            callback, line = self._events.get ()
+
+            try :
+                callback (line)
+
+            except Exception as e :
+                self._logger.exception ("reactor callback failed: %s" % e)
+
+
+# ------------------------------------------------------------------------------
+
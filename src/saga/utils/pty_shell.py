@@ -9,6 +9,7 @@ import os
 import sys
 import errno
 import tempfile
+import uuid
 
 import saga.utils.misc              as sumisc
 import radical.utils                as ru
@@ -147,6 +148,11 @@ class PTYShell (object) :
     channel *in a separate thread* and invoke that callback on any received
     message, passing the message text (sans newline) to the callback.
 
+    Independent of that named pipe, the output of any `PTYShell` can be passed
+    to a line callback via :func:`subscribe` -- if the pty reactor is enabled
+    (see :mod:`saga.utils.pty_reactor`), a single reactor thread serves all
+    subscribed shells, so that monitoring channels don't need a thread each.
+
     An example usage: the command channel may run the following command line::
 
       ( sh -c 'sleep 100 && echo "job $$ done" > $SAGA_ASYNC_PIPE" \
@@ -403,6 +409,44 @@ class PTYShell (object) :
                 raise ptye.translate_exception (e)
 
 
+    # ----------------------------------------------------------------
+    #
+    def subscribe (self, callback) :
+        """
+        Pass all further shell output, line by line, to the given callback --
+        the callback is invoked with `None` when the shell's I/O channel closes.
+        This is only supported if the pty reactor is enabled: the method
+        returns `False` otherwise, and the caller needs to read the output via
+        :func:`find` (usually in a separate thread).
+
+        Subscribing a shell does not survive a shell restart.
+        """
+
+        with self.pty_shell.rlock :
+
+            try :
+                return self.pty_shell.subscribe (callback)
+
+            except Exception as e :
+                raise ptye.translate_exception (e)
+
+
+    # ----------------------------------------------------------------
+    #
+    def unsubscribe (self) :
+        """
+        Collect shell output for :func:`find` again.
+        """
+
+        with self.pty_shell.rlock :
+
+            try :
+                self.pty_shell.unsubscribe ()
+
+            except Exception as e :
+                raise ptye.translate_exception (e)
+
+
     # ----------------------------------------------------------------
     #
     def set_prompt (self, new_prompt) :
@@ -675,6 +719,12 @@ class PTYShell (object) :
                 if  iomode == None :
                     redir  =  ""
 
+                # a redirection appended to a multi-line command (like
+                # a here-document) would end up after its last line
+                if  redir and '\n' in command :
+                    raise se.BadParameter ("run_sync can't redirect multi-line commands ('%s')" \
+                                        % command)
+
                 self.logger.debug    ('run_sync: %s%s'   % (command, redir))
                 self.pty_shell.write (          "%s%s\n" % (command, redir))
 
@@ -741,6 +791,93 @@ class PTYShell (object) :
                 raise ptye.translate_exception (e)
 
 
+    # ----------------------------------------------------------------
+    #
+    def run_batch (self, commands) :
+        """
+        Run a list of independent shell commands in a single round trip, and
+        report exit code, stdout and stderr for each of them (as a list of
+        tuples, in the order of the given commands).
+
+        :type  commands: list of strings
+        :param commands: shell commands to run.
+
+        All commands are sent to the shell in one write, and are run one after
+        the other, each in its own subshell -- so a command cannot change the
+        working directory or environment for the commands following it, and
+        a failing command does not affect the others.  The output and exit code
+        of each command are delimited by a unique marker, which is then used to
+        split the shell's output again.
+
+        Output is captured like for `run_sync` with iomode `None`, i.e. stderr
+        is not redirected and is always returned as `None`.  Commands must be
+        single line foreground commands.
+        """
+
+        if  not commands :
+            return list()
+
+        with self.pty_shell.rlock :
+
+            self._trace ("run batch : %s" % commands)
+            self.pty_shell.flush ()
+
+            # same as for run_sync: the shell needs to be in ground state
+            if not self.pty_shell.alive (recover=True) :
+                raise se.IncorrectState ("Can't run commands -- shell died:\n%s" \
+                                      % self.pty_shell.autopsy ())
+
+            try :
+
+                marker = "SAGA-BATCH-%s" % uuid.uuid4 ().hex
+                batch  = ""
+
+                for command in commands :
+
+                    command = command.strip ()
+
+                    if  '\n' in command :
+                        raise se.BadParameter ("run_batch can only run single line "
+                                               "commands ('%s')" % command)
+
+                    if  command.endswith ('&') :
+                        raise se.BadParameter ("run_batch can only run foreground "
+                                               "jobs ('%s')" % command)
+
+                    # the leading newline separates the marker from command
+                    # output which does not end in a newline
+                    batch += " ( %s ) ; printf '\\n%s:%%d\\n' $? ;" % (command, marker)
+
+                self.logger.debug    ('run_batch: %s'   % batch)
+                self.pty_shell.write (          "%s\n" % batch)
+
+                fret, match = self.pty_shell.find ([self.prompt], timeout=-1.0)  # blocks
+
+                if  fret == None :
+                    # not find prompt after blocking?  BAD!  Restart the shell
+                    self.finalize (kill_pty=True)
+                    raise se.IncorrectState ("run_batch failed, no prompt (%s)" % batch)
+
+                _, txt = self._eval_prompt (match)
+
+                # splitting at the markers yields output and exit code for each
+                # command, followed by the (empty) remainder after the last one
+                parts = re.split ("\n%s:(\d+)\n" % marker, txt)
+
+                if  len(parts) != 2 * len(commands) + 1 :
+                    raise se.NoSuccess ("run_batch failed, cannot parse output (%s)" \
+                                     % txt)
+
+                ret = list()
+                for i in range (len(commands)) :
+                    ret.append ((int(parts[2*i+1]), parts[2*i], None))
+
+                return ret
+
+            except Exception as e :
+                raise ptye.translate_exception (e)
+
+
     # ----------------------------------------------------------------
     #
     def run_async (self, command) :
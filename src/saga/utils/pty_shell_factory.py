@@ -6,10 +6,13 @@ __license__   = "MIT"
 
 import os
 import sys
-import pwd
+import errno
+import stat
 import time
 import string
+import hashlib
 import getpass
+import subprocess
 
 import radical.utils           as ru
 import radical.utils.logger    as rul
@@ -35,8 +38,8 @@ import pty_exceptions               as ptye
 #   CheckHostIP no
 #   ConnectTimeout
 #   ControlMaster  yes | no | no ...
-#   ControlPath    $BASE/ssh_control_%n_%p.$$.sock
-#                  %r (remote id)? would need inspection
+#   ControlPath    $HOME/.saga/ssh/<hash>.ctrl
+#                  hash over host, port, user and security context
 #   ControlPersist 100  : close master after 100 seconds idle
 #   EscapeChar     none : transparent for binary data
 #   TCPKeepAlive   yes  : detect connection failure
@@ -52,18 +55,18 @@ _SCHEMAS_GSI = ['gsissh', 'gsiscp', 'gsisftp']
 
 _SCHEMAS = _SCHEMAS_SH + _SCHEMAS_SSH + _SCHEMAS_GSI
 
-# FIXME: '-o ControlPersist' is only supported for newer ssh versions.  We
-# should add detection, and enable that if available -- for now, just diable it.
-#
-# FIXME: we should use '%n' instead of '%h', but that is not supported by older
-# ssh versions...
+# '-o ControlPersist' is only supported for newer ssh versions -- we detect
+# support for it before using it (see _ssh_persist_flag).
 
 # ssh master/slave flag magic # FIXME: make timeouts configurable
-_SSH_FLAGS_MASTER   = "-o ControlMaster=%(share_mode)s -o ControlPath=%(ctrl)s -o TCPKeepAlive=no  -o ServerAliveInterval=10 -o ServerAliveCountMax=20 %(connect_timeout)s"
+_SSH_FLAGS_MASTER   = "-o ControlMaster=%(share_mode)s -o ControlPath=%(ctrl)s -o TCPKeepAlive=no  -o ServerAliveInterval=10 -o ServerAliveCountMax=20 %(connect_timeout)s %(persist)s"
 _SSH_FLAGS_SLAVE    = "-o ControlMaster=%(share_mode)s -o ControlPath=%(ctrl)s -o TCPKeepAlive=no  -o ServerAliveInterval=10 -o ServerAliveCountMax=20 %(connect_timeout)s"
 _SCP_FLAGS          = ""
 _SFTP_FLAGS         = ""
 
+# checks if an ssh master is listening on a control socket
+_SSH_CHECK          = '%(ssh_env)s "%(ssh_exe)s" -o ControlPath=%(ctrl)s -O check %(host_str)s'
+
 # FIXME: right now, we create a shell connection as master --
 # but a master does not actually need a shell, as it is never really
 # used to run commands...
@@ -111,6 +114,15 @@ class PTYShellFactory (object) :
     Any ssh master connection in this registry can idle, and may thus shut down
     after ``ControlPersist`` seconds (see options).
 
+    The registry only covers the current process.  To share ssh masters between
+    processes, the control sockets live in a private per-user directory (see the
+    ``ssh_ctrl_dir`` option), named by a hash of host, port, user and security
+    context.  A new master entry first checks if a live master listens on that
+    socket -- ssh then attaches to it without re-authentication.  Masters are
+    kept alive for ``ssh_persist`` seconds after their last client disconnects,
+    so that short-lived processes can reuse them.  Stale sockets are removed,
+    and if no private socket directory can be used, sharing is disabled.
+
     data model::
 
 
@@ -148,8 +160,26 @@ class PTYShellFactory (object) :
 
         self.logger     = ru.Logger('radical.saga.pty')
         self.registry   = {}
+        self.which      = {}   # cache for local 'which' lookups
+        self.persist    = {}   # ControlPersist support, per ssh executable
         self.rlock      = ru.RLock ('pty shell factory')
 
+        ru.atfork (child=self._atfork_child)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _atfork_child (self) :
+        """
+        The master processes registered here belong to the parent process (see
+        `saga.utils.pty_process._atfork_child`) -- a forked child needs to
+        create its own.  The lock may be held by another thread of the parent,
+        so we replace it.  The lookup caches remain valid.
+        """
+
+        self.registry = {}
+        self.rlock    = ru.RLock ('pty shell factory')
+
 
     # --------------------------------------------------------------------------
     #
@@ -182,7 +212,16 @@ class PTYShellFactory (object) :
             if not user_s in self.registry[host_s]         : self.registry[host_s][user_s] = {}
             if not type_s in self.registry[host_s][user_s] :
 
-                # new master: create an instance, and register it
+                # new master: maybe some other process has one running for us.
+                # If a stale control socket is in the way, we can't share.
+                if  info['shell_type'] == 'ssh' and info['share_mode'] != 'no' :
+                    if  not self._check_ctrl (info) :
+                        info['share_mode'] = 'no'
+                        info['ctrl']       = 'none'
+                        info['persist']    = ''
+                        self._ssh_flags (info)
+
+                # create an instance, and register it
                 m_cmd = info['scripts'][info['shell_type']]['master'] % info
 
                 logger.debug ("open master pty for [%s] [%s] %s: %s'" \
@@ -456,17 +495,144 @@ class PTYShellFactory (object) :
     #
     def _which(self, cmd):
 
-        ret = ru.which(cmd)
-        if not ret:
-            raise RuntimeError('cmd %s not found' % cmd)
-        return ret
+        # local executables don't move while we run -- only search the PATH
+        # once per command
+        if cmd not in self.which:
+            ret = ru.which(cmd)
+            if not ret:
+                raise RuntimeError('cmd %s not found' % cmd)
+            self.which[cmd] = ret
+
+        return self.which[cmd]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _ssh_persist_flag (self, info, persist) :
+        """
+        Returns the ControlPersist flag for the given number of seconds, or an
+        empty string if the ssh executable does not support that option.
+        """
+
+        if  persist <= 0 :
+            return ''
+
+        ssh_exe = info['ssh_exe']
+
+        if  ssh_exe not in self.persist :
+            # older ssh versions fail on the unknown option before reporting
+            # the version
+            try :
+                with open (os.devnull, 'w') as null :
+                    ret = subprocess.call ([ssh_exe, '-o', 'ControlPersist=1', '-V'],
+                                           stdout=null, stderr=null)
+                self.persist[ssh_exe] = (ret == 0)
+            except Exception :
+                self.persist[ssh_exe] = False
+
+            if  not self.persist[ssh_exe] :
+                info['logger'].info ("%s does not support ControlPersist" % ssh_exe)
+
+        if  self.persist[ssh_exe] : return '-o ControlPersist=%d' % persist
+        else                      : return ''
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _ssh_flags (self, info) :
+        """
+        (Re)sets the ssh flags for master and slave connections of the given
+        master entry, according to its share mode and control socket.
+        """
+
+        info['m_flags']  = _SSH_FLAGS_MASTER % ({'share_mode' : info['share_mode'],
+                                                 'ctrl'       : info['ctrl'],
+                                                 'persist'    : info['persist'],
+                                                 'connect_timeout': info['ssh_connect_timeout']})
+        info['s_flags']  = _SSH_FLAGS_SLAVE  % ({'share_mode' : info['share_mode'],
+                                                 'ctrl'       : info['ctrl'],
+                                                 'connect_timeout': info['ssh_connect_timeout']})
+
+        info['logger'].debug('SSH Connection M_FLAGS: %s' % info['m_flags'])
+        info['logger'].debug('SSH Connection S_FLAGS: %s' % info['s_flags'])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _ctrl_dir (self, path, logger) :
+        """
+        Makes sure that the given control socket directory exists and is only
+        accessible by us.  Returns `None` if that is not the case.
+        """
+
+        path = os.path.normpath (os.path.expandvars (os.path.expanduser (path)))
+
+        try :
+            if  not os.path.isdir (path) :
+                os.makedirs (path, 0700)
+
+            st = os.stat (path)
+
+            if  st.st_uid != os.getuid () :
+                logger.warning ("ssh control dir %s is not owned by us" % path)
+                return None
+
+            if  stat.S_IMODE (st.st_mode) & 0077 :
+                os.chmod (path, 0700)
+
+        except Exception as e :
+            logger.warning ("cannot use ssh control dir %s: %s" % (path, e))
+            return None
+
+        return path
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _check_ctrl (self, info) :
+        """
+        Checks if an ssh master is listening on the control socket of the given
+        master entry (usually started by some other process).  If so, ssh will
+        attach to it -- otherwise we remove stale sockets, so that ssh can
+        start a new master.  Returns `False` if the control socket can't be
+        used, i.e. if a stale socket could not be removed.
+        """
+
+        ctrl   = info['ctrl']
+        logger = info['logger']
+
+        if  not os.path.exists (ctrl) :
+            return True
+
+        try :
+            with open (os.devnull, 'w') as null :
+                ret = subprocess.call (_SSH_CHECK % info, shell=True,
+                                       stdout=null, stderr=null)
+        except Exception as e :
+            logger.warning ("cannot check ssh master at %s: %s" % (ctrl, e))
+            ret = -1
+
+        if  ret == 0 :
+            logger.info ("attach to running ssh master for %s (%s)" \
+                      % (info['host_str'], ctrl))
+            return True
+
+        logger.info ("remove stale ssh control socket %s" % ctrl)
+        try :
+            os.unlink (ctrl)
+        except OSError as e :
+            if  e.errno != errno.ENOENT :
+                logger.warning ("cannot remove ssh control socket %s: %s" \
+                             % (ctrl, e))
+                return False
+
+        return True
 
 
     # --------------------------------------------------------------------------
     #
     def _create_master_entry (self, url, session, prompt, logger, posix,
             interactive) :
-        # FIXME: cache 'which' results, etc
         # FIXME: check 'which' results
 
         with self.rlock :
@@ -482,6 +648,8 @@ class PTYShellFactory (object) :
             info['ssh_copy_mode']  = session_cfg['ssh_copy_mode'].get_value ()
             info['ssh_share_mode'] = session_cfg['ssh_share_mode'].get_value ()
             info['ssh_timeout']    = session_cfg['ssh_timeout'].get_value ()
+            info['ssh_ctrl_dir']   = session_cfg['ssh_ctrl_dir'].get_value ()
+            info['ssh_persist']    = session_cfg['ssh_persist'].get_value ()
 
             logger.info ("ssh copy  mode set to '%s'" % info['ssh_copy_mode' ])
             logger.info ("ssh share mode set to '%s'" % info['ssh_share_mode'])
@@ -561,9 +729,6 @@ class PTYShellFactory (object) :
             try :
                 info['latency'] = sumisc.get_host_latency (url)
 
-                # FIXME: note that get_host_latency is considered broken (see
-                # saga/utils/misc.py line 73), and will return a constant 250ms.
-
             except Exception  as e :
                 info['latency'] = 1.0  # generic value assuming slow link
                 info['logger'].warning ("Could not contact host '%s': %s" % (url, e))
@@ -652,26 +817,31 @@ class PTYShellFactory (object) :
                 if url.username   :  info['user'] = url.username
                 if url.password   :  info['pass'] = url.password
 
-                ctrl_user = pwd.getpwuid (os.getuid ()).pw_name
-                ctrl_base = "/tmp/saga_ssh_%s" % ctrl_user
-
-
                 if  'user' in info and info['user'] :
                     info['host_str'] = "%s@%s"  % (info['user'], info['host_str'])
-                    info['ctrl'] = "%s_%%h_%%p.%s.ctrl" % (ctrl_base, info['user'])
                 else :
                     info['user'] = getpass.getuser ()
-                    info['ctrl'] = "%s_%%h_%%p.ctrl" % (ctrl_base)
 
-                info['m_flags']  = _SSH_FLAGS_MASTER % ({'share_mode' : info['share_mode'],
-                                                         'ctrl'       : info['ctrl'],
-                                                         'connect_timeout': info['ssh_connect_timeout']})
-                info['s_flags']  = _SSH_FLAGS_SLAVE  % ({'share_mode' : info['share_mode'],
-                                                         'ctrl'       : info['ctrl'],
-                                                         'connect_timeout': info['ssh_connect_timeout']})
+                # the control socket is shared by all processes which connect
+                # to the same host, port and user, with the same security
+                # context (which shows in the ssh arguments and environment).
+                ctrl_dir = None
+                if  info['share_mode'] != 'no' :
+                    ctrl_dir = self._ctrl_dir (info['ssh_ctrl_dir'], logger)
+
+                if  ctrl_dir :
+                    ctrl_id = hashlib.md5 ("%s %s %s %s" % (info['ssh_exe'], 
+                                           info['host_str'], info['ssh_args'],
+                                           info['ssh_env'])).hexdigest ()[:16]
+                    info['ctrl']    = "%s/%s.ctrl" % (ctrl_dir, ctrl_id)
+                    info['persist'] = self._ssh_persist_flag (info, info['ssh_persist'])
+                else :
+                    # no place for sockets we can trust: don't share
+                    info['share_mode'] = 'no'
+                    info['ctrl']       = 'none'
+                    info['persist']    = ''
 
-                logger.debug('SSH Connection M_FLAGS: %s' % info['m_flags'])
-                logger.debug('SSH Connection S_FLAGS: %s' % info['s_flags'])
+                self._ssh_flags (info)
                 
                 # we want the userauth and hostname parts of the URL, to get the
                 # scp-scope fs root.
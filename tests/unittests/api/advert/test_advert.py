@@ -1,12 +1,29 @@
 
+import os
+import time
+import tempfile
+
 import saga
 import saga.utils.test_config as sutc
 
-import radical.utils as ru
+import radical.utils.testing  as testing
 
 
 check = False
 
+# ------------------------------------------------------------------------------
+#
+def advert_url (tc, path) :
+    """ the configured advert url, with the given path (keeps the query) """
+
+    base      = saga.Url (tc.advert_url)
+    url       = saga.Url (tc.advert_url)
+    url.path  = path
+    url.query = base.query
+
+    return url
+
+
 # ------------------------------------------------------------------------------
 #
 
@@ -28,9 +45,9 @@ def test_advert_callback () :
     try :
         global check
 
-        tc = ru.get_test_config ()
+        tc = testing.get_test_config ()
         
-        d_1 = saga.advert.Directory (tc.advert_url + '/tmp/test1/test1/',
+        d_1 = saga.advert.Directory (advert_url (tc, '/tmp/test1/test1/'),
                                      saga.advert.CREATE | saga.advert.CREATE_PARENTS)
 
         d_1.set_attribute ('foo', 'bar')
@@ -50,6 +67,136 @@ def test_advert_callback () :
     
 
 
+# ------------------------------------------------------------------------------
+#
+def test_advert_find () :
+
+    try :
+        tc = testing.get_test_config ()
+
+        d_1 = saga.advert.Directory (advert_url (tc, '/tmp/test1/find/'),
+                                     saga.advert.CREATE | saga.advert.CREATE_PARENTS)
+
+        e_1 = d_1.open     ('e_1',     saga.advert.CREATE)
+        d_2 = d_1.open_dir ('d_2',     saga.advert.CREATE)
+        e_2 = d_2.open     ('e_2',     saga.advert.CREATE)
+
+        e_1.set_attribute ('color', 'red')
+        e_2.set_attribute ('color', 'blue')
+
+        names = [str(u).rstrip ('/').split ('/')[-1] for u in d_1.list ()]
+        assert sorted (names) == ['d_2', 'e_1'], names
+
+        names = [saga.Url (u).path.split ('/')[-1]
+                 for u in d_1.find ('*', ['color=b*'])]
+        assert names == ['e_2'], names
+
+        assert     d_1.is_dir ('d_2')
+        assert not d_1.is_dir ('e_1')
+
+    except saga.NotImplemented as ni:
+            assert tc.notimpl_warn_only, "%s " % ni
+            if tc.notimpl_warn_only:
+                print "%s " % ni
+    except saga.SagaException as se:
+        assert False, "Unexpected exception: %s" % se
+
+
+# ------------------------------------------------------------------------------
+#
+def test_advert_sqlite_db () :
+
+    tc = testing.get_test_config ()
+
+    if  saga.Url (tc.advert_url).scheme != 'sqlite' :
+        return
+
+    fd, dbpath = tempfile.mkstemp (suffix='.db')
+    os.close (fd)
+
+    try :
+        # directories and entries honor the database given in the url query,
+        # also for the entries they open
+        url = saga.Url ('sqlite://localhost/tmp/test1/db/?db=%s' % dbpath)
+        d_1 = saga.advert.Directory (url, saga.advert.CREATE | 
+                                          saga.advert.CREATE_PARENTS)
+        e_1 = d_1.open ('e_1', saga.advert.CREATE)
+        e_1.set_attribute ('color', 'red')
+
+        assert dbpath in str(d_1.get_url ()), d_1.get_url ()
+        assert dbpath in str(e_1.get_url ()), e_1.get_url ()
+
+        url = saga.Url ('sqlite://localhost/tmp/test1/db/e_1?db=%s' % dbpath)
+        e_2 = saga.advert.Entry (url)
+        assert e_2.list_attributes () == ['color'], e_2.list_attributes ()
+        assert e_2.get_attribute   ('color') == 'red'
+
+        # the entry does not exist in any other database
+        fd, other = tempfile.mkstemp (suffix='.db')
+        os.close (fd)
+
+        try :
+            url = saga.Url ('sqlite://localhost/tmp/test1/db/?db=%s' % other)
+            d_2 = saga.advert.Directory (url, saga.advert.CREATE | 
+                                              saga.advert.CREATE_PARENTS)
+            assert not d_2.list (), d_2.list ()
+        finally :
+            os.unlink (other)
+
+    except saga.SagaException as se:
+        assert False, "Unexpected exception: %s" % se
+
+    finally :
+        os.unlink (dbpath)
+
+
+
+# ------------------------------------------------------------------------------
+#
+def test_advert_sqlite_events () :
+
+    tc = testing.get_test_config ()
+
+    if  saga.Url (tc.advert_url).scheme != 'sqlite' :
+        return
+
+    import saga.adaptors.sqlite.sqlite_namespace as sns
+
+    fd, dbpath = tempfile.mkstemp (suffix='.db')
+    os.close (fd)
+
+    db = sns.get_db (dbpath)
+
+    try :
+        # writers prune old events, even if nobody lists or finds entries
+        e = sns.sqlite_ns_entry.open (db, '/tmp/events/e', 
+                                      sns.CREATE | sns.CREATE_PARENTS)
+        e.set_key ('color', 'red')
+        e.set_key ('color', 'blue')
+
+        count = lambda : db.query ('SELECT COUNT(*) FROM events')[0][0]
+        assert count () == 2, count ()
+
+        with db.transaction () as conn :
+            conn.execute ('UPDATE events SET time = time - ?',
+                          (2 * sns.EVENT_RETENTION,))
+
+        # pruning is throttled
+        db.last_prune = time.time ()
+        e.set_key ('color', 'green')
+        assert count () == 3, count ()
+
+        db.last_prune = 0.0
+        e.set_key ('color', 'yellow')
+        assert count () == 2, count ()
+        assert e.get_key ('color') == 'yellow'
+
+    finally :
+        sns.release_db (db)
+        os.unlink (dbpath)
+
+
+
 
 
 test_advert_callback ()
@@ -0,0 +1,710 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Tests for the redis namespace of the redis advert adaptor.  Most of them
+only run against a redis advert url (see configs/advert_redis_localhost.cfg),
+and are skipped otherwise -- the client side parts are also tested against
+stubs.
+"""
+
+import time
+import uuid
+import threading
+
+from   unittest import SkipTest
+
+import saga
+
+import radical.utils.testing  as testing
+
+
+# ------------------------------------------------------------------------------
+#
+def _redis () :
+    """
+    Returns the redis namespace module, a shared server instance, and a fresh
+    base path -- skips the test if it doesn't run against redis.
+    """
+
+    tc  = testing.get_test_config ()
+    url = saga.Url (tc.advert_url)
+
+    if  url.scheme != 'redis' :
+        raise SkipTest ("no redis advert url configured")
+
+    rns  = _import ('redis_namespace')
+    r    = rns.get_server (url)
+    base = '/tmp/test_redis/%s' % uuid.uuid4 ().hex
+
+    return rns, r, base
+
+
+# ------------------------------------------------------------------------------
+#
+def _import (name) :
+    """
+    Returns the given redis adaptor module -- skips the test if the redis
+    client module is not installed.
+    """
+
+    try :
+        return __import__ ('saga.adaptors.redis.%s' % name, fromlist=[name])
+    except ImportError as e :
+        raise SkipTest ("redis adaptor not usable: %s" % e)
+
+
+# ------------------------------------------------------------------------------
+#
+class _Listener (object) :
+    """ collects the attribute updates of callbacks """
+
+    _UP = '_up'
+
+    def __init__ (self) :
+        self.updates = list()
+
+    def set_attribute (self, key, val, flow) :
+        self.updates.append ((key, val))
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_find () :
+    """ Test attribute index lookups of find() """
+
+    rns, r, base = _redis ()
+
+    try :
+        flags = saga.advert.CREATE | saga.advert.CREATE_PARENTS
+
+        d   = rns.redis_ns_entry.opendir (r, base,            flags)
+        e_1 = rns.redis_ns_entry.open    (r, base+'/e_1',     flags)
+        e_2 = rns.redis_ns_entry.open    (r, base+'/sub/e_2', flags)
+        e_3 = rns.redis_ns_entry.open    (r, base+'/e_3',     flags)
+
+        e_1.set_keys ({'color' : 'red',  'size' : 'big'  })
+        e_2.set_keys ({'color' : 'blue', 'size' : 'small'})
+        e_3.set_keys ({'shape' : 'round'})
+
+        # exact values use the attr index
+        assert sorted (d.find (None, ['color=red']))  == [base+'/e_1']
+        assert sorted (d.find (None, 'color=blue'))   == [base+'/sub/e_2']
+        assert sorted (d.find (None, ['color=green'])) == []
+
+        # multiple patterns intersect
+        assert d.find (None, ['color=red', 'size=big'])   == [base+'/e_1']
+        assert d.find (None, ['color=red', 'size=small']) == []
+
+        # key only, and wildcard values
+        assert sorted (d.find (None, ['color']))   == [base+'/e_1', base+'/sub/e_2']
+        assert sorted (d.find (None, ['color=*'])) == [base+'/e_1', base+'/sub/e_2']
+        assert sorted (d.find (None, ['color=b*'])) == [base+'/sub/e_2']
+        assert sorted (d.find (None, ['size=?ig'])) == [base+'/e_1']
+
+        # name patterns, and non-recursive lookups
+        assert sorted (d.find ('e_*', ['color'])) == [base+'/e_1', base+'/sub/e_2']
+        assert sorted (d.find ('*_3'))            == [base+'/e_3']
+        assert sorted (d.find (None, ['color'], recursive=False)) == [base+'/e_1']
+
+        # updated values leave the old index entries
+        e_1.set_keys ({'color' : 'green'})
+        assert d.find (None, ['color=red'])   == []
+        assert d.find (None, ['color=green']) == [base+'/e_1']
+
+    finally :
+        rns.release_server (r)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_list_recursive () :
+    """ Test server side recursive listings """
+
+    rns, r, base = _redis ()
+
+    try :
+        flags = saga.advert.CREATE | saga.advert.CREATE_PARENTS
+
+        d = rns.redis_ns_entry.opendir (r, base, flags)
+
+        rns.redis_ns_entry.open (r, base+'/e_1',       flags)
+        rns.redis_ns_entry.open (r, base+'/a/e_2',     flags)
+        rns.redis_ns_entry.open (r, base+'/a/b/c/e_3', flags)
+
+        assert sorted (d.list ()) == [base+'/a', base+'/e_1']
+
+        assert sorted (d.list (recursive=True)) == \
+               sorted ([base+'/e_1', base+'/a', base+'/a/e_2', base+'/a/b',
+                        base+'/a/b/c', base+'/a/b/c/e_3'])
+
+        # an empty directory has no descendants
+        e = rns.redis_ns_entry.opendir (r, base+'/empty', flags)
+        assert e.list (recursive=True) == []
+
+    finally :
+        rns.release_server (r)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_events () :
+    """ Test batching and parsing of monitor events """
+
+    rns, r, base = _redis ()
+
+    try :
+        flags = saga.advert.CREATE | saga.advert.CREATE_PARENTS
+
+        e = rns.redis_ns_entry.open (r, base+'/e_1', flags)
+        e.fetch ()
+
+        listener = _Listener ()
+        e.manage_callback ('foo', 1, lambda *args : True, listener)
+        e.manage_callback ('bar', 2, lambda *args : True, listener)
+
+        def msg (data) :
+            return {'type' : 'message', 'channel' : rns.MON, 'data' : data}
+
+        path = e.path
+        r.monitor._handle ([
+            {'type' : 'subscribe', 'channel' : rns.MON, 'data' : 1},
+            msg ('ATTRIBUTE %s [foo=1]'  % path),
+            msg ('ATTRIBUTE %s [foo=2]'  % path),
+            msg ('ATTRIBUTES %s [{"foo": "3", "bar": "x"}]' % path),
+            msg ('ATTRIBUTE %s [baz=1]'  % path),    # no callback
+            msg ('ATTRIBUTE %s [foo]'    % path),    # no value
+            msg ('ATTRIBUTES %s [{foo]'  % path),    # no json
+            msg ('ATTRIBUTE %s foo=4'    % path),    # no brackets
+            msg ('garbage'),
+        ])
+
+        # one update per key, with the last value
+        assert sorted (listener.updates) == [('bar', 'x'), ('foo', '3')], \
+               listener.updates
+
+        # our own invalidations are ignored, others drop the cached entry
+        r.monitor._handle ([msg ('INVALIDATE %s [%s]' % (path, r.id))])
+        assert r.cache.get (rns.NODE+':'+path)
+
+        r.monitor._handle ([msg ('INVALIDATE %s [other]' % path),
+                            msg ('INVALIDATE %s [other]' % path)])
+        try :
+            r.cache.get (rns.NODE+':'+path)
+            assert False, "expected cache miss"
+        except AttributeError :
+            pass
+
+        # a failing callback does not affect the others
+        class _Broken (_Listener) :
+            def set_attribute (self, key, val, flow) :
+                raise RuntimeError ("broken callback")
+
+        e.manage_callback ('foo', 3, lambda *args : True, _Broken ())
+        listener.updates = list()
+        r.monitor._handle ([msg ('ATTRIBUTE %s [foo=5]' % path)])
+        assert listener.updates == [('foo', '5')], listener.updates
+        assert r.monitor.is_alive ()
+
+        e.manage_callback ('foo', None, None, None)
+        e.manage_callback ('bar', None, None, None)
+        assert path not in r.callbacks
+
+    finally :
+        rns.release_server (r)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_ttl () :
+    """ Test cleanup of expired entries """
+
+    rns, r, base = _redis ()
+
+    try :
+        flags = saga.advert.CREATE | saga.advert.CREATE_PARENTS
+
+        d   = rns.redis_ns_entry.opendir (r, base,        flags)
+        e_1 = rns.redis_ns_entry.open    (r, base+'/e_1', flags)
+        e_2 = rns.redis_ns_entry.open    (r, base+'/e_2', flags)
+
+        e_1.set_keys ({'color' : 'red'})
+        e_2.set_keys ({'color' : 'red'})
+
+        e_1.set_ttl (1)
+        assert 0 <= e_1.get_ttl () <= 1
+        assert e_2.get_ttl () == -1
+
+        # removing the ttl again keeps the entry
+        e_2.set_ttl (1)
+        e_2.set_ttl (-1)
+        assert e_2.get_ttl () == -1
+
+        time.sleep (1.5)
+
+        assert r.cleanup (force=True) >= 1
+
+        # the expired entry is gone from the listing and the indexes
+        assert d.list ()                         == [base+'/e_2'], d.list ()
+        assert d.find (None, ['color=red'])      == [base+'/e_2']
+        assert not r.sismember (rns.KEYS+':color', base+'/e_1')
+        assert not r.exists    (rns.INDX+':'+base+'/e_1')
+
+        try :
+            rns.redis_ns_entry.open (r, base+'/e_1', 0)
+            assert False, "expected BadParameter"
+        except saga.BadParameter :
+            pass
+
+    finally :
+        rns.release_server (r)
+
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_ttl_subtree () :
+    """ Test cleanup below expired directories, and re-created entries """
+
+    rns, r, base = _redis ()
+
+    try :
+        flags = saga.advert.CREATE | saga.advert.CREATE_PARENTS
+
+        d   = rns.redis_ns_entry.opendir (r, base,              flags)
+        sub = rns.redis_ns_entry.opendir (r, base+'/sub',       flags)
+        e_1 = rns.redis_ns_entry.open    (r, base+'/sub/a/e_1', flags)
+        e_2 = rns.redis_ns_entry.open    (r, base+'/e_2',       flags)
+
+        e_1.set_keys ({'color' : 'red'})
+        e_2.set_keys ({'color' : 'red'})
+
+        sub.set_ttl (1)
+        e_2.set_ttl (1)
+
+        time.sleep (1.5)
+
+        # e_2 is re-created before the cleanup ran: the new entry survives
+        e_2 = rns.redis_ns_entry.open (r, base+'/e_2', flags)
+        e_2.set_keys ({'shape' : 'round'})
+
+        r.cleanup (force=True)
+
+        # everything below the expired directory is gone
+        assert d.list ()                    == [base+'/e_2'], d.list ()
+        assert d.list (recursive=True)      == [base+'/e_2']
+        assert d.find (None, ['color=red']) == []
+        assert d.find (None, ['shape'])     == [base+'/e_2']
+        assert not r.exists (rns.NODE+':'+base+'/sub/a/e_1')
+        assert not r.exists (rns.KIDS+':'+base+'/sub')
+        assert e_2.get_ttl () == -1
+
+    finally :
+        rns.release_server (r)
+
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_write_delay () :
+    """ Test that failed delayed writes are kept and reported """
+
+    rns, r, base = _redis ()
+    delay = r.write_delay
+
+    try :
+        flags = saga.advert.CREATE | saga.advert.CREATE_PARENTS
+
+        r.write_delay = 0.1
+
+        e = rns.redis_ns_entry.open (r, base+'/e_1', flags)
+
+        def fail (updates) :
+            raise saga.NoSuccess ("write failed")
+
+        e.set_keys = fail
+        e.set_key ('color', 'red')
+        time.sleep (0.5)
+
+        # the write failed in the timer thread, but is not lost
+        assert e.pending == {'color' : 'red'}, e.pending
+
+        try :
+            e.fetch ()
+            assert False, "expected NoSuccess"
+        except saga.NoSuccess :
+            pass
+
+        e.set_key ('color', 'blue')
+        del e.set_keys
+        e.flush ()
+
+        assert not e.pending
+        assert e.get_key ('color') == 'blue'
+
+    finally :
+        r.write_delay = delay
+        rns.release_server (r)
+
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_closed () :
+    """ Test that closed adverts don't use the released server anymore """
+
+    ra = _import ('redis_advert')
+
+    class _Entry (object) :
+        flushed = 0
+        dropped = list()
+        def flush (self) :
+            _Entry.flushed += 1
+        def drop_callbacks (self, obj) :
+            _Entry.dropped.append (obj)
+
+    class _Adaptor (object) :
+        released = list()
+        def release_redis (self, r) :
+            self.released.append (r)
+
+    class _Api (object) :
+        pass
+
+    api     = _Api ()
+    adaptor = _Adaptor ()
+
+    d = ra.RedisDirectory (api, adaptor)
+    d._url, d._r, d._nsdir = saga.Url ('redis://localhost/tmp/'), 'r_1', _Entry ()
+
+    e = ra.RedisEntry (api, adaptor)
+    e._url, e._r, e._nsentry = saga.Url ('redis://localhost/tmp/e'), 'r_2', _Entry ()
+
+    d.close ()
+    e.close ()
+
+    # callbacks are dropped, pending updates are written, and the servers
+    # are released once
+    assert _Entry.dropped    == [api, api]
+    assert _Entry.flushed    == 2
+    assert adaptor.released  == ['r_1', 'r_2']
+    assert d._nsdir   is None
+    assert e._nsentry is None
+
+    for call in [lambda : d.list (None, 0),
+                 lambda : d.is_dir ('foo'),
+                 lambda : d.attribute_getter ('foo'),
+                 lambda : d.get_ttl ('foo'),
+                 lambda : d.find_adverts ('*', None, None, 0),
+                 lambda : e.attribute_setter ('foo', 'bar'),
+                 lambda : e.get_ttl ()] :
+        try :
+            call ()
+            assert False, "expected IncorrectState"
+        except saga.IncorrectState :
+            pass
+
+    # closing again (and garbage collection) don't release again
+    d.close ()
+    e.finalize ()
+    assert adaptor.released == ['r_1', 'r_2']
+
+
+# ------------------------------------------------------------------------------
+#
+class _Logger (object) :
+    """ swallows log messages """
+
+    def _log (self, *args) :
+        pass
+
+    debug = info = warn = warning = error = critical = _log
+
+
+# ------------------------------------------------------------------------------
+#
+class _Server (object) :
+    """
+    stands in for a redis_ns_server, for the parts of the namespace which
+    don't talk to redis
+    """
+
+    def __init__ (self, write_delay=0.0) :
+
+        import saga.adaptors.redis.redis_cache as rc
+
+        self.id          = 'me'
+        self.logger      = _Logger ()
+        self.cache       = rc.Cache (logger=self.logger, ttl=60.0)
+        self.callbacks   = dict()
+        self.cb_lock     = threading.RLock ()
+        self.write_delay = write_delay
+        self.closed      = False
+        self.invalid     = list()
+        self.channels    = list()
+
+    def invalidate (self, path) :
+        self.invalid.append (path)
+
+    def subscribe (self, path) :
+        self.channels.append (path)
+
+    def unsubscribe (self, path) :
+        self.channels.remove (path)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_cache_epoch () :
+    """ Test that cache fills which raced with invalidations are dropped """
+
+    import saga.adaptors.redis.redis_cache as rc
+
+    cache = rc.Cache (logger=_Logger (), ttl=60.0)
+
+    try :
+        cache.get ('foo')
+        assert False, "expected cache miss"
+    except AttributeError :
+        pass
+
+    # a fill without concurrent invalidations is cached
+    epoch = cache.epoch
+    cache.set ('foo', 1, epoch)
+    assert cache.get ('foo') == 1
+
+    # an invalidation drops the entry, and bumps the epoch
+    cache.invalidate ('foo')
+    assert cache.epoch == epoch + 1
+
+    try :
+        cache.get ('foo')
+        assert False, "expected cache miss"
+    except AttributeError :
+        pass
+
+    # a fill which started before the invalidation is stale
+    cache.set ('foo', 2, epoch)
+    try :
+        cache.get ('foo')
+        assert False, "expected cache miss"
+    except AttributeError :
+        pass
+
+    # invalidating other keys also drops stale fills
+    epoch = cache.epoch
+    cache.invalidate ('bar')
+    cache.set ('foo', 3, epoch)
+    try :
+        cache.get ('foo')
+        assert False, "expected cache miss"
+    except AttributeError :
+        pass
+
+    # fills without epoch are always cached, until the cache is flushed
+    cache.set ('foo', 4)
+    assert cache.get ('foo') == 4
+
+    epoch = cache.epoch
+    cache.flush ()
+    assert cache.epoch == epoch + 1
+    try :
+        cache.get ('foo')
+        assert False, "expected cache miss"
+    except AttributeError :
+        pass
+
+    # ttls can shorten the lifetime of entries
+    cache.set ('foo', 5, cache.epoch, ttl=0.1)
+    assert cache.get ('foo') == 5
+    time.sleep (0.2)
+    try :
+        cache.get ('foo')
+        assert False, "expected cache miss"
+    except AttributeError :
+        pass
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_monitor_batch () :
+    """ Test batching of monitor events, and callback isolation """
+
+    rns = _import ('redis_namespace')
+
+    r       = _Server ()
+    monitor = rns.redis_ns_monitor (r, None)
+
+    class _Broken (_Listener) :
+        def set_attribute (self, key, val, flow) :
+            raise RuntimeError ("broken callback")
+
+    ok     = _Listener ()
+    broken = _Broken ()
+
+    r.callbacks['/a'] = {'foo' : {1 : [None, broken], 2 : [None, ok]},
+                         'bar' : {3 : [None, ok]}}
+
+    def msg (path, data) :
+        return {'type'    : 'message',
+                'channel' : rns.redis_ns_channel (path),
+                'data'    : data}
+
+    monitor._handle ([
+        {'type' : 'subscribe', 'channel' : rns.MON, 'data' : 1},
+        msg ('/a', 'ATTRIBUTE /a [foo=1]'),
+        msg ('/a', 'ATTRIBUTE /a [foo=2]'),
+        msg ('/a', 'ATTRIBUTES /a [{"foo": "3", "bar": "x"}]'),
+        msg ('/b', 'ATTRIBUTE /b [foo=1]'),     # no callback
+        msg ('/a', 'ATTRIBUTE /a [foo]'),       # no value
+        msg ('/a', 'ATTRIBUTES /a [{foo]'),     # no json
+        msg ('/a', 'ATTRIBUTE /a foo=4'),       # no brackets
+        msg ('/a', 'garbage'),
+        {'type' : 'message', 'channel' : rns.MON, 'data' : None},
+        msg ('/', 'INVALIDATE /a [me]'),        # our own
+        msg ('/', 'INVALIDATE /a [other]'),
+        msg ('/', 'INVALIDATE /a [other]'),
+        msg ('/', 'INVALIDATE /b [other]'),
+    ])
+
+    # one callback per key, with the last value -- the broken callback does
+    # not affect the others
+    assert sorted (ok.updates) == [('bar', 'x'), ('foo', '3')], ok.updates
+
+    # one invalidation per path, none for our own events
+    assert sorted (r.invalid) == ['/a', '/b'], r.invalid
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_monitor_work () :
+    """ Test that the monitor drains queued events into one batch """
+
+    rns = _import ('redis_namespace')
+
+    class _PubSub (object) :
+
+        def __init__ (self, first, queued) :
+            self.first  = first
+            self.queued = queued
+
+        def listen (self) :
+            for info in self.first :
+                yield info
+
+        def get_message (self) :
+            if  self.queued :
+                return self.queued.pop (0)
+            return None
+
+    def msg (data) :
+        return {'type' : 'message', 'channel' : rns.MON, 'data' : data}
+
+    batches = list()
+
+    class _Monitor (rns.redis_ns_monitor) :
+        def _handle (self, batch) :
+            batches.append (batch)
+
+    first  = [msg ('INVALIDATE /a [x]'), msg ('INVALIDATE /c [x]')]
+    queued = [msg ('INVALIDATE /b [x]')] * (rns.MON_BATCH + 1)
+
+    monitor = _Monitor (_Server (), _PubSub (first, queued))
+    monitor.work ()
+
+    # the first batch is limited in size, the second one takes the rest --
+    # the monitor stops once the subscriptions are gone
+    assert len (batches)    == 2, len (batches)
+    assert len (batches[0]) == rns.MON_BATCH
+    assert len (batches[1]) == 3
+    assert batches[0][0]['data'] == 'INVALIDATE /a [x]'
+    assert batches[1][0]['data'] == 'INVALIDATE /c [x]'
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_drop_callbacks () :
+    """ Test that callbacks are dropped per object """
+
+    rns = _import ('redis_namespace')
+
+    r   = _Server ()
+    one = _Listener ()
+    two = _Listener ()
+
+    e1  = rns.redis_ns_entry (r, '/a')
+    e2  = rns.redis_ns_entry (r, '/a')
+
+    e1.manage_callback ('color', 0, 'cb_1', one)
+    e1.manage_callback ('size',  1, 'cb_2', one)
+    e2.manage_callback ('color', 0, 'cb_3', two)
+
+    assert r.channels == ['/a'], r.channels
+
+    # the other object's callbacks survive, even if the ids are the same
+    e1.drop_callbacks (one)
+    assert r.callbacks == {'/a' : {'color' : {0 : ['cb_3', two]}}}, r.callbacks
+    assert r.channels  == ['/a'], r.channels
+
+    # dropping twice is fine, and the last callback unsubscribes
+    e1.drop_callbacks (one)
+    e2.drop_callbacks (two)
+    assert r.callbacks == dict(), r.callbacks
+    assert r.channels  == list(), r.channels
+
+    e2.drop_callbacks (two)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_redis_flush () :
+    """ Test that failed flushes keep the buffered updates """
+
+    rns = _import ('redis_namespace')
+
+    # the timer does not fire during the test
+    r = _Server (write_delay=60.0)
+    e = rns.redis_ns_entry (r, '/a')
+
+    written = list()
+
+    def fail (updates) :
+        raise saga.NoSuccess ("write failed")
+
+    e.set_keys = fail
+    e.set_key ('color', 'red')
+    e.set_key ('size',  'big')
+
+    assert e.timer
+    assert e.pending == {'color' : 'red', 'size' : 'big'}, e.pending
+
+    try :
+        e.flush ()
+        assert False, "expected NoSuccess"
+    except saga.NoSuccess :
+        pass
+
+    # the updates are kept, newer updates win
+    assert e.pending == {'color' : 'red', 'size' : 'big'}, e.pending
+    assert not e.timer
+
+    e.set_key ('color', 'blue')
+    e.timer.cancel ()
+
+    e.set_keys = written.append
+    e.flush ()
+
+    assert written   == [{'color' : 'blue', 'size' : 'big'}], written
+    assert e.pending == dict()
+
+    # nothing to write, nothing written
+    e.flush ()
+    assert len (written) == 1
+
+    # errors of the timer thread are logged, and the updates kept
+    e.set_keys = fail
+    e.pending  = {'color' : 'green'}
+    e._delayed_flush ()
+    assert e.pending == {'color' : 'green'}, e.pending
@@ -6,6 +6,8 @@ __license__   = "MIT"
 
 import os
 import saga
+import shutil
+import tempfile
 import unittest
 
 from copy import deepcopy
@@ -206,3 +208,129 @@ class TestFile(unittest.TestCase):
 
         except saga.SagaException as ex:
             assert False, "Unexpected exception: %s" % ex
+
+    # -------------------------------------------------------------------------
+    #
+    def test_file_move(self):
+        """ Testing if we can move an existing file.
+        """
+        try:
+            tc = testing.get_test_config ()
+            filename1 = deepcopy(saga.Url(tc.filesystem_url))
+            filename1.path += "/%s" % self.uniquefilename1
+            f1 = saga.filesystem.File(filename1, saga.filesystem.CREATE)
+            f1.write("move me")
+
+            filename2 = deepcopy(saga.Url(tc.filesystem_url))
+            filename2.path += "/%s" % self.uniquefilename2
+
+            f1.move(filename2)
+            assert f1.url.path == filename2.path, f1.url
+
+            d = saga.filesystem.Directory(tc.filesystem_url)
+            assert not d.exists(self.uniquefilename1)
+            assert     d.exists(self.uniquefilename2)
+
+            f2 = saga.filesystem.File(filename2)
+            assert f2.size == len("move me")
+
+        except saga.SagaException as ex:
+            assert False, "Unexpected exception: %s" % ex
+
+    # -------------------------------------------------------------------------
+    #
+    def test_directory_move(self):
+        """ Testing if we can move directories (relative to their parent).
+        """
+        try:
+            tc = testing.get_test_config ()
+            d = saga.filesystem.Directory(tc.filesystem_url)
+
+            d1 = d.open_dir(self.uniquefilename1, saga.filesystem.CREATE)
+            d1.open("data", saga.filesystem.CREATE)
+
+            # a relative target is interpreted relative to the parent dir
+            d1.move(self.uniquefilename2)
+            assert d1.url.path.rstrip('/') == \
+                   os.path.join(d.url.path, self.uniquefilename2), d1.url
+
+            assert not d.exists(self.uniquefilename1)
+            assert     d.is_dir(self.uniquefilename2)
+            assert     d1.exists("data")
+
+            # moving an entry of a directory
+            d.move(self.uniquefilename2, self.uniquefilename1,
+                   saga.filesystem.RECURSIVE)
+            assert     d.is_dir(self.uniquefilename1)
+            assert not d.exists(self.uniquefilename2)
+
+        except saga.SagaException as ex:
+            assert False, "Unexpected exception: %s" % ex
+
+        finally:
+            try:
+                d.remove(self.uniquefilename1, saga.filesystem.RECURSIVE)
+                d.remove(self.uniquefilename2, saga.filesystem.RECURSIVE)
+            except saga.SagaException:
+                pass
+
+    # -------------------------------------------------------------------------
+    #
+    def test_directory_remove_self(self):
+        """ Testing if a removed directory can't be used anymore.
+        """
+        try:
+            tc = testing.get_test_config ()
+            d = saga.filesystem.Directory(tc.filesystem_url)
+
+            d1 = d.open_dir(self.uniquefilename1, saga.filesystem.CREATE)
+            d1.remove(flags=saga.filesystem.RECURSIVE)
+
+            assert not d.exists(self.uniquefilename1)
+
+            d1.list()
+            assert False, "Expected IncorrectState exception but got none."
+
+        except saga.IncorrectState:
+            assert True
+        except saga.SagaException as ex:
+            assert False, "Unexpected exception: %s" % ex
+
+    # -------------------------------------------------------------------------
+    #
+    def test_directory_list_flags(self):
+        """ Testing recursive and dereferencing listings of local directories.
+        """
+        tmp = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(tmp, "a", "b"))
+            os.makedirs(os.path.join(tmp, "c", ".hidden"))
+            for name in ["x.txt", "a/y.txt", "a/b/z.dat", "c/.hidden/h.txt"]:
+                open(os.path.join(tmp, name), "w").close()
+            os.symlink(os.path.join(tmp, "a"), os.path.join(tmp, "l"))
+
+            d = saga.filesystem.Directory("file://localhost%s" % tmp)
+
+            assert [str(u) for u in d.list()] == ["a", "c", "l", "x.txt"]
+
+            assert [str(u) for u in d.list(flags=saga.filesystem.RECURSIVE)] \
+                == ["a", "a/b", "a/b/z.dat", "a/y.txt", "c", "l", "x.txt"]
+
+            # symlinked directories are only followed with DEREFERENCE
+            assert [str(u) for u in d.list("*.txt", saga.filesystem.RECURSIVE)] \
+                == ["a/y.txt", "x.txt"]
+            assert [str(u) for u in d.list("*.txt", saga.filesystem.RECURSIVE
+                                                  | saga.filesystem.DEREFERENCE)] \
+                == ["a/y.txt", "l/y.txt", "x.txt"]
+
+            try:
+                d.list(flags=saga.filesystem.OVERWRITE)
+                assert False, "Expected BadParameter exception but got none."
+            except saga.BadParameter:
+                pass
+
+        except saga.SagaException as ex:
+            assert False, "Unexpected exception: %s" % ex
+
+        finally:
+            shutil.rmtree(tmp)
@@ -3,7 +3,9 @@ __author__    = "Andre Merzky, Ole Weidner"
 __copyright__ = "Copyright 2013, The SAGA Project"
 __license__   = "MIT"
 
+import os
 import time
+import pickle
 import saga
 
 import radical.utils.testing  as testing
@@ -503,6 +505,129 @@ def test_get_id():
         _silent_close_js(js)
 
 
+# ------------------------------------------------------------------------------
+#
+def test_pickle_job():
+    """ Test job handles passed to other processes via pickle
+    """
+    js  = None
+    js2 = None
+    j   = None
+    try:
+        tc = testing.get_test_config ()
+        js = saga.job.Service(tc.job_service_url, tc.session)
+        jd = saga.job.Description()
+        jd.executable = '/bin/sleep'
+        jd.arguments = ['60']
+
+        # add options from the test .cfg file if set
+        jd = sutc.add_tc_params_to_jd(tc=tc, jd=jd)
+
+        j = js.create_job(jd)
+        j.run()
+
+        # reconnecting can take a while, so the job may have finished by
+        # the time the state gets checked -- it must not be unknown though
+        known = [saga.job.RUNNING, saga.job.PENDING, saga.job.DONE]
+
+        j2 = pickle.loads(pickle.dumps(j))
+        assert j2.id == j.id, "%s == %s" % (j2.id, j.id)
+        assert j2.state in known, j2.state
+
+        # unpickled job services are shared with the unpickled jobs
+        js2 = pickle.loads(pickle.dumps(js))
+        assert str(js2.url) == str(js.url)
+        assert js2 is pickle.loads(pickle.dumps(js))
+
+        # a forked child reconnects on its own, without touching the pty
+        # processes of the parent
+        rfd, wfd = os.pipe()
+        pid = os.fork()
+        if not pid:
+            try:
+                os.close(rfd)
+                j3 = pickle.loads(pickle.dumps(j))
+                os.write(wfd, "%s %s" % (j3.id, j3.state))
+            finally:
+                os._exit(0)
+
+        os.close(wfd)
+        out = os.read(rfd, 1024)
+        os.close(rfd)
+        os.waitpid(pid, 0)
+
+        child_id, child_state = out.rsplit(' ', 1)
+        assert child_id == j.id, "%s == %s" % (child_id, j.id)
+        assert child_state in known, child_state
+        assert j.state in known, j.state
+
+    except saga.NotImplemented as ni:
+        assert tc.notimpl_warn_only, "%s " % ni
+        if tc.notimpl_warn_only:
+            print "%s " % ni
+    except saga.SagaException as se:
+        assert False, "Unexpected exception: %s" % se
+    finally:
+        _silent_cancel(j)
+        _silent_close_js(js2)
+        _silent_close_js(js)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_reconnect_job_array():
+    """ Test reconnecting to job arrays via their ID
+    """
+    js  = None
+    js2 = None
+    j   = None
+    try:
+        tc = testing.get_test_config ()
+        js = saga.job.Service(tc.job_service_url, tc.session)
+        jd = saga.job.Description()
+        jd.executable  = '/bin/sleep'
+        jd.arguments   = ['60']
+        jd.array_start = 2
+        jd.array_end   = 6
+        jd.array_step  = 2
+
+        # add options from the test .cfg file if set
+        jd = sutc.add_tc_params_to_jd(tc=tc, jd=jd)
+
+        j = js.create_job(jd)
+        j.run()
+
+        assert j.id in js.list(), "%s not in %s" % (j.id, js.list())
+
+        # a different service finds the array by its ID
+        js2 = saga.job.Service(tc.job_service_url, tc.session)
+        j2  = js2.get_job(j.id)
+        assert j2.id == j.id, "%s == %s" % (j2.id, j.id)
+        assert sorted(j2.get_array_states().keys()) == [2, 4, 6], \
+               j2.get_array_states()
+        assert j2.state in [saga.job.RUNNING, saga.job.PENDING], j2.state
+
+        handles = js2.get_jobs([j.id])
+        assert handles[0].state == j2.state, handles[0].state
+
+        j3 = pickle.loads(pickle.dumps(j))
+        assert j3.id == j.id, "%s == %s" % (j3.id, j.id)
+
+        j2.cancel()
+        assert j2.state == saga.job.CANCELED, j2.state
+
+    except saga.NotImplemented as ni:
+        assert tc.notimpl_warn_only, "%s " % ni
+        if tc.notimpl_warn_only:
+            print "%s " % ni
+    except saga.SagaException as se:
+        assert False, "Unexpected exception: %s" % se
+    finally:
+        _silent_cancel(j)
+        _silent_close_js(js)
+        _silent_close_js(js2)
+
+
 # if __name__ == '__main__' :
 # 
 #     def cb (obj, metric, ctx) :
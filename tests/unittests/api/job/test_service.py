@@ -4,6 +4,14 @@ __copyright__ = "Copyright 2013, The SAGA Project"
 __license__   = "MIT"
 
 
+import os
+import glob
+import shutil
+import hashlib
+import tempfile
+
+from   unittest import SkipTest
+
 import saga
 import radical.utils.testing  as testing
 import saga.utils.test_config as sutc
@@ -191,6 +199,181 @@ def test_get_job():
         _silent_close_js(js)
 
 
+# ------------------------------------------------------------------------------
+#
+def test_get_jobs():
+    """ Test to retrieve lightweight handles for several jobs """
+    j  = None
+    js = None
+    try:
+        tc = testing.get_test_config ()
+        js = saga.job.Service(tc.job_service_url, tc.session)
+
+        # create job service and job
+        jd = saga.job.Description()
+        jd.executable = '/bin/sleep'
+        jd.arguments = ['10']
+
+        # add options from the test .cfg file if set
+        jd = sutc.add_tc_params_to_jd(tc=tc, jd=jd)
+
+        j = js.create_job(jd)
+        j.run()
+
+        handles = js.get_jobs([j.id, j.id])
+        assert len(handles) == 2
+        assert handles[0].id == j.id
+        assert handles[0].state in [saga.job.RUNNING, saga.job.PENDING], \
+               handles[0].state
+
+        # full job objects are created on demand
+        assert handles[1].get_job().id == j.id
+        assert handles[1].get_job() is handles[1].get_job()
+
+        assert js.get_jobs([]) == []
+
+    except saga.NotImplemented as ni:
+        assert tc.notimpl_warn_only, "%s " % ni
+        if tc.notimpl_warn_only:
+            print "%s " % ni
+    except saga.SagaException as se:
+        assert False, "Unexpected exception: %s" % se
+    finally:
+        _silent_cancel(j)
+        _silent_close_js(js)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_get_poll_stats():
+    """ Test to retrieve the job state poll statistics of a service """
+    j  = None
+    js = None
+    try:
+        tc = testing.get_test_config ()
+        js = saga.job.Service(tc.job_service_url, tc.session)
+
+        # create job service and job
+        jd = saga.job.Description()
+        jd.executable = '/bin/sleep'
+        jd.arguments = ['10']
+
+        # add options from the test .cfg file if set
+        jd = sutc.add_tc_params_to_jd(tc=tc, jd=jd)
+
+        j = js.create_job(jd)
+        j.run()
+        j.get_state()
+
+        stats = js.get_poll_stats()
+
+        assert stats['queries'] >= 1, stats
+        assert stats['polls']   >= stats['queries'], stats
+        assert stats['rate']    >  0, stats
+
+    except saga.NotImplemented as ni:
+        assert tc.notimpl_warn_only, "%s " % ni
+        if tc.notimpl_warn_only:
+            print "%s " % ni
+    except saga.SagaException as se:
+        assert False, "Unexpected exception: %s" % se
+    finally:
+        _silent_cancel(j)
+        _silent_close_js(js)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_shell_wrapper_bootstrap():
+    """ Test installation and reuse of the shell adaptor's job wrapper """
+    tc = testing.get_test_config ()
+
+    if saga.Url(tc.job_service_url).scheme != 'fork':
+        raise SkipTest("wrapper bootstrap is checked on fork:// only")
+
+    import saga.adaptors.shell.shell_job as sj
+    import saga.utils.pty_shell          as sups
+
+    js       = None
+    adaptor  = None
+    orig     = None
+    tmp      = tempfile.mkdtemp()
+    base     = "%s/base" % tmp
+    installs = list()
+    probes   = list()
+
+    orig_install   = sj.ShellJobService._install_wrapper
+    orig_run_async = sups.PTYShell.run_async
+
+    def install(self, src, tgt):
+        installs.append(tgt)
+        return orig_install(self, src, tgt)
+
+    def run_async(self, command):
+        if sj._WRAPPER_MISSING in command:
+            probes.append(command)
+        return orig_run_async(self, command)
+
+    def service():
+        del probes[:]
+        js = saga.job.Service(tc.job_service_url, tc.session)
+        # both channels probe for the wrapper in a single round trip
+        assert len(probes) == 2, probes
+        return js
+
+    def wrappers():
+        return sorted(glob.glob("%s/wrapper.*" % base))
+
+    try:
+        js      = saga.job.Service(tc.job_service_url, tc.session)
+        adaptor = js._adaptor._adaptor
+        orig    = (adaptor.base_workdir, adaptor.purge_on_start)
+
+        sj.ShellJobService._install_wrapper = install
+        sups.PTYShell.run_async             = run_async
+        adaptor.base_workdir                = base
+        _silent_close_js(js)
+
+        # an empty base directory gets the wrapper installed
+        js = service()
+        assert len(installs) == 1, installs
+        assert wrappers() == installs, wrappers()
+
+        # the wrapper name contains the hash of its content, and no temporary
+        # copies are left over
+        name = os.path.basename(installs[0])
+        with open(installs[0]) as f:
+            md5 = hashlib.md5(f.read()).hexdigest()[:12]
+        assert name == "wrapper.%s.sh" % md5, name
+
+        j = js.run_job("/bin/true")
+        j.wait()
+        assert j.state == saga.job.DONE, j.state
+        _silent_close_js(js)
+
+        # reconnecting uses the installed wrapper
+        js = service()
+        assert len(installs) == 1, installs
+        _silent_close_js(js)
+
+        # a wrapper with different settings is installed next to it
+        adaptor.purge_on_start = not adaptor.purge_on_start
+        js = service()
+        assert len(installs) == 2, installs
+        assert installs[1] != installs[0]
+        assert wrappers() == sorted(installs), wrappers()
+
+    except saga.SagaException as se:
+        assert False, "Unexpected exception: %s" % se
+    finally:
+        sj.ShellJobService._install_wrapper = orig_install
+        sups.PTYShell.run_async             = orig_run_async
+        if orig:
+            adaptor.base_workdir, adaptor.purge_on_start = orig
+        _silent_close_js(js)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
 # ------------------------------------------------------------------------------
 #
 def helper_multiple_services(i):
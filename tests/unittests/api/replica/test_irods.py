@@ -0,0 +1,286 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Unit tests for the output parsers of the iRODS adaptor -- they run on
+sample output, and don't need an iRODS installation.
+"""
+
+import os
+import shutil
+import tempfile
+
+import saga
+import saga.utils.host_metrics as suhm
+
+import saga.adaptors.irods.irods_replica as sair
+
+
+ILS_L = """\
+/osg/home/azebro1:
+  azebro1           0 UFlorida-SSERCA_FTP            12 2012-11-14.09:55 & irods-test.txt
+        /data/cache/UFlorida-SSERCA_FTPplaceholder/home/azebro1/irods-test.txt    osgGridFtpGroup
+  azebro1           1 Nebraska_FTP                   12 2012-11-14.09:57   irods-test.txt
+        /data/cache/Nebraska_FTPplaceholder/home/azebro1/irods-test.txt    osgGridFtpGroup
+  azebro1           0 Nebraska_FTP                 4096 2012-11-15.10:01 & my file.dat
+        /data/cache/Nebraska_FTPplaceholder/home/azebro1/my file.dat    osgGridFtpGroup
+  C- /osg/home/azebro1/subdir
+"""
+
+ILSRESC_L = """\
+resource name:     BNL_ATLAS_2_FTP
+resc id:           16214
+zone:              osg
+type:              MSS universal driver
+class:             compound
+location:          gw014k1.fnal.gov
+vault:             /data/cache/BNL_ATLAS_2_FTPplaceholder
+free space:
+status:            up
+info:
+comment:
+create time:       01343055975: 2012-07-23.09:06:15
+modify time:       01347480717: 2012-09-12.14:11:57
+----
+resource name:     Nebraska_FTP
+resc id:           16215
+zone:              osg
+location:          red-gridftp.unl.edu
+status:            up
+----
+resource group:    osgGridFtpGroup
+Includes resource: BNL_ATLAS_2_FTP
+Includes resource: Nebraska_FTP
+-----
+"""
+
+
+# ------------------------------------------------------------------------------
+#
+class _Shell (object) :
+    """ returns canned output for all commands, and fails those which contain
+        the `fail` string """
+
+    def __init__ (self, out, ret=0, fail=None) :
+        self.out  = out
+        self.ret  = ret
+        self.fail = fail
+        self.cmds = list()
+
+    def run_sync (self, cmd) :
+        self.cmds.append (cmd)
+        if  self.fail and self.fail in cmd :
+            return 1, "failed", ""
+        return self.ret, self.out, ""
+
+    def finalize (self, kill_pty=False) :
+        pass
+
+
+# ------------------------------------------------------------------------------
+#
+def test_irods_parse_listing () :
+    """ Test parsing of 'ils -L' output """
+
+    entries = sair.irods_parse_listing (ILS_L)
+
+    assert entries.keys () == ['irods-test.txt', 'my file.dat',
+                               '/osg/home/azebro1/subdir'], entries.keys ()
+
+    # replicas are merged into one entry
+    e = entries['irods-test.txt']
+    assert e.locations    == ['UFlorida-SSERCA_FTP', 'Nebraska_FTP']
+    assert e.owner        == 'azebro1'
+    assert e.size         == '12'
+    assert e.date         == '2012-11-14.09:55'
+    assert not e.is_directory
+
+    e = entries['my file.dat']
+    assert e.locations    == ['Nebraska_FTP']
+    assert e.size         == '4096'
+
+    e = entries['/osg/home/azebro1/subdir']
+    assert e.is_directory
+
+    assert sair.irods_parse_listing ("")          == {}
+    assert sair.irods_parse_listing ("/osg/x:\n") == {}
+
+
+# ------------------------------------------------------------------------------
+#
+def test_irods_resource_listing () :
+    """ Test parsing of 'ilsresc -l' output """
+
+    adaptor = sair.Adaptor ()
+    entries = adaptor.irods_get_resource_listing (_Shell (ILSRESC_L))
+
+    assert [e.name for e in entries] == ['BNL_ATLAS_2_FTP', 'Nebraska_FTP',
+                                         'osgGridFtpGroup']
+
+    e = entries[0]
+    assert not e.is_resource_group
+    assert e.zone           == 'osg'
+    assert e.type           == 'MSS universal driver'
+    assert e.resource_class == 'compound'
+    assert e.location       == 'gw014k1.fnal.gov'
+    assert e.vault          == '/data/cache/BNL_ATLAS_2_FTPplaceholder'
+    assert e.free_space     is None
+    assert e.status         == 'up'
+    assert e.create_time    == '01343055975: 2012-07-23.09:06:15'
+
+    e = entries[2]
+    assert e.is_resource_group
+    assert e.location       is None
+    assert e.group_members  == ['BNL_ATLAS_2_FTP', 'Nebraska_FTP']
+
+    try :
+        adaptor.irods_get_resource_listing (_Shell ("", ret=1))
+        assert False, "expected NoSuccess"
+    except saga.NoSuccess :
+        pass
+
+
+# ------------------------------------------------------------------------------
+#
+def test_irods_rank_locations () :
+    """ Test ranking of replica locations """
+
+    adaptor = sair.Adaptor ()
+    adaptor._resources.clear ()
+
+    metrics = suhm.HostMetrics ()
+    probe   = metrics._probe
+
+    try :
+        metrics._probe = False
+        metrics.invalidate ()
+
+        shell = _Shell (ILSRESC_L)
+        locs  = ['unknown_FTP', 'BNL_ATLAS_2_FTP', 'Nebraska_FTP']
+
+        assert adaptor.irods_get_resource_hosts (shell) == \
+               {'BNL_ATLAS_2_FTP' : 'gw014k1.fnal.gov',
+                'Nebraska_FTP'    : 'red-gridftp.unl.edu'}
+
+        # without recorded transfers, the order is kept
+        assert adaptor.irods_rank_locations (locs, 10**6, shell) == locs
+
+        metrics.record_transfer ('irods://gw014k1.fnal.gov/',    10**6, 10.0)
+        metrics.record_transfer ('irods://red-gridftp.unl.edu/', 10**6,  1.0)
+
+        assert adaptor.irods_rank_locations (locs, 10**6, shell) == \
+               ['Nebraska_FTP', 'BNL_ATLAS_2_FTP', 'unknown_FTP']
+
+    finally :
+        metrics._probe = probe
+        metrics.invalidate ()
+        adaptor._resources.clear ()
+
+
+# ------------------------------------------------------------------------------
+#
+def test_irods_run_transfers () :
+    """ Test failure isolation and reporting of concurrent transfers """
+
+    adaptor = sair.Adaptor ()
+    shells  = list()
+
+    def _shell () :
+        shells.append (_Shell ("", fail="bad"))
+        return shells[-1]
+
+    try :
+        adaptor.irods_transfer_shell = _shell
+
+        transfers = [{'cmd' : 'iput good_1', 'source' : 'good_1', 'target' : '/c',
+                      'size' : 100},
+                     {'cmd' : 'iput bad',    'source' : 'bad',    'target' : '/c',
+                      'size' : 1000},
+                     {'cmd' : 'iput good_2', 'source' : 'good_2', 'target' : '/c',
+                      'size' : 10,   'invalidate' : ['/c/good_2']}]
+
+        report = adaptor.irods_run_transfers (transfers)
+
+        # the failed transfer does not stop the others
+        assert report['transfers'] is transfers
+        assert [t['state'] for t in transfers] == \
+               [saga.task.DONE, saga.task.FAILED, saga.task.DONE]
+        assert transfers[0]['error'] is None
+        assert 'failed' in transfers[1]['error']
+        assert None not in [t['time'] for t in transfers]
+
+        # each command ran exactly once, and each worker used its own shell
+        cmds = sum ([sh.cmds for sh in shells], [])
+        assert sorted (cmds) == ['iput bad', 'iput good_1', 'iput good_2'], cmds
+        assert len (shells) <= max (1, adaptor.bulk_concurrency)
+
+        # only successful transfers count for size and throughput
+        assert report['size'] == 110
+        assert report['time'] >= 0
+        if  report['time'] > 0 :
+            assert report['throughput'] == 110 / report['time']
+
+        assert adaptor.irods_run_transfers ([])['size'] == 0
+
+    finally :
+        del adaptor.irods_transfer_shell
+
+
+# ------------------------------------------------------------------------------
+#
+def test_irods_upload_bulk () :
+    """ Test the size balanced grouping of bulk uploads """
+
+    adaptor     = sair.Adaptor ()
+    concurrency = adaptor.bulk_concurrency
+    shell       = _Shell ("")
+    tmp         = tempfile.mkdtemp ()
+
+    try :
+        adaptor.bulk_concurrency     = 2
+        adaptor.irods_transfer_shell = lambda : shell
+
+        names = list()
+        for name, size in [('s', 30), ('l', 100), ('m', 50), ('n', 40)] :
+            path = os.path.join (tmp, name)
+            with open (path, 'w') as f :
+                f.write ('x' * size)
+            names.append ('file://localhost%s' % path)
+
+        # don't run the constructor, it opens a shell
+        d          = sair.IRODSDirectory.__new__ (sair.IRODSDirectory)
+        d._adaptor = adaptor
+        d._logger  = adaptor._logger
+        d._url     = saga.Url ('irods:///osg/home/azebro1')
+        d.shell    = shell
+
+        report = d.upload_bulk (names, None, 0)
+        groups = sorted ([(t['size'], t['source']) for t in report['transfers']])
+
+        # largest files first, each to the group with the least bytes so far
+        assert groups == [(100, [os.path.join (tmp, 'l')]),
+                          (120, [os.path.join (tmp, n) for n in 'mns'])], groups
+
+        for t in report['transfers'] :
+            assert t['state']  == saga.task.DONE
+            assert t['target'] == '/osg/home/azebro1'
+
+        assert sorted (shell.cmds) == \
+               sorted (["iput -b %s %s /osg/home/azebro1"
+                        % (adaptor.irods_transfer_opts (), " ".join (t['source']))
+                        for t in report['transfers']]), shell.cmds
+
+        # at most one group per file
+        adaptor.bulk_concurrency = 8
+        shell.cmds = list()
+        report     = d.upload_bulk (names[:1], None, 0)
+        assert len (report['transfers']) == 1
+        assert report['size'] == 30
+
+    finally :
+        adaptor.bulk_concurrency = concurrency
+        del adaptor.irods_transfer_shell
+        shutil.rmtree (tmp)
+
@@ -11,6 +11,7 @@ import os, sys
 from   saga.engine.engine import Engine
 
 import radical.utils as ru
+import saga
 
 
 def test_singleton():
@@ -112,3 +113,36 @@ def test_load_broken_adaptor():
 
 
 
+
+def test_bind_cache():
+    """ Test that recent binding failures and successes order adaptors
+    """
+    e   = Engine()
+    key = e._bind_key('saga.job.Service', 'mock', 'host.net', None)
+    a   = {'adaptor_name': 'a'}
+    b   = {'adaptor_name': 'b'}
+
+    assert e._bind_order(key, [a, b]) == ([a, b], [])
+
+    # the last successful adaptor goes first
+    e._bind_result(key, 'b')
+    assert e._bind_order(key, [a, b]) == ([b, a], [])
+
+    # recently failed adaptors are skipped...
+    err = saga.NotImplemented('failed')
+    e._bind_result(key, 'b', err)
+    candidates, skipped = e._bind_order(key, [a, b])
+    assert candidates == [a]
+    assert [name for name, _ in skipped] == ['b']
+
+    # ... and reported with the type and message of the original exception,
+    # which is not kept alive by the cache
+    assert skipped[0][1] is not err
+    assert isinstance(skipped[0][1], saga.NotImplemented)
+    assert skipped[0][1]._plain_message == 'failed'
+
+    # ... unless nothing else is left
+    e._bind_result(key, 'a', err)
+    assert e._bind_order(key, [a, b]) == ([a, b], [])
+
+    e._bind_cache.clear()
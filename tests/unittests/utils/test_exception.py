@@ -7,6 +7,8 @@ __license__   = "MIT"
 """ Unit tests for saga.utils.exception.py
 """
 
+import sys
+
 import saga
 
 import radical.utils as ru
@@ -24,3 +26,23 @@ def test_Exceptions():
 
 
 
+
+
+def _fail():
+    raise ValueError('native error')
+
+
+def test_ExceptionParent():
+    """ Test that native parent exceptions keep their traceback, but no frames
+    """
+    try:
+        try:
+            _fail()
+        except ValueError, ve:
+            raise saga.NoSuccess('wrapped', parent=ve)
+    except saga.NoSuccess, se:
+        for val in se.__dict__.values():
+            assert not isinstance(val, type(sys.exc_info()[2])), val
+        assert '_fail' in se.traceback, se.traceback
+        assert "raise ValueError('native error')" in se.traceback, se.traceback
+        assert 'native error' in se.message
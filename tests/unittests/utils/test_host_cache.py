@@ -0,0 +1,80 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Unit tests for saga.utils.host_cache.py
+"""
+
+import time
+import shutil
+import tempfile
+
+import saga
+
+from saga.utils.host_cache import HostCache
+
+
+class _Session(object):
+    """ only provides the contexts of a session """
+
+    def __init__(self, contexts):
+        self.contexts = contexts
+
+
+
+def test_HostCache():
+    """ Test host capability caching, expiry and invalidation
+    """
+    cache = HostCache()
+    path  = cache._path
+    ttl   = cache._ttl
+
+    try:
+        cache._path    = tempfile.mkdtemp()
+        cache._ttl     = 60
+        cache._entries = dict()
+
+        url = 'ssh://user@host.net/'
+        assert cache.get(url, 'adaptor') is None
+
+        cache.set(url, 'adaptor', {'ppn': 8})
+        assert cache.get(url,                   'adaptor') == {'ppn': 8}
+        assert cache.get('slurm+ssh://user@host.net/', 'adaptor') == {'ppn': 8}
+        assert cache.get('ssh://other@host.net/',      'adaptor') is None
+
+        # entries are read back from disk
+        cache._entries = dict()
+        assert cache.get(url, 'adaptor') == {'ppn': 8}
+
+        cache.invalidate(url, 'adaptor')
+        assert cache.get(url, 'adaptor') is None
+
+        cache.set(url, 'adaptor', {'ppn': 8})
+        cache._entries[cache._key(url)]['adaptor']['time'] = time.time() - 61
+        assert cache.get(url, 'adaptor') is None
+
+        cache.set(url, 'adaptor', {'ppn': 8})
+        cache.invalidate()
+        assert cache.get(url, 'adaptor') is None
+
+        # without user in the URL, the context user_id selects the entry
+        ctx         = saga.Context('userpass')
+        ctx.user_id = 'host_cache_test'
+        session     = _Session([ctx])
+
+        cache.set('ssh://host_cache_test@host.net/', 'adaptor', {'ppn': 8})
+        assert cache.get('ssh://host.net/', 'adaptor', session) == {'ppn': 8}
+        assert cache.get('ssh://host.net/', 'adaptor') is None
+        assert cache.get('ssh://other@host.net/', 'adaptor', session) is None
+
+        # contexts don't apply to local shells
+        cache.set('fork://localhost/', 'adaptor', {'ppn': 2}, session)
+        assert cache.get('fork://localhost/', 'adaptor') == {'ppn': 2}
+
+    finally:
+        shutil.rmtree(cache._path)
+        cache._path    = path
+        cache._ttl     = ttl
+        cache._entries = dict()
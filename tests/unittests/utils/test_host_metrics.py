@@ -0,0 +1,56 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Unit tests for saga.utils.host_metrics.py
+"""
+
+import saga.utils.host_metrics as suhm
+
+from saga.utils.host_metrics import HostMetrics
+
+
+def test_HostMetrics():
+    """ Test bandwidth recording and host ranking
+    """
+    metrics = HostMetrics()
+    probe   = metrics._probe
+
+    try:
+        # don't probe the network
+        metrics._probe = False
+        metrics.invalidate()
+
+        assert metrics.get_latency('ssh://localhost/')   == 0.0
+        assert metrics.get_latency('ssh://remote.org/')  == suhm.DEFAULT_LATENCY
+        assert metrics.get_bandwidth('ssh://remote.org/') is None
+
+        metrics.record_transfer('gsiftp://slow.org/', 1000, 1.0)
+        metrics.record_transfer('gsiftp://fast.org/', 1000, 0.1)
+        metrics.record_transfer('gsiftp://fast.org/', 0,    0.1)  # ignored
+
+        assert metrics.get_bandwidth('ssh://slow.org/')  == 1000.0
+        assert metrics.get_bandwidth('ssh://fast.org/')  == 10000.0
+
+        # averaged with the previous transfers
+        metrics.record_transfer('gsiftp://fast.org/', 1000, 1.0)
+        bw = metrics.get_bandwidth('ssh://fast.org/')
+        assert 1000.0 < bw < 10000.0
+
+        urls = ['irods://slow.org/', 'irods://fast.org/']
+        assert metrics.rank(urls, 10**6) == ['irods://fast.org/', 'irods://slow.org/']
+
+        # without history, hosts are ranked by latency only
+        assert metrics.rank(['irods://new.org/', 'irods://localhost/']) == \
+                            ['irods://localhost/', 'irods://new.org/']
+
+        metrics.invalidate('irods://fast.org/')
+        assert metrics.get_bandwidth('ssh://fast.org/') is None
+        assert metrics.get_bandwidth('ssh://slow.org/') == 1000.0
+
+    finally:
+        metrics._probe = probe
+        metrics.invalidate()
+
@@ -0,0 +1,74 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Unit tests for saga.utils.job.job_array.py
+"""
+
+import saga
+
+from saga.utils.job import JobArray
+
+
+def test_JobArray_specs():
+    """ Test job array index notations
+    """
+    ja = JobArray(1, 9, 2)
+
+    assert ja.indices      == [1, 3, 5, 7, 9]
+    assert ja.range_spec() == '1-9:2'
+    assert ja.list_spec()  == '1,3,5,7,9'
+    assert ja.substitute('out.$SAGA_ARRAY_INDEX', 3) == 'out.3'
+
+    assert ja.parse_indices('3')        == [3]
+    assert ja.parse_indices('1-5:1,9')  == [1, 3, 5, 9]
+    assert ja.parse_indices('N/A')      == []
+
+    try:
+        JobArray(0, 3).range_spec(min_start=1)
+        assert False
+    except saga.BadParameter:
+        pass
+
+    try:
+        JobArray(3, 1)
+        assert False
+    except saga.BadParameter:
+        pass
+
+
+def test_JobArray_description():
+    """ Test job array creation from job descriptions
+    """
+    jd = saga.job.Description()
+    assert JobArray.from_description(jd) is None
+
+    jd.array_end = 4
+    ja = JobArray.from_description(jd)
+    assert ja.indices == [1, 2, 3, 4]
+
+
+def test_JobArray_states():
+    """ Test job array element state handling
+    """
+    ja     = JobArray(1, 3)
+    states = ja.initial_states()
+    assert ja.collapse_states(states) == saga.job.PENDING
+
+    states = ja.merge_states(states, {1: saga.job.RUNNING,
+                                      2: saga.job.PENDING,
+                                      3: saga.job.PENDING})
+    assert ja.collapse_states(states) == saga.job.RUNNING
+
+    # elements which disappear are considered DONE
+    states = ja.merge_states(states, {2: saga.job.RUNNING})
+    assert states[1] == saga.job.DONE
+    assert states[3] == saga.job.DONE
+
+    states = ja.cancel_states(states)
+    assert states[1] == saga.job.DONE
+    assert states[2] == saga.job.CANCELED
+    assert ja.collapse_states(states) == saga.job.CANCELED
+
@@ -0,0 +1,102 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Unit tests for saga.utils.job.job_table.py
+"""
+
+import gc
+
+import saga
+
+from saga.utils.job import JobTable, JobInfo
+
+
+class _Job(object):
+    """ stands in for a saga.job.Job instance """
+    pass
+
+
+def test_JobInfo():
+    """ Test the dict protocol of job records
+    """
+    info = JobInfo({'state': saga.job.PENDING, 'exec_hosts': ['node1/0']})
+
+    assert info['state'] == saga.job.PENDING
+    assert info['gone'] is False
+    assert info['returncode'] is None
+    assert info.get('array') is None
+    assert info.get('foo', 'bar') == 'bar'
+
+    # keys without slot are supported, too
+    info['foo'] = 'bar'
+    assert info['foo'] == 'bar'
+    assert 'foo' in info
+
+    try:
+        info['unknown']
+        assert False, "expected KeyError"
+    except KeyError:
+        pass
+
+    # state strings and host names are interned
+    info['state']      = ''.join(['Run', 'ning'])
+    info['exec_hosts'] = [''.join(['node', '1/0'])]
+    assert info['state']         is saga.job.RUNNING
+    assert info['exec_hosts'][0] is intern('node1/0')
+
+    copy = info.copy()
+    assert copy['state'] == saga.job.RUNNING
+    assert copy['foo']   == 'bar'
+
+
+def test_JobTable():
+    """ Test in-place updates of job records
+    """
+    jobs = JobTable()
+
+    jobs['a'] = {'state': saga.job.PENDING, 'name': 'job_a'}
+    record    = jobs['a']
+    assert isinstance(record, JobInfo)
+
+    # assigned dicts update the existing record
+    jobs['a'] = {'state': saga.job.RUNNING}
+    assert jobs['a'] is record
+    assert record['state'] == saga.job.RUNNING
+    assert record['name']  == 'job_a'
+
+    jobs['a'] = record
+    assert jobs['a'] is record
+
+
+def test_JobTable_purge():
+    """ Test purging of final jobs
+    """
+    jobs = JobTable(retention=0)
+    job  = _Job()
+
+    jobs['running'] = {'state': saga.job.RUNNING}
+    jobs['done']    = {'state': saga.job.DONE}
+    jobs['held']    = {'state': saga.job.DONE}
+    jobs.attach('held', job)
+
+    assert jobs.purge(force=True) == 1
+    assert sorted(jobs.keys()) == ['held', 'running']
+
+    # the job object of a purgeable job keeps the record alive
+    assert jobs.purge(force=True) == 0
+    assert jobs['held']['obj'] is job
+
+    del job
+    gc.collect()
+
+    assert jobs.purge(force=True) == 1
+    assert jobs.keys() == ['running']
+
+    # no purging without retention period
+    jobs = JobTable(retention=None)
+    jobs['done'] = {'state': saga.job.DONE}
+    assert jobs.purge(force=True) == 0
+
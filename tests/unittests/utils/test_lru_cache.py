@@ -0,0 +1,96 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Unit tests for saga.utils.lru_cache.py
+"""
+
+import time
+
+import saga
+
+from saga.utils.lru_cache import LRUCache
+
+
+def test_LRUCache():
+    """ Test LRU eviction and statistics
+    """
+    cache = LRUCache(size=2)
+
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    # 'b' is the least recently used entry now
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+
+    try:
+        cache.get('b')
+        assert False, "expected KeyError"
+    except KeyError:
+        pass
+
+    assert cache.delete('a') is True
+    assert cache.delete('a') is False
+
+    stats = cache.stats()
+    assert stats['hits']      == 1
+    assert stats['misses']    == 1
+    assert stats['evictions'] == 1
+    assert stats['entries']   == 1
+
+    try:
+        LRUCache(size=0)
+        assert False, "expected BadParameter"
+    except saga.BadParameter:
+        pass
+
+
+def test_LRUCache_ttl():
+    """ Test expiry of cache entries
+    """
+    cache = LRUCache(ttl=0.1)
+
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=10)
+    time.sleep(0.2)
+
+    assert 'a' not in cache
+    assert cache.get('b') == 2
+
+    try:
+        cache.get('a')
+        assert False, "expected KeyError"
+    except KeyError:
+        pass
+
+    assert cache.stats()['expired'] == 1
+
+    # ttl 0 disables caching
+    cache = LRUCache(ttl=0)
+    cache.set('a', 1)
+    assert len(cache) == 0
+
+
+def test_LRUCache_bytes():
+    """ Test size bound in bytes
+    """
+    cache = LRUCache(max_bytes=10, sizeof=len)
+
+    cache.set('a', 'x' * 4)
+    cache.set('b', 'x' * 4)
+    cache.set('c', 'x' * 4)
+
+    assert 'a' not in cache
+    assert cache.stats()['bytes'] == 8
+
+    # a single entry larger than the bound is kept
+    cache.set('d', 'x' * 20)
+    assert len(cache) == 1
+    assert cache.get('d') == 'x' * 20
+
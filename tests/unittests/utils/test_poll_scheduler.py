@@ -0,0 +1,165 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Unit tests for saga.utils.job.poll_scheduler.py
+"""
+
+import time
+import threading
+
+import saga
+
+from saga.utils.job import PollInterval, PollScheduler
+
+
+def test_PollInterval():
+    """ Test adaptive poll intervals
+    """
+    pi = PollInterval(min_interval=1, max_interval=4, factor=2, jitter=0)
+
+    assert pi.next('PENDING') == 1
+    assert pi.next('PENDING') == 2
+    assert pi.next('PENDING') == 4
+    assert pi.next('PENDING') == 4
+
+    # state changes trigger a fast re-poll
+    assert pi.next('RUNNING') == 1
+    assert pi.next('RUNNING') == 2
+
+    pi.reset()
+    assert pi.next('RUNNING') == 1
+
+    pi = PollInterval(min_interval=10, max_interval=10, jitter=0.1)
+    for _ in range(10):
+        assert 9.0 <= pi.next('PENDING') <= 11.0
+
+    # sleeps never extend beyond the deadline
+    start = time.time()
+    pi.sleep('PENDING', deadline=start + 0.1)
+    assert time.time() - start < 1.0
+
+
+def test_PollScheduler():
+    """ Test aggregation of concurrent polls into bulk queries
+    """
+    queries = list()
+
+    def query(job_ids):
+        queries.append(sorted(job_ids))
+        time.sleep(0.2)
+        return dict([(job_id, 'state.%s' % job_id) for job_id in job_ids
+                                                   if job_id != 'gone'])
+
+    ps      = PollScheduler(query)
+    results = dict()
+
+    def poller(job_id):
+        results[job_id] = ps.poll(job_id)
+
+    threads = [threading.Thread(target=poller, args=[str(i)]) for i in range(10)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    for i in range(10):
+        assert results[str(i)] == 'state.%d' % i
+
+    # the first poll runs a query on its own, all others wait for it and are
+    # then served by one more query
+    assert len(queries) < 10, queries
+    assert sum([len(q) for q in queries]) == 10
+
+    assert ps.poll_many(['1', 'gone']) == {'1': 'state.1', 'gone': None}
+
+    stats = ps.stats()
+    assert stats['polls']   == 12
+    assert stats['queries'] == len(queries)
+    assert ps.rate > 0
+
+    # results of final jobs are dropped by the adaptors
+    for job_id in [str(i) for i in range(10)] + ['gone']:
+        ps.forget(job_id)
+    assert not ps._results, ps._results
+
+
+def test_PollScheduler_error():
+    """ Test error propagation of bulk queries
+    """
+    def query(job_ids):
+        raise saga.NoSuccess('backend down')
+
+    ps = PollScheduler(query)
+
+    try:
+        ps.poll('1')
+        assert False
+    except saga.NoSuccess:
+        pass
+
+
+
+def test_PollScheduler_backoff():
+    """ Test poll intervals of scheduled jobs against a fake backend
+    """
+    states = ['PENDING'] * 5 + ['RUNNING'] * 3 + ['DONE']
+    polls  = list()
+
+    def query(job_ids):
+        polls.append(job_ids)
+        return dict([(job_id, states[min(len(polls), len(states)) - 1])
+                     for job_id in job_ids])
+
+    ps       = PollScheduler(query, min_interval=1, max_interval=4)
+    interval = ps.interval()
+    expected = 1.0
+    last     = None
+
+    while True:
+        state = ps.poll('1')
+        if state == 'DONE':
+            break
+
+        if state != last:
+            expected = 1.0
+            last     = state
+
+        # intervals grow while the state remains, with bounded jitter
+        delay = interval.next(state)
+        assert 0.9 * expected <= delay <= 1.1 * expected, (state, delay, expected)
+        expected = min(4.0, expected * 1.5)
+
+    assert len(polls) == len(states)
+    assert ps.stats()['queries'] == len(states)
+
+
+def test_PollScheduler_forget_rate():
+    """ Test dropping results and the query rate window
+    """
+    queries = list()
+
+    def query(job_ids):
+        queries.append(job_ids)
+        return dict([(job_id, 'RUNNING') for job_id in job_ids])
+
+    ps = PollScheduler(query, rate_window=10.0)
+
+    for _ in range(5):
+        assert ps.poll('1') == 'RUNNING'
+
+    assert len(queries) == 5
+    assert abs(ps.rate - 0.5) < 1e-6, ps.rate
+
+    # queries older than the window don't count
+    ps._stamps.appendleft(time.time() - 20.0)
+    assert abs(ps.rate - 0.5) < 1e-6, ps.rate
+
+    # forgotten results are gone, but the job can be polled again
+    ps.forget('1')
+    ps.forget('unknown')
+    assert '1' not in ps._results
+
+    assert ps.poll('1') == 'RUNNING'
+    assert len(queries) == 6
+    assert ps.stats()['polls_per_query'] == 1.0
@@ -0,0 +1,129 @@
+
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Unit tests for saga.utils.pty_reactor.py
+"""
+
+import os
+import time
+
+import saga
+import saga.utils.pty_reactor as ptyr
+
+
+# ------------------------------------------------------------------------------
+#
+def test_reactor_read () :
+    """ Test reading through the pty reactor """
+
+    if  not ptyr.available () :
+        return
+
+    reactor = ptyr.PTYReactor ()
+    rfd, wfd = os.pipe ()
+
+    try :
+        reactor.register (rfd)
+
+        assert (reactor.read (rfd, 0.1) == '')
+
+        os.write (wfd, "foo\r\nbar")
+        data  = ""
+        start = time.time ()
+        while len(data) < 7 and time.time () - start < 5 :
+            data += reactor.read (rfd, 0.1)
+        assert (data == "foo\nbar"), repr(data)
+
+        os.close (wfd)
+        wfd = None
+
+        try :
+            reactor.read (rfd, 5.0)
+            assert (False), "expected NoSuccess on EOF"
+        except saga.NoSuccess :
+            pass
+
+    finally :
+        reactor.unregister (rfd)
+        os.close (rfd)
+        if  wfd : os.close (wfd)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_reactor_subscribe () :
+    """ Test line callbacks from the pty reactor """
+
+    if  not ptyr.available () :
+        return
+
+    reactor = ptyr.PTYReactor ()
+    rfd, wfd = os.pipe ()
+    lines    = list()
+
+    try :
+        reactor.register (rfd)
+        reactor.subscribe (rfd, lines.append, data="0:")
+
+        os.write (wfd, "one\n2:tw")
+        os.write (wfd, "o\n3:three")
+        os.close (wfd)
+        wfd = None
+
+        start = time.time ()
+        while None not in lines and time.time () - start < 5 :
+            time.sleep (0.01)
+
+        # the incomplete last line is not passed on
+        assert (lines == ['0:one', '2:two', None]), lines
+
+    finally :
+        reactor.unregister (rfd)
+        os.close (rfd)
+        if  wfd : os.close (wfd)
+
+
+
+# ------------------------------------------------------------------------------
+#
+def test_reactor_fail () :
+    """ Test that a broken reactor wakes up all readers """
+
+    if  not ptyr.available () :
+        return
+
+    reactor = ptyr.PTYReactor ()
+    rfd, wfd = os.pipe ()
+
+    try :
+        reactor.register (rfd)
+
+        # what the reader thread does when epoll fails
+        reactor._fail ()
+
+        start = time.time ()
+        try :
+            reactor.read (rfd, 5.0)
+            assert (False), "expected NoSuccess after reactor failure"
+        except saga.NoSuccess :
+            pass
+        assert (time.time () - start < 1.0)
+
+        reactor.unregister (rfd)
+
+        # the reactor keeps working for new fds
+        reactor.register (rfd)
+        os.write (wfd, "foo\n")
+        data  = ""
+        start = time.time ()
+        while len(data) < 4 and time.time () - start < 5 :
+            data += reactor.read (rfd, 0.1)
+        assert (data == "foo\n"), repr(data)
+
+    finally :
+        reactor.unregister (rfd)
+        os.close (rfd)
+        os.close (wfd)
@@ -6,9 +6,13 @@ __license__   = "MIT"
 
 import os
 import time
+import shutil
+import tempfile
 import signal
 import saga
 import saga.utils.pty_shell   as sups
+import saga.utils.pty_shell_factory as supsf
+import saga.utils.job.script_submit as sujss
 import saga.utils.test_config as sutc
 
 import radical.utils.testing as rut
@@ -62,10 +66,68 @@ def test_ptyshell_async () :
     shell.send ('EOT\n')
 
     ret, out = shell.find_prompt ()
- 
+
     assert (ret == 0)   , "%s"       % (repr(ret))
     assert (out == txt) , "%s == %s" % (repr(out), repr(txt))
- 
+
+    assert (shell.alive ())
+    shell.finalize (True)
+    assert (not shell.alive ())
+
+
+# ------------------------------------------------------------------------------
+#
+def test_ptyshell_batch () :
+    """ Test pty_shell which runs several commands in one round trip """
+    conf  = rut.get_test_config ()
+    shell = sups.PTYShell (saga.Url(conf.job_service_url), conf.session)
+
+    res = shell.run_batch (["printf 'a'", "printf 'b\\n'; false", "cd /", "pwd"])
+
+    assert (len(res) == 4), "%s" % (repr(res))
+    assert (res[0] == (0, 'a',   None)), "%s" % (repr(res[0]))
+    assert (res[1] == (1, 'b\n', None)), "%s" % (repr(res[1]))
+    assert (res[2] == (0, '',    None)), "%s" % (repr(res[2]))
+
+    # commands run in subshells, and don't change the shell's state
+    ret, out, _ = shell.run_sync ("pwd")
+    assert (res[3] == (0, out,   None)), "%s == %s" % (repr(res[3]), repr(out))
+
+    assert (shell.run_batch ([]) == [])
+
+    try :
+        shell.run_batch (["sleep 1 &"])
+        assert (False), "expected BadParameter"
+    except saga.BadParameter :
+        pass
+
+    assert (shell.alive ())
+    shell.finalize (True)
+    assert (not shell.alive ())
+
+
+# ------------------------------------------------------------------------------
+#
+def test_ptyshell_heredoc () :
+    """ Test pty_shell which runs a batch script submission command """
+    conf  = rut.get_test_config ()
+    shell = sups.PTYShell (saga.Url(conf.job_service_url), conf.session)
+
+    script = "echo \\$HOME\necho SAGA_JOB_SCRIPT_EOF\n"
+    cmd    = sujss.script_submit_cmd ('cat', script, expand=True)
+
+    ret, out, _ = shell.run_sync (cmd)
+    assert (ret == 0), "%s" % (repr(ret))
+    assert ("echo $HOME" in out), "%s" % (repr(out))
+    assert ("echo SAGA_JOB_SCRIPT_EOF" in out), "%s" % (repr(out))
+
+    # redirections can't be appended to multi-line commands
+    try :
+        shell.run_sync (cmd, iomode=sups.MERGED)
+        assert (False), "expected BadParameter"
+    except saga.BadParameter :
+        pass
+
     assert (shell.alive ())
     shell.finalize (True)
     assert (not shell.alive ())
@@ -117,3 +179,33 @@ def test_ptyshell_file_stage () :
 # ------------------------------------------------------------------------------
 
 
+# ------------------------------------------------------------------------------
+#
+def test_ptyshell_ctrl () :
+    """ Test handling of stale ssh control sockets """
+
+    factory = supsf.PTYShellFactory ()
+    tmp     = tempfile.mkdtemp ()
+
+    try :
+        info = {'ctrl'     : "%s/test.ctrl" % tmp,
+                'logger'   : factory.logger,
+                'ssh_env'  : '',
+                'ssh_exe'  : '/bin/false',
+                'host_str' : 'localhost'}
+
+        # no socket: ssh can create one
+        assert factory._check_ctrl (info)
+
+        # no master listening: the stale socket gets removed
+        open (info['ctrl'], 'w').close ()
+        assert factory._check_ctrl (info)
+        assert not os.path.exists (info['ctrl'])
+
+        # stale socket which can't be removed: don't share
+        os.makedirs ("%s/test.ctrl/sub" % tmp)
+        assert not factory._check_ctrl (info)
+
+    finally :
+        shutil.rmtree (tmp)
+
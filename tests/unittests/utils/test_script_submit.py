@@ -0,0 +1,127 @@
+__author__    = "Andre Merzky"
+__copyright__ = "Copyright 2013, The SAGA Project"
+__license__   = "MIT"
+
+
+""" Unit tests for saga.utils.job.script_submit.py
+"""
+
+import os
+import shutil
+import tempfile
+import subprocess
+
+from saga.utils.job import script_submit_cmd
+from saga.utils.job.script_submit import SCRIPT_EOF
+
+
+# ------------------------------------------------------------------------------
+#
+def _run(cmd, cwd=None):
+    """ run a command in /bin/sh, and return its exit code and stdout
+    """
+    proc = subprocess.Popen(['/bin/sh', '-c', cmd], cwd=cwd,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, _ = proc.communicate()
+    return proc.returncode, out
+
+
+# ------------------------------------------------------------------------------
+#
+def test_quoted_heredoc():
+    """ Test that the script is passed on verbatim by default
+    """
+    script = "#!/bin/sh\necho $HOME `hostname` \\$USER\n"
+    cmd    = script_submit_cmd('cat', script)
+
+    assert cmd == "cat <<'%s'\n%s%s" % (SCRIPT_EOF, script, SCRIPT_EOF)
+
+    ret, out = _run(cmd)
+    assert ret == 0
+    assert out == script, repr(out)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_expanded_heredoc():
+    """ Test that expanded scripts keep pre-escaped variables
+    """
+    # the batch adaptors escape '$' to '\$' for all variables which are to be
+    # evaluated on the execution node -- those must survive the expansion
+    script = "#!/bin/sh\nexport FOO=bar\necho \\$FOO \\$PBS_O_WORKDIR\n"
+    cmd    = script_submit_cmd('cat', script, expand=True)
+
+    assert cmd == "cat <<%s\n%s%s" % (SCRIPT_EOF, script, SCRIPT_EOF)
+
+    ret, out = _run(cmd)
+    assert ret == 0
+    assert out == "#!/bin/sh\nexport FOO=bar\necho $FOO $PBS_O_WORKDIR\n", \
+           repr(out)
+
+    # unescaped variables are expanded by the submitting shell
+    ret, out = _run("X=expanded; %s" % script_submit_cmd('cat', 'echo $X',
+                                                          expand=True))
+    assert ret == 0
+    assert out == "echo expanded\n", repr(out)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_trailing_newline():
+    """ Test that the delimiter always ends up on a line of its own
+    """
+    cmd = script_submit_cmd('cat', 'echo foo')
+    assert cmd.endswith("echo foo\n%s" % SCRIPT_EOF)
+
+    cmd = script_submit_cmd('cat', 'echo foo\n')
+    assert cmd.endswith("echo foo\n%s" % SCRIPT_EOF)
+
+    ret, out = _run(cmd)
+    assert ret == 0
+    assert out == "echo foo\n", repr(out)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_mkdirs():
+    """ Test that missing directories are created before submission
+    """
+    assert script_submit_cmd('cat', 'x').startswith("cat <<")
+    assert script_submit_cmd('cat', 'x', mkdirs=[]).startswith("cat <<")
+    assert script_submit_cmd('cat', 'x', mkdirs=[None, '']).startswith("cat <<")
+
+    cmd = script_submit_cmd('cat', 'x', mkdirs=['a/b', None, '', 'c'])
+    assert cmd.startswith("mkdir -p a/b c && cat <<")
+
+    tmp = tempfile.mkdtemp()
+    try:
+        ret, out = _run(cmd, cwd=tmp)
+        assert ret == 0
+        assert out == "x\n", repr(out)
+        assert os.path.isdir(os.path.join(tmp, 'a', 'b'))
+        assert os.path.isdir(os.path.join(tmp, 'c'))
+
+        # a failing mkdir prevents the submission
+        open(os.path.join(tmp, 'file'), 'w').close()
+        ret, out = _run(script_submit_cmd('cat', 'x', mkdirs=['file/d']),
+                        cwd=tmp)
+        assert ret != 0
+        assert out == "", repr(out)
+    finally:
+        shutil.rmtree(tmp)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_delimiter_in_script():
+    """ Test that a script containing the delimiter is not truncated
+    """
+    script = "echo 1\n%s\necho 2\n%s_1\necho 3\n" % (SCRIPT_EOF, SCRIPT_EOF)
+
+    for expand in [False, True]:
+        cmd = script_submit_cmd('cat', script, expand=expand)
+        assert cmd.endswith("\n%s_2" % SCRIPT_EOF), repr(cmd)
+
+        ret, out = _run(cmd)
+        assert ret == 0
+        assert out == script, repr(out)